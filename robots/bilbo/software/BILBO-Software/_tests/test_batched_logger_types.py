@@ -0,0 +1,46 @@
+import tempfile
+
+from core.utils.csv_utils import BatchedLogger, read_binary_log, read_csv_file
+
+
+def log_samples(samples: list, format: str) -> BatchedLogger:
+    folder = tempfile.mkdtemp()
+    logger = BatchedLogger(format=format, buffer_size=4)
+    logger.make_file('types.log' if format == 'binary' else 'types.csv', folder=folder)
+    for sample in samples:
+        logger.write_data(sample)
+    logger.close()
+    return logger
+
+
+def test_int_to_float():
+    # A float in an int column would be truncated by NumPy without an error
+    logger = log_samples([{'x': 0, 'y': {'z': 1}}, {'x': 1.7, 'y': {'z': 2}}, {'x': 2.5, 'y': {'z': 3}}], 'binary')
+    assert len(logger.file_paths) == 2
+
+    first, header_first = read_binary_log(logger.file_paths[0])
+    second, header_second = read_binary_log(logger.file_paths[1])
+    assert header_first['types'][1] == 'int' and list(first['x']) == [0]
+    assert header_second['types'][1] == 'float' and list(second['x']) == [1.7, 2.5]
+    assert list(second['index']) == [1, 2]
+
+
+def test_float_to_str():
+    # A numeric string in a float column would be parsed by NumPy without an error
+    logger = log_samples([{'x': 1.5}, {'x': '2.5'}, {'x': 'text'}, {'x': 3.5}], 'csv')
+    assert len(logger.file_paths) == 3
+
+    rows = [read_csv_file(file_path, meta_lines=0)['data'] for file_path in logger.file_paths]
+    assert [row['x'] for row in rows[0]] == [1.5]
+    assert [row['x'] for row in rows[1]] == ['2.5', 'text']
+    assert [row['x'] for row in rows[2]] == [3.5]
+
+
+def main():
+    test_int_to_float()
+    test_float_to_str()
+    print("BatchedLogger type changes: OK")
+
+
+if __name__ == '__main__':
+    main()
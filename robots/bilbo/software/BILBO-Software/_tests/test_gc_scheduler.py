@@ -0,0 +1,50 @@
+import gc
+import time
+import weakref
+
+from core.utils.realtime import GC_Scheduler
+
+
+class Node:
+    def __init__(self):
+        self.other = self
+
+
+def test_fallback_without_updates():
+    # Without calls to collect(), e.g. while no low-level samples arrive, cyclic garbage is still collected
+    scheduler = GC_Scheduler(fallback_timeout=0.2)
+    scheduler.start()
+    try:
+        assert not gc.isenabled()
+        node = Node()
+        reference = weakref.ref(node)
+        del node
+        time.sleep(0.5)
+        assert reference() is None
+        assert scheduler.statistics['fallback'] >= 1
+    finally:
+        scheduler.stop()
+    assert gc.isenabled()
+
+
+def test_no_fallback_with_updates():
+    scheduler = GC_Scheduler(fallback_timeout=0.2)
+    scheduler.start()
+    try:
+        time_end = time.monotonic() + 0.5
+        while time.monotonic() < time_end:
+            scheduler.collect(budget=0.01)
+            time.sleep(0.01)
+        assert scheduler.statistics['fallback'] == 0
+    finally:
+        scheduler.stop()
+
+
+def main():
+    test_fallback_without_updates()
+    test_no_fallback_with_updates()
+    print("GC_Scheduler fallback: OK")
+
+
+if __name__ == '__main__':
+    main()
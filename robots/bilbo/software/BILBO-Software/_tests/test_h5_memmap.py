@@ -0,0 +1,86 @@
+import os
+import tempfile
+
+import numpy as np
+
+from core.utils.h5 import H5PyDictLogger, H5SampleReader, make_contiguous
+
+DTYPE = np.dtype([('general.time', np.float64), ('lowlevel.estimation.state.v', np.float32),
+                  ('lowlevel.estimation.state.theta', np.float32)])
+
+
+def make_samples(start: int, num_samples: int) -> np.ndarray:
+    samples = np.zeros(num_samples, dtype=DTYPE)
+    samples['general.time'] = np.arange(start, start + num_samples) * 0.01
+    samples['lowlevel.estimation.state.theta'] = np.sin(samples['general.time'])
+    return samples
+
+
+def write_log(filename: str, samples: np.ndarray, mode: str = 'w', **kwargs):
+    logger = H5PyDictLogger(filename, chunk_size=100, **kwargs)
+    logger.init(DTYPE)
+    logger.start(mode=mode)
+    for start in range(0, len(samples), 7):
+        logger.appendSamples(samples[start:start + 7])
+    logger.close()
+
+
+def test_finished_log_is_mapped():
+    filename = os.path.join(tempfile.mkdtemp(), 'log.h5')
+    samples = make_samples(0, 1234)
+    write_log(filename, samples, contiguous_on_close=True)
+
+    with H5SampleReader(filename) as reader:
+        assert reader.memmap() is not None
+        theta = reader.read('lowlevel.estimation.state.theta', time_range=(1.0, 2.0), lazy=True)
+        assert isinstance(theta, np.memmap)
+        assert np.array_equal(theta, samples['lowlevel.estimation.state.theta'][100:200])
+        assert np.array_equal(reader.read(), samples)
+
+
+def test_resumed_log_is_mapped():
+    filename = os.path.join(tempfile.mkdtemp(), 'log.h5')
+    samples = make_samples(0, 500)
+    write_log(filename, samples[:250], contiguous_on_close=True)
+    write_log(filename, samples[250:], mode='a', contiguous_on_close=True)
+
+    with H5SampleReader(filename) as reader:
+        assert len(reader) == 500
+        assert reader.memmap() is not None
+        assert np.array_equal(reader.memmap(), samples)
+
+
+def test_make_contiguous():
+    # Logs stay chunked by default and can be converted offline
+    filename = os.path.join(tempfile.mkdtemp(), 'log.h5')
+    samples = make_samples(0, 500)
+    write_log(filename, samples)
+
+    with H5SampleReader(filename) as reader:
+        assert reader.memmap() is None
+    make_contiguous(filename)
+    with H5SampleReader(filename) as reader:
+        assert np.array_equal(reader.memmap(), samples)
+
+
+def test_compressed_log_is_read_lazily():
+    filename = os.path.join(tempfile.mkdtemp(), 'log.h5')
+    samples = make_samples(0, 500)
+    write_log(filename, samples, compression='lzf')
+
+    with H5SampleReader(filename) as reader:
+        assert reader.memmap() is None
+        theta = reader.read('lowlevel.estimation.state.theta', lazy=True)
+        assert np.array_equal(theta[10:20], samples['lowlevel.estimation.state.theta'][10:20])
+
+
+def main():
+    test_finished_log_is_mapped()
+    test_resumed_log_is_mapped()
+    test_make_contiguous()
+    test_compressed_log_is_read_lazily()
+    print("H5PyDictLogger memory-mapped reads: OK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+import ctypes
+
+import numpy as np
+
+from core.utils.ctypes_utils import bytes_to_records, bytes_to_value, record_to_dict
+from robot.lowlevel.stm32_sample import bilbo_ll_sample_struct, bilbo_ll_sample_dtype, bilbo_ll_sample_flat_dtype
+
+NUM_SAMPLES = 10
+
+
+def fill_struct(struct: ctypes.Structure, seed: int):
+    # Different, exactly representable values for every field and sample
+    counter = [seed * 1000]
+
+    def value(ctype_type):
+        counter[0] += 1
+        if ctype_type is ctypes.c_bool:
+            return counter[0] % 2 == 0
+        if ctype_type in (ctypes.c_float, ctypes.c_double):
+            return counter[0] * 0.25 - 100
+        return counter[0] % (1 << (8 * ctypes.sizeof(ctype_type) - 1))
+
+    def fill(target: ctypes.Structure):
+        for name, ctype_type in target._fields_:
+            if issubclass(ctype_type, ctypes.Structure):
+                fill(getattr(target, name))
+            elif issubclass(ctype_type, ctypes.Array):
+                array = getattr(target, name)
+                for i in range(len(array)):
+                    array[i] = value(ctype_type._type_)
+            else:
+                setattr(target, name, value(ctype_type))
+
+    fill(struct)
+
+
+def make_buffer() -> bytes:
+    samples = (bilbo_ll_sample_struct * NUM_SAMPLES)()
+    for i, sample in enumerate(samples):
+        fill_struct(sample, seed=i + 1)
+    return bytes(samples)
+
+
+def flatten(data: dict, prefix: str = '') -> dict:
+    flat = {}
+    for key, value in data.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        else:
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def test_decode_matches_ctypes():
+    buffer = make_buffer()
+    size = ctypes.sizeof(bilbo_ll_sample_struct)
+
+    # Decoded sample by sample through ctypes, like the SPI interface did before the zero-copy path
+    expected = [bytes_to_value(buffer[i * size:(i + 1) * size], bilbo_ll_sample_struct) for i in range(NUM_SAMPLES)]
+
+    records = bytes_to_records(buffer, dtype=bilbo_ll_sample_dtype)
+    assert len(records) == NUM_SAMPLES
+    assert [record_to_dict(record) for record in records] == expected
+
+    flat = bytes_to_records(buffer, dtype=bilbo_ll_sample_flat_dtype)
+    for record, sample in zip(flat, expected):
+        for name, value in flatten(sample).items():
+            assert np.array_equal(record[name], value), name
+
+
+def main():
+    test_decode_matches_ctypes()
+    print("Low-level sample decoding: OK")
+
+
+if __name__ == '__main__':
+    main()
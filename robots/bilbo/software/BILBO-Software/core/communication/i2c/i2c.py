@@ -1,12 +1,327 @@
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
 import board
 from core.utils import bytes_utils as bt
 
+# Priorities of the bus traffic. Lower numbers go first.
+I2C_PRIORITY_HIGH = 0  # Sensors
+I2C_PRIORITY_NORMAL = 1  # IO expanders, LEDs, EEPROMs
+I2C_PRIORITY_LOW = 2  # Display
+
+# Bus number of board.I2C(), the SCL/SDA pins of the CM4
+BOARD_I2C_BUS = 1
+
+# Bits on the wire per transaction (start, address byte with ACK, stop) and per data byte (8 bits + ACK)
+_I2C_TRANSACTION_BITS = 11
+_I2C_BYTE_BITS = 9
+
+
+# ======================================================================================================================
+class _PriorityLock:
+    """
+    Lock that is handed to the waiting thread with the highest priority when it is released. Threads with the same
+    priority get it in the order they asked for it.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._locked = False
+        self._waiting = []
+        self._counter = itertools.count()
+
+    def acquire(self, priority: int):
+        with self._condition:
+            entry = (priority, next(self._counter))
+            heapq.heappush(self._waiting, entry)
+            while self._locked or self._waiting[0] != entry:
+                self._condition.wait()
+            heapq.heappop(self._waiting)
+            self._locked = True
+
+    def release(self):
+        with self._condition:
+            self._locked = False
+            self._condition.notify_all()
+
+
+# ======================================================================================================================
+class I2C_Bus:
+    """
+    Shared access to an I2C bus of the CM4. All transfers are serialized by priority, so that a long transfer like
+    a display update, which is split into several transactions, lets more important traffic through in between.
+    Register based devices get a shadow copy of their registers with registers(address), which suppresses writes
+    that would not change anything.
+
+    The bus records the traffic of every device. The utilisation is the estimated time on the wire (bytes at the
+    bus frequency) relative to the time since the statistics were reset.
+
+    Only bus BOARD_I2C_BUS has a device for the transfers. Other buses are driven by their own drivers, e.g. luma
+    for a display on another port, and only get the arbitration and the statistics.
+    """
+    bus: int
+    frequency: int
+
+    def __init__(self, bus: int = BOARD_I2C_BUS, frequency: int = 100000):
+        self.bus = bus
+        self.frequency = frequency
+        self._i2c = None
+        self._lock = _PriorityLock()
+        self._shadows = {}
+        self._statistics_lock = threading.Lock()
+        self.resetStatistics()
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @property
+    def i2c(self) -> board.I2C:
+        if self.bus != BOARD_I2C_BUS:
+            raise ValueError(f"I2C bus {self.bus} has no device, only bus {BOARD_I2C_BUS} is opened with board.I2C()")
+        if self._i2c is None:
+            self._i2c = board.I2C()
+        return self._i2c
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @contextmanager
+    def transaction(self, address: int, priority: int = I2C_PRIORITY_NORMAL, num_bytes: int = 0):
+        """
+        Exclusive access to the bus for one transfer to the given device. Transfers that do not go through write()
+        or writeThenRead(), like the ones of the display driver, give the number of bytes for the statistics. Yields
+        the I2C device, or None on a bus without one.
+        """
+        time_request = time.perf_counter()
+        self._lock.acquire(priority)
+        time_start = time.perf_counter()
+        try:
+            yield self.i2c if self.bus == BOARD_I2C_BUS else None
+        finally:
+            time_end = time.perf_counter()
+            self._lock.release()
+            self._record(address, num_bytes, time_end - time_start, time_start - time_request)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def write(self, address: int, data: (bytes, bytearray, list), priority: int = I2C_PRIORITY_NORMAL):
+        data = bytes(data)
+        with self.transaction(address, priority, num_bytes=len(data)) as i2c:
+            i2c.writeto(address, data)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def writeThenRead(self, address: int, data: (bytes, bytearray, list), num_bytes: int,
+                      priority: int = I2C_PRIORITY_NORMAL) -> bytearray:
+        data = bytes(data)
+        buffer = bytearray(num_bytes)
+        with self.transaction(address, priority, num_bytes=len(data) + num_bytes) as i2c:
+            i2c.writeto_then_readfrom(address=address, buffer_out=data, buffer_in=buffer)
+        return buffer
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def registers(self, address: int, auto_increment: bool = None,
+                  priority: int = I2C_PRIORITY_NORMAL) -> 'I2C_RegisterShadow':
+        """
+        The shadow registers of a device. There is one shadow per address, shared by all users of the device. A
+        given auto_increment is applied to the shadow, None keeps its current setting.
+        """
+        shadow = self._shadows.get(address)
+        if shadow is None:
+            shadow = self._shadows.setdefault(address, I2C_RegisterShadow(self, address, bool(auto_increment),
+                                                                          priority))
+        if auto_increment is not None:
+            shadow.auto_increment = auto_increment
+        return shadow
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def countSuppressed(self, address: int, num_writes: int = 1):
+        with self._statistics_lock:
+            self._device(address)['suppressed'] += num_writes
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def statistics(self) -> dict:
+        with self._statistics_lock:
+            duration = time.perf_counter() - self._statistics_start
+            devices = {f"0x{address:02X}": dict(device) for address, device in self._devices.items()}
+
+        wire_time = sum(device['wire_time'] for device in devices.values())
+        busy_time = sum(device['busy_time'] for device in devices.values())
+        return {
+            'bus': self.bus,
+            'frequency': self.frequency,
+            'duration': duration,
+            'utilisation': wire_time / duration if duration > 0 else 0.0,
+            'busy': busy_time / duration if duration > 0 else 0.0,
+            'devices': devices,
+        }
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def resetStatistics(self):
+        with self._statistics_lock:
+            self._devices = {}
+            self._statistics_start = time.perf_counter()
 
+    # === PRIVATE METHODS ==============================================================================================
+    def _device(self, address: int) -> dict:
+        device = self._devices.get(address)
+        if device is None:
+            device = self._devices[address] = {
+                'transactions': 0,
+                'bytes': 0,
+                'suppressed': 0,
+                'wire_time': 0.0,  # Estimated from the number of bytes
+                'busy_time': 0.0,  # Measured time the bus was held
+                'max_wait': 0.0,  # Longest time a transfer waited for the bus
+            }
+        return device
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _record(self, address: int, num_bytes: int, busy_time: float, wait_time: float):
+        with self._statistics_lock:
+            device = self._device(address)
+            device['transactions'] += 1
+            device['bytes'] += num_bytes
+            device['wire_time'] += (_I2C_TRANSACTION_BITS + _I2C_BYTE_BITS * num_bytes) / self.frequency
+            device['busy_time'] += busy_time
+            device['max_wait'] = max(device['max_wait'], wait_time)
+
+
+# ======================================================================================================================
+class I2C_RegisterShadow:
+    """
+    Shadow copy of the 8-bit registers of a device.
+
+    A register is read from the device the first time it is needed and then served from the shadow, unless it is
+    marked as volatile. Writes of the value a register already has are suppressed. Within batch(), writes only
+    change the shadow and every changed register is written once when the batch ends. With auto_increment, changed
+    registers with consecutive addresses are written with a single transfer.
+    """
+    address: int
+
+    def __init__(self, bus: I2C_Bus, address: int, auto_increment: bool = False,
+                 priority: int = I2C_PRIORITY_NORMAL):
+        self.bus = bus
+        self.address = address
+        self.auto_increment = auto_increment
+        self.priority = priority
+        self.volatile = set()
+
+        self._values = {}
+        self._dirty = set()
+        self._batch_depth = 0
+        self._lock = threading.RLock()
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def read(self, register: int) -> int:
+        with self._lock:
+            if register in self._values and register not in self.volatile:
+                return self._values[register]
+            value = self.bus.writeThenRead(self.address, [register], 1, self.priority)[0]
+            self._values[register] = value
+            return value
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def write(self, register: int, value: int, force: bool = False):
+        """
+        Writes the register if its value changes. With force, it is always written, e.g. for registers that
+        trigger an action.
+        """
+        value &= 0xFF
+        with self._lock:
+            if not force and self._values.get(register) == value and register not in self._dirty:
+                self.bus.countSuppressed(self.address)
+                return
+            self._values[register] = value
+            if self._batch_depth and not force:
+                self._dirty.add(register)
+                return
+            self._dirty.discard(register)
+            self.bus.write(self.address, [register, value], self.priority)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def updateBits(self, register: int, mask: int, value: int):
+        """
+        Changes the bits of the mask to the ones of value, with the shadow instead of a read-modify-write cycle.
+        """
+        with self._lock:
+            current = self.read(register)
+            self.write(register, (current & ~mask) | (value & mask))
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def setBit(self, register: int, bit: int, state: bool):
+        self.updateBits(register, 1 << bit, (1 << bit) if state else 0)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def toggleBit(self, register: int, bit: int):
+        with self._lock:
+            self.write(register, self.read(register) ^ (1 << bit))
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @contextmanager
+    def batch(self):
+        """
+        Collects all writes and writes every changed register once at the end.
+        """
+        with self._lock:
+            self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    self.flush()
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def flush(self):
+        with self._lock:
+            registers = sorted(self._dirty)
+            self._dirty.clear()
+            for start, values in self._groupRegisters(registers):
+                self.bus.write(self.address, [start] + values, self.priority)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def invalidate(self, register: int = None):
+        """
+        Forgets the shadow values, e.g. after a reset of the device.
+        """
+        with self._lock:
+            if register is None:
+                self._values.clear()
+                self._dirty.clear()
+            else:
+                self._values.pop(register, None)
+                self._dirty.discard(register)
+
+    # === PRIVATE METHODS ==============================================================================================
+    def _groupRegisters(self, registers: list) -> list:
+        groups = []
+        for register in registers:
+            if self.auto_increment and groups and groups[-1][0] + len(groups[-1][1]) == register:
+                groups[-1][1].append(self._values[register])
+            else:
+                groups.append((register, [self._values[register]]))
+        return groups
+
+
+# ======================================================================================================================
+_buses = {}
+
+
+def getI2CBus(bus: int = BOARD_I2C_BUS) -> I2C_Bus:
+    """
+    The shared I2C_Bus object of the given bus number.
+    """
+    if bus not in _buses:
+        _buses.setdefault(bus, I2C_Bus(bus))
+    return _buses[bus]
+
+
+# ======================================================================================================================
 class I2C_Interface:
     i2c_device: board.I2C
+    bus: I2C_Bus
 
     def __init__(self):
-        self.i2c_device = board.I2C()
+        self.bus = getI2CBus()
+        self.i2c_device = self.bus.i2c
 
     def init(self):
 
@@ -15,12 +330,19 @@ class I2C_Interface:
     def start(self):
         ...
 
-    def writeToMemory(self, device_address, memory_address, data, length=1):
+    def writeToMemory(self, device_address, memory_address, data, length=1, force: bool = True):
+        """
+        Writes data to the memory of a device. Without force, single bytes are only written if they differ from the
+        last value written to the same address.
+        """
         if not isinstance(memory_address, bytes):
             memory_address = bt.bytes_(memory_address)
 
         if not isinstance(data, bytes):
             data = bt.bytes_(data)
 
-        x = memory_address + data
-        self.i2c_device.writeto(address=device_address, buffer=memory_address + data)
+        if len(memory_address) == 1 and len(data) == 1:
+            self.bus.registers(device_address).write(memory_address[0], data[0], force=force)
+            return
+
+        self.bus.write(device_address, memory_address + data)
@@ -1,3 +1,4 @@
+import logging
 import queue
 import threading
 
@@ -23,7 +24,6 @@ class SerialConnection:
 
     callbacks: SerialConnection_Callbacks
     events: dict[str, threading.Event]
-    _thread: threading.Thread
     _exit: bool
 
     def __init__(self, device: str, baudrate: int = 115200, config: dict = None):
@@ -39,7 +39,9 @@ class SerialConnection:
 
         self.config = {**default_config, **config}
 
-        self._socket = UART_Socket(device=device, baudrate=baudrate, config=self.config)
+        # Frames are decoded in the RX thread of the socket, so the socket does not need to queue them
+        self._socket = UART_Socket(device=device, baudrate=baudrate, config={**self.config, 'use_queue': False})
+        self._socket.callbacks.rx.register(self._rx_handling)
 
         # Prepare the callbacks and events
         self.callbacks = SerialConnection_Callbacks()
@@ -59,13 +61,10 @@ class SerialConnection:
 
         # Start the socket
         self._socket.start()
-        self._thread = threading.Thread(target=self._thread_fun, daemon=True)
-        self._thread.start()
 
     # ------------------------------------------------------------------------------------------------------------------
     def close(self, *args, **kwargs):
         self._exit = True
-        # self._thread.join()
         self._socket.close()
 
     # ------------------------------------------------------------------------------------------------------------------
@@ -74,6 +73,11 @@ class SerialConnection:
         if buffer is not None:
             self._socket.send(buffer)
 
+    # ------------------------------------------------------------------------------------------------------------------
+    def sendBatch(self, messages: list):
+        buffers = [self._encode_message(msg) for msg in messages]
+        self._socket.sendFrames([buffer for buffer in buffers if buffer is not None])
+
     # ------------------------------------------------------------------------------------------------------------------
     def sendRaw(self, buffer):
         self._socket.send(buffer)
@@ -90,22 +94,17 @@ class SerialConnection:
         return msg
 
     # ------------------------------------------------------------------------------------------------------------------
-    def _rx_handling(self, buffer):
-        pass
-
-    # ------------------------------------------------------------------------------------------------------------------
-    def _thread_fun(self):
-
-        while not self._exit:
-            try:
-                data = self._socket.rx_queue.get(timeout=1)
-                msg = self._decode_message(data)
-                if msg is not None:
-                    if self.config['use_queues']:
-                        self.rx_queue.put(msg)
-                    for cb in self.callbacks.rx:
-                        cb(msg)
-                    self.events['rx'].set()
-            except queue.Empty:
-                ...
-        # Exit
+    def _rx_handling(self, buffer, *args, **kwargs):
+        try:
+            msg = self._decode_message(buffer)
+        except Exception as e:
+            logging.warning(f"Cannot decode serial message {buffer}: {e}")
+            self.events['error'].set()
+            return
+
+        if msg is not None:
+            if self.config['use_queues']:
+                self.rx_queue.put(msg)
+            for cb in self.callbacks.rx:
+                cb(msg)
+            self.events['rx'].set()
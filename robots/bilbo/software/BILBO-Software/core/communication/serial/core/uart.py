@@ -6,12 +6,131 @@ import threading
 import cobs.cobs as cobs
 import serial
 
-from core.utils.time import precise_sleep
 from core.utils.callbacks import callback_definition, CallbackContainer
 
 SERIAL_BUFFER_SIZE = 8192
 
 
+# ======================================================================================================================
+def _make_crc8_table(polynomial: int = 0x07) -> bytes:
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ polynomial) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table.append(crc)
+    return bytes(table)
+
+
+CRC8_TABLE = _make_crc8_table()
+
+
+def crc8(data: (bytes, bytearray, memoryview), crc: int = 0) -> int:
+    """
+    CRC-8 with polynomial 0x07 (CRC-8/SMBUS).
+    """
+    table = CRC8_TABLE
+    for byte in data:
+        crc = table[crc ^ byte]
+    return crc
+
+
+# ======================================================================================================================
+class UART_FrameParser:
+    """
+    Incremental parser for delimiter-terminated (and optionally COBS-encoded) frames.
+
+    Chunks of any size are fed in as they are read from the device. Complete frames are returned, the rest is kept
+    in a reusable buffer until the next chunk arrives. Frames longer than max_frame_size are discarded up to the
+    next delimiter. If crc is True, the last byte of every decoded frame has to be the CRC-8 of the bytes before
+    it and is removed.
+    """
+
+    def __init__(self, delimiter: (bytes, None) = b'\x00', use_cobs: bool = True, crc: bool = False,
+                 max_frame_size: int = SERIAL_BUFFER_SIZE):
+        self.delimiter = delimiter
+        self.use_cobs = use_cobs
+        self.crc = crc
+        self.max_frame_size = max_frame_size
+
+        self._buffer = bytearray()
+        self._discarding = False  # True while skipping the rest of an oversized frame
+
+        self.frames = 0
+        self.errors = {
+            'cobs': 0,
+            'crc': 0,
+            'overflow': 0,
+        }
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def feed(self, chunk: (bytes, bytearray)) -> list[bytes]:
+        if self.delimiter is None:
+            # Without a delimiter every chunk is a frame
+            frame = self._decode(bytes(chunk))
+            return [frame] if frame is not None else []
+
+        buffer = self._buffer
+        search_start = len(buffer)
+        buffer += chunk
+
+        frames = []
+        start = 0
+        while True:
+            end = buffer.find(self.delimiter, search_start)
+            if end < 0:
+                break
+            if self._discarding:
+                self._discarding = False
+            elif end > start:
+                frame = self._decode(bytes(buffer[start:end]))
+                if frame is not None:
+                    frames.append(frame)
+            start = end + len(self.delimiter)
+            search_start = start
+
+        del buffer[:start]
+        if len(buffer) > self.max_frame_size:
+            self.errors['overflow'] += 1
+            self._discarding = True
+            buffer.clear()
+        return frames
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def reset(self):
+        self._buffer.clear()
+        self._discarding = False
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def encode(self, data: (bytes, bytearray, list)) -> bytes:
+        data = bytes(data)
+        if self.crc:
+            data += bytes([crc8(data)])
+        if self.use_cobs:
+            data = cobs.encode(data)
+        if self.delimiter is not None:
+            data += self.delimiter
+        return data
+
+    # === PRIVATE METHODS ==============================================================================================
+    def _decode(self, frame: bytes) -> (bytes, None):
+        if self.use_cobs:
+            try:
+                frame = cobs.decode(frame)
+            except cobs.DecodeError:
+                self.errors['cobs'] += 1
+                logging.warning(f"Cannot COBS decode buffer:{frame} ")
+                return None
+        if self.crc:
+            if len(frame) < 1 or crc8(frame[:-1]) != frame[-1]:
+                self.errors['crc'] += 1
+                return None
+            frame = frame[:-1]
+        self.frames += 1
+        return frame
+
+
+# ======================================================================================================================
 @callback_definition
 class UART_Socket_Callbacks:
     rx: CallbackContainer
@@ -21,11 +140,14 @@ class UART_Socket_Callbacks:
 
 class UART_Socket:
     """
+    Frame-based transport over a serial device.
 
+    The RX thread reads everything that is available at once and runs it through a UART_FrameParser. The TX thread
+    writes all queued frames back to back in a single write.
     """
     device: str  # name of the device or port, such as "COMx" oder "/dev/ttyAMAx"
     baudrate: int
-    timeout: int
+    timeout: float
 
     _device: serial.Serial
 
@@ -38,23 +160,28 @@ class UART_Socket:
     rx_queue: queue.Queue
     tx_queue: queue.Queue
 
+    parser: UART_FrameParser
+
     _rxThread: threading.Thread
     _txThread: threading.Thread
 
     _exit: bool
 
-    def __init__(self, device: str = None, baudrate: int = 115200, timeout: int = 0, config: dict = None):
+    def __init__(self, device: str = None, baudrate: int = 115200, timeout: float = 0.1, config: dict = None):
         """
 
         :param device:
         :param baudrate:
-        :param timeout:
+        :param timeout: Read timeout in seconds. The RX thread checks for exit after every timeout.
         :param config:
         """
 
         default_config = {
             'delimiter': b'\x00',
-            'cobs': True
+            'cobs': True,
+            'crc': False,
+            'use_queue': True,  # Put received frames into rx_queue. Disable if only the rx callback is used.
+            'max_frame_size': SERIAL_BUFFER_SIZE,
         }
 
         self.device = device
@@ -69,14 +196,16 @@ class UART_Socket:
         self.rx_queue = queue.Queue()
         self.tx_queue = queue.Queue()
 
+        self.parser = UART_FrameParser(delimiter=self.config['delimiter'], use_cobs=self.config['cobs'],
+                                       crc=self.config['crc'], max_frame_size=self.config['max_frame_size'])
+
         # Test if the device exists:
         try:
             os.stat(self.device)
         except OSError:
             raise Exception(f"UART Device {self.device} does not exist!")
 
-        # self._device = serial.Serial(self.device, baudrate=self.baudrate, timeout=self.timeout)
-        self._device = serial.Serial(self.device, baudrate=self.baudrate)
+        self._device = serial.Serial(self.device, baudrate=self.baudrate, timeout=self.timeout)
 
         self.callbacks = UART_Socket_Callbacks()
 
@@ -86,6 +215,14 @@ class UART_Socket:
             'error': threading.Event()
         }
 
+        self.statistics = {
+            'reads': 0,
+            'bytes_received': 0,
+            'writes': 0,
+            'frames_sent': 0,
+            'bytes_sent': 0,
+        }
+
         self._exit = False
 
     # === METHODS ======================================================================================================
@@ -110,71 +247,77 @@ class UART_Socket:
     # ------------------------------------------------------------------------------------------------------------------
     def close(self):
         self._exit = True
+        self.tx_queue.put(None)  # Wake up the TX thread
         self._rxThread.join()
         self._txThread.join()
         self._device.close()
 
     # ------------------------------------------------------------------------------------------------------------------
     def send(self, data):
-        if self.config['cobs']:
-            data = cobs.encode(data)
-        if self.config['delimiter'] is not None:
-            data = data + self.config['delimiter']
+        self.tx_queue.put_nowait(self.parser.encode(data))
+        self.statistics['frames_sent'] += 1
 
-        self.tx_queue.put_nowait(data)
+    # ------------------------------------------------------------------------------------------------------------------
+    def sendFrames(self, frames: list):
+        """
+        Sends several frames back to back with a single write.
+        """
+        if not frames:
+            return
+        self.tx_queue.put_nowait(b''.join(self.parser.encode(data) for data in frames))
+        self.statistics['frames_sent'] += len(frames)
 
     # === PRIVATE METHODS ==============================================================================================
     def _rxThreadFunction(self):
         """
-
-        :return:
+        Blocks until at least one byte arrived (or the read timeout passed) and then reads everything that is
+        waiting in the driver with the same call.
         """
-        # TODO: This might not be the best way to do it
-        buffer = [b'\x00'] * SERIAL_BUFFER_SIZE
-        idx_write = 0
+        device = self._device
+        parser = self.parser
 
         while not self._exit:
-            # Read data
-            data = self._device.read(size=1)
-            # Put the data into the reception buffer
-            if len(data) > 0:
-                buffer[idx_write] = data
-
-                # Check if the delimiter is reached
-                if buffer[idx_write] == self.config['delimiter']:
-                    self._rx_handling(buffer[0:idx_write + 1])
-                    idx_write = 0
-                else:
-                    idx_write += 1
+            try:
+                data = device.read(device.in_waiting or 1)
+            except serial.SerialException as e:
+                if self._exit:
+                    break
+                logging.error(f"Serial read failed: {e}")
+                self.events['error'].set()
+                break
+
+            if not data:
+                continue
+            self.statistics['reads'] += 1
+            self.statistics['bytes_received'] += len(data)
+
+            for frame in parser.feed(data):
+                self._rx_handling(frame)
 
     # ------------------------------------------------------------------------------------------------------------------
     def _txThreadFunction(self):
 
         while not self._exit:
             try:
-                data_out = self.tx_queue.get(timeout=1)
-                while not self._device.writable():
-                    ...
-                self._write(data_out)
-                precise_sleep(0.001)
+                frames = [self.tx_queue.get(timeout=1)]
             except queue.Empty:
-                ...
+                continue
 
-    # ------------------------------------------------------------------------------------------------------------------
-    def _rx_handling(self, buffer):
-        if isinstance(buffer, list):
-            buffer = b''.join(buffer)
+            # Everything else that was queued in the meantime goes out with the same write
+            while True:
+                try:
+                    frames.append(self.tx_queue.get_nowait())
+                except queue.Empty:
+                    break
 
-        if self.config['cobs']:
-            # Remove the last zero
-            buffer = buffer[0:-1]
-            try:
-                buffer = cobs.decode(buffer)
-            except:
-                logging.warning(f"Cannot COBS decode buffer:{buffer} ")
-                return
+            frames = [frame for frame in frames if frame is not None]
+            if frames:
+                self._write(b''.join(frames))
 
-        self.rx_queue.put_nowait(buffer)
+    # ------------------------------------------------------------------------------------------------------------------
+    def _rx_handling(self, buffer: bytes):
+        if self.config['use_queue']:
+            self.rx_queue.put_nowait(buffer)
         for cb in self.callbacks.rx:
             cb(buffer)
 
@@ -183,3 +326,5 @@ class UART_Socket:
     # ------------------------------------------------------------------------------------------------------------------
     def _write(self, data):
         self._device.write(data)
+        self.statistics['writes'] += 1
+        self.statistics['bytes_sent'] += len(data)
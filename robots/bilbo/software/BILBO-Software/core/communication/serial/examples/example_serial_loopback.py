@@ -0,0 +1,153 @@
+"""
+Measures the round-trip latency of Serial_Interface read and function calls, of transactions with several function
+calls and the throughput of stream messages over a pseudo-terminal (pty) loopback. The other end of the pty is served by a simulated STM32 that answers every
+read and function call and can send bursts of stream messages.
+
+Run from the BILBO-Software directory (Linux only):
+    python -m core.communication.serial.examples.example_serial_loopback
+"""
+import ctypes
+import os
+import statistics
+import threading
+import time
+import tty
+
+from core.communication.serial.core.serial_protocol import UART_Protocol, UART_Message
+from core.communication.serial.core.uart import UART_FrameParser
+from core.communication.serial.serial_interface import Serial_Interface, SerialCommandType
+
+
+# ======================================================================================================================
+class SimulatedSTM32:
+    """
+    Answers read requests with the register address as uint32 and function calls with their input data.
+    """
+
+    def __init__(self):
+        self.master, slave = os.openpty()
+        tty.setraw(slave)
+        self.port = os.ttyname(slave)
+        self._slave = slave
+        self.parser = UART_FrameParser()
+        self._exit = False
+        self._write_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._task, daemon=True)
+        self._thread.start()
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def sendStream(self, num_messages: int, payload_size: int = 32):
+        msg = UART_Message()
+        msg.cmd = SerialCommandType.UART_CMD_STREAM
+        msg.module = 1
+        msg.address = [0x00, 0x10]
+        msg.flag = 0
+        msg.data = bytes(payload_size)
+        frame = self.parser.encode(UART_Protocol.encode(msg))
+        self._write(frame * num_messages)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def close(self):
+        self._exit = True
+        os.close(self.master)
+
+    # === PRIVATE METHODS ==============================================================================================
+    def _task(self):
+        while not self._exit:
+            try:
+                data = os.read(self.master, 4096)
+            except OSError:
+                return
+            for frame in self.parser.feed(data):
+                self._answer(UART_Protocol.decode(frame))
+
+    def _answer(self, request: UART_Message):
+        if request.cmd == SerialCommandType.UART_CMD_READ:
+            data = request.address.to_bytes(4, 'little')
+        elif request.cmd == SerialCommandType.UART_CMD_FCT:
+            data = bytes(request.data)
+        else:
+            return
+
+        answer = UART_Message()
+        answer.cmd = SerialCommandType.UART_CMD_ANSWER
+        answer.module = request.module
+        answer.address = list(request.address.to_bytes(2, 'big'))
+        answer.flag = 1
+        answer.data = data
+        self._write(self.parser.encode(UART_Protocol.encode(answer)))
+
+    def _write(self, data: bytes):
+        with self._write_lock:
+            view = memoryview(data)
+            while view:
+                written = os.write(self.master, view)
+                view = view[written:]
+
+
+# ======================================================================================================================
+def _latency(function, num_calls: int) -> list:
+    times = []
+    for i in range(num_calls):
+        start = time.perf_counter()
+        result = function(i)
+        times.append(time.perf_counter() - start)
+        assert result is not None, "No answer"
+    return times
+
+
+def _report(name: str, times: list):
+    times = sorted(times)
+    print(f"{name:>16}: median {statistics.median(times) * 1e6:8.1f} us, "
+          f"p99 {times[int(len(times) * 0.99)] * 1e6:8.1f} us, max {times[-1] * 1e6:8.1f} us")
+
+
+def example_serial_loopback(num_calls: int = 1000, num_stream_messages: int = 20000):
+    stm32 = SimulatedSTM32()
+    interface = Serial_Interface(port=stm32.port, baudrate=1000000)
+    interface.start()
+
+    received = [0]
+    all_received = threading.Event()
+
+    def stream_callback(message, *args, **kwargs):
+        received[0] += 1
+        if received[0] == num_stream_messages:
+            all_received.set()
+
+    interface.callbacks.stream_all.register(stream_callback)
+
+    _report('read', _latency(lambda i: interface.read(address=i % 256, module=1, type=ctypes.c_uint32), num_calls))
+    _report('function', _latency(lambda i: interface.function(address=0x0102, module=1, data=float(i),
+                                                              input_type=ctypes.c_float,
+                                                              output_type=ctypes.c_float), num_calls))
+
+    def sequential(i, num_functions=10):
+        return [interface.function(address=0x0102, module=1, data=float(i + j), input_type=ctypes.c_float,
+                                   output_type=ctypes.c_float) for j in range(num_functions)]
+
+    def transaction(i, num_functions=10):
+        tx = interface.transaction()
+        for j in range(num_functions):
+            tx.function(address=0x0102, module=1, data=float(i + j), input_type=ctypes.c_float,
+                        output_type=ctypes.c_float, check=lambda value, expected=float(i + j): value == expected)
+        return True if tx.execute() else None
+
+    _report('10 functions', _latency(sequential, num_calls // 10))
+    _report('transaction (10)', _latency(transaction, num_calls // 10))
+
+    start = time.perf_counter()
+    stm32.sendStream(num_stream_messages)
+    all_received.wait(timeout=30)
+    duration = time.perf_counter() - start
+    print(f"{'stream':>16}: {received[0]} of {num_stream_messages} messages in {duration:.3f} s "
+          f"({received[0] / duration:.0f} messages/s)")
+    print(f"{'socket':>16}: {interface.device._socket.statistics}, parser errors "
+          f"{interface.device._socket.parser.errors}")
+
+    interface.close()
+    stm32.close()
+
+
+if __name__ == '__main__':
+    example_serial_loopback()
@@ -1,6 +1,7 @@
 import ctypes
 import enum
 import threading
+import time
 
 # === OWN PACKAGES =====================================================================================================
 from core.communication.serial.core.serial_protocol import UART_Message
@@ -70,6 +71,144 @@ class ReadRequest:
         self.event = threading.Event()
 
 
+# ======================================================================================================================
+class TransactionItem:
+    """
+    One write, read or function call of a SerialTransaction. After the transaction was executed, value holds the
+    decoded answer and success tells if the answer arrived and passed the check. Items that are not required (e.g.
+    snapshot reads for a rollback) do not decide whether the transaction succeeded.
+    """
+    cmd: SerialCommandType
+    module: int
+    address: int
+    data: (bytes, list)
+    output_type: type = None
+    check: callable = None
+    required: bool = True
+
+    request: ReadRequest = None
+    value = None
+    success: bool = False
+
+    def __init__(self, cmd, module, address, data, output_type=None, check=None, required=True):
+        self.cmd = cmd
+        self.module = module
+        self.address = address
+        self.data = data
+        self.output_type = output_type
+        self.check = check
+        self.required = required
+
+
+class SerialTransaction:
+    """
+    Register writes, reads and function calls that are executed together.
+
+    All requests are sent back to back with a single write and all answers are awaited with one common timeout,
+    so the whole transaction takes about one round trip instead of one per register. Reads and function calls can
+    carry a check function that gets the decoded answer. If an answer is missing or a check fails, the transaction
+    fails and the optional rollback function is called with a new transaction that it can fill (for example with
+    values read at the beginning of the failed transaction). The rollback transaction is executed right away. Reads
+    and function calls with required=False are executed, but a missing answer does not fail the transaction.
+
+    Example:
+        transaction = interface.transaction()
+        old = transaction.read(address=0x10, module=1, type=ctypes.c_float, required=False)
+        transaction.write(module=1, address=0x10, value=2.0, type=ctypes.c_float)
+        transaction.read(address=0x10, module=1, type=ctypes.c_float, check=lambda value: value == 2.0)
+        success = transaction.execute(
+            rollback=lambda tx: tx.write(module=1, address=0x10, value=old.value, type=ctypes.c_float))
+    """
+    interface: 'Serial_Interface'
+    timeout: float
+    items: list[TransactionItem]
+    success: bool
+
+    def __init__(self, interface: 'Serial_Interface', timeout: float = 1):
+        self.interface = interface
+        self.timeout = timeout
+        self.items = []
+        self.success = False
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def write(self, module: int = 0, address: (int, list) = None, value=None, type=ctypes.c_uint8) -> TransactionItem:
+        assert (type is None or is_valid_ctype(type))
+        item = TransactionItem(cmd=SerialCommandType.UART_CMD_WRITE, module=module, address=address,
+                               data=value_to_bytes(value, type))
+        item.success = True  # Writes are not answered
+        self.items.append(item)
+        return item
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def read(self, address, module: int = 1, type=None, check: callable = None,
+             required: bool = True) -> TransactionItem:
+        assert (is_valid_ctype(type))
+        item = TransactionItem(cmd=SerialCommandType.UART_CMD_READ, module=module, address=address, data=[],
+                               output_type=type, check=check, required=required)
+        self.items.append(item)
+        return item
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def function(self, address, module: int = 1, data=None, input_type=None, output_type=None,
+                 check: callable = None, required: bool = True) -> TransactionItem:
+        assert (input_type is None or is_valid_ctype(input_type))
+        assert (output_type is None or is_valid_ctype(output_type))
+
+        buffer = ctype_to_bytes(value_to_ctype(data, input_type)) if input_type is not None else []
+        item = TransactionItem(cmd=SerialCommandType.UART_CMD_FCT, module=module, address=address, data=buffer,
+                               output_type=output_type, check=check, required=required)
+        item.success = output_type is None
+        self.items.append(item)
+        return item
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def execute(self, rollback: callable = None) -> bool:
+        answered = [item for item in self.items if item.output_type is not None]
+
+        # Register all answers before sending, they can arrive before the last request is sent
+        for item in answered:
+            item.request = self.interface._registerRead(module=item.module, address=item.address)
+
+        self.interface._sendMessages([self.interface._buildMessage(cmd=item.cmd, module=item.module,
+                                                                   address=item.address, data=item.data)
+                                      for item in self.items])
+
+        deadline = time.monotonic() + self.timeout
+        for item in answered:
+            if not item.request.event.wait(timeout=max(deadline - time.monotonic(), 0)):
+                self.interface._unregisterRead(item.request)
+                continue
+            item.value = self._decode(item)
+            if item.value is None:
+                continue
+            try:
+                item.success = item.check is None or bool(item.check(item.value))
+            except Exception as e:
+                logger.warning(f"Check for {item.cmd.name} {item.module}:{item.address} raised {e}")
+
+        self.success = all(item.success for item in self.items if item.required)
+        if not self.success:
+            for item in self.items:
+                if item.required and not item.success:
+                    logger.warning(f"Transaction failed at {item.cmd.name} {item.module}:{item.address} "
+                                   f"(value: {item.value})")
+            if rollback is not None:
+                rollback_transaction = SerialTransaction(self.interface, self.timeout)
+                rollback(rollback_transaction)
+                if not rollback_transaction.execute():
+                    logger.error("Rollback of the failed transaction failed")
+
+        return self.success
+
+    # === PRIVATE METHODS ==============================================================================================
+    @staticmethod
+    def _decode(item: TransactionItem):
+        msg = item.request.msg
+        if msg.flag != 1 or ctypes.sizeof(item.output_type) != len(msg.data):
+            return None
+        return ctype_to_value(bytes_to_ctype(msg.data, item.output_type), item.output_type)
+
+
 # === CALLBACKS ========================================================================================================
 @callback_definition
 class SerialInterface_Callbacks:
@@ -110,6 +249,7 @@ class Serial_Interface:
         self.known_messages = []
 
         self._readRequests = []
+        self._readRequestsLock = threading.Lock()
 
     # ------------------------------------------------------------------------------------------------------------------
     def init(self):
@@ -160,11 +300,13 @@ class Serial_Interface:
     def read(self, address, module: int = 1, type=None):
         assert (type is None or is_valid_ctype(type))
 
-        # Send the message for reading
-        self._send(cmd=SerialCommandType.UART_CMD_READ, module=module, address=address, flag=0, data=[])
+        # Register before sending, the answer can arrive before _send returns
         request = self._registerRead(module=module, address=address)
+        self._send(cmd=SerialCommandType.UART_CMD_READ, module=module, address=address, flag=0, data=[])
 
         event_success = request.event.wait(timeout=0.1)
+        if not event_success:
+            self._unregisterRead(request)
 
         if event_success and request.msg.flag == 1:
             # Check if the data length matches the data type
@@ -189,13 +331,17 @@ class Serial_Interface:
         else:
             buffer = None
 
+        # Register for reading if type is not None. This has to happen before sending, the answer can arrive
+        # before _send returns
+        req = self._registerRead(module=module, address=address) if output_type is not None else None
+
         # logger.info(f"Sending function call to module {module} and address {address} with data {buffer}")
         self._send(cmd=SerialCommandType.UART_CMD_FCT, module=module, address=address, flag=0, data=buffer)
 
-        # Register for reading if type is not None
         if output_type is not None:
-            req = self._registerRead(module=module, address=address)
             event_success = req.event.wait(timeout=timeout)
+            if not event_success:
+                self._unregisterRead(req)
             if event_success and req.msg.flag == 1:
                 # Check if the data length matches the data type
                 if not ctypes.sizeof(output_type) == len(req.msg.data):
@@ -208,6 +354,10 @@ class Serial_Interface:
         else:
             return None
 
+    # ------------------------------------------------------------------------------------------------------------------
+    def transaction(self, timeout: float = 1) -> SerialTransaction:
+        return SerialTransaction(self, timeout)
+
     # ------------------------------------------------------------------------------------------------------------------
     def isRunning(self):
         return self._thread.is_alive()
@@ -260,17 +410,20 @@ class Serial_Interface:
         if len(self._readRequests) == 0:
             return
 
-        found_request = None
-        for req in self._readRequests:
-            if req.module == msg.module and req.address == msg.address:
-                logger.debug(f"Got an answer for request {req.module}:{req.address}")
-                req.msg = msg
-                req.event.set()
-                found_request = req
-                break
+        with self._readRequestsLock:
+            found_request = None
+            for req in self._readRequests:
+                if req.module == msg.module and req.address == msg.address:
+                    logger.debug(f"Got an answer for request {req.module}:{req.address}")
+                    found_request = req
+                    break
+
+            if found_request is not None:
+                self._readRequests.remove(found_request)
 
         if found_request is not None:
-            self._readRequests.remove(found_request)
+            found_request.msg = msg
+            found_request.event.set()
 
     # ------------------------------------------------------------------------------------------------------------------
     def _handleMessage_stream(self, message):
@@ -299,12 +452,26 @@ class Serial_Interface:
         request.module = module
 
         logger.debug(f"Register read request for module {module} and address {address}")
-        self._readRequests.append(request)
+        with self._readRequestsLock:
+            self._readRequests.append(request)
         return request
 
+    # ------------------------------------------------------------------------------------------------------------------
+    def _unregisterRead(self, request: ReadRequest):
+        # Requests that timed out must not receive a late answer meant for a newer request
+        with self._readRequestsLock:
+            if request in self._readRequests:
+                self._readRequests.remove(request)
+
     # ------------------------------------------------------------------------------------------------------------------
     def _send(self, cmd: int = 0, module: int = 0, address: (bytes, bytearray, list, int) = None, flag: int = 0,
               data=None):
+        self._sendMessage(self._buildMessage(cmd, module, address, flag, data))
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def _buildMessage(cmd: int = 0, module: int = 0, address: (bytes, bytearray, list, int) = None, flag: int = 0,
+                      data=None) -> UART_Message:
         if isinstance(address, int):
             address = list(core.utils.bytes_utils.intToByte(address, 2))
         elif isinstance(address, bytes):
@@ -322,7 +489,7 @@ class Serial_Interface:
             data = []
 
         msg.data = data
-        self._sendMessage(msg)
+        return msg
 
     # ------------------------------------------------------------------------------------------------------------------
     def _sendMessage(self, msg: UART_Message):
@@ -333,6 +500,15 @@ class Serial_Interface:
 
         self.device.send(msg)
 
+    # ------------------------------------------------------------------------------------------------------------------
+    def _sendMessages(self, messages: list[UART_Message]):
+        for msg in messages:
+            assert (msg.data is not None)
+            assert (len(msg.address) == 2)
+            assert (msg.cmd in iter(SerialCommandType))
+
+        self.device.sendBatch(messages)
+
     # ------------------------------------------------------------------------------------------------------------------
     def _sendRaw(self, buffer):
         self.device.sendRaw(buffer)
@@ -9,6 +9,7 @@ from core.utils import network as network
 from core.communication.protocol import Message
 from core.communication.wifi.tcp.protocols.tcp_base_protocol import TCP_Base_Message, TCP_Base_Protocol
 from core.communication.wifi.tcp.protocols.tcp_json_protocol import TCP_JSON_Protocol, TCP_JSON_Message
+from core.communication.wifi.tcp.protocols.tcp_stream_protocol import TCP_Stream_Protocol
 from core.utils.callbacks import callback_definition, CallbackContainer
 import core.settings as settings
 from core.utils.logging_utils import Logger, setLoggerLevel
@@ -49,6 +50,7 @@ class WIFI_Connection:
 
     base_protocol = TCP_Base_Protocol
     protocol = TCP_JSON_Protocol
+    tx_protocols = [TCP_JSON_Protocol, TCP_Stream_Protocol]
 
     _server_data: ServerData
     _thread: threading.Thread
@@ -188,7 +190,7 @@ class WIFI_Connection:
             return
 
         # Check if the protocol of the message is supported
-        if message._protocol is not self.protocol:
+        if message._protocol not in self.tx_protocols:
             logger.error(f"Cannot send message with protocol: {message._protocol}")
 
         # Generate the payload buffer from the message
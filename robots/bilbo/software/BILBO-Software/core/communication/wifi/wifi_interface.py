@@ -4,11 +4,14 @@ import time
 
 from core.communication.protocol import Protocol
 from core.communication.wifi.tcp.protocols.tcp_json_protocol import TCP_JSON_Protocol, TCP_JSON_Message
+from core.communication.wifi.tcp.protocols.tcp_stream_protocol import TCP_Stream_Message
 from core.communication.wifi.wifi_connection import WIFI_Connection
 from core.communication.wifi.data_link import DataLink, Command, generateDataDict, generateCommandDict
 from core.utils.callbacks import Callback, callback_definition, CallbackContainer
 from core.utils.events import event_definition
 from core.utils.logging_utils import Logger
+from core.utils.stream_codec import StreamSchema, StreamCodec, getStreamCodec, STREAM_ENCODING_STRUCT, \
+    STREAM_ENCODING_RECORDS
 from core.utils.time import TimeoutTimer
 
 logger = Logger("WIFI INTERFACE")
@@ -63,6 +66,7 @@ class WIFI_Interface:
         connected (bool): Connection status.
         callbacks (WIFI_Interface_Callbacks): Callbacks for connection events.
         protocol (Protocol): Communication protocol (default is TCP_JSON_Protocol).
+        stream_codec (StreamCodec): Codec for binary stream messages, if a stream schema is set.
     """
 
     name: str
@@ -87,6 +91,9 @@ class WIFI_Interface:
 
     protocol: Protocol = TCP_JSON_Protocol
 
+    stream_codec: (StreamCodec, None)
+    _binary_stream_active: bool
+
     def __init__(self, interface_type: str = 'wifi', device_class: str = None, device_type: str = None,
                  device_revision: str = None, device_name: str = None, device_id: str = None):
         """
@@ -109,6 +116,9 @@ class WIFI_Interface:
         self.connected = False
         self.state = WIFI_Interface_State.NOT_CONNECTED
 
+        self.stream_codec = None
+        self._binary_stream_active = False
+
         self.heartbeat_timer = TimeoutTimer(timeout_time=5, timeout_callback=self._heartbeat_timeout_callback)
 
         # Initialize callbacks and WI-FI connection.
@@ -165,6 +175,20 @@ class WIFI_Interface:
             msg.request_id = request_id
         self._wifi_send(msg)
 
+    def setStreamSchema(self, schema: StreamSchema, encoding: int = STREAM_ENCODING_STRUCT):
+        """
+        Sets the schema of the stream samples. The schema is announced in the device identification
+        and stream messages are sent in binary form once the server has confirmed it.
+
+        Args:
+            schema (StreamSchema): Schema of the stream samples.
+            encoding (int): Binary encoding (STREAM_ENCODING_STRUCT or STREAM_ENCODING_MSGPACK).
+        """
+        self.stream_codec = getStreamCodec(schema, encoding)
+        if self.stream_codec is None:
+            logger.warning(f"Stream encoding {encoding} is not available. Using JSON streams.")
+        self._binary_stream_active = False
+
     def sendStreamMessage(self, data):
         """
         Sends a stream message to the remote device.
@@ -172,6 +196,13 @@ class WIFI_Interface:
         Args:
             data: The data to be streamed.
         """
+        if self._binary_stream_active:
+            codec = self.stream_codec
+            msg = TCP_Stream_Message(schema_hash=codec.schema.hash, encoding=codec.encoding,
+                                     payload=codec.encode(data))
+            self._wifi_send(msg)
+            return
+
         msg = TCP_JSON_Message()
         msg.source = self.id
         msg.address = 0
@@ -179,6 +210,16 @@ class WIFI_Interface:
         msg.data = data
         self._wifi_send(msg)
 
+    def sendRecordsMessage(self, stream_id: int, payload: bytes):
+        """
+        Sends a batch of packed records of a stream subscription.
+
+        Args:
+            stream_id (int): Id of the subscription.
+            payload (bytes): Concatenated records in the layout of the subscription schema.
+        """
+        self._wifi_send(TCP_Stream_Message(schema_hash=stream_id, encoding=STREAM_ENCODING_RECORDS, payload=payload))
+
     def addCommands(self, commands):
         """
         Adds one or more commands to the WIFI_Interface.
@@ -248,6 +289,7 @@ class WIFI_Interface:
         """
         self.connected = False
         self.state = WIFI_Interface_State.NOT_CONNECTED
+        self._binary_stream_active = False
         for callback in self.callbacks.disconnected:
             callback(self)
 
@@ -510,6 +552,8 @@ class WIFI_Interface:
             self.callbacks.sync.call(message.data)
         elif message.event == 'heartbeat':
             self._handleHeartbeatMessage(message.data)
+        elif message.event == 'stream_config':
+            self._handleStreamConfigMessage(message.data)
         else:
             ...
         # match message.event:
@@ -524,6 +568,20 @@ class WIFI_Interface:
     def _handleHeartbeatMessage(self, data):
         self.heartbeat_timer.reset()
 
+    # ------------------------------------------------------------------------------------------------------------------
+    def _handleStreamConfigMessage(self, data):
+        """
+        Switches to binary stream messages if the server confirmed the announced schema.
+        """
+        codec = self.stream_codec
+        self._binary_stream_active = (codec is not None
+                                      and data.get('hash') == codec.schema.hash
+                                      and data.get('encoding') == codec.encoding)
+        if self._binary_stream_active:
+            logger.info(f"Using binary stream encoding {codec.encoding} (schema {codec.schema.hash:08x})")
+        else:
+            logger.info("Using JSON stream messages")
+
     # ------------------------------------------------------------------------------------------------------------------
     def _heartbeat_timeout_callback(self):
         return
@@ -559,6 +617,7 @@ class WIFI_Interface:
             'address': self.id,
             'revision': self.device_revision,
             'data': generateDataDict(self.data),
-            'commands': generateCommandDict(self.commands)
+            'commands': generateCommandDict(self.commands),
+            'stream': self.stream_codec.describe() if self.stream_codec is not None else None,
         }
         self._wifi_send(msg)
@@ -9,7 +9,7 @@ def main():
 
     for _ in range(0, 25):
         sx.toggleGPIO(3)
-        a = sx._readReg(0x08)
+        a = sx.registers.read(0x08)
         print(a)
         time.sleep(1)
 
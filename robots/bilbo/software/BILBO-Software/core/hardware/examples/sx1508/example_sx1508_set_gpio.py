@@ -9,7 +9,7 @@ def main():
 
     sx.writeGPIO(3, 0)
     time.sleep(0.25)
-    b = sx._readReg(0x08)
+    b = sx.registers.read(0x08)
     print(f"{bin(b)}")
 
     time.sleep(1)
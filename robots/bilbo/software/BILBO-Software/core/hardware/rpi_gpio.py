@@ -30,6 +30,19 @@ def add_event_detect(pin, flanks: int, callback, bouncetime):
     GPIO.add_event_detect(pin, flanks, callback, bouncetime)
 
 
+def wait_for_edge(pin, flanks: int, timeout: float = None, bouncetime: int = None) -> bool:
+    """
+    Blocks until an edge is detected on the pin. Returns False if the timeout (in s) expired first. Cannot be used on
+    a pin with event detection.
+    """
+    kwargs = {}
+    if timeout is not None:
+        kwargs['timeout'] = max(1, int(timeout * 1000))
+    if bouncetime is not None:
+        kwargs['bouncetime'] = bouncetime
+    return GPIO.wait_for_edge(pin, flanks, **kwargs) is not None
+
+
 def close(*args, **kwargs):
     GPIO.cleanup()
 
@@ -1,6 +1,5 @@
 import enum
-import board
-from core.utils import bytes_utils as bt
+from core.communication.i2c.i2c import getI2CBus, I2C_RegisterShadow
 
 RegInputDisable = 0x00
 RegPullUp = 0x03
@@ -10,8 +9,6 @@ RegData = 0x08
 RegReset = 0x7D
 SX1508_I2C_ADDRESS = 0x20
 
-PIN_REGISTER_DATA = 0
-
 RESET = False
 
 
@@ -21,13 +18,17 @@ class SX1508_GPIO_MODE(enum.IntEnum):
 
 
 class SX1508:
+    """
+    The registers are kept in the shadow of the I2C bus, which is shared by all SX1508 objects with the same address.
+    Pin changes only write the data register if it changes. The pin changes within writeGPIOs() or batch() are
+    written with one transfer.
+    """
     address: int
-
-    _i2c: board.I2C
+    registers: I2C_RegisterShadow
 
     def __init__(self, address: int = SX1508_I2C_ADDRESS, reset=False):
         self.address = address
-        self._i2c = board.I2C()
+        self.registers = getI2CBus().registers(self.address, auto_increment=True)
 
         global RESET
         if not RESET:
@@ -46,18 +47,29 @@ class SX1508:
         self.configureGPIO(gpio, mode=SX1508_GPIO_MODE.INPUT)
 
     def writeGPIO(self, gpio, state):
-        global PIN_REGISTER_DATA
-        PIN_REGISTER_DATA = bt.changeBit(PIN_REGISTER_DATA, gpio, state)
-        self._writeReg(RegData, PIN_REGISTER_DATA)
+        self.registers.setBit(RegData, gpio, state)
+
+    def writeGPIOs(self, states: dict):
+        """
+        Sets several pins, given as {gpio: state}, with a single write.
+        """
+        with self.registers.batch():
+            for gpio, state in states.items():
+                self.writeGPIO(gpio, state)
 
     def toggleGPIO(self, gpio):
-        global PIN_REGISTER_DATA
-        PIN_REGISTER_DATA = bt.toggleBit(PIN_REGISTER_DATA, gpio)
-        self._writeReg(RegData, PIN_REGISTER_DATA)
+        self.registers.toggleBit(RegData, gpio)
+
+    def batch(self):
+        """
+        Context in which all pin and configuration changes are collected and written once at the end.
+        """
+        return self.registers.batch()
 
     def reset(self):
-        self._writeReg(RegReset, 0x12)
-        self._writeReg(RegReset, 0x34)
+        self.registers.write(RegReset, 0x12, force=True)
+        self.registers.write(RegReset, 0x34, force=True)
+        self.registers.invalidate()
 
     def _setGPIOMode(self, gpio, mode: SX1508_GPIO_MODE):
         """
@@ -73,45 +85,16 @@ class SX1508:
         # data = bt.changeBit(data, gpio, mode)
         # self._writeReg(RegInputDisable, data)
 
-        direction_data = self._readReg(RegDir)
-        direction_data = bt.changeBit(direction_data, gpio, not mode)  # here 0 is an output and 1 is an input
-        self._writeReg(RegDir, direction_data)
+        self.registers.setBit(RegDir, gpio, not mode)  # here 0 is an output and 1 is an input
 
     def _setPullup(self, gpio, mode: bool):
         """
         Set the pullup for the GPIO pin. '0' disables the pullup, '1' enables the pullup
         """
-        pullup_data = self._readReg(RegPullUp)
-        pullup_data = bt.changeBit(pullup_data, gpio, mode)
-        self._writeReg(RegPullUp, pullup_data)
+        self.registers.setBit(RegPullUp, gpio, mode)
 
     def _setPulldown(self, gpio, mode: bool):
         """
         Set the pullup for the GPIO pin. '0' disables the pullup, '1' enables the pullup
         """
-        pulldown_data = self._readReg(RegPullDown)
-        pulldown_data = bt.changeBit(pulldown_data, gpio, mode)
-        self._writeReg(RegPullDown, pulldown_data)
-
-    def _writeReg(self, reg, data):
-        """
-
-        """
-        if not isinstance(reg, bytes):
-            reg = bt.bytes_(reg)
-
-        if not isinstance(data, bytes):
-            data = bt.bytes_(data)
-
-        self._i2c.writeto(address=self.address, buffer=reg + data)
-
-    def _readReg(self, reg):
-        """
-
-        """
-        if not isinstance(reg, bytes):
-            reg = bt.bytes_(reg)
-        data = [0]
-        self._i2c.writeto_then_readfrom(address=self.address, buffer_out=reg, buffer_in=data)
-
-        return data[0]
+        self.registers.setBit(RegPullDown, gpio, mode)
@@ -1,8 +1,7 @@
 import enum
 import time
 
-import board
-from core.utils import bytes_utils as bt
+from core.communication.i2c.i2c import getI2CBus, I2C_RegisterShadow
 
 RegInputDisable_B = 0x00
 RegInputDisable_A = 0x01
@@ -26,9 +25,6 @@ BANK_B = [8, 9, 10, 11, 12, 13, 14, 15]
 
 SX1509_I2C_ADDRESS = 0x3E
 
-output_data_A = 0
-output_data_B = 0
-
 
 class SX1509_GPIO_MODE(enum.Enum):
     INPUT = 0
@@ -37,13 +33,19 @@ class SX1509_GPIO_MODE(enum.Enum):
 
 # ======================================================================================================================
 class SX1509:
+    """
+    The registers are kept in the shadow of the I2C bus, which is shared by all SX1509 objects with the same address.
+    Pin changes only write the data register if it changes, and the pin changes within writeGPIOs() or batch() are
+    written with one transfer for both banks.
+    """
     address: int
-    _i2c: board.I2C
+    registers: I2C_RegisterShadow
 
     # ------------------------------------------------------------------------------------------------------------------
     def __init__(self, address: int = SX1509_I2C_ADDRESS, reset=False):
         self.address = address
-        self._i2c = board.I2C()
+        # The register address auto-increments, so RegData_B and RegData_A can be written together
+        self.registers = getI2CBus().registers(self.address, auto_increment=True)
         if reset:
             self.reset()
 
@@ -63,29 +65,38 @@ class SX1509:
     # ------------------------------------------------------------------------------------------------------------------
     def writeGPIO(self, gpio, state):
         if gpio in BANK_A:
-            global output_data_A
-            output_data_A = bt.changeBit(output_data_A, gpio, state)
-            self._writeReg(RegData_A, output_data_A)
+            self.registers.setBit(RegData_A, gpio, state)
         elif gpio in BANK_B:
-            global output_data_B
-            output_data_B = bt.changeBit(output_data_B, gpio-8, state)
-            self._writeReg(RegData_B, output_data_B)
+            self.registers.setBit(RegData_B, gpio - 8, state)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def writeGPIOs(self, states: dict):
+        """
+        Sets several pins, given as {gpio: state}, with a single write.
+        """
+        with self.registers.batch():
+            for gpio, state in states.items():
+                self.writeGPIO(gpio, state)
 
     # ------------------------------------------------------------------------------------------------------------------
     def toggleGPIO(self, gpio):
         if gpio in BANK_A:
-            global output_data_A
-            output_data_A = bt.toggleBit(output_data_A, gpio)
-            self._writeReg(RegData_A, output_data_A)
+            self.registers.toggleBit(RegData_A, gpio)
         elif gpio in BANK_B:
-            global output_data_B
-            output_data_B = bt.toggleBit(output_data_B, gpio-8)
-            self._writeReg(RegData_B, output_data_B)
+            self.registers.toggleBit(RegData_B, gpio - 8)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def batch(self):
+        """
+        Context in which all pin and configuration changes are collected and written once at the end.
+        """
+        return self.registers.batch()
 
     # ------------------------------------------------------------------------------------------------------------------
     def reset(self):
-        self._writeReg(RegReset, 0x12)
-        self._writeReg(RegReset, 0x34)
+        self.registers.write(RegReset, 0x12, force=True)
+        self.registers.write(RegReset, 0x34, force=True)
+        self.registers.invalidate()
 
     # ------------------------------------------------------------------------------------------------------------------
     def _setGPIOMode(self, gpio, mode: SX1509_GPIO_MODE):
@@ -111,9 +122,7 @@ class SX1509:
         else:
             return
 
-        direction_data = self._readReg(direction_reg)
-        direction_data = bt.changeBit(direction_data, gpio_pos, not mode)  # here 0 is an output and 1 is an input
-        self._writeReg(direction_reg, direction_data)
+        self.registers.setBit(direction_reg, gpio_pos, not mode)  # here 0 is an output and 1 is an input
 
     # ------------------------------------------------------------------------------------------------------------------
     def _setPullup(self, gpio, mode: bool):
@@ -121,15 +130,9 @@ class SX1509:
         Set the pullup for the GPIO pin. '0' disables the pullup, '1' enables the pullup
         """
         if gpio in BANK_A:
-            pullup_reg = RegPullUp_A
+            self.registers.setBit(RegPullUp_A, gpio, mode)
         elif gpio in BANK_B:
-            pullup_reg = RegPullUp_B
-        else:
-            return
-
-        pullup_data = self._readReg(pullup_reg)
-        pullup_data = bt.changeBit(pullup_data, gpio, mode)
-        self._writeReg(pullup_reg, pullup_data)
+            self.registers.setBit(RegPullUp_B, gpio - 8, mode)
 
     # ------------------------------------------------------------------------------------------------------------------
     def _setPulldown(self, gpio, mode: bool):
@@ -137,40 +140,9 @@ class SX1509:
         Set the pullup for the GPIO pin. '0' disables the pullup, '1' enables the pullup
         """
         if gpio in BANK_A:
-            pulldown_reg = RegPullDown_A
+            self.registers.setBit(RegPullDown_A, gpio, mode)
         elif gpio in BANK_B:
-            pulldown_reg = RegPullDown_B
-        else:
-            return
-
-        pulldown_data = self._readReg(pulldown_reg)
-        pulldown_data = bt.changeBit(pulldown_data, gpio, mode)
-        self._writeReg(pulldown_reg, pulldown_data)
-
-    # ------------------------------------------------------------------------------------------------------------------
-    def _writeReg(self, reg, data):
-        """
-        """
-
-        if not isinstance(reg, bytes):
-            reg = bt.bytes_(reg)
-
-        if not isinstance(data, bytes):
-            data = bt.bytes_(data)
-
-        self._i2c.writeto(address=self.address, buffer=reg + data)
-
-    # ------------------------------------------------------------------------------------------------------------------
-    def _readReg(self, reg):
-        """
-        """
-
-        if not isinstance(reg, bytes):
-            reg = bt.bytes_(reg)
-        data = [0]
-        self._i2c.writeto_then_readfrom(address=self.address, buffer_out=reg, buffer_in=data)
-
-        return data[0]
+            self.registers.setBit(RegPullDown_B, gpio - 8, mode)
 
 
 def test_sx1509():
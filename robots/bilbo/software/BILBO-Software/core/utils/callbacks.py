@@ -1,10 +1,31 @@
 import enum
+import functools
+import threading
+import time
 import typing
 
+from core.utils.logging_utils import Logger
+
+logger = Logger('callbacks')
+
 # Constants to indicate whether a parameter is required or optional.
 REQUIRED = True
 OPTIONAL = False
 
+# If enabled, the execution time of every callback called via CallbackContainer.call() is recorded
+_profiling = False
+
+
+def setCallbackProfiling(enabled: bool):
+    """
+    Enables or disables recording of the execution time of all callbacks called via CallbackContainer.call().
+
+    Args:
+        enabled (bool): Whether execution times are recorded.
+    """
+    global _profiling
+    _profiling = enabled
+
 
 class Callback:
     """
@@ -16,14 +37,22 @@ class Callback:
         parameters (dict): Additional parameters associated with the callback.
         function (callable): The callback function to be executed.
         discard_inputs (bool): If True, ignores any extra positional or keyword arguments when calling the function.
+        once (bool): If True, the callback is removed from its container when it is called the first time.
+        calls, errors, total_time, max_time: Call statistics, recorded while profiling is enabled.
     """
     inputs: dict
     lambdas: dict
     parameters: dict
     function: callable
+    once: bool
+
+    calls: int
+    errors: int
+    total_time: float
+    max_time: float
 
     def __init__(self, function: callable, inputs: dict = None, lambdas: dict = None, parameters: dict = None,
-                 discard_inputs: bool = False, *args, **kwargs):
+                 discard_inputs: bool = False, once: bool = False, *args, **kwargs):
         """
         Initializes a new Callback instance.
 
@@ -33,6 +62,7 @@ class Callback:
             lambdas (dict, optional): A dictionary of callables whose results will be passed as inputs.
             parameters (dict, optional): Additional parameters for the callback.
             discard_inputs (bool, optional): If True, extra inputs provided during the call are ignored.
+            once (bool, optional): If True, the callback is only called once.
         """
         self.function = function
 
@@ -49,6 +79,14 @@ class Callback:
         self.parameters = parameters
 
         self.discard_inputs = discard_inputs
+        self.once = once
+
+        self.calls = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+        self._invoke = self._bind()
 
     def __call__(self, *args, **kwargs):
         """
@@ -57,6 +95,36 @@ class Callback:
         Returns:
             The return value of the callback function.
         """
+        return self._invoke(*args, **kwargs)
+
+    def statistics(self) -> dict:
+        """
+        Returns:
+            dict: Number of calls and errors, mean and maximum execution time in seconds.
+        """
+        return {
+            'function': getattr(self.function, '__qualname__', repr(self.function)),
+            'calls': self.calls,
+            'errors': self.errors,
+            'mean_time': self.total_time / self.calls if self.calls else 0.0,
+            'max_time': self.max_time,
+        }
+
+    def _bind(self):
+        """
+        Pre-binds the stored inputs, so that the common cases do not build dictionaries on every call.
+        """
+        if self.lambdas:
+            return self._callWithLambdas
+        if self.discard_inputs:
+            inputs = dict(self.inputs)
+            function = self.function
+            return lambda *args, **kwargs: function(**inputs)
+        if self.inputs:
+            return functools.partial(self.function, **self.inputs)
+        return self.function
+
+    def _callWithLambdas(self, *args, **kwargs):
         # Evaluate any lambda functions.
         lambdas_exec = {key: value() for (key, value) in self.lambdas.items()}
 
@@ -73,11 +141,15 @@ class CallbackContainer:
     A container for managing callbacks. It allows registration, removal, and invocation of callbacks.
     It can also be parameterized with expected parameters; required parameters must be provided when registering a callback.
 
+    Registering and removing callbacks replaces the tuple of callbacks (copy-on-write), so invoking them iterates
+    over a snapshot without taking a lock. Exceptions raised by one callback are logged and do not prevent the
+    other callbacks from being called.
+
     Attributes:
-        callbacks (list[Callback]): The list of registered Callback objects.
+        callbacks (tuple[Callback]): The registered Callback objects.
         expected_parameters (dict): Mapping of parameter names to a tuple (expected type, required flag).
     """
-    callbacks: list[Callback]
+    callbacks: tuple[Callback, ...]
 
     def __init__(self, parameters=None):
         """
@@ -88,8 +160,9 @@ class CallbackContainer:
                 that define the expected parameters. For example:
                 [('param1', int,  OPTIONAL), ('param2', float, REQUIRED)]
         """
-        self.callbacks = []
+        self.callbacks = ()
         self.parameters = parameters  # original input
+        self._lock = threading.Lock()
 
         # Validate and convert the parameter specifications into a dict.
         if parameters is not None:
@@ -112,7 +185,7 @@ class CallbackContainer:
             self.expected_parameters = {}
 
     def register(self, function: callable, inputs: dict = None, parameters: dict = None, lambdas: dict = None,
-                 discard_inputs=False, *args, **kwargs):
+                 discard_inputs=False, once=False, *args, **kwargs):
         """
         Registers a callback function. Checks that all required parameters (if any) are provided.
 
@@ -122,8 +195,12 @@ class CallbackContainer:
             parameters (dict, optional): Dictionary of parameters to associate with the callback.
             lambdas (dict, optional): Dictionary of lambdas to evaluate at call time.
             discard_inputs (bool, optional): Whether to discard extra call inputs.
+            once (bool, optional): Whether the callback is removed after its first call.
             *args, **kwargs: Additional arguments passed to the Callback constructor.
 
+        Returns:
+            Callback: The registered callback.
+
         Raises:
             RuntimeError: If any required parameter (as specified by expected_parameters) is missing.
             TypeError: If a parameter value does not match its expected type.
@@ -145,23 +222,33 @@ class CallbackContainer:
                             f"got {type(parameters[param_name]).__name__}."
                         )
 
-        # Create a new Callback with an empty inputs dict.
         callback = Callback(function, inputs=inputs, lambdas=lambdas, parameters=parameters,
-                            discard_inputs=discard_inputs, *args, **kwargs)
-        self.callbacks.append(callback)
+                            discard_inputs=discard_inputs, once=once, *args, **kwargs)
+        with self._lock:
+            self.callbacks = self.callbacks + (callback,)
+        return callback
 
-    def remove(self, callback):
+    def remove(self, callback) -> bool:
         """
         Removes a callback from the container.
 
         Args:
             callback (Callback or callable): The callback instance or function to remove.
+
+        Returns:
+            bool: True if the callback was removed.
         """
-        if isinstance(callback, Callback):
-            self.callbacks.remove(callback)
-        elif callable(callback):
-            cb = next(cb for cb in self.callbacks if cb.function == callback)
-            self.callbacks.remove(cb)
+        with self._lock:
+            if isinstance(callback, Callback):
+                remaining = tuple(cb for cb in self.callbacks if cb is not callback)
+            elif callable(callback):
+                cb = next((cb for cb in self.callbacks if cb.function == callback), None)
+                remaining = tuple(other for other in self.callbacks if other is not cb)
+            else:
+                return False
+            removed = len(remaining) != len(self.callbacks)
+            self.callbacks = remaining
+        return removed
 
     def call(self, *args, **kwargs):
         """
@@ -172,7 +259,34 @@ class CallbackContainer:
             **kwargs: Keyword arguments to pass to each callback.
         """
         for callback in self.callbacks:
-            callback(*args, **kwargs)
+            # Once-only callbacks are removed before they are called, so concurrent calls run them only once
+            if callback.once and not self.remove(callback):
+                continue
+            if _profiling:
+                start = time.perf_counter()
+                try:
+                    callback._invoke(*args, **kwargs)
+                except Exception as e:
+                    self._reportError(callback, e)
+                duration = time.perf_counter() - start
+                callback.calls += 1
+                callback.total_time += duration
+                if duration > callback.max_time:
+                    callback.max_time = duration
+            else:
+                try:
+                    callback._invoke(*args, **kwargs)
+                except Exception as e:
+                    self._reportError(callback, e)
+
+    def statistics(self) -> list[dict]:
+        """
+        Returns:
+            list[dict]: Call statistics of all callbacks, slowest first. Times are only recorded while profiling
+                is enabled (see setCallbackProfiling).
+        """
+        return sorted((callback.statistics() for callback in self.callbacks),
+                      key=lambda entry: entry['max_time'], reverse=True)
 
     def __iter__(self):
         """
@@ -182,7 +296,13 @@ class CallbackContainer:
         return iter(self.callbacks)
 
     def clear_callbacks(self):
-        self.callbacks.clear()
+        with self._lock:
+            self.callbacks = ()
+
+    @staticmethod
+    def _reportError(callback: Callback, error: Exception):
+        callback.errors += 1
+        logger.error(f"Error in callback {getattr(callback.function, '__qualname__', callback.function)}: {error}")
 
 
 # def callback_handler(cls):
@@ -1,16 +1,23 @@
 import os
 import csv
 import enum
+import json
+import queue
 import threading
 import time
 from dataclasses import is_dataclass, fields
 from functools import lru_cache
 
+import numpy as np
+
 from core.utils.dict_utils import cache_dict_paths_for_flatten, \
     optimized_flatten_dict
 from core.utils.files import dirExists, makeDir
+from core.utils.logging_utils import Logger
 from core.utils.time import precise_sleep
 
+logger = Logger('csv')
+
 # ======================================================================================================================
 def read_csv_file(file_path, meta_lines=1):
     """
@@ -256,6 +263,484 @@ class CSVLogger:
         self.close()
 
 
+# ======================================================================================================================
+class BatchedLogger:
+    """
+    Logger with the interface of CSVLogger for samples that are logged from time-critical threads.
+
+    The column schema is inferred from the first sample. Rows are copied into a preallocated NumPy buffer and
+    written in batches by a background thread, so write_data does not touch the file. Two output formats exist:
+
+        'csv'    - same layout as CSVLogger (custom header, names, types, rows) and readable by read_csv_file
+        'binary' - a JSON header line followed by fixed-size records, readable by read_binary_log
+
+    Samples can be (lists of) nested dicts, dataclass instances or flat structured NumPy arrays. For dicts, a
+    function that reads all values of the inferred schema is generated, so the dict is only walked again if its
+    structure changed. If the structure or the types of the samples change, the current file is finished and a new
+    segment <name>_1.csv, <name>_2.csv, ... is started with the new schema.
+
+    Rows are dropped if the writer thread falls more than max_pending_buffers buffers behind. Rows that reach the
+    file later than max_latency seconds after they were logged are counted as late. Both are reported by
+    getStatistics() and when the logger is closed.
+    """
+
+    def __init__(self, format='csv', precision=4, buffer_size=1000, flush_interval=1.0, max_pending_buffers=8,
+                 max_latency=5.0, string_length=64):
+        """
+        :param format: 'csv' or 'binary'
+        :param precision: The number of digits after the comma for values >= 1,
+                          or the number of digits after the first significant digit for values < 1. Only used for
+                          CSV files. If None, floats are written with full precision.
+        :param buffer_size: Number of rows per buffer. A full buffer is handed to the writer thread.
+        :param flush_interval: Partially filled buffers are written after this time in seconds.
+        :param string_length: Maximum length of string columns in binary files.
+        """
+        if format not in ('csv', 'binary'):
+            raise ValueError(f"Unknown format '{format}'")
+        self.format = format
+        self.precision = precision
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.max_pending_buffers = max_pending_buffers
+        self.max_latency = max_latency
+        self.string_length = string_length
+
+        self.file_path = None
+        self.file_paths = []
+        self.fieldnames = None
+        self.fieldtypes = None
+        self.is_closed = True
+        self.index = 0
+
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.rows_late = 0
+
+        self.file_lock = threading.Lock()
+        self._custom_text_header = None
+        self._dtype = None
+        self._records_dtype = None  # dtype of the structured arrays the current segment was started for
+        self._extract = None  # Generated function returning the row of a dict sample, see _compile_row_extractor
+        self._pending = 0  # Buffers handed to the writer thread that are not written yet
+        self._buffer = None
+        self._count = 0
+        self._first_time = None
+        self._free_buffers = []
+        self._queue = queue.Queue()
+        self._thread = None
+        self._file = None
+        self._writer = None
+        self._segment = 0
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @property
+    def is_open(self):
+        return not self.is_closed
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def make_file(self, file, folder="./", custom_text_header=None):
+        """
+        Creates (or recreates) the log file and starts the writer thread. The file itself is written when the
+        first batch of rows is ready.
+        """
+        if self.is_open:
+            self.close()
+
+        os.makedirs(folder, exist_ok=True)
+        self.file_path = os.path.join(folder, file)
+        self.file_paths = []
+        self.fieldnames = None
+        self.fieldtypes = None
+        self.index = 0
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.rows_late = 0
+        self._custom_text_header = custom_text_header
+        self._dtype = None
+        self._records_dtype = None
+        self._extract = None
+        self._pending = 0
+        self._buffer = None
+        self._count = 0
+        self._free_buffers = []
+        self._segment = 0
+        self._queue = queue.Queue()
+
+        self.is_closed = False
+        self._thread = threading.Thread(target=self._writerThread, daemon=True)
+        self._thread.start()
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def write_data(self, data):
+        """
+        Adds data to the row buffer. The data can be a dict, a dataclass instance, a list of them or a structured
+        NumPy array with one record per row.
+        """
+        with self.file_lock:
+            if self.is_closed:
+                return
+
+            if isinstance(data, np.ndarray) and data.dtype.names is not None:
+                self._bufferRecords(data)
+                return
+
+            if not isinstance(data, list):
+                data = [data]
+            for sample in data:
+                if is_dataclass(sample):
+                    sample = asdict_optimized(sample)
+                self._bufferSample(sample)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def log_event(self, data):
+        """
+        Adds a single event's data to the row buffer. Accepts the same data as write_data.
+        """
+        self.write_data(data)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def flush(self, timeout=None):
+        """
+        Hands the buffered rows to the writer thread and waits until they are in the file.
+        """
+        with self.file_lock:
+            if self.is_closed:
+                return
+            self._handOver()
+            done = threading.Event()
+            self._queue.put(('flush', done))
+        done.wait(timeout)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def close(self):
+        """
+        Writes all buffered rows and closes the file.
+        """
+        with self.file_lock:
+            if self.is_closed:
+                return
+            self._handOver()
+            self.is_closed = True
+            self._queue.put(('close',))
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+        if self.rows_dropped or self.rows_late:
+            logger.warning(f"{self.file_path}: {self.rows_dropped} rows dropped, {self.rows_late} rows written "
+                           f"later than {self.max_latency} s")
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def getStatistics(self) -> dict:
+        return {
+            'rows_logged': self.index,
+            'rows_written': self.rows_written,
+            'rows_dropped': self.rows_dropped,
+            'rows_late': self.rows_late,
+            'pending_buffers': self._pending,
+            'segments': len(self.file_paths),
+        }
+
+    # === PRIVATE METHODS ==============================================================================================
+    def _bufferSample(self, sample: dict):
+        if self._extract is not None:
+            try:
+                row = self._extract(sample, self.index)
+            except (KeyError, TypeError, IndexError):
+                row = None
+            if row is not None and self._bufferRow(row):
+                return
+
+        # The structure or the types of the sample differ from the schema, or no schema exists yet
+        paths, values = [], []
+        _flatten_sample(sample, (), paths, values)
+        names = tuple('.'.join(str(key) for key in path) for path in paths)
+        types = [_infer_type(value) for value in values]
+        row = (self.index, *values)
+        # NumPy converts some values silently (e.g. a float into an int column), so the types are compared first
+        if (self._dtype is None or names != self._dtype.names[1:] or types != self.fieldtypes[1:]
+                or not self._bufferRow(row)):
+            self._startSegment(names, values)
+            self._extract = _compile_row_extractor(sample, paths, types)
+            if not self._bufferRow(row):
+                self.rows_dropped += 1
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _bufferRow(self, row: tuple) -> bool:
+        try:
+            self._buffer[self._count] = row
+        except (ValueError, TypeError, OverflowError):
+            return False
+
+        if self._count == 0:
+            self._first_time = time.monotonic()
+        self._count += 1
+        self.index += 1
+        if self._count == self.buffer_size:
+            self._handOver()
+        return True
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _bufferRecords(self, records: np.ndarray):
+        if records.dtype != self._records_dtype:
+            self._startSegment(records.dtype.names, records.dtype)
+            self._records_dtype = records.dtype
+
+        fields = self._buffer[list(records.dtype.names)]
+        start = 0
+        while start < len(records):
+            n = min(len(records) - start, self.buffer_size - self._count)
+            if self._count == 0:
+                self._first_time = time.monotonic()
+            self._buffer['index'][self._count:self._count + n] = np.arange(self.index, self.index + n)
+            fields[self._count:self._count + n] = records[start:start + n]
+            self._count += n
+            self.index += n
+            start += n
+            if self._count == self.buffer_size:
+                self._handOver()
+                fields = self._buffer[list(records.dtype.names)]
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _startSegment(self, names: tuple, values):
+        """
+        Finishes the current segment and starts a new one with the schema given by the names and either the values
+        of a first row or a structured dtype.
+        """
+        self._handOver()
+        if isinstance(values, np.dtype):
+            column_dtypes = [values[name] for name in names]
+            types = [_dtype_type_name(dtype) for dtype in column_dtypes]
+        else:
+            types = [_infer_type(value) for value in values]
+            column_dtypes = [self._columnDtype(type_name) for type_name in types]
+
+        self._dtype = np.dtype([('index', np.int64)] + list(zip(names, column_dtypes)))
+        self._records_dtype = None
+        self._extract = None
+        self._buffer = np.zeros(self.buffer_size, dtype=self._dtype)
+        self._free_buffers = []
+        self.fieldnames = ['index', *names]
+        self.fieldtypes = ['int', *types]
+        self._queue.put(('segment', self._dtype, self.fieldnames, self.fieldtypes))
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _columnDtype(self, type_name: str):
+        if type_name == 'str' and self.format == 'binary':
+            return np.dtype(f"S{self.string_length}")
+        return np.dtype({'int': np.int64, 'float': np.float64, 'bool': np.bool_, 'str': object}[type_name])
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _handOver(self):
+        """
+        Hands the filled part of the current buffer to the writer thread. Must be called with file_lock held.
+        """
+        if self._count == 0:
+            return
+        if self._pending >= self.max_pending_buffers:
+            # The writer is too far behind, the rows of this buffer are lost
+            self.rows_dropped += self._count
+            self._count = 0
+            self._first_time = None
+            return
+
+        self._pending += 1
+        self._queue.put(('rows', self._buffer, self._count, self._first_time))
+        self._buffer = self._free_buffers.pop() if self._free_buffers else np.zeros(self.buffer_size,
+                                                                                    dtype=self._dtype)
+        self._count = 0
+        self._first_time = None
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _writerThread(self):
+        while True:
+            try:
+                command = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                with self.file_lock:
+                    if self._first_time is not None and time.monotonic() - self._first_time >= self.flush_interval:
+                        self._handOver()
+                continue
+
+            if command[0] == 'rows':
+                _, buffer, count, first_time = command
+                try:
+                    self._writeRows(buffer[:count])
+                    if first_time is not None and time.monotonic() - first_time > self.max_latency:
+                        self.rows_late += count
+                except Exception as e:
+                    logger.error(f"Could not write {count} rows to {self.file_paths[-1]}: {e}")
+                    self.rows_dropped += count
+                with self.file_lock:
+                    self._pending -= 1
+                    if buffer.dtype == self._dtype:
+                        self._free_buffers.append(buffer)
+            elif command[0] == 'segment':
+                self._openSegment(*command[1:])
+            elif command[0] == 'flush':
+                if self._file is not None:
+                    self._file.flush()
+                command[1].set()
+            elif command[0] == 'close':
+                self._closeSegment()
+                return
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _openSegment(self, dtype: np.dtype, names: list, types: list):
+        self._closeSegment()
+        if self._segment == 0:
+            file_path = self.file_path
+        else:
+            root, ext = os.path.splitext(self.file_path)
+            file_path = f"{root}_{self._segment}{ext}"
+        self._segment += 1
+        self.file_paths.append(file_path)
+
+        if self.format == 'csv':
+            self._file = open(file_path, mode='w', newline='', encoding='utf-8')
+            _write_custom_text_header(self._file, self._custom_text_header)
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(names)
+            self._writer.writerow(types)
+        else:
+            self._file = open(file_path, mode='wb')
+            header = {
+                'names': list(dtype.names),
+                'formats': [dtype[name].str for name in dtype.names],
+                'types': types,
+                'header': self._custom_text_header,
+            }
+            self._file.write(BINARY_LOG_MAGIC + json.dumps(header).encode('utf-8') + b"\n")
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _closeSegment(self):
+        if self._file is not None:
+            self._file.close()
+        self._file = None
+        self._writer = None
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _writeRows(self, rows: np.ndarray):
+        if self.format == 'binary':
+            self._file.write(rows.tobytes())
+        else:
+            columns = []
+            for name in rows.dtype.names:
+                column = rows[name]
+                if column.dtype.kind == 'f' and self.precision is not None:
+                    column = _round_floats(column, self.precision)
+                elif column.dtype.kind == 'S':
+                    column = np.char.decode(column, 'utf-8', errors='replace')
+                columns.append(column.tolist())
+            self._writer.writerows(zip(*columns))
+        self.rows_written += len(rows)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def __del__(self):
+        self.close()
+
+
+# ======================================================================================================================
+BINARY_LOG_MAGIC = b"BLOG1 "
+
+
+def read_binary_log(file_path) -> (np.ndarray, dict):
+    """
+    Reads a file written by BatchedLogger in binary format.
+
+    :return: A structured array with one record per row and the header with the names, types and the custom text
+             header of the file.
+    """
+    with open(file_path, 'rb') as file:
+        line = file.readline()
+        if not line.startswith(BINARY_LOG_MAGIC):
+            raise ValueError(f"'{file_path}' is not a binary log file")
+        header = json.loads(line[len(BINARY_LOG_MAGIC):])
+        dtype = np.dtype(list(zip(header['names'], header['formats'])))
+        data = np.fromfile(file, dtype=dtype)
+    return data, header
+
+
+def _flatten_sample(d: dict, parent_path: tuple, paths: list, values: list):
+    for key, value in d.items():
+        path = (*parent_path, key)
+        if isinstance(value, dict):
+            _flatten_sample(value, path, paths, values)
+        else:
+            if isinstance(value, enum.Enum):
+                value = value.value
+            paths.append(path)
+            values.append(value)
+
+
+def _compile_row_extractor(sample: dict, paths: list, types: list):
+    """
+    Generates a function (sample, index) -> (index, *values) for samples with the structure of the given sample.
+    It returns None if the number of keys of a nested dict differs or if a value does not have the type of its
+    column (see _infer_type). Missing keys raise a KeyError.
+    """
+    checks = []
+
+    def collect_checks(d, access):
+        checks.append(f"len({access}) != {len(d)}")
+        for key, value in d.items():
+            if isinstance(value, dict):
+                collect_checks(value, f"{access}[{key!r}]")
+
+    collect_checks(sample, "d")
+    leaves = ["d" + "".join(f"[{key!r}]" for key in path) for path in paths]
+
+    values = [f"v{i}" for i in range(len(leaves))]
+    type_checks = [f"infer_type({value}) != {type_name!r}" for value, type_name in zip(values, types)]
+
+    source = (f"def extract(d, index):\n"
+              f"    if {' or '.join(checks)}:\n"
+              f"        return None\n")
+    if values:
+        source += (f"    {', '.join(values)}, = {', '.join(leaves)},\n"
+                   f"    if {' or '.join(type_checks)}:\n"
+                   f"        return None\n")
+    source += f"    return (index, {', '.join(values)})\n"
+    namespace = {'infer_type': _infer_type}
+    exec(source, namespace)
+    return namespace['extract']
+
+
+def _infer_type(value) -> str:
+    if isinstance(value, (bool, np.bool_)):
+        return 'bool'
+    elif isinstance(value, (int, np.integer)):
+        return 'int'
+    elif isinstance(value, (float, np.floating)):
+        return 'float'
+    else:
+        return 'str'
+
+
+def _dtype_type_name(dtype: np.dtype) -> str:
+    return {'b': 'bool', 'i': 'int', 'u': 'int', 'f': 'float'}.get(dtype.kind, 'str')
+
+
+def _round_floats(values: np.ndarray, precision: int) -> np.ndarray:
+    """
+    Vectorized version of CSVLogger._round_float.
+    """
+    abs_values = np.abs(values)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        decimals = np.where(abs_values >= 1, precision, precision - np.floor(np.log10(abs_values)))
+    decimals = np.nan_to_num(decimals, nan=precision, posinf=precision, neginf=precision).astype(np.int64)
+    scale = 10.0 ** np.minimum(decimals, 300)
+    return np.round(values * scale) / scale
+
+
+def _write_custom_text_header(file, custom_text_header):
+    if custom_text_header:
+        if isinstance(custom_text_header, list):
+            file.write("\n".join(custom_text_header) + "\n")
+        else:
+            file.write(custom_text_header + "\n")
+
+
 # ======================================================================================================================
 def main():
     """
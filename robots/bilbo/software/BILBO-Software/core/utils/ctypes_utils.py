@@ -2,6 +2,8 @@ import ctypes
 from dataclasses import is_dataclass, fields
 from typing import List, Dict, Tuple, Union, Type, Any
 
+import numpy as np
+
 # import graphviz
 
 
@@ -260,6 +262,102 @@ def bytes_to_value(byte_data, ctype_type):
     return ctype_to_value(ctype_value=bytes_to_ctype(byte_data=byte_data, ctype_type=ctype_type), ctype_type=ctype_type)
 
 
+def ctype_to_dtype(ctype_type, flatten: bool = False, sep: str = '.') -> np.dtype:
+    """
+    Generates a little endian NumPy dtype with the same memory layout as a ctypes type. Field offsets and the item
+    size are taken from ctypes, so padding and `_pack_` are mirrored exactly.
+
+    Args:
+        ctype_type: A ctypes.Structure, ctypes.Array or simple ctypes type.
+        flatten (bool): If True, nested structures are flattened into fields named by their `sep`-separated path.
+
+    Returns:
+        np.dtype: The generated dtype. Its itemsize is equal to ctypes.sizeof(ctype_type).
+
+    Raises:
+        ConversionError: If the ctypes type cannot be represented or the generated layout does not match ctypes.
+    """
+    if flatten and isinstance(ctype_type, type) and issubclass(ctype_type, ctypes.Structure):
+        names, formats, offsets = [], [], []
+        _collect_flat_dtype_fields(ctype_type, '', 0, sep, names, formats, offsets)
+        dtype = np.dtype({'names': names, 'formats': formats, 'offsets': offsets,
+                          'itemsize': ctypes.sizeof(ctype_type)})
+    else:
+        dtype = _ctype_to_dtype(ctype_type)
+
+    if dtype.itemsize != ctypes.sizeof(ctype_type):
+        raise ConversionError(f"Generated dtype for {ctype_type.__name__} has size {dtype.itemsize}, "
+                              f"expected {ctypes.sizeof(ctype_type)}")
+    return dtype
+
+
+def bytes_to_records(byte_data, ctype_type=None, dtype: np.dtype = None) -> np.ndarray:
+    """
+    Interprets a buffer of consecutive ctypes structures as a NumPy structured array without copying.
+
+    Args:
+        byte_data: bytes, bytearray or memoryview. The array is read-only if the buffer is immutable.
+        ctype_type: The ctypes type of one element. Ignored if `dtype` is given.
+        dtype (np.dtype): A dtype generated with ctype_to_dtype, to avoid generating it for every call.
+    """
+    if dtype is None:
+        dtype = ctype_to_dtype(ctype_type)
+    if len(byte_data) % dtype.itemsize != 0:
+        raise ConversionError(f"Buffer size {len(byte_data)} is not a multiple of the element size {dtype.itemsize}")
+    return np.frombuffer(byte_data, dtype=dtype)
+
+
+def record_to_dict(record) -> dict:
+    """
+    Converts a record of a structured array generated with ctype_to_dtype to a nested dictionary, like
+    struct_to_dict does for the ctypes structure.
+    """
+    result = {}
+    for name in record.dtype.names:
+        value = record[name]
+        if value.dtype.names is not None:
+            result[name] = record_to_dict(value)
+        elif value.shape:
+            result[name] = value.tolist()
+        else:
+            result[name] = value.item()
+    return result
+
+
+def _ctype_to_dtype(ctype_type) -> np.dtype:
+    if issubclass(ctype_type, ctypes.Structure):
+        names, formats, offsets = [], [], []
+        for field in ctype_type._fields_:
+            if len(field) > 2:
+                raise ConversionError(f"Bit field '{field[0]}' in {ctype_type.__name__} cannot be represented")
+            name, field_type = field
+            names.append(name)
+            formats.append(_ctype_to_dtype(field_type))
+            offsets.append(getattr(ctype_type, name).offset)
+        return np.dtype({'names': names, 'formats': formats, 'offsets': offsets,
+                         'itemsize': ctypes.sizeof(ctype_type)})
+    elif issubclass(ctype_type, ctypes.Array):
+        return np.dtype((_ctype_to_dtype(ctype_type._type_), (ctype_type._length_,)))
+    elif issubclass(ctype_type, ctypes._SimpleCData) and ctype_type._type_ not in 'zZPO':
+        return np.dtype(ctype_type).newbyteorder('<')
+    raise ConversionError(f"Unsupported ctypes type {ctype_type} for dtype generation")
+
+
+def _collect_flat_dtype_fields(struct_type, prefix: str, base_offset: int, sep: str, names: list, formats: list,
+                               offsets: list):
+    for field in struct_type._fields_:
+        if len(field) > 2:
+            raise ConversionError(f"Bit field '{field[0]}' in {struct_type.__name__} cannot be represented")
+        name, field_type = field
+        offset = base_offset + getattr(struct_type, name).offset
+        if issubclass(field_type, ctypes.Structure):
+            _collect_flat_dtype_fields(field_type, f"{prefix}{name}{sep}", offset, sep, names, formats, offsets)
+        else:
+            names.append(f"{prefix}{name}")
+            formats.append(_ctype_to_dtype(field_type))
+            offsets.append(offset)
+
+
 def STRUCTURE(cls):
     """
     Decorator to simplify and automate the creation of ctypes.Structure classes.
@@ -1,3 +1,4 @@
+import base64
 from math import isclose
 import numpy as np
 from scipy.signal import butter, filtfilt
@@ -124,3 +125,33 @@ def generate_random_input(t_vector, f_cutoff, sigma_I):
     start_idx = idx_candidates[0]
     return u[start_idx:start_idx + N]
 
+
+def encode_array(array, dtype=None) -> dict:
+    """
+    Encode an array as a JSON-compatible dict that holds the raw bytes in base64. This is much more compact than a
+    nested list of numbers. Structured arrays keep their fields.
+
+    Parameters:
+        array (array_like): The array to encode.
+        dtype (numpy.dtype, optional): Type to convert the array to before encoding, e.g. np.float32.
+
+    Returns:
+        dict: {'dtype': ..., 'shape': ..., 'data': ...}, which can be decoded with decode_array.
+    """
+    array = np.ascontiguousarray(np.asarray(array, dtype=dtype))
+    return {
+        'dtype': array.dtype.descr if array.dtype.names else array.dtype.str,
+        'shape': list(array.shape),
+        'data': base64.b64encode(array.tobytes()).decode('ascii'),
+    }
+
+
+def decode_array(data: dict) -> np.ndarray:
+    """
+    Decode an array that was encoded with encode_array.
+    """
+    dtype = data['dtype']
+    if isinstance(dtype, list):
+        dtype = [tuple(tuple(item) if isinstance(item, list) else item for item in field) for field in dtype]
+    array = np.frombuffer(base64.b64decode(data['data']), dtype=np.dtype(dtype))
+    return array.reshape(data['shape']).copy()
@@ -0,0 +1,205 @@
+"""
+Checks that the compiled converters of dataclass_utils give the same results as from_dict and asdict_optimized
+on randomly generated (and partially invalid) input, and measures the conversion cost per sample.
+
+Run from the BILBO-Software directory:
+    python -m core.utils.examples.example_dataclass_converters
+"""
+import copy
+import dataclasses
+import enum
+import random
+import time
+from typing import Optional, List, Dict, Tuple, Union, Any
+
+import numpy as np
+from dacite import Config
+
+from core.utils.dataclass_utils import from_dict, asdict_optimized, compile_from_dict, compile_to_dict, \
+    from_dict_fast, asdict_fast
+
+
+class Mode(enum.IntEnum):
+    OFF = 0
+    BALANCING = 1
+    VELOCITY = 2
+
+
+class Color(enum.Enum):
+    RED = 'red'
+    BLUE = 'blue'
+
+
+@dataclasses.dataclass
+class Inner:
+    x: float = 0.0
+    y: int = 0
+    flag: bool = False
+
+
+@dataclasses.dataclass
+class Leaf:
+    name: str
+    value: Optional[float] = None
+
+
+@dataclasses.dataclass
+class Outer:
+    inner: Inner = dataclasses.field(default_factory=Inner)
+    leaf: Optional[Leaf] = None
+    mode: Mode = Mode.OFF
+    color: Color = Color.RED
+    values: List[float] = dataclasses.field(default_factory=list)
+    leaves: List[Leaf] = dataclasses.field(default_factory=list)
+    table: Dict[str, int] = dataclasses.field(default_factory=dict)
+    pair: Tuple[int, str] = (0, '')
+    either: Union[int, str] = 0
+    anything: Any = None
+    array: np.ndarray = dataclasses.field(default_factory=lambda: np.zeros(3))
+    hidden: int = dataclasses.field(default=5, init=False)
+    optional_mode: Optional[Mode] = None
+
+
+@dataclasses.dataclass(frozen=True)
+class Frozen:
+    a: int
+    inner: Inner = dataclasses.field(default_factory=Inner)
+
+
+@dataclasses.dataclass
+class Node:
+    value: int = 0
+    child: Optional['Node'] = None
+
+
+CONFIGS = [None, Config(check_types=False), Config(strict=True), Config(type_hooks={Color: Color, Mode: Mode}),
+           Config(cast=[Mode, tuple])]
+
+VALUES = {
+    'float': [1.5, 2, True, 'x', None, np.float64(3.0), np.float32(1.0)],
+    'int': [1, 0, 2.5, True, 'x', None, np.int64(3)],
+    'bool': [True, False, 1, None],
+    'str': ['a', 1, None],
+}
+
+
+# ======================================================================================================================
+class RandomData:
+    """
+    Random input dicts for the dataclasses above. About a third of them is invalid (missing or extra keys,
+    wrong types).
+    """
+
+    def __init__(self, seed=0):
+        self.random = random.Random(seed)
+
+    def value(self, kind):
+        return self.random.choice(VALUES[kind])
+
+    def mutate(self, data: dict) -> dict:
+        r = self.random.random()
+        if r < 0.15 and data:
+            data.pop(self.random.choice(list(data)))
+        elif r < 0.25:
+            data['extra'] = 1
+        return data
+
+    def inner(self):
+        return self.mutate({'x': self.value('float'), 'y': self.value('int'), 'flag': self.value('bool')})
+
+    def leaf(self):
+        return self.mutate({'name': self.value('str'), 'value': self.value('float')})
+
+    def outer(self):
+        choice = self.random.choice
+        return self.mutate({
+            'inner': choice([self.inner(), Inner(), None, 3]),
+            'leaf': choice([self.leaf(), None, Leaf('leaf')]),
+            'mode': choice([0, 1, 5, 'OFF', Mode.VELOCITY, None, 1.0]),
+            'color': choice(['red', Color.BLUE, 'green', None]),
+            'values': choice([[1.0, 2], [], [1, 'x'], (1.0,), None]),
+            'leaves': choice([[self.leaf(), self.leaf()], [], None]),
+            'table': choice([{'a': 1}, {'a': 'x'}, {}, None]),
+            'pair': choice([(1, 'a'), (1,), ('a', 1), [1, 'a']]),
+            'either': choice([1, 'a', 1.5, None]),
+            'anything': choice([1, None, 'x', [1]]),
+            'array': choice([np.ones(2), [1, 2], None]),
+            'hidden': choice([1, 'x']),
+            'optional_mode': choice([None, 1, 'x', 7]),
+        })
+
+    def node(self, depth=0):
+        data = {'value': self.value('int')}
+        if depth < 3 and self.random.random() < 0.7:
+            data['child'] = self.node(depth + 1)
+        return self.mutate(data)
+
+    def frozen(self):
+        return self.mutate({'a': self.value('int'), 'inner': self.inner()})
+
+
+def _outcome(function):
+    try:
+        result = function()
+    except Exception as e:
+        return 'error', type(e).__name__, str(e)
+    return 'ok', type(result), repr(result)
+
+
+def check_equivalence(num_cases=10000, seed=0):
+    data_generator = RandomData(seed)
+    generators = [(Outer, data_generator.outer), (Inner, data_generator.inner), (Leaf, data_generator.leaf),
+                  (Node, data_generator.node), (Frozen, data_generator.frozen)]
+    mismatches = 0
+    valid = 0
+    for _ in range(num_cases):
+        data_class, generate = data_generator.random.choice(generators)
+        config = data_generator.random.choice(CONFIGS)
+        data = generate()
+
+        expected = _outcome(lambda: from_dict(data_class, copy.deepcopy(data), config))
+        result = _outcome(lambda: from_dict_fast(data_class, copy.deepcopy(data), config))
+        if expected != result:
+            mismatches += 1
+            print(f"from_dict mismatch for {data_class.__name__} with {data}:\n  {expected}\n  {result}")
+        elif expected[0] == 'ok':
+            valid += 1
+            instance = from_dict(data_class, copy.deepcopy(data), config)
+            if repr(asdict_optimized(instance)) != repr(asdict_fast(instance)):
+                mismatches += 1
+                print(f"asdict mismatch for {instance}")
+
+    print(f"{num_cases} cases ({valid} valid): {mismatches} mismatches")
+    return mismatches == 0
+
+
+def benchmark(data_class, num_samples=2000):
+    instance = data_class()
+    data = asdict_optimized(instance)
+    from_dict_compiled = compile_from_dict(data_class)
+    to_dict_compiled = compile_to_dict(data_class)
+
+    def cost(function):
+        start = time.perf_counter()
+        for _ in range(num_samples):
+            function()
+        return (time.perf_counter() - start) / num_samples * 1e6
+
+    print(f"{data_class.__name__}:")
+    print(f"  from_dict:         {cost(lambda: from_dict(data_class, data)):8.1f} us/sample")
+    print(f"  compiled:          {cost(lambda: from_dict_compiled(data)):8.1f} us/sample")
+    print(f"  asdict_optimized:  {cost(lambda: asdict_optimized(instance)):8.1f} us/sample")
+    print(f"  compiled:          {cost(lambda: to_dict_compiled(instance)):8.1f} us/sample")
+
+
+if __name__ == '__main__':
+    check_equivalence()
+    benchmark(Outer)
+    try:
+        from robot.lowlevel.stm32_sample import BILBO_LL_Sample
+        from robot.logging.bilbo_sample import BILBO_Sample
+    except ImportError as e:
+        print(f"Skipping the BILBO sample benchmark: {e}")
+    else:
+        benchmark(BILBO_LL_Sample)
+        benchmark(BILBO_Sample)
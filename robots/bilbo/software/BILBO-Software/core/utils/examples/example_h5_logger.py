@@ -0,0 +1,104 @@
+"""
+Compares the chunked H5PyDictLogger with the write path it replaced (resize the dataset, write and flush the file
+on every append). Samples of 800 bytes are appended in batches of 10, like the logging of BILBO. Prints the CPU
+time and the bytes written by each writer, and checks that every appended sample is in the file after close().
+
+Run from the BILBO-Software directory:
+    python -m core.utils.examples.example_h5_logger [num_samples]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import h5py
+import numpy as np
+
+from core.utils.h5 import H5PyDictLogger, H5SampleReader
+
+NUM_FIELDS = 100  # 100 float64 fields, 800 bytes per sample
+BATCH_SIZE = 10
+
+
+def make_batches(num_samples: int) -> (np.dtype, list):
+    dtype = np.dtype([('time', np.float64)] + [(f'signal_{i}', np.float64) for i in range(NUM_FIELDS - 1)])
+    samples = np.zeros(num_samples, dtype=dtype)
+    samples['time'] = np.arange(num_samples) * 0.01
+    rng = np.random.default_rng(1)
+    for name in dtype.names[1:]:
+        # Slowly changing signals, so that a compression filter has something to do
+        samples[name] = np.round(np.cumsum(rng.normal(0, 0.01, num_samples)), 3)
+    return dtype, [samples[i:i + BATCH_SIZE] for i in range(0, num_samples, BATCH_SIZE)]
+
+
+def bytes_written() -> (int, None):
+    try:
+        with open('/proc/self/io') as f:
+            return next(int(line.split()[1]) for line in f if line.startswith('wchar'))
+    except (OSError, StopIteration):
+        return None
+
+
+def write_per_append(filename: str, dtype: np.dtype, batches: list, chunk_size: int = None):
+    """
+    The write path of the logger before the chunked writer.
+    """
+    with h5py.File(filename, 'w') as file:
+        dataset = file.create_dataset('samples', shape=(0,), maxshape=(None,), dtype=dtype,
+                                      chunks=(chunk_size,) if chunk_size else True)
+        size = 0
+        for batch in batches:
+            dataset.resize((size + len(batch),))
+            dataset[size:size + len(batch)] = batch
+            size += len(batch)
+            file.flush()
+
+
+def write_chunked(filename: str, dtype: np.dtype, batches: list, **kwargs) -> int:
+    logger = H5PyDictLogger(filename=filename, chunk_size=1000, flush_interval=5, **kwargs)
+    logger.init(dtype)
+    logger.start()
+    for batch in batches:
+        logger.appendSamples(batch)
+    logger.close()
+    return logger.num_samples
+
+
+def measure(function, *args, **kwargs) -> dict:
+    bytes_start = bytes_written()
+    time_start = time.process_time()
+    result = function(*args, **kwargs)
+    cpu_time = time.process_time() - time_start
+    bytes_end = bytes_written()
+    return {'cpu_time': cpu_time, 'bytes': bytes_end - bytes_start if bytes_start is not None else None,
+            'result': result}
+
+
+def main():
+    num_samples = int(sys.argv[1]) if len(sys.argv) > 1 else 30000
+    dtype, batches = make_batches(num_samples)
+    folder = tempfile.mkdtemp()
+
+    writers = {
+        'Old, default chunks': (write_per_append, {}),
+        'Old, 1000-sample chunks': (write_per_append, {'chunk_size': 1000}),
+        'New': (write_chunked, {}),
+        'New with lzf': (write_chunked, {'compression': 'lzf'}),
+    }
+
+    print(f"{num_samples} samples of {dtype.itemsize} bytes, appended in batches of {BATCH_SIZE}")
+    for name, (function, kwargs) in writers.items():
+        filename = os.path.join(folder, f"{name.replace(' ', '_').replace(',', '')}.h5")
+        result = measure(function, filename, dtype, batches, **kwargs)
+        written = f"{result['bytes'] / 1e6:10.1f} MB" if result['bytes'] is not None else "         -"
+        print(f"{name:>24}: CPU time {result['cpu_time']:6.2f} s, written {written}, "
+              f"file {os.path.getsize(filename) / 1e6:6.1f} MB")
+
+        if function is write_chunked:
+            with H5SampleReader(filename) as reader:
+                assert len(reader) == num_samples == result['result']
+                assert np.array_equal(reader.read('time'), np.arange(num_samples) * 0.01)
+
+
+if __name__ == '__main__':
+    main()
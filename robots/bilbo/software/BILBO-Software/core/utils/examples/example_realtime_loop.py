@@ -0,0 +1,68 @@
+"""
+Runs a 100 Hz loop that allocates cyclic garbage, once with the automatic garbage collection and once with the
+collection scheduled by GC_Scheduler after every cycle, and prints the per-stage timing statistics of LoopTiming.
+If the process may use SCHED_FIFO (root or CAP_SYS_NICE), the loop runs with real-time priority.
+
+Run from the BILBO-Software directory:
+    python -m core.utils.examples.example_realtime_loop
+"""
+import time
+
+from core.utils.realtime import GC_Scheduler, LoopTiming, configure_thread
+
+PERIOD = 0.01
+
+
+class Node:
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.children = []
+        if parent is not None:
+            parent.children.append(self)
+
+
+def _work(garbage: list):
+    # Reference cycles can only be freed by the garbage collector
+    for _ in range(300):
+        root = Node()
+        Node(Node(root))
+        garbage.append(root)
+    del garbage[:-300]
+
+
+def run_loop(gc_scheduler: (GC_Scheduler, None), num_cycles: int = 1000) -> dict:
+    timing = LoopTiming(stages=['work', 'gc'], period=PERIOD, size=num_cycles)
+    garbage = []
+    if gc_scheduler is not None:
+        gc_scheduler.start()
+
+    next_time = time.perf_counter()
+    for tick in range(num_cycles):
+        timing.start()
+        _work(garbage)
+        timing.mark('work')
+        total = timing.finish(tick)
+        if gc_scheduler is not None:
+            timing.set('gc', gc_scheduler.collect(budget=PERIOD - total))
+
+        next_time += PERIOD
+        time.sleep(max(0.0, next_time - time.perf_counter()))
+
+    if gc_scheduler is not None:
+        gc_scheduler.stop()
+    return timing.statistics()
+
+
+def _report(name: str, statistics: dict):
+    print(f"{name}: {statistics['cycles']} cycles, {statistics['overruns']} overruns, "
+          f"{statistics['missed_cycles']} missed cycles")
+    for stage in ['total', 'work', 'gc', 'jitter']:
+        percentiles = ", ".join(f"p{p}: {value * 1e3:.3f}" for p, value in
+                                zip(statistics['percentiles'], statistics[stage]['percentiles']))
+        print(f"  {stage:>6} [ms]  {percentiles}, max: {statistics[stage]['max'] * 1e3:.3f}")
+
+
+if __name__ == '__main__':
+    print(configure_thread(priority=50))
+    _report('automatic gc', run_loop(None))
+    _report('scheduled gc', run_loop(GC_Scheduler(gen1_interval=10, full_interval=100)))
@@ -0,0 +1,70 @@
+"""
+Identifies a lightly damped second-order system from 300 noisy trials with the vectorized FIR least squares and
+ERA, compares the time with the row-by-row regression and checks the frequency response estimated from a multisine
+experiment against the identified model.
+
+Run from the BILBO-Software directory:
+    python -m core.utils.examples.example_system_identification
+"""
+import time
+
+import numpy as np
+from scipy.signal import lfilter
+
+from core.utils.system_identification import identify, multisine, estimate_frequency_response
+
+DT = 0.01
+NUM = [0, 0.05]
+DEN = [1, -1.9, 0.92]
+
+
+def plant(u: np.ndarray, rng, noise: float = 0.01) -> np.ndarray:
+    return lfilter(NUM, DEN, u) + noise * rng.normal(size=len(u))
+
+
+def fir_loop(u_list, y_list, length: int) -> np.ndarray:
+    """
+    Regression with one row per sample, as it was built before.
+    """
+    U_big, Y_big = [], []
+    for u, y in zip(u_list, y_list):
+        for t in range(len(u)):
+            U_big.append([u[t - k] if t - k >= 0 else 0 for k in range(length)])
+            Y_big.append(y[t])
+    return np.linalg.lstsq(np.array(U_big), np.array(Y_big), rcond=None)[0]
+
+
+def main(num_trials: int = 300, length: int = 500, fir_length: int = 100):
+    rng = np.random.default_rng(0)
+    u_list = [rng.normal(size=length) for _ in range(num_trials)]
+    y_list = [plant(u, rng) for u in u_list]
+
+    start = time.perf_counter()
+    result = identify(u_list, y_list, fir_length=fir_length, dt=DT)
+    time_vectorized = time.perf_counter() - start
+    print(f"Vectorized: {num_trials} trials in {time_vectorized:.2f} s, order {result.model.order}, "
+          f"fit {result.fit:.1f} %, poles {np.round(np.linalg.eigvals(result.model.A), 4)}")
+
+    num_loop = max(1, num_trials // 10)
+    start = time.perf_counter()
+    h_loop = fir_loop(u_list[:num_loop], y_list[:num_loop], fir_length)
+    time_loop = time.perf_counter() - start
+    print(f"Row by row: {num_loop} trials in {time_loop:.2f} s "
+          f"(~{time_loop * num_trials / num_loop:.1f} s for {num_trials} trials)")
+
+    h_vectorized = identify(u_list[:num_loop], y_list[:num_loop], fir_length=fir_length).impulse_response
+    print(f"Max. difference of the impulse responses: {np.max(np.abs(h_loop - h_vectorized)):.2e}")
+
+    period = 200
+    excitation = multisine(period=period, dt=DT, f_min=0, f_max=20, amplitude=0.5, periods=5)
+    experiments = [excitation] * 20
+    frequency_response = estimate_frequency_response(experiments, [plant(u, rng) for u in experiments],
+                                                     period=period, dt=DT)
+    model_response = result.model.frequency_response(frequency_response.frequencies)
+    error = np.abs(frequency_response.response - model_response) / np.abs(model_response)
+    print(f"Multisine: {len(frequency_response.bins)} bins, median relative deviation from the model "
+          f"{np.median(error) * 100:.2f} %, min. coherence {np.min(frequency_response.coherence):.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,11 @@
 
 
+import atexit
+import os
+import queue
+import time
+import weakref
+
 import h5py
 import numpy as np
 import threading
@@ -7,20 +13,50 @@ import random
 
 from core.utils.dict_utils import cache_dict_paths_for_flatten, optimized_flatten_dict, unflatten_dict_baseline
 
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
 
 # -----------------------------------------------------------------------------
 # H5PyDictLogger implementation with nested signal support
 # -----------------------------------------------------------------------------
 
 class H5PyDictLogger:
+    """
+    Logs samples into a compound HDF5 dataset.
+
+    Appended samples are collected in an in-memory chunk with the layout of the dataset. Only whole chunks are
+    written, by a background thread (or the calling thread if asynchronous=False), and the dataset grows in
+    multiples of the chunk size. Incomplete chunks are written and the file is flushed when flush_interval has
+    passed or flush_size samples have been written since the last flush. The number of valid samples is stored in
+    the 'num_samples' attribute of the dataset on every flush, so a file that was not closed properly can still
+    be read up to the last flush. Reading samples writes all pending samples first.
+
+    H5SampleReader can only memory-map contiguous datasets. An uncompressed log can be rewritten with a contiguous
+    layout on close (contiguous_on_close) or later with make_contiguous().
+    """
+
     def __init__(self, filename, dataset_name="samples", chunk_size=10000,
-                 type_mapping=None):
+                 type_mapping=None, asynchronous: bool = True, compression=None, compression_opts=None,
+                 flush_interval: float = 5.0, flush_size: int = None, contiguous_on_close: bool = False):
         """
         Initializes the H5PyDictLogger.
 
         :param filename: HDF5 file name.
         :param dataset_name: Name of the dataset in the file.
+        :param chunk_size: Number of samples per HDF5 chunk and per write.
         :param type_mapping: Mapping from Python types to NumPy dtypes.
+        :param asynchronous: If True, chunks are written by a background thread.
+        :param compression: HDF5 compression filter of the dataset, e.g. 'gzip' or 'lzf'.
+        :param compression_opts: Options of the compression filter, e.g. the gzip level.
+        :param flush_interval: Maximum time in seconds between flushes of the file. None disables the time policy.
+        :param flush_size: Number of written samples after which the file is flushed. Defaults to the chunk size.
+        :param contiguous_on_close: If True and the dataset is not compressed, the file is rewritten with a
+            contiguous dataset on close, so that it can be memory-mapped. This writes the whole log a second time
+            and close(), also the one of the exit handler, takes time proportional to the size of the log. Only
+            for logs that are read memory-mapped. Ignored for compressed datasets and fields of variable length.
         """
         if type_mapping is None:
             self.type_mapping = {
@@ -42,7 +78,47 @@ class H5PyDictLogger:
         self.current_size = 0  # Number of samples currently in the dataset.
         self._dict_flatten_cache = None
 
-    def init(self, initial_sample: dict):
+        self.asynchronous = asynchronous
+        self.compression = compression
+        self.compression_opts = compression_opts
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size if flush_size is not None else chunk_size
+        self.contiguous_on_close = contiguous_on_close
+
+        # In-memory chunk that collects appended samples. Full chunks are handed to the writer and replaced by a
+        # free buffer, partial chunks are only copied out by a flush.
+        self._chunk = None
+        self._chunk_count = 0  # Number of samples in the current chunk
+        self._chunk_start = 0  # Dataset index of the first sample in the current chunk
+        self._free_chunks = []
+        self._chunk_lock = threading.Lock()
+
+        self._write_queue = queue.Queue()
+        self._writer_thread = None
+        self._unflushed = 0  # Samples written since the last flush
+        self._last_flush = time.monotonic()
+        self._closed = True
+
+        # Statistics of the writes to the file
+        self.writes = 0
+        self.flushes = 0
+        self.bytes_written = 0
+
+    @property
+    def num_samples(self) -> int:
+        """
+        Number of appended samples, including the ones that are not written to the file yet.
+        """
+        return self._chunk_start + self._chunk_count
+
+    def init(self, initial_sample: (dict, np.dtype)):
+        """
+        Sets the dtype of the dataset, either inferred from an initial sample or given directly as a compound dtype
+        with dot-separated field names.
+        """
+        if isinstance(initial_sample, np.dtype):
+            self.dtype = initial_sample
+            return
         # Create a cache for optimized flattening.
         _, self._dict_flatten_cache = cache_dict_paths_for_flatten(initial_sample, sep='.')
         # Flatten the initial sample.
@@ -59,17 +135,29 @@ class H5PyDictLogger:
         self.file = h5py.File(self.filename, mode, locking=False)
         if self.dataset_name in self.file:
             self.dataset = self.file[self.dataset_name]
-            self.current_size = self.dataset.shape[0]
+            self.current_size = int(self.dataset.attrs.get('num_samples', self.dataset.shape[0]))
+            self.dtype = self.dataset.dtype
+            if self.dataset.chunks is None:
+                # Made contiguous by close(). Appending needs a resizable, chunked dataset again
+                self._rechunkDataset()
         else:
-            self.dataset = self.file.create_dataset(
-                self.dataset_name,
-                shape=(0,),
-                maxshape=(None,),
-                dtype=self.dtype,
-                chunks=(self.chunk_size,)
-            )
+            self.dataset = self._createDataset()
+            self.dataset.attrs['num_samples'] = 0
             self.current_size = 0
 
+        self._chunk = np.zeros(self.chunk_size, dtype=self.dtype)
+        self._chunk_count = 0
+        self._chunk_start = self.current_size
+        self._last_flush = time.monotonic()
+        self._closed = False
+
+        if self.asynchronous:
+            self._writer_thread = threading.Thread(target=self._writerThread, daemon=True, name='h5_writer')
+            self._writer_thread.start()
+
+        # Write the pending samples if the program exits without closing the logger
+        atexit.register(_close_logger, weakref.ref(self))
+
     def appendSample(self, sample):
         """
         Appends a single sample to the dataset.
@@ -86,44 +174,59 @@ class H5PyDictLogger:
             if set(sample.keys()) != set(self.dtype.names):
                 sample = optimized_flatten_dict(sample, self._dict_flatten_cache)
             sample = self._dict_to_record(sample)
-        with self.lock:
-            new_size = self.current_size + 1
-            self.dataset.resize((new_size,))
-            self.dataset[self.current_size] = sample
-            self.current_size = new_size
-            self.file.flush()  # Ensure data is written to disk.
+        self._appendRecords(np.array([sample], dtype=self.dtype))
 
-    def appendSamples(self, samples: list):
+    def appendSamples(self, samples: (list, np.ndarray)):
         """
         Appends a list of samples to the dataset in a batch operation.
 
         Each sample is first converted to a flattened dict (if needed) and then to a record.
-        The dataset is resized once to accommodate all new samples, and they are written
-        in a single operation, followed by one flush.
+        A structured array is used as it is, or converted field by field if its dtype differs.
+        The records are copied into the current chunk, which is written once it is full.
         """
         if self.dtype is None:
             return
 
-        records = []
-        for sample in samples:
-            if isinstance(sample, dict):
-                # Flatten the dict if needed
-                if set(sample.keys()) != set(self.dtype.names):
-                    sample = optimized_flatten_dict(sample, self._dict_flatten_cache)
-                record = self._dict_to_record(sample)
-                records.append(record)
+        if isinstance(samples, np.ndarray):
+            if samples.dtype == self.dtype:
+                records_array = samples
             else:
-                raise ValueError("Each sample must be a dictionary.")
+                records_array = np.zeros(len(samples), dtype=self.dtype)
+                for field in self.dtype.names:
+                    records_array[field] = samples[field]
+        else:
+            records = []
+            for sample in samples:
+                if isinstance(sample, dict):
+                    # Flatten the dict if needed
+                    if set(sample.keys()) != set(self.dtype.names):
+                        sample = optimized_flatten_dict(sample, self._dict_flatten_cache)
+                    record = self._dict_to_record(sample)
+                    records.append(record)
+                else:
+                    raise ValueError("Each sample must be a dictionary.")
 
-        # Convert the list of records to a NumPy structured array
-        records_array = np.array(records, dtype=self.dtype)
-        with self.lock:
-            new_size = self.current_size + len(records_array)
-            if self.dataset is not None:
-                self.dataset.resize((new_size,))
-                self.dataset[self.current_size:new_size] = records_array
-                self.current_size = new_size
-                self.file.flush()  # Ensure data is written to disk.
+            # Convert the list of records to a NumPy structured array
+            records_array = np.array(records, dtype=self.dtype)
+
+        self._appendRecords(records_array)
+
+    def flush(self):
+        """
+        Writes all pending samples, including an incomplete chunk, and flushes the file. Blocks until done.
+        """
+        done = threading.Event()
+        with self._chunk_lock:
+            if self._closed:
+                return
+            if self.asynchronous:
+                # Queued under the lock, so that it is always in front of the marker of close()
+                self._write_queue.put(('flush', done))
+        if not self.asynchronous:
+            self._writePartialChunk()
+            self._flushFile()
+            return
+        done.wait()
 
     def getSample(self, index, signals=None):
         """
@@ -136,6 +239,7 @@ class H5PyDictLogger:
           - If the signal is a prefix (e.g., 'subdict1.subdict2'), all flattened keys starting
             with that prefix are collected and unflattened into a nested dict.
         """
+        self.flush()
         with self.lock:
             if signals is None:
                 rec = self.dataset[index]
@@ -196,8 +300,9 @@ class H5PyDictLogger:
             return self.getSample(index, signals)
 
         # Case 2: Slice access – process indices in batches.
+        self.flush()
         start = index.start if index.start is not None else 0
-        stop = index.stop if index.stop is not None else len(self.dataset)
+        stop = min(index.stop, self.current_size) if index.stop is not None else self.current_size
         step = index.step if index.step is not None else 1
         indices = list(range(start, stop, step))
         total_samples = len(indices)
@@ -241,15 +346,192 @@ class H5PyDictLogger:
                             result[s].append(unflatten_dict_baseline(subdict))
             return result
 
+    def getColumns(self, signals=None, index_start: int = None, index_end: int = None, time_range: tuple = None,
+                   time_field: str = 'general.time') -> (np.ndarray, dict):
+        """
+        Reads the selected signals of a range of samples with a single hyperslab read per signal set.
+
+        :param signals: Field names or prefixes. A prefix selects all fields below it. If None, all fields are read.
+        :param index_start: First sample index.
+        :param index_end: End sample index (exclusive).
+        :param time_range: (start, end) of time_field. Overrides the index range. time_field has to be increasing.
+        :return: A structured array if signals is None, otherwise a dict with a column array for every signal that
+            is a field and a structured array for every prefix.
+        """
+        self.flush()
+        with self.lock:
+            return _read_signals(self.dataset, self.current_size, signals, index_start, index_end, time_range,
+                                 time_field)
+
     def close(self):
         """
-        Closes the HDF5 file.
+        Writes all pending samples, shrinks the dataset to the number of samples and closes the HDF5 file.
         """
+        with self._chunk_lock:
+            if self._closed:
+                return
+            # Appends are rejected from here on, all chunks handed to the writer are queued before the marker
+            self._closed = True
+            if self.asynchronous and self._writer_thread is not None:
+                self._write_queue.put(('close', None))
+        if self.asynchronous and self._writer_thread is not None:
+            self._writer_thread.join()
+            self._writer_thread = None
+            # Nothing is queued after the marker, but a waiting flush() must never be left behind
+            while not self._write_queue.empty():
+                command, data = self._write_queue.get_nowait()
+                if command == 'flush':
+                    data.set()
+        else:
+            self._writePartialChunk()
+
         with self.lock:
             if self.file:
+                self.dataset.resize((self.current_size,))
+                self.dataset.attrs['num_samples'] = self.current_size
                 self.file.close()
                 self.file = None
                 self.dataset = None
+                if self.contiguous_on_close and self.compression is None and not self.dtype.hasobject:
+                    make_contiguous(self.filename, self.dataset_name, self.chunk_size)
+
+    # --- Chunked writing --- #
+
+    def _createDataset(self, name: str = None):
+        return self.file.create_dataset(
+            name or self.dataset_name,
+            shape=(0,),
+            maxshape=(None,),
+            dtype=self.dtype,
+            chunks=(self.chunk_size,),
+            compression=self.compression,
+            compression_opts=self.compression_opts,
+        )
+
+    def _rechunkDataset(self):
+        """
+        Replaces the contiguous dataset of a finished log by a chunked copy. The space of the old dataset is only
+        reclaimed if the file is rewritten with make_contiguous() again.
+        """
+        contiguous = self.dataset
+        self.dataset = self._createDataset(f"{self.dataset_name}_chunked")
+        self.dataset.resize((self.current_size,))
+        for start in range(0, self.current_size, self.chunk_size):
+            end = min(start + self.chunk_size, self.current_size)
+            self.dataset[start:end] = contiguous[start:end]
+        self.dataset.attrs.update(contiguous.attrs)
+        del self.file[self.dataset_name]
+        self.file.move(f"{self.dataset_name}_chunked", self.dataset_name)
+        self.dataset = self.file[self.dataset_name]
+
+    def _appendRecords(self, records: np.ndarray):
+        """
+        Copies records into the current chunk and hands every full chunk to the writer.
+        """
+        full_chunks = []
+        with self._chunk_lock:
+            if self._closed:
+                return
+            position = 0
+            while position < len(records):
+                n = min(len(records) - position, self.chunk_size - self._chunk_count)
+                self._chunk[self._chunk_count:self._chunk_count + n] = records[position:position + n]
+                self._chunk_count += n
+                position += n
+                if self._chunk_count == self.chunk_size:
+                    full_chunks.append((self._chunk, self._chunk_start))
+                    self._chunk = self._free_chunks.pop() if self._free_chunks else np.zeros(self.chunk_size,
+                                                                                             dtype=self.dtype)
+                    self._chunk_start += self.chunk_size
+                    self._chunk_count = 0
+
+            if self.asynchronous:
+                # Queued under the lock, so that close() cannot put its marker in front of them
+                for chunk, start in full_chunks:
+                    self._write_queue.put(('chunk', (chunk, start)))
+                full_chunks = []
+
+        for chunk, start in full_chunks:
+            self._writeChunk(chunk, start)
+
+        if not self.asynchronous and self._flushDue():
+            self._writePartialChunk()
+            self._flushFile()
+
+    def _writerThread(self):
+        while True:
+            timeout = None
+            if self.flush_interval is not None:
+                timeout = max(0.0, self._last_flush + self.flush_interval - time.monotonic())
+            try:
+                command, data = self._write_queue.get(timeout=timeout)
+            except queue.Empty:
+                command, data = 'timeout', None
+
+            try:
+                if command == 'chunk':
+                    self._writeChunk(*data)
+                    if self._flushDue():
+                        self._flushFile()
+                elif command == 'timeout':
+                    self._writePartialChunk()
+                    self._flushFile()
+                elif command == 'flush':
+                    self._writePartialChunk()
+                    self._flushFile()
+                    data.set()
+                elif command == 'close':
+                    self._writePartialChunk()
+                    self._flushFile()
+                    return
+            except Exception as e:
+                print(f"Error writing to {self.filename}: {e}")
+                if command == 'flush':
+                    data.set()
+
+    def _writeChunk(self, chunk: np.ndarray, start: int):
+        self._writeRecords(chunk, start)
+        with self._chunk_lock:
+            self._free_chunks.append(chunk)
+
+    def _writePartialChunk(self):
+        """
+        Writes the samples of the current, incomplete chunk. They are written again once the chunk is full.
+        """
+        with self._chunk_lock:
+            if self._chunk_count == 0:
+                return
+            records = self._chunk[:self._chunk_count].copy()
+            start = self._chunk_start
+        self._writeRecords(records, start)
+
+    def _writeRecords(self, records: np.ndarray, start: int):
+        end = start + len(records)
+        with self.lock:
+            if self.dataset is None:
+                return
+            if end > self.dataset.shape[0]:
+                # Grow the dataset in whole chunks
+                self.dataset.resize((-(-end // self.chunk_size) * self.chunk_size,))
+            self.dataset[start:end] = records
+            self.current_size = max(self.current_size, end)
+            self._unflushed += len(records)
+            self.writes += 1
+            self.bytes_written += records.nbytes
+
+    def _flushDue(self) -> bool:
+        if self._unflushed >= self.flush_size:
+            return True
+        return self.flush_interval is not None and time.monotonic() - self._last_flush >= self.flush_interval
+
+    def _flushFile(self):
+        with self.lock:
+            if self.file is not None and self._unflushed > 0:
+                self.dataset.attrs['num_samples'] = self.current_size
+                self.file.flush()
+                self.flushes += 1
+            self._unflushed = 0
+            self._last_flush = time.monotonic()
 
     # --- Helper functions for converting between flattened dicts and records --- #
 
@@ -332,6 +614,243 @@ class H5PyDictLogger:
             return unflatten_dict_baseline(flat_dict)
 
 
+class H5SampleReader:
+    """
+    Read-only, columnar access to a dataset written by H5PyDictLogger.
+
+    Only the requested fields and sample ranges are read from the file. Uncompressed datasets with a contiguous
+    layout can also be memory-mapped, in which case reads do not go through HDF5 at all.
+
+    Usage:
+        with H5SampleReader('log.h5') as reader:
+            theta = reader.read('lowlevel.estimation.state.theta', time_range=(10, 20))
+            df = reader.toDataFrame(['general.time', 'lowlevel.estimation.state'])
+    """
+
+    def __init__(self, filename, dataset_name="samples"):
+        self.filename = filename
+        self.file = h5py.File(filename, 'r', locking=False)
+        self.dataset = self.file[dataset_name]
+        self.dtype = self.dataset.dtype
+        self.fields = list(self.dtype.names)
+        self._memmap = None
+
+    def __len__(self):
+        return int(self.dataset.attrs.get('num_samples', self.dataset.shape[0]))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def resolve(self, signals) -> list:
+        """
+        Field names selected by a list of field names or prefixes.
+        """
+        fields = []
+        for signal in _as_list(signals):
+            fields.extend(_resolve_signal(self.fields, signal))
+        return fields
+
+    def read(self, signals=None, index_start: int = None, index_end: int = None, time_range: tuple = None,
+             time_field: str = 'general.time', lazy: bool = False):
+        """
+        Reads the selected signals of a range of samples.
+
+        :param signals: A field name or prefix, or a list of them. If None, all fields are read.
+        :param time_range: (start, end) of time_field. Overrides the index range. time_field has to be increasing.
+        :param lazy: If True, nothing is read yet. Signals are returned as H5Column objects, or as views of the
+            memory-mapped dataset if it can be mapped.
+        :return: Like H5PyDictLogger.getColumns. A single signal that is not given as a list is returned directly.
+        """
+        if lazy:
+            index_start, index_end = _index_range(self.dataset, len(self), index_start, index_end, time_range,
+                                                  time_field)
+            source = self.memmap()
+            if source is None:
+                columns = {signal: H5Column(self.dataset, _resolve_signal(self.fields, signal), index_start, index_end)
+                           for signal in _as_list(signals or self.fields)}
+            else:
+                columns = {signal: source[_signal_selection(self.fields, signal)][index_start:index_end]
+                           for signal in _as_list(signals or self.fields)}
+            return columns if isinstance(signals, list) or signals is None else columns[signals]
+
+        result = _read_signals(self.dataset, len(self), _as_list(signals) if signals is not None else None,
+                               index_start, index_end, time_range, time_field)
+        if signals is not None and not isinstance(signals, list):
+            return result[signals]
+        return result
+
+    def toDataFrame(self, signals=None, index_start: int = None, index_end: int = None, time_range: tuple = None,
+                    time_field: str = 'general.time'):
+        """
+        Reads the selected signals into a pandas DataFrame with one column per field.
+        """
+        if pd is None:
+            raise ImportError("pandas is required for toDataFrame")
+        fields = self.resolve(signals) if signals is not None else self.fields
+        index_start, index_end = _index_range(self.dataset, len(self), index_start, index_end, time_range, time_field)
+        data = self.dataset.fields(fields)[index_start:index_end] if len(fields) > 1 else None
+        columns = {}
+        for field in fields:
+            column = data[field] if data is not None else self.dataset.fields(field)[index_start:index_end]
+            if column.dtype.kind == 'S':
+                column = column.astype(str)
+            if column.ndim > 1:
+                for i in range(column.shape[1]):
+                    columns[f"{field}[{i}]"] = column[:, i]
+            else:
+                columns[field] = column
+        return pd.DataFrame(columns, index=pd.RangeIndex(index_start, index_end))
+
+    def memmap(self) -> (np.memmap, None):
+        """
+        Memory-maps the dataset. Only possible for uncompressed, contiguous datasets without variable length
+        fields, i.e. uncompressed logs that were closed with contiguous_on_close or converted with
+        make_contiguous(). Otherwise None is returned.
+        """
+        if self._memmap is None:
+            offset = self.dataset.id.get_offset()
+            if self.dataset.chunks is not None or offset is None or self.dtype.hasobject:
+                return None
+            self._memmap = np.memmap(self.filename, dtype=self.dtype, mode='r', offset=offset,
+                                     shape=(len(self),))
+        return self._memmap
+
+    def close(self):
+        self._memmap = None
+        if self.file:
+            self.file.close()
+            self.file = None
+            self.dataset = None
+
+
+class H5Column:
+    """
+    Lazy reference to fields of a range of samples. Data is read from the file when it is indexed or converted
+    to an array.
+    """
+
+    def __init__(self, dataset, fields: list, index_start: int, index_end: int):
+        self.dataset = dataset
+        self.fields = fields
+        self.index_start = index_start
+        self.index_end = index_end
+
+    def __len__(self):
+        return self.index_end - self.index_start
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            start, stop, step = item.indices(len(self))
+            data = self.dataset.fields(self._selection())[self.index_start + start:self.index_start + stop]
+            return data[::step] if step != 1 else data
+        if isinstance(item, (int, np.integer)):
+            if item < 0:
+                item += len(self)
+            return self.dataset.fields(self._selection())[self.index_start + item]
+        return np.asarray(self)[item]
+
+    def __array__(self, dtype=None, copy=None):
+        data = self[:]
+        return data.astype(dtype) if dtype is not None else data
+
+    def _selection(self):
+        return self.fields[0] if len(self.fields) == 1 else self.fields
+
+
+# --- Helper functions for the columnar reads --- #
+
+def _as_list(signals) -> list:
+    return signals if isinstance(signals, list) else [signals]
+
+
+def _resolve_signal(fields, signal: str) -> list:
+    if signal in fields:
+        return [signal]
+    matched = [field for field in fields if field.startswith(signal + '.')]
+    if not matched:
+        raise KeyError(f"Signal '{signal}' not found")
+    return matched
+
+
+def _signal_selection(fields, signal: str):
+    """
+    Index into a structured array for a signal: the field name itself, or the list of fields below a prefix.
+    """
+    return signal if signal in fields else _resolve_signal(fields, signal)
+
+
+def _search_sorted(dataset, field: str, value, lo: int, hi: int) -> int:
+    """
+    Binary search for the first sample in [lo, hi) whose increasing field is >= value, reading single elements.
+    """
+    column = dataset.fields(field)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if column[mid] < value:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def _index_range(dataset, num_samples: int, index_start, index_end, time_range, time_field) -> tuple:
+    index_start = 0 if index_start is None else max(0, index_start)
+    index_end = num_samples if index_end is None else min(index_end, num_samples)
+    if time_range is not None:
+        time_start, time_end = time_range
+        index_start = _search_sorted(dataset, time_field, time_start, index_start, index_end)
+        index_end = _search_sorted(dataset, time_field, time_end, index_start, index_end)
+    return index_start, max(index_start, index_end)
+
+
+def _read_signals(dataset, num_samples: int, signals, index_start, index_end, time_range, time_field):
+    index_start, index_end = _index_range(dataset, num_samples, index_start, index_end, time_range, time_field)
+    fields = list(dataset.dtype.names)
+    if signals is None:
+        return dataset[index_start:index_end]
+
+    selected = []
+    for signal in signals:
+        selected.extend(field for field in _resolve_signal(fields, signal) if field not in selected)
+    # One hyperslab read of only the selected members of the compound type
+    data = dataset.fields(selected)[index_start:index_end]
+    return {signal: data[_signal_selection(fields, signal)] for signal in signals}
+
+
+def make_contiguous(filename: str, dataset_name: str = "samples", block_size: int = 10000):
+    """
+    Rewrites a closed log with the given dataset in contiguous layout, so that H5SampleReader can memory-map it,
+    e.g. offline before an analysis. Written to a temporary file first, so that the file is never incomplete and
+    the space of the chunked dataset is not kept. The dataset must not be compressed or have fields of variable
+    length.
+    """
+    temporary = f"{filename}.contiguous"
+    with h5py.File(filename, 'r', locking=False) as source:
+        chunked = source[dataset_name]
+        if chunked.compression is not None or chunked.dtype.hasobject:
+            raise ValueError(f"Dataset {dataset_name} of {filename} is compressed or has fields of variable length")
+    with h5py.File(filename, 'r', locking=False) as source, h5py.File(temporary, 'w', locking=False) as target:
+        target.attrs.update(source.attrs)
+        for name in source:
+            if name != dataset_name:
+                source.copy(source[name], target, name)
+        chunked = source[dataset_name]
+        dataset = target.create_dataset(dataset_name, shape=chunked.shape, dtype=chunked.dtype)
+        for start in range(0, chunked.shape[0], block_size):
+            dataset[start:start + block_size] = chunked[start:start + block_size]
+        dataset.attrs.update(chunked.attrs)
+    os.replace(temporary, filename)
+
+
+def _close_logger(logger_ref):
+    logger = logger_ref()
+    if logger is not None:
+        logger.close()
+
+
 # -----------------------------------------------------------------------------
 # Main example demonstrating usage of nested signal extraction
 # -----------------------------------------------------------------------------
@@ -0,0 +1,309 @@
+import ctypes
+import ctypes.util
+import gc
+import os
+import threading
+import time
+
+import numpy as np
+
+from core.utils.logging_utils import Logger
+from core.utils.ring_buffer import StructuredRingBuffer
+
+logger = Logger('realtime')
+logger.setLevel('INFO')
+
+# Percentiles reported by LoopTiming.statistics
+TIMING_PERCENTILES = (50, 90, 99, 99.9)
+
+# Upper bin edges of the latency histograms in seconds. The last bin collects everything above.
+TIMING_HISTOGRAM_EDGES = (0.0001, 0.0002, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2)
+
+_MCL_CURRENT = 1
+_MCL_FUTURE = 2
+
+
+# ======================================================================================================================
+def set_realtime_priority(priority: int, thread_id: int = 0) -> bool:
+    """
+    Runs the thread with the given native id (0: calling thread) with SCHED_FIFO and the given priority (1-99).
+    Needs root or CAP_SYS_NICE. Returns False if the priority could not be set.
+    """
+    try:
+        os.sched_setscheduler(thread_id, os.SCHED_FIFO, os.sched_param(priority))
+    except (AttributeError, PermissionError, OSError) as e:
+        logger.warning(f"Cannot set SCHED_FIFO priority {priority}: {e}")
+        return False
+    return True
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def set_cpu_affinity(cpus: list, thread_id: int = 0) -> bool:
+    """
+    Restricts the thread with the given native id (0: calling thread) to the given CPUs.
+    """
+    try:
+        os.sched_setaffinity(thread_id, set(cpus))
+    except (AttributeError, OSError, ValueError) as e:
+        logger.warning(f"Cannot set CPU affinity {cpus}: {e}")
+        return False
+    return True
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def lock_memory() -> bool:
+    """
+    Locks all current and future pages of the process in RAM (mlockall), so the control loop does not run into
+    page faults. Limited by RLIMIT_MEMLOCK.
+    """
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        if libc.mlockall(_MCL_CURRENT | _MCL_FUTURE) != 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+    except (AttributeError, OSError, TypeError) as e:
+        logger.warning(f"Cannot lock memory: {e}")
+        return False
+    return True
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def configure_thread(priority: int = None, cpus: list = None) -> dict:
+    """
+    Applies the real-time settings to the calling thread. Settings that are None are left unchanged.
+
+    Returns:
+        dict: The native thread id and which of the settings could be applied.
+    """
+    result = {
+        'thread': threading.current_thread().name,
+        'native_id': threading.get_native_id(),
+        'priority': None,
+        'cpus': None,
+    }
+    if priority is not None:
+        result['priority'] = priority if set_realtime_priority(priority) else False
+    if cpus is not None:
+        result['cpus'] = list(cpus) if set_cpu_affinity(cpus) else False
+    return result
+
+
+# ======================================================================================================================
+class GC_Scheduler:
+    """
+    Runs the garbage collection at fixed points instead of whenever the allocation counters trigger it.
+
+    The automatic collection is disabled and collect() has to be called in the idle time after every update. Young
+    objects are collected every time, the middle generation every gen1_interval calls. A full collection is due
+    every full_interval calls, but is only run once the remaining time of the cycle is longer than the last full
+    collection took. It is postponed at most full_interval calls.
+
+    If collect() is not called for fallback_timeout seconds, e.g. because the low-level samples stopped, a
+    background thread runs it instead, so that the garbage of the other threads is still collected.
+    """
+
+    def __init__(self, gen1_interval: int = 10, full_interval: int = 600, fallback_timeout: float = 1.0):
+        self.gen1_interval = gen1_interval
+        self.full_interval = full_interval
+        self.fallback_timeout = fallback_timeout
+
+        self.running = False
+        self._calls = 0
+        self._full_due = 0  # Calls since a full collection became due
+        self._last_collect = time.monotonic()
+        self._lock = threading.Lock()
+        self._exit = threading.Event()
+        self._fallback_thread = None
+
+        self.statistics = {
+            'collections': [0, 0, 0],
+            'max_time': [0.0, 0.0, 0.0],
+            'last_time': [0.0, 0.0, 0.0],
+            'postponed': 0,
+            'fallback': 0,  # Collections run by the fallback thread
+        }
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def start(self):
+        """
+        Disables the automatic collection. Everything allocated so far is moved into the permanent generation, so
+        the full collections only have to walk through the objects created at runtime.
+        """
+        gc.collect()
+        gc.freeze()
+        gc.disable()
+        self._last_collect = time.monotonic()
+        self.running = True
+
+        self._exit.clear()
+        self._fallback_thread = threading.Thread(target=self._fallbackThread, daemon=True, name='gc_fallback')
+        self._fallback_thread.start()
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def stop(self):
+        self._exit.set()
+        if self._fallback_thread is not None:
+            self._fallback_thread.join()
+            self._fallback_thread = None
+        gc.unfreeze()
+        gc.enable()
+        self.running = False
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def collect(self, budget: float = None) -> float:
+        """
+        Runs the collection that is due.
+
+        Args:
+            budget: Time left in the current cycle in seconds. None if unknown.
+
+        Returns:
+            float: Duration of the collection in seconds.
+        """
+        if not self.running:
+            return 0.0
+
+        with self._lock:
+            return self._collect(budget)
+
+    # === PRIVATE METHODS ==============================================================================================
+    def _collect(self, budget: (float, None)) -> float:
+        self._calls += 1
+        generation = 1 if self._calls % self.gen1_interval == 0 else 0
+
+        if self._calls % self.full_interval == 0 or self._full_due:
+            self._full_due += 1
+            if (budget is None or budget > self.statistics['last_time'][2]
+                    or self._full_due > self.full_interval):
+                generation = 2
+                self._full_due = 0
+            else:
+                self.statistics['postponed'] += 1
+
+        start = time.perf_counter()
+        gc.collect(generation)
+        duration = time.perf_counter() - start
+
+        self.statistics['collections'][generation] += 1
+        self.statistics['last_time'][generation] = duration
+        self.statistics['max_time'][generation] = max(self.statistics['max_time'][generation], duration)
+        self._last_collect = time.monotonic()
+        return duration
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _fallbackThread(self):
+        while not self._exit.wait(max(self._last_collect + self.fallback_timeout - time.monotonic(), 0.01)):
+            with self._lock:
+                if time.monotonic() - self._last_collect < self.fallback_timeout:
+                    continue
+                self.statistics['fallback'] += 1
+                self._collect(budget=None)
+
+
+# ======================================================================================================================
+class LoopTiming:
+    """
+    Per-stage timing of a periodic loop. Every cycle is stored as a record with the period since the previous cycle,
+    the duration of every stage and the total duration in a ring buffer of the last `size` cycles.
+
+    Usage within one cycle:
+        timing.start()
+        ...
+        timing.mark('control')  # Duration since start() or the previous mark
+        ...
+        timing.finish(tick)
+    """
+    stages: list[str]
+    period: float
+    buffer: StructuredRingBuffer
+
+    def __init__(self, stages: list[str], period: float, size: int = 6000):
+        self.stages = list(stages)
+        self.period = period
+        self.dtype = np.dtype([('tick', np.int64), ('period', np.float64), ('total', np.float64)]
+                              + [(stage, np.float64) for stage in self.stages])
+        self.buffer = StructuredRingBuffer(self.dtype, size)
+
+        self._record = np.zeros(1, dtype=self.dtype)
+        self._start = 0.0
+        self._last_mark = 0.0
+        self._last_start = None
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def start(self):
+        now = time.perf_counter()
+        self._record[0] = 0
+        self._record['period'] = now - self._last_start if self._last_start is not None else self.period
+        self._start = self._last_mark = self._last_start = now
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def mark(self, stage: str):
+        now = time.perf_counter()
+        self._record[stage] += now - self._last_mark
+        self._last_mark = now
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def finish(self, tick: int = 0) -> float:
+        """
+        Stores the cycle and returns its total duration.
+        """
+        total = time.perf_counter() - self._start
+        self._record['total'] = total
+        self._record['tick'] = tick
+        self.buffer.append(self._record)
+        return total
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def set(self, stage: str, duration: float):
+        """
+        Sets the duration of a stage of the last stored cycle, for work that runs after finish(), e.g. the garbage
+        collection in the idle time.
+        """
+        if self.buffer.count:
+            self.buffer.data[(self.buffer.count - 1) % self.buffer.size][stage] = duration
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def reset(self):
+        self.buffer.clear()
+        self._last_start = None
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def statistics(self, last: int = None) -> dict:
+        """
+        Statistics of the last `last` cycles (all stored cycles if None). Times are in seconds.
+
+        Returns:
+            dict: For the period, its deviation from the nominal period ('jitter'), the total duration and every
+                stage: mean, std, min, max, the tick of the maximum, the percentiles of TIMING_PERCENTILES and a
+                histogram with the bin edges of TIMING_HISTOGRAM_EDGES. 'overruns' counts the cycles that took
+                longer than the nominal period, 'missed_cycles' the periods that were skipped completely.
+        """
+        records = self.buffer.get() if last is None else self.buffer.last(last)
+        result = {
+            'cycles': len(records),
+            'nominal_period': self.period,
+            'percentiles': list(TIMING_PERCENTILES),
+            'histogram_edges': list(TIMING_HISTOGRAM_EDGES),
+        }
+        if len(records) == 0:
+            return result
+
+        ticks = records['tick']
+        result['overruns'] = int(np.count_nonzero(records['total'] > self.period))
+        result['missed_cycles'] = int(np.sum(np.maximum(np.round(records['period'] / self.period) - 1, 0)))
+
+        columns = {'period': records['period'], 'jitter': np.abs(records['period'] - self.period),
+                   'total': records['total'], **{stage: records[stage] for stage in self.stages}}
+
+        edges = np.asarray(TIMING_HISTOGRAM_EDGES)
+        for name, values in columns.items():
+            index_max = int(np.argmax(values))
+            result[name] = {
+                'mean': float(np.mean(values)),
+                'std': float(np.std(values)),
+                'min': float(np.min(values)),
+                'max': float(values[index_max]),
+                'max_tick': int(ticks[index_max]),
+                'percentiles': np.percentile(values, TIMING_PERCENTILES).tolist(),
+                'histogram': np.bincount(np.searchsorted(edges, values), minlength=len(edges) + 1).tolist(),
+            }
+        return result
@@ -0,0 +1,115 @@
+import numpy as np
+
+
+class StructuredRingBuffer:
+    """
+    Preallocated ring buffer of NumPy records.
+
+    Records are addressed by their global index, i.e. the number of records written before them. Only the
+    last `size` records are kept. Reads return views into the buffer as long as the requested range does not
+    wrap around the end of the buffer, otherwise a copy.
+    """
+    data: np.ndarray
+    size: int
+    count: int  # Total number of records written
+
+    def __init__(self, dtype: np.dtype, size: int):
+        self.data = np.zeros(size, dtype=dtype)
+        self.size = size
+        self.count = 0
+        self._index = 0  # Position of the next record in data
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @property
+    def dtype(self) -> np.dtype:
+        return self.data.dtype
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @property
+    def first_index(self) -> int:
+        """
+        Global index of the oldest record still in the buffer.
+        """
+        return max(0, self.count - self.size)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def append(self, records: np.ndarray):
+        n = len(records)
+        if n > self.size:
+            records = records[-self.size:]
+            self._index = (self._index + n - self.size) % self.size
+            self.count += n - self.size
+            n = self.size
+
+        end = self._index + n
+        if end <= self.size:
+            self.data[self._index:end] = records
+        else:
+            split = self.size - self._index
+            self.data[self._index:] = records[:split]
+            self.data[:n - split] = records[split:]
+
+        self._index = end % self.size
+        self.count += n
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def latest(self):
+        """
+        The most recent record, or None if the buffer is empty.
+        """
+        if self.count == 0:
+            return None
+        return self.data[(self._index - 1) % self.size]
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def last(self, n: int) -> np.ndarray:
+        return self.get(self.count - n, self.count)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def get(self, index_start: int = None, index_end: int = None) -> np.ndarray:
+        """
+        Records with global indices in [index_start, index_end), clipped to the records still in the buffer.
+        """
+        index_start = self.first_index if index_start is None else max(index_start, self.first_index)
+        index_end = self.count if index_end is None else min(index_end, self.count)
+        if index_end <= index_start:
+            return self.data[0:0]
+
+        start = index_start % self.size
+        end = start + index_end - index_start
+        if end <= self.size:
+            return self.data[start:end]
+        return np.concatenate((self.data[start:], self.data[:end - self.size]))
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def window(self, field: str, value_start, value_end) -> np.ndarray:
+        """
+        Records with value_start <= record[field] < value_end. The field has to be increasing with the
+        global index, e.g. a time or tick.
+        """
+        index_start = self.search(field, value_start)
+        index_end = self.search(field, value_end)
+        return self.get(index_start, index_end)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def clear(self):
+        self.count = 0
+        self._index = 0
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def search(self, field: str, value) -> int:
+        """
+        Global index of the first record whose field is >= value.
+        """
+        first = self.first_index
+        start = first % self.size
+        n = self.count - first
+        column = self.data[field]
+        if start + n <= self.size:
+            return first + int(np.searchsorted(column[start:start + n], value))
+
+        # The buffer wraps around: search the older and the newer part separately
+        older = column[start:]
+        if len(older) and older[-1] >= value:
+            return first + int(np.searchsorted(older, value))
+        return first + len(older) + int(np.searchsorted(column[:n - len(older)], value))
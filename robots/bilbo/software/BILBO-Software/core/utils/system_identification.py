@@ -0,0 +1,408 @@
+import dataclasses
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import lfilter
+
+# Maximum number of regressor entries that are copied at once when the normal equations are accumulated
+REGRESSION_CHUNK_SIZE = 2 ** 21
+
+
+# === REGRESSORS =======================================================================================================
+def lagged_matrix(x: np.ndarray, columns: int) -> np.ndarray:
+    """
+    Regressor of a causal FIR filter: row t is [x[t], x[t-1], ..., x[t-columns+1]], with zeros before the start of
+    the signal. For an array of trials with shape (..., T), the result has the shape (..., T, columns).
+
+    The result is a read-only view of a padded copy of x, the rows are not copied.
+    """
+    x = np.asarray(x, dtype=float)
+    padded = np.concatenate([np.zeros(x.shape[:-1] + (columns - 1,)), x], axis=-1)
+    return sliding_window_view(padded, columns, axis=-1)[..., ::-1]
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def hankel_matrix(x: np.ndarray, rows: int, columns: int = None) -> np.ndarray:
+    """
+    Hankel matrix H[i, j] = x[i + j] with the given number of rows. By default, all samples of x are used. Returns a
+    read-only view of x.
+    """
+    x = np.asarray(x, dtype=float)
+    if columns is None:
+        columns = len(x) - rows + 1
+    if rows < 1 or columns < 1 or rows + columns - 1 > len(x):
+        raise ValueError(f"Cannot build a {rows}x{columns} Hankel matrix from {len(x)} samples")
+    return sliding_window_view(x[:rows + columns - 1], columns)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def lifted_matrix(impulse_response: np.ndarray, size: int) -> np.ndarray:
+    """
+    Lifted system matrix (lower triangular Toeplitz matrix) P[i, j] = h[i - j] for i >= j, so that y = P u for
+    trajectories of the given length. Impulse responses shorter than the size are padded with zeros.
+    """
+    h = np.zeros(size)
+    impulse_response = np.asarray(impulse_response, dtype=float)[:size]
+    h[:len(impulse_response)] = impulse_response
+    return np.array(lagged_matrix(h, size))
+
+
+# ======================================================================================================================
+def _trial_groups(u_list, y_list) -> list:
+    """
+    Groups the trials by their length, so that every group can be processed as one 2D array (trials, samples).
+    """
+    groups = {}
+    for u, y in zip(u_list, y_list):
+        u = np.asarray(u, dtype=float).ravel()
+        y = np.asarray(y, dtype=float).ravel()
+        if len(u) != len(y):
+            raise ValueError(f"Input and output of a trial have different lengths ({len(u)} and {len(y)})")
+        groups.setdefault(len(u), ([], []))
+        groups[len(u)][0].append(u)
+        groups[len(u)][1].append(y)
+    return [(np.stack(u), np.stack(y)) for u, y in groups.values()]
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _solve_normal_equations(gram: np.ndarray, cross: np.ndarray, regularization: float) -> np.ndarray:
+    gram = gram + regularization * np.eye(gram.shape[-1])
+    return np.linalg.lstsq(gram, cross, rcond=None)[0]
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _accumulate(regressor, target, gram: np.ndarray, cross: np.ndarray, num_trials: int):
+    """
+    Adds regressor^T regressor and regressor^T target of all trials to the normal equations. The regressor views
+    are copied in chunks of trials, so that the memory stays bounded for hundreds of trials.
+    """
+    samples, columns = regressor.shape[-2:]
+    chunk = max(1, REGRESSION_CHUNK_SIZE // (samples * columns))
+    for start in range(0, num_trials, chunk):
+        phi = regressor[start:start + chunk].reshape(-1, columns)
+        gram += phi.T @ phi
+        cross += phi.T @ target[start:start + chunk].reshape(-1)
+
+
+# === FIR AND ARX ======================================================================================================
+def estimate_fir(u_list, y_list, length: int, regularization: float = 0.0) -> np.ndarray:
+    """
+    Least squares estimate of the impulse response h of length `length` from all trials, y[t] = sum_k h[k] u[t-k].
+    The trials can have different lengths and start at rest.
+
+    Args:
+        regularization: Ridge term added to the normal equations, for short or poorly exciting trials.
+
+    Returns:
+        np.ndarray: The impulse response (Markov parameters), h[0] is the direct feedthrough.
+    """
+    gram = np.zeros((length, length))
+    cross = np.zeros(length)
+    for u, y in _trial_groups(u_list, y_list):
+        _accumulate(lagged_matrix(u, length), y, gram, cross, len(u))
+    return _solve_normal_equations(gram, cross, regularization)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def estimate_fir_trials(u_list, y_list, length: int, regularization: float = 0.0) -> np.ndarray:
+    """
+    Impulse response of every trial on its own, with one batched solve for all trials. The spread over the trials
+    shows the uncertainty of the estimate. All trials need the same length.
+
+    Returns:
+        np.ndarray: Impulse responses with shape (trials, length).
+    """
+    groups = _trial_groups(u_list, y_list)
+    if len(groups) != 1:
+        raise ValueError("All trials need the same length")
+    u, y = groups[0]
+
+    phi = lagged_matrix(u, length)
+    gram = np.einsum('kti,ktj->kij', phi, phi, optimize=True) + regularization * np.eye(length)
+    cross = np.einsum('kti,kt->ki', phi, y, optimize=True)
+    return np.linalg.solve(gram, cross[..., None])[..., 0]
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def estimate_arx(u_list, y_list, na: int, nb: int, delay: int = 1,
+                 regularization: float = 0.0) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Least squares estimate of the ARX model
+        y[t] + a_1 y[t-1] + ... + a_na y[t-na] = b_0 u[t-delay] + ... + b_(nb-1) u[t-delay-nb+1]
+
+    Returns:
+        tuple: (num, den) of the transfer function in powers of z^-1, num = [0]*delay + [b_0, ...] and
+            den = [1, a_1, ..., a_na], as used by scipy.signal.lfilter.
+    """
+    columns = na + nb
+    gram = np.zeros((columns, columns))
+    cross = np.zeros(columns)
+    for u, y in _trial_groups(u_list, y_list):
+        regressor = np.concatenate([-lagged_matrix(y, na + 1)[..., 1:],
+                                    lagged_matrix(u, delay + nb)[..., delay:]], axis=-1)
+        _accumulate(regressor, y, gram, cross, len(u))
+    theta = _solve_normal_equations(gram, cross, regularization)
+    den = np.concatenate([[1.0], theta[:na]])
+    num = np.concatenate([np.zeros(delay), theta[na:]])
+    return num, den
+
+
+# === STATE SPACE ======================================================================================================
+@dataclasses.dataclass
+class StateSpaceModel:
+    """
+    Discrete-time SISO model x[t+1] = A x[t] + B u[t], y[t] = C x[t] + D u[t].
+    """
+    A: np.ndarray
+    B: np.ndarray
+    C: np.ndarray
+    D: np.ndarray
+    dt: float = 1.0
+
+    @property
+    def order(self) -> int:
+        return self.A.shape[0]
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def impulse_response(self, length: int) -> np.ndarray:
+        h = np.zeros(length)
+        h[0] = self.D[0, 0]
+        x = self.B[:, 0]
+        for k in range(1, length):
+            h[k] = self.C[0] @ x
+            x = self.A @ x
+        return h
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def lifted(self, size: int) -> np.ndarray:
+        """
+        Lifted system matrix for trajectories of the given length, e.g. for the learning matrix of an ILC.
+        """
+        return lifted_matrix(self.impulse_response(size), size)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def frequency_response(self, frequencies: np.ndarray) -> np.ndarray:
+        """
+        Complex response at the given frequencies in Hz.
+        """
+        z = np.exp(2j * np.pi * np.asarray(frequencies, dtype=float) * self.dt)
+        resolvent = z[:, None, None] * np.eye(self.order) - self.A
+        x = np.linalg.solve(resolvent, np.broadcast_to(self.B, (len(z),) + self.B.shape))
+        return (self.C @ x)[:, 0, 0] + self.D[0, 0]
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def simulate(self, u: np.ndarray) -> np.ndarray:
+        """
+        Output for the input u from rest. u can be an array of trials with shape (..., T).
+        """
+        u = np.asarray(u, dtype=float)
+        return lfilter(self.impulse_response(u.shape[-1]), [1.0], u, axis=-1)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def toDict(self) -> dict:
+        return {'A': self.A.tolist(), 'B': self.B.tolist(), 'C': self.C.tolist(), 'D': self.D.tolist(),
+                'dt': self.dt}
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def era(impulse_response: np.ndarray, order: int = None, rows: int = None, threshold: float = 1e-2,
+        dt: float = 1.0) -> tuple[StateSpaceModel, np.ndarray]:
+    """
+    Eigensystem Realization Algorithm: balanced state-space realization of the impulse response from the singular
+    value decomposition of its Hankel matrix.
+
+    Args:
+        order: Order of the model. If None, all singular values above threshold times the largest one are kept.
+        rows: Rows of the Hankel matrix. By default, the Markov parameters are split evenly between rows and
+            columns.
+
+    Returns:
+        tuple: The model and the singular values of the Hankel matrix.
+    """
+    h = np.asarray(impulse_response, dtype=float)
+    markov = h[1:]
+    if rows is None:
+        rows = len(markov) // 2
+    columns = len(markov) - rows
+    if rows < 1 or columns < 1:
+        raise ValueError(f"Impulse response with {len(h)} samples is too short for the realization")
+
+    H0 = hankel_matrix(markov, rows, columns)
+    H1 = hankel_matrix(markov[1:], rows, columns)
+
+    U, s, Vt = np.linalg.svd(H0, full_matrices=False)
+    if order is None:
+        order = max(1, int(np.count_nonzero(s > threshold * s[0]))) if s[0] > 0 else 1
+    order = min(order, len(s))
+
+    s_sqrt = np.sqrt(s[:order])
+    observability = U[:, :order] * s_sqrt
+    controllability = s_sqrt[:, None] * Vt[:order]
+
+    A = (U[:, :order].T @ H1 @ Vt[:order].T) / np.outer(s_sqrt, s_sqrt)
+    B = controllability[:, :1]
+    C = observability[:1, :]
+    D = h[:1].reshape(1, 1)
+    return StateSpaceModel(A=A, B=B, C=C, D=D, dt=dt), s
+
+
+# === FREQUENCY DOMAIN =================================================================================================
+def multisine(period: int, dt: float, f_min: float, f_max: float, amplitude: float = 1.0, periods: int = 1,
+              phases: str = 'schroeder', seed: int = None) -> np.ndarray:
+    """
+    Periodic multisine with equal amplitudes at all FFT bins of one period between f_min and f_max.
+
+    Args:
+        period: Samples per period.
+        amplitude: RMS value of the signal.
+        periods: Number of periods. The first ones are usually dropped as transient in the estimation.
+        phases: 'schroeder' for a low crest factor or 'random' for random phases.
+
+    Returns:
+        np.ndarray: The signal with period * periods samples.
+    """
+    frequencies = np.fft.rfftfreq(period, dt)
+    bins = np.flatnonzero((frequencies >= f_min) & (frequencies <= f_max) & (frequencies > 0))
+    if len(bins) == 0:
+        raise ValueError(f"No frequency bin between {f_min} and {f_max} Hz for {period} samples of {dt} s")
+
+    if phases == 'schroeder':
+        k = np.arange(1, len(bins) + 1)
+        phi = -np.pi * k * (k - 1) / len(bins)
+    elif phases == 'random':
+        phi = np.random.default_rng(seed).uniform(-np.pi, np.pi, len(bins))
+    else:
+        raise ValueError(f"Unknown phases {phases}")
+
+    spectrum = np.zeros(len(frequencies), dtype=complex)
+    spectrum[bins] = np.exp(1j * phi)
+    signal = np.fft.irfft(spectrum, period)
+    signal *= amplitude / np.sqrt(np.mean(signal ** 2))
+    return np.tile(signal, periods)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+@dataclasses.dataclass
+class FrequencyResponse:
+    frequencies: np.ndarray  # Hz
+    response: np.ndarray  # Complex response
+    std: np.ndarray  # Standard deviation of the response over the trials and periods
+    coherence: np.ndarray
+    dt: float
+    period: int
+    bins: np.ndarray  # FFT bins of one period
+
+    @property
+    def magnitude(self) -> np.ndarray:
+        return np.abs(self.response)
+
+    @property
+    def phase(self) -> np.ndarray:
+        return np.unwrap(np.angle(self.response))
+
+
+def estimate_frequency_response(u_list, y_list, period: int, dt: float, transient_periods: int = 1,
+                                bins: np.ndarray = None) -> FrequencyResponse:
+    """
+    Frequency response from periodic (multisine) experiments. The steady-state periods of all trials are
+    transformed with one FFT and averaged with the H1 estimator sum(Y U*) / sum(|U|^2) at the excited bins.
+
+    Args:
+        period: Samples per period of the excitation.
+        transient_periods: Periods at the start of every trial that are dropped.
+        bins: FFT bins of one period to evaluate. By default, all bins with input power.
+    """
+    groups = _trial_groups(u_list, y_list)
+    U, Y = [], []
+    for u, y in groups:
+        num_periods = u.shape[1] // period - transient_periods
+        if num_periods < 1:
+            continue
+        start, end = transient_periods * period, (transient_periods + num_periods) * period
+        U.append(np.fft.rfft(u[:, start:end].reshape(-1, period), axis=-1))
+        Y.append(np.fft.rfft(y[:, start:end].reshape(-1, period), axis=-1))
+    if not U:
+        raise ValueError("No trial is longer than the transient periods")
+    U = np.concatenate(U)
+    Y = np.concatenate(Y)
+
+    if bins is None:
+        power = np.mean(np.abs(U) ** 2, axis=0)
+        bins = np.flatnonzero(power > 1e-6 * np.max(power))
+        bins = bins[bins > 0]
+    U, Y = U[:, bins], Y[:, bins]
+
+    S_uu = np.sum(np.abs(U) ** 2, axis=0)
+    S_yy = np.sum(np.abs(Y) ** 2, axis=0)
+    S_yu = np.sum(Y * np.conj(U), axis=0)
+
+    response = S_yu / S_uu
+    realizations = Y / U
+    std = np.std(realizations, axis=0) / np.sqrt(len(U)) if len(U) > 1 else np.zeros(len(bins))
+    coherence = np.abs(S_yu) ** 2 / (S_uu * S_yy)
+
+    return FrequencyResponse(frequencies=np.fft.rfftfreq(period, dt)[bins], response=response, std=std,
+                             coherence=coherence, dt=dt, period=period, bins=np.asarray(bins))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def fir_from_frequency_response(frequency_response: FrequencyResponse, length: int,
+                                regularization: float = 0.0) -> np.ndarray:
+    """
+    Impulse response of the given length that fits the measured frequency response in the least squares sense.
+    The length should be at most twice the number of excited bins.
+    """
+    omega = 2 * np.pi * frequency_response.bins / frequency_response.period
+    basis = np.exp(-1j * np.outer(omega, np.arange(length)))
+    weights = 1 / np.maximum(frequency_response.std, 1e-12) if np.any(frequency_response.std) else 1.0
+    basis = basis * np.reshape(weights, (-1, 1))
+    target = frequency_response.response * weights
+
+    # Real and imaginary parts as separate equations, the impulse response is real
+    regressor = np.concatenate([basis.real, basis.imag])
+    target = np.concatenate([target.real, target.imag])
+    return _solve_normal_equations(regressor.T @ regressor, regressor.T @ target, regularization)
+
+
+# === PIPELINE =========================================================================================================
+@dataclasses.dataclass
+class SystemIdentificationResult:
+    impulse_response: np.ndarray
+    model: StateSpaceModel
+    singular_values: np.ndarray
+    P: np.ndarray  # Lifted system matrix
+    fit: float  # Normalized fit of the model on the data in percent (100: perfect)
+
+
+def fit_percent(y_list, y_estimated_list) -> float:
+    """
+    Normalized fit 100 * (1 - ||y - y_est|| / ||y - mean(y)||) over all trials.
+    """
+    y = np.concatenate([np.ravel(y) for y in y_list])
+    y_estimated = np.concatenate([np.ravel(y) for y in y_estimated_list])
+    denominator = np.linalg.norm(y - np.mean(y))
+    if denominator == 0:
+        return 0.0
+    return float(100 * (1 - np.linalg.norm(y - y_estimated) / denominator))
+
+
+def identify(u_list, y_list, fir_length: int, lifted_size: int = None, order: int = None, dt: float = 1.0,
+             regularization: float = 0.0, threshold: float = 1e-2) -> SystemIdentificationResult:
+    """
+    Identification from time-domain trials: FIR least squares over all trials, a state-space model of the impulse
+    response with ERA and the lifted matrix of the model for trajectories of lifted_size samples (by default the
+    length of the first trial).
+    """
+    h = estimate_fir(u_list, y_list, fir_length, regularization)
+    model, singular_values = era(h, order=order, threshold=threshold, dt=dt)
+
+    if lifted_size is None:
+        lifted_size = len(u_list[0])
+
+    h_model = model.impulse_response(max(lifted_size, max(np.size(u) for u in u_list)))
+    y_estimated = [lfilter(h_model[:np.size(u)], [1.0], np.ravel(u)) for u in u_list]
+    return SystemIdentificationResult(impulse_response=h,
+                                      model=model,
+                                      singular_values=singular_values,
+                                      P=lifted_matrix(h_model, lifted_size),
+                                      fit=fit_percent(y_list, y_estimated))
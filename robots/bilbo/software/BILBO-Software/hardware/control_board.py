@@ -3,7 +3,7 @@ import time
 from core.utils.exit import register_exit_callback
 # === OWN PACKAGES =====================================================================================================
 from hardware.hardware.gpio import GPIO_Output
-from core.communication.i2c.i2c import I2C_Interface
+from core.communication.i2c.i2c import I2C_Interface, getI2CBus
 from core.communication.spi.spi import SPI_Interface
 from core.communication.wifi.wifi_interface import WIFI_Interface
 from core.communication.wifi.data_link import Command, CommandArgument
@@ -36,6 +36,7 @@ class RobotControl_Board:
     io_extension: RobotControl_IO_Extension
 
     shield = None
+    _rgb_led_extern_color: (list, None) = None
 
     # === INIT =========================================================================================================
     def __init__(self, device_class: str = 'board', device_type: str = 'RobotControl', device_revision: str = 'v3',
@@ -87,6 +88,15 @@ class RobotControl_Board:
                                                            description='Number of repeats')
                                        ])
 
+        self.wifi_interface.addCommand(identifier='getI2CStatistics',
+                                       callback=self.getI2CStatistics,
+                                       arguments=[],
+                                       description='Returns the utilisation and the traffic per device of the I2C bus')
+        self.wifi_interface.addCommand(identifier='resetI2CStatistics',
+                                       callback=getI2CBus().resetStatistics,
+                                       arguments=[],
+                                       description='Resets the statistics of the I2C bus')
+
         # This too
 
         self.status_led = GPIO_Output(pin_type=self.board_config['pins']['status_led']['type'],
@@ -149,13 +159,24 @@ class RobotControl_Board:
         ...
 
     # ------------------------------------------------------------------------------------------------------------------
-    def setRGBLEDExtern(self, color):
+    def setRGBLEDExtern(self, color, force: bool = False):
+        """
+        Sets the color of the external LEDs. The color is only sent to the STM32 if it changes, unless forced.
+        """
+        color = list(color)
+        if not force and color == self._rgb_led_extern_color:
+            return
+        self._rgb_led_extern_color = color
         color_struct = bilbo_external_rgb_struct(red=color[0], green=color[1], blue=color[2])
         self.serial_interface.function(address=BILBO_GeneralAddresses.ADDRESS_FIRMWARE_EXTERNAL_LED,
                                        module=BILBO_AddressTables.REGISTER_TABLE_GENERAL,
                                        input_type=bilbo_external_rgb_struct,
                                        data=color_struct)
 
+    # ------------------------------------------------------------------------------------------------------------------
+    def getI2CStatistics(self) -> dict:
+        return getI2CBus().statistics()
+
     # ------------------------------------------------------------------------------------------------------------------
     def beep(self, frequency: (str, float) = None, time_ms: int = 500, repeats: int = 1):
         if frequency is None:
@@ -189,5 +210,5 @@ class RobotControl_Board:
         self.wifi_interface.close()
         time.sleep(0.25)
         self.setStatusLed(0)
-        self.setRGBLEDExtern([2, 2, 2])
+        self.setRGBLEDExtern([2, 2, 2], force=True)
         logger.info("Exit Board")
@@ -0,0 +1,33 @@
+import time
+
+from core.communication.i2c.i2c import getI2CBus
+from hardware.control_board import RobotControl_Board
+from core.utils.logging_utils import setLoggerLevel
+
+setLoggerLevel('wifi', 'ERROR')
+
+
+def main():
+    board = RobotControl_Board(device_class='robot', device_type='bilbo', device_revision='v4',
+                               device_id='robot1', device_name='robot1')
+    board.init()
+    board.start()
+
+    bus = getI2CBus()
+    bus.resetStatistics()
+
+    # The same color every 10 ms, like the status LEDs in the update loop. Only the first one is written.
+    led = board.io_extension.rgb_led_intern[0]
+    for i in range(500):
+        led.setColor(0, 20 if (i // 100) % 2 else 0, 20)
+        time.sleep(0.01)
+
+    statistics = bus.statistics()
+    print(f"Utilisation: {statistics['utilisation'] * 100:.2f} % (busy: {statistics['busy'] * 100:.2f} %)")
+    for address, device in statistics['devices'].items():
+        print(f"{address}: {device['transactions']} transactions, {device['bytes']} bytes, "
+              f"{device['suppressed']} suppressed writes, max wait {device['max_wait'] * 1e3:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
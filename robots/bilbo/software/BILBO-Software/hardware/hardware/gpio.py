@@ -126,6 +126,13 @@ class GPIO_Input:
                               callback=callback,
                               bouncetime=bouncetime)
 
+    # ------------------------------------------------------------------------------------------------------------------
+    def waitForEdge(self, interrupt_flank: InterruptFlank = InterruptFlank.BOTH, timeout: float = None) -> bool:
+        """
+        Blocks the calling thread until the given edge. Only for inputs without an interrupt callback.
+        """
+        return gpio.wait_for_edge(pin=self.pin, flanks=interrupt_flank.value, timeout=timeout)
+
     # ------------------------------------------------------------------------------------------------------------------
     def read(self):
         return gpio.read(self.pin)
@@ -1,6 +1,6 @@
 import ctypes
 
-from core.communication.i2c.i2c import I2C_Interface
+from core.communication.i2c.i2c import I2C_Interface, I2C_RegisterShadow
 from hardware.io_extension.registers import *
 from hardware.board_config import getBoardConfig
 
@@ -8,7 +8,12 @@ from hardware.board_config import getBoardConfig
 # from control_board.control_board_settings import IO_EXTENSION_I2C_ADDRESS
 
 class RobotControl_IO_Extension_RGBLED:
+    """
+    The color is only written if it changes. The color registers are consecutive, so a new color is written with a
+    single transfer. The state and blink registers trigger an action and are always written.
+    """
     interface: I2C_Interface
+    registers: I2C_RegisterShadow
     position: int
     register_config: bytes
     register_red: bytes
@@ -21,6 +26,7 @@ class RobotControl_IO_Extension_RGBLED:
         config = getBoardConfig()
         self.IO_EXTENSION_I2C_ADDRESS = config['devices']['IO_EXTENSION_I2C_ADDRESS']
         self.interface = interface
+        self.registers = self.interface.bus.registers(self.IO_EXTENSION_I2C_ADDRESS, auto_increment=True)
 
         # Should be rewritten to also allow for external LEDs
         self.position = position
@@ -36,12 +42,10 @@ class RobotControl_IO_Extension_RGBLED:
                                      data=state)
 
     def setColor(self, red, green, blue):
-        self.interface.writeToMemory(device_address=self.IO_EXTENSION_I2C_ADDRESS, memory_address=self.register_red,
-                                     data=red)
-        self.interface.writeToMemory(device_address=self.IO_EXTENSION_I2C_ADDRESS, memory_address=self.register_green,
-                                     data=green)
-        self.interface.writeToMemory(device_address=self.IO_EXTENSION_I2C_ADDRESS, memory_address=self.register_blue,
-                                     data=blue)
+        with self.registers.batch():
+            self.registers.write(self.register_red, red)
+            self.registers.write(self.register_green, green)
+            self.registers.write(self.register_blue, blue)
 
     def blink(self, time):
         time_data = (int(time / 10))
@@ -1,4 +1,5 @@
 import ctypes
+import threading
 import time
 
 from core.utils.delayed_executor import delayed_execution
@@ -7,10 +8,13 @@ from hardware.control_board import RobotControl_Board
 from hardware.stm32.stm32 import resetSTM32
 from robot.bilbo_core import BILBO_Core
 from robot.experiment.bilbo_experiment import BILBO_ExperimentHandler
+from robot.experiment.bilbo_ilc import BILBO_ILC
 from robot.interfaces.bilbo_interfaces import BILBO_Interfaces
 from robot.utilities.bilbo_utilities import BILBO_Utilities
 from robot.utilities.id import readID
+from core.communication.wifi.data_link import CommandArgument
 from core.utils.callbacks import callback_definition, CallbackContainer
+from core.utils.data import encode_array
 from core.utils.events import EventListener, ConditionEvent, event_definition
 from core.utils.singletonlock.singletonlock import SingletonLock, terminate
 from robot.communication.bilbo_communication import BILBO_Communication
@@ -26,6 +30,7 @@ from robot.supervisor.twipr_supervisor import TWIPR_Supervisor
 from core.utils.revisions import get_versions, is_ll_version_compatible
 import robot.lowlevel.stm32_addresses as stm32_addresses
 from core.utils.exit import register_exit_callback
+from core.utils.realtime import GC_Scheduler, LoopTiming, configure_thread, lock_memory
 
 
 # === GLOBAL VARIABLES =================================================================================================
@@ -33,6 +38,11 @@ from core.utils.exit import register_exit_callback
 setLoggerLevel('wifi', 'ERROR')
 setLoggerLevel('Sound', 'ERROR')
 
+UPDATE_PERIOD = 0.1  # The update is triggered by every sample of the STM32, which are sent with 10 Hz
+
+# Stages of the update that are timed separately. 'gc' is the garbage collection in the idle time after the update
+UPDATE_STAGES = ['control', 'leds', 'logging', 'callbacks', 'events', 'gc']
+
 
 # === Callbacks ========================================================================================================
 @callback_definition
@@ -59,6 +69,7 @@ class BILBO:
     drive: BILBO_Drive
     sensors: BILBO_Sensors
     experiment_handler: BILBO_ExperimentHandler
+    ilc: BILBO_ILC
     logging: BILBO_Logging
     utilities: BILBO_Utilities
 
@@ -70,13 +81,22 @@ class BILBO:
     loop_time: float
     tick: int = 0
 
+    realtime_config: dict
+    timing: LoopTiming
+    gc_scheduler: GC_Scheduler
+
     _initialized: bool = False
     _last_update_time: float = 0
     _first_sample_user_message_sent: bool = False
     _eventListener: EventListener
 
     # === INIT =========================================================================================================
-    def __init__(self, reset_stm32: bool = False):
+    def __init__(self, reset_stm32: bool = False, realtime_config: dict = None):
+        """
+        :param reset_stm32: Reset the STM32 before starting
+        :param realtime_config: Real-time settings of the update. The SCHED_FIFO priority and the CPU affinity are
+            applied to the thread running the update and the thread reading the samples from the STM32.
+        """
         self.lock = SingletonLock(lock_file="/tmp/twipr.lock", timeout=10, override=True, override_timeout=5)
         self.lock.__enter__()
 
@@ -99,6 +119,24 @@ class BILBO:
 
         self._initialized = False
 
+        default_realtime_config = {
+            'priority': None,  # SCHED_FIFO priority (1-99). None keeps the normal scheduling
+            'cpus': None,  # CPUs the threads are restricted to, e.g. [3]. None keeps all CPUs
+            'lock_memory': False,  # Lock the memory of the process to avoid page faults
+            'gc': True,  # Run the garbage collection in the idle time after the update instead of automatically
+            'gc_full_interval': 600,  # Updates between two full garbage collections
+            'gc_fallback_timeout': 1.0,  # Seconds without an update after which a background thread collects
+            'timing_size': 6000,  # Number of updates kept for the timing statistics
+        }
+        if realtime_config is None:
+            realtime_config = {}
+        self.realtime_config = {**default_realtime_config, **realtime_config}
+
+        self.timing = LoopTiming(stages=UPDATE_STAGES, period=UPDATE_PERIOD, size=self.realtime_config['timing_size'])
+        self.gc_scheduler = GC_Scheduler(full_interval=self.realtime_config['gc_full_interval'],
+                                         fallback_timeout=self.realtime_config['gc_fallback_timeout'])
+        self._realtime_threads = {}
+
         # Set up the control board
         self.board = RobotControl_Board(device_class='robot', device_type='bilbo', device_revision='v4',
                                         device_id=self.id, device_name=self.id)
@@ -118,6 +156,7 @@ class BILBO:
         self.experiment_handler = BILBO_ExperimentHandler(communication=self.communication,
                                                           utils=self.utilities,
                                                           control=self.control, )
+        self.ilc = BILBO_ILC(experiment_handler=self.experiment_handler, communication=self.communication)
 
         self.logging = BILBO_Logging(comm=self.communication,
                                      control=self.control,
@@ -135,9 +174,27 @@ class BILBO:
                                            arguments=['input'],
                                            description='Test the communication')
 
+        self.communication.wifi.addCommand(identifier='getTimingStatistics',
+                                           callback=self.getTimingStatistics,
+                                           arguments=[CommandArgument(name='last',
+                                                                      type=int,
+                                                                      optional=True,
+                                                                      description='Number of updates. All stored '
+                                                                                  'updates if not given')],
+                                           description='Return the jitter and latency statistics of the update')
+        self.communication.wifi.addCommand(identifier='getTimingData',
+                                           callback=self.getTimingData,
+                                           arguments=[],
+                                           description='Return the timing of the stored updates in binary form')
+        self.communication.wifi.addCommand(identifier='resetTimingStatistics',
+                                           callback=self.timing.reset,
+                                           arguments=[],
+                                           description='Reset the timing statistics of the update')
+
         self.events = BILBO_Events()
         self.callbacks = BILBO_Callbacks()
         self._eventListener = EventListener(event=self.communication.events.rx_stm32_sample, callback=self.update)
+        self.communication.callbacks.rx_stm32_sample.register(self._configureRealtimeThread, discard_inputs=True)
         register_exit_callback(self._shutdown, priority=0)
         register_exit_callback(self._shutdownInit, priority=2)
 
@@ -185,6 +242,11 @@ class BILBO:
         self.utilities.playTone('notification')
         self.utilities.speak(f'Start {self.id}')
 
+        if self.realtime_config['lock_memory']:
+            lock_memory()
+        if self.realtime_config['gc']:
+            self.gc_scheduler.start()
+
         self.communication.startSampleListener()
         self._eventListener.start()
         self.interfaces.start()
@@ -200,39 +262,85 @@ class BILBO:
         """
         # if not self._initialized:
         #     return
-        time_loop_start = time.perf_counter()
+        timing = self.timing
+        timing.start()
         self.update_time = time.perf_counter() - self._last_update_time
         self._last_update_time = time.perf_counter()
 
+        self._configureRealtimeThread()
+
         # Update the control
         self.control.update()
+        timing.mark('control')
 
         self._setExternalLEDs()
+        timing.mark('leds')
 
         # Update the logging
         self.logging.update()
+        timing.mark('logging')
 
         # Callbacks
         self.callbacks.update.call()
+        timing.mark('callbacks')
 
         # Events
         with self.events.update:
             self.events.update.notify_all()
+        timing.mark('events')
 
         if not self._first_sample_user_message_sent:
             self._sendFirstSampleMessage()
 
         self.tick += 10
-        self.loop_time = time.perf_counter() - time_loop_start
+        self.loop_time = timing.finish(self.tick)
         # print(f"Loop time {self.loop_time:.4f} s, Update time {self.update_time:.4f} s, Tick {self.tick}")
 
         if self.loop_time > 0.18:
-            self.logger.warning(f"Loop took {self.loop_time * 1000:.2f} ms")
+            stages = timing.buffer.latest()
+            self.logger.warning(f"Loop took {self.loop_time * 1000:.2f} ms ("
+                                + ", ".join(f"{stage}: {stages[stage] * 1000:.2f} ms" for stage in UPDATE_STAGES)
+                                + ")")
 
         if self.update_time > 0.2 and self._startup_phase == False:
             self.logger.warning(f"Update took {self.update_time * 1000:.2f} ms")
 
+        # Garbage collection in the time that is left until the next sample
+        if self.gc_scheduler.running:
+            timing.set('gc', self.gc_scheduler.collect(budget=UPDATE_PERIOD - self.loop_time))
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def getTimingStatistics(self, last: int = None) -> dict:
+        """
+        Jitter and latency statistics of the update (see LoopTiming.statistics), together with the statistics of
+        the garbage collection and the real-time settings of the threads.
+        """
+        return {
+            **self.timing.statistics(last),
+            'gc_collections': self.gc_scheduler.statistics,
+            'threads': list(self._realtime_threads.values()),
+        }
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def getTimingData(self) -> dict:
+        """
+        Period, total and stage durations of the stored updates as encoded structured array.
+        """
+        return encode_array(self.timing.buffer.get())
+
     # === PRIVATE METHODS ==============================================================================================
+    def _configureRealtimeThread(self):
+        """
+        Applies the real-time settings to the calling thread the first time it runs the update or delivers a sample.
+        """
+        native_id = threading.get_native_id()
+        if native_id in self._realtime_threads:
+            return
+        self._realtime_threads[native_id] = configure_thread(priority=self.realtime_config['priority'],
+                                                             cpus=self.realtime_config['cpus'])
+        self.logger.debug(f"Real-time settings of thread {self._realtime_threads[native_id]}")
+
+    # ------------------------------------------------------------------------------------------------------------------
     def _resetLowLevel(self):
         # self.board.beep()
 
@@ -248,8 +356,9 @@ class BILBO:
         self.logger.important(f"Shutdown {self.id}")
         self.control.setMode(BILBO_Control_Mode.OFF)
         self._eventListener.stop()
+        self.gc_scheduler.stop()
         self.utilities.playTone('warning')
-        self.board.setRGBLEDExtern([2, 2, 2])
+        self.board.setRGBLEDExtern([2, 2, 2], force=True)
 
     # ------------------------------------------------------------------------------------------------------------------
     def _shutdown(self, *args, **kwargs):
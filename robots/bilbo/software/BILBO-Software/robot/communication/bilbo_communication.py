@@ -54,6 +54,16 @@ class BILBO_Communication:
         # Configure the SPI Interface
         self.spi.callbacks.rx_latest_sample.register(self._stm32_rx_sample_callback)
 
+        self.wifi.addCommand(identifier='getSampleStatistics',
+                             callback=self.spi.getSampleStatistics,
+                             arguments=[],
+                             description='Returns missed and duplicated batches, stalls and latencies of the '
+                                         'low-level samples')
+        self.wifi.addCommand(identifier='resetSampleStatistics',
+                             callback=self.spi.acquisition.resetStatistics,
+                             arguments=[],
+                             description='Resets the statistics of the low-level samples')
+
         setLoggerLevel('tcp', 'WARNING')
         self.wifi.callbacks.connected.register(self._wifi_connected_callback)
         self.wifi.callbacks.disconnected.register(self._wifi_disconnected_callback)
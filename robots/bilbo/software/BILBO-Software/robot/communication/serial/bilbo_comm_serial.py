@@ -1,6 +1,6 @@
 import ctypes
 
-from core.communication.serial.serial_interface import Serial_Interface, SerialMessage
+from core.communication.serial.serial_interface import Serial_Interface, SerialMessage, SerialTransaction
 import robot.lowlevel.stm32_addresses as addresses
 from robot.communication.serial.bilbo_serial_messages import BILBO_SERIAL_MESSAGES
 from robot.lowlevel.stm32_general import twipr_firmware_revision
@@ -71,6 +71,10 @@ class BILBO_Serial_Communication:
                         timeout=1):
         return self.interface.function(address, module, data, input_type, output_type, timeout)
 
+    # ------------------------------------------------------------------------------------------------------------------
+    def transaction(self, timeout: float = 1) -> SerialTransaction:
+        return self.interface.transaction(timeout)
+
     # ------------------------------------------------------------------------------------------------------------------
     def readTick(self):
         tick = self.interface.read(module=addresses.TWIPR_AddressTables.REGISTER_TABLE_GENERAL,
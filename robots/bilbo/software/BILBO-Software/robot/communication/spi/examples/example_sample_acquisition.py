@@ -0,0 +1,49 @@
+"""
+Runs the sample acquisition against a simulated source at the rate of the STM32 and injects faults: lost
+interrupts, a duplicated batch and a stall. Prints what the acquisition measured.
+
+Run from the BILBO-Software directory:
+    python -m robot.communication.spi.examples.example_sample_acquisition
+"""
+import time
+
+from robot.communication.spi.sample_acquisition import BILBO_SampleAcquisition, SimulatedSampleSource, LATENCY_NAMES
+
+
+def main():
+    source = SimulatedSampleSource(jitter=0.0005, read_time=0.0003, seed=1)
+    acquisition = BILBO_SampleAcquisition(source=source, stall_timeout=0.3)
+
+    ticks = []
+
+    def consumer(batch):
+        ticks.extend(batch.samples['general']['tick'].tolist())
+        time.sleep(0.0002)
+
+    acquisition.callbacks.rx_batch.register(consumer)
+    acquisition.start()
+
+    time.sleep(1.0)
+    source.dropBatches(2)
+    time.sleep(0.5)
+    source.duplicateBatch()
+    time.sleep(0.5)
+    source.stall(0.8)
+    time.sleep(1.5)
+    acquisition.close()
+
+    statistics = acquisition.statistics()
+    missing = sorted(set(range(ticks[0], ticks[-1] + 1)) - set(ticks))
+    print(f"Batches: {statistics['batches']}, samples: {statistics['samples']}, last tick: {statistics['last_tick']}")
+    print(f"Missed samples: {statistics['missed_samples']} (ticks not received by the consumer: {len(missing)})")
+    print(f"Duplicated batches: {statistics['duplicated_batches']}, stalls: {statistics['stalls']} "
+          f"(longest {statistics['longest_stall']:.2f} s), late batches: {statistics['late_batches']}, "
+          f"max period: {statistics['max_period'] * 1e3:.1f} ms")
+    for name in LATENCY_NAMES:
+        latency = statistics['latency'][name]
+        print(f"Latency {name:>8}: mean {latency['mean'] * 1e3:.3f} ms, p99 {latency['p99'] * 1e3:.3f} ms, "
+              f"max {latency['max'] * 1e3:.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
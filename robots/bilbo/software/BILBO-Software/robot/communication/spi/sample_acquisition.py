@@ -0,0 +1,353 @@
+import dataclasses
+import threading
+import time
+from collections import deque
+from ctypes import sizeof
+
+import numpy as np
+
+# === OWN PACKAGES =====================================================================================================
+from core.utils.callbacks import callback_definition, CallbackContainer
+from core.utils.ctypes_utils import bytes_to_records
+from core.utils.logging_utils import Logger
+from robot.lowlevel.stm32_general import LOOP_TIME_CONTROL
+from robot.lowlevel.stm32_sample import bilbo_ll_sample_struct, bilbo_ll_sample_dtype, SAMPLE_BUFFER_LL_SIZE
+
+logger = Logger('SPI Samples')
+logger.setLevel('INFO')
+
+# Latencies that are reported, see BILBO_SampleAcquisition
+LATENCY_NAMES = ('signal', 'read', 'dispatch', 'total')
+
+# Batch periods between two signals after which a batch counts as late
+LATE_BATCH_PERIODS = 1.5
+
+
+# ======================================================================================================================
+@dataclasses.dataclass
+class BILBO_SampleBatch:
+    samples: np.ndarray  # View on a preallocated buffer. Copy it to keep it for longer than num_buffers batches.
+    sequence: int  # Number of the batch since the start of the acquisition
+    tick: int  # Tick of the last sample
+    time_signal: float  # Monotonic time the STM32 signaled the batch
+    time_read: float  # Monotonic time the batch was read
+    missed_samples: int = 0  # Samples lost between the previous batch and this one
+    latency_signal: float = 0.0  # Delay of the signal relative to the tick clock
+
+
+# ======================================================================================================================
+class BILBO_SampleSource:
+    """
+    Where the batches of low-level samples come from. waitForBatch blocks until a new batch is signaled and returns
+    the monotonic time of the signal, or None if the timeout expired. readInto then reads the batch into a buffer.
+    """
+
+    def waitForBatch(self, timeout: float) -> (float, None):
+        raise NotImplementedError
+
+    def readInto(self, buffer: bytearray):
+        raise NotImplementedError
+
+    def close(self):
+        ...
+
+
+# ======================================================================================================================
+class SimulatedSampleSource(BILBO_SampleSource):
+    """
+    Batches at the rate of the STM32 without hardware, for tests. Only the ticks are set, unless a fill function is
+    given, which is called with the structured array of every batch.
+
+    Faults can be injected while running:
+        dropBatches(n): the next n batches are never signaled, as if the interrupts were lost
+        duplicateBatch(): the last batch is signaled again
+        stall(duration): no batches are signaled for the duration. The batches in between are lost.
+
+    The signals are delayed by an exponentially distributed jitter and reading a batch takes read_time.
+    """
+
+    def __init__(self, batch_size: int = SAMPLE_BUFFER_LL_SIZE, sample_time: float = LOOP_TIME_CONTROL,
+                 jitter: float = 0.0, read_time: float = 0.0, fill: callable = None, seed: int = None):
+        self.batch_size = batch_size
+        self.sample_time = sample_time
+        self.period = batch_size * sample_time
+        self.jitter = jitter
+        self.read_time = read_time
+        self.fill = fill
+
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+        self._time_start = None
+        self._next_index = 0
+        self._read_index = -1
+        self._drop = 0
+        self._repeat = False
+        self._time_resume = 0.0
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def dropBatches(self, num_batches: int = 1):
+        with self._lock:
+            self._drop += num_batches
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def duplicateBatch(self):
+        with self._lock:
+            self._repeat = True
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def stall(self, duration: float):
+        with self._lock:
+            self._time_resume = time.monotonic() + duration
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def waitForBatch(self, timeout: float) -> (float, None):
+        now = time.monotonic()
+        with self._lock:
+            if self._time_start is None:
+                self._time_start = now
+            if self._repeat and self._read_index >= 0:
+                self._repeat = False
+                return now
+            index = self._next_index + self._drop
+            self._drop = 0
+            while self._time_start + (index + 1) * self.period < self._time_resume:
+                index += 1
+            self._next_index = index
+
+        time_signal = self._time_start + (index + 1) * self.period
+        if self.jitter > 0:
+            time_signal += self._rng.exponential(self.jitter)
+        if time_signal - now > timeout:
+            time.sleep(timeout)
+            return None
+        time.sleep(max(0.0, time_signal - now))
+
+        with self._lock:
+            self._read_index = index
+            self._next_index = index + 1
+        return time.monotonic()
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def readInto(self, buffer: bytearray):
+        samples = bytes_to_records(buffer, dtype=bilbo_ll_sample_dtype)
+        samples.fill(0)
+        samples['general']['tick'] = self._read_index * self.batch_size + np.arange(self.batch_size)
+        if self.fill is not None:
+            self.fill(samples)
+        if self.read_time > 0:
+            time.sleep(self.read_time)
+
+
+# ======================================================================================================================
+@callback_definition
+class BILBO_SampleAcquisition_Callbacks:
+    rx_batch: CallbackContainer
+    stall: CallbackContainer
+
+
+class BILBO_SampleAcquisition:
+    """
+    Reader thread for the batches of low-level samples.
+
+    The thread blocks until the source signals a batch and reads it into the next of num_buffers preallocated
+    buffers. Every batch is checked for continuity of the ticks: batches with the tick of the previous batch are
+    duplicates and are dropped, gaps are counted as missed samples and a tick that goes back is counted as a reset
+    of the STM32. If no batch arrives within stall_timeout, the stream counts as stalled until the next batch.
+
+    The STM32 and the CM4 have no common clock. Ticks are mapped to monotonic times with the smallest offset between
+    the time of the signal and the tick of the last sample over the last offset_window batches, so the fastest
+    batch of the window has no delay. For every batch, the latencies are:
+        signal:   delay of the signal relative to this tick clock (interrupt and scheduling jitter)
+        read:     from the signal to the end of the transfer
+        dispatch: from the end of the transfer until all rx_batch callbacks returned
+        total:    from the tick of the last sample to the end of the dispatch, the sum of the three
+    """
+    source: BILBO_SampleSource
+    callbacks: BILBO_SampleAcquisition_Callbacks
+
+    def __init__(self, source: BILBO_SampleSource, batch_size: int = SAMPLE_BUFFER_LL_SIZE,
+                 sample_time: float = LOOP_TIME_CONTROL, num_buffers: int = 8, stall_timeout: float = 0.5,
+                 offset_window: int = 100, statistics_window: int = 1000):
+        self.source = source
+        self.batch_size = batch_size
+        self.sample_time = sample_time
+        self.num_buffers = num_buffers
+        self.stall_timeout = stall_timeout
+        self.statistics_window = statistics_window
+        self.callbacks = BILBO_SampleAcquisition_Callbacks()
+
+        buffer_size = batch_size * sizeof(bilbo_ll_sample_struct)
+        self._buffers = [bytearray(buffer_size) for _ in range(num_buffers)]
+        self._views = [bytes_to_records(buffer, dtype=bilbo_ll_sample_dtype) for buffer in self._buffers]
+
+        self._offsets = deque(maxlen=offset_window)
+        self._statistics_lock = threading.Lock()
+        self._thread = None
+        self._running = False
+        self._sequence = 0
+        self._last_tick = None
+        self._last_time_signal = None
+        self._time_stall = None
+        self.resetStatistics()
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._threadFunction, daemon=True)
+        self._thread.start()
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def close(self, *args, **kwargs):
+        self._running = False
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2 * self.stall_timeout)
+        self._thread = None
+        self.source.close()
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def statistics(self) -> dict:
+        with self._statistics_lock:
+            statistics = {key: value for key, value in self._statistics.items() if key != 'latency'}
+            latencies = {name: np.asarray(values) for name, values in self._statistics['latency'].items()}
+
+        statistics['latency'] = {
+            name: {
+                'mean': float(np.mean(values)) if len(values) else 0.0,
+                'p99': float(np.percentile(values, 99)) if len(values) else 0.0,
+                'max': float(np.max(values)) if len(values) else 0.0,
+            } for name, values in latencies.items()}
+        statistics['stalled'] = self._time_stall is not None
+        return statistics
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def resetStatistics(self):
+        with self._statistics_lock:
+            self._statistics = {
+                'batches': 0,
+                'samples': 0,
+                'missed_samples': 0,
+                'duplicated_batches': 0,
+                'inconsistent_batches': 0,  # Ticks within the batch are not consecutive
+                'tick_resets': 0,
+                'read_errors': 0,
+                'stalls': 0,
+                'longest_stall': 0.0,
+                'late_batches': 0,
+                'max_period': 0.0,
+                'last_tick': self._last_tick,
+                'latency': {name: deque(maxlen=self.statistics_window) for name in LATENCY_NAMES},
+            }
+
+    # === PRIVATE METHODS ==============================================================================================
+    def _threadFunction(self):
+        while self._running:
+            time_signal = self.source.waitForBatch(self.stall_timeout)
+            if not self._running:
+                break
+            if time_signal is None:
+                self._onStall()
+                continue
+
+            index = self._sequence % self.num_buffers
+            try:
+                self.source.readInto(self._buffers[index])
+            except Exception as e:
+                logger.error(f"Cannot read samples: {e}")
+                with self._statistics_lock:
+                    self._statistics['read_errors'] += 1
+                continue
+            time_read = time.monotonic()
+
+            batch = self._checkBatch(self._views[index], time_signal, time_read)
+            if batch is None:
+                continue
+            self._sequence += 1
+
+            self.callbacks.rx_batch.call(batch)
+            self._recordLatency(batch, time.monotonic())
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _checkBatch(self, samples: np.ndarray, time_signal: float, time_read: float) -> (BILBO_SampleBatch, None):
+        ticks = samples['general']['tick']
+        tick = int(ticks[-1])
+        missed = 0
+
+        with self._statistics_lock:
+            statistics = self._statistics
+
+            if self._last_tick is not None:
+                if tick == self._last_tick:
+                    statistics['duplicated_batches'] += 1
+                    return None
+                if tick < self._last_tick:
+                    statistics['tick_resets'] += 1
+                    self._offsets.clear()
+                    logger.warning(f"Tick went back from {self._last_tick} to {tick}")
+                else:
+                    missed = tick - self._last_tick - self.batch_size
+                    if missed > 0:
+                        statistics['missed_samples'] += missed
+                        logger.warning(f"Missed {missed} samples (ticks {self._last_tick + 1} to "
+                                       f"{tick - self.batch_size})")
+                    missed = max(missed, 0)
+
+            if int(ticks[-1]) - int(ticks[0]) != len(ticks) - 1:
+                statistics['inconsistent_batches'] += 1
+
+            if self._time_stall is not None:
+                duration = time_signal - self._time_stall
+                statistics['longest_stall'] = max(statistics['longest_stall'], duration)
+                logger.info(f"Samples resumed after {duration:.2f} s")
+                self._time_stall = None
+
+            if self._last_time_signal is not None:
+                period = time_signal - self._last_time_signal
+                statistics['max_period'] = max(statistics['max_period'], period)
+                if period > LATE_BATCH_PERIODS * self.batch_size * self.sample_time:
+                    statistics['late_batches'] += 1
+
+            statistics['batches'] += 1
+            statistics['samples'] += len(ticks)
+            statistics['last_tick'] = tick
+
+        self._last_tick = tick
+        self._last_time_signal = time_signal
+
+        offset = time_signal - tick * self.sample_time
+        self._offsets.append(offset)
+
+        return BILBO_SampleBatch(samples=samples,
+                                 sequence=self._sequence,
+                                 tick=tick,
+                                 time_signal=time_signal,
+                                 time_read=time_read,
+                                 missed_samples=missed,
+                                 latency_signal=offset - min(self._offsets))
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _recordLatency(self, batch: BILBO_SampleBatch, time_dispatched: float):
+        read = batch.time_read - batch.time_signal
+        dispatch = time_dispatched - batch.time_read
+        with self._statistics_lock:
+            latency = self._statistics['latency']
+            latency['signal'].append(batch.latency_signal)
+            latency['read'].append(read)
+            latency['dispatch'].append(dispatch)
+            latency['total'].append(batch.latency_signal + read + dispatch)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _onStall(self):
+        if self._time_stall is not None:
+            return
+        self._time_stall = self._last_time_signal if self._last_time_signal is not None else time.monotonic()
+        with self._statistics_lock:
+            self._statistics['stalls'] += 1
+        logger.warning(f"No samples for {self.stall_timeout:.2f} s")
+        self.callbacks.stall.call()
@@ -1,18 +1,20 @@
 import threading
-from ctypes import sizeof
+import time
 
 # === OWN PACKAGES =====================================================================================================
 from core.communication.spi.spi import SPI_Interface
 from core.utils.callbacks import callback_definition, CallbackContainer
-from core.utils.dataclass_utils import from_dict
+from core.utils.dataclass_utils import compile_from_dict
 # from utils.exit import ExitHandler
-from robot.lowlevel.stm32_sample import bilbo_ll_sample_struct, BILBO_LL_Sample
-from core.utils.ctypes_utils import bytes_to_value
-from robot.lowlevel.stm32_sample import SAMPLE_BUFFER_LL_SIZE
+from robot.communication.spi.sample_acquisition import BILBO_SampleAcquisition, BILBO_SampleBatch, BILBO_SampleSource
+from robot.lowlevel.stm32_sample import BILBO_LL_Sample
+from core.utils.ctypes_utils import record_to_dict
 from hardware.hardware.gpio import GPIO_Input, InterruptFlank, PullupPulldown
 from core.utils.time import precise_sleep
 from core.utils.bytes_utils import intToByteList
 
+_ll_sample_from_dict = compile_from_dict(BILBO_LL_Sample)
+
 
 # ======================================================================================================================
 @callback_definition
@@ -26,19 +28,49 @@ class BILBO_SPI_Command_Type:
     SEND_TRAJECTORY = 2
 
 
+# ======================================================================================================================
+class BILBO_SPI_SampleSource(BILBO_SampleSource):
+    """
+    Batches from the STM32 over SPI. The STM32 toggles the notification pin when a batch is ready. The reader thread
+    blocks on the edge, requests the batch with a READ_SAMPLE command and reads it after command_delay, the time the
+    STM32 needs to prepare the transfer.
+    """
+
+    def __init__(self, spi: 'BILBO_SPI_Interface', command_delay: float = 0.002):
+        self.spi = spi
+        self.command_delay = command_delay
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def waitForBatch(self, timeout: float) -> (float, None):
+        if self.spi.gpio_input.waitForEdge(InterruptFlank.BOTH, timeout=timeout):
+            return time.monotonic()
+        return None
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def readInto(self, buffer: bytearray):
+        with self.spi.lock:
+            self.spi._sendCommand(BILBO_SPI_Command_Type.READ_SAMPLE, 0)
+            time.sleep(self.command_delay)
+            self.spi.interface.readinto(buffer, start=0, end=len(buffer))
+
+
 # ======================================================================================================================
 class BILBO_SPI_Interface:
+    """
+    SPI connection to the STM32. The batches of low-level samples are read by a BILBO_SampleAcquisition, which
+    blocks on the notification pin and checks the ticks and latencies of the stream. A simulated source can be
+    given instead of the SPI source to run without hardware.
+    """
     interface: SPI_Interface
     callbacks: BILBO_SPI_Callbacks
     sample_notification_pin: int
+    acquisition: BILBO_SampleAcquisition
 
     gpio_input: (None, GPIO_Input)
 
     lock: threading.Lock
 
-    _startSampleListening: bool
-
-    def __init__(self, interface: SPI_Interface, sample_notification_pin):
+    def __init__(self, interface: SPI_Interface, sample_notification_pin, source: BILBO_SampleSource = None):
         self.interface = interface
         self.sample_notification_pin = sample_notification_pin
         self.callbacks = BILBO_SPI_Callbacks()
@@ -47,14 +79,17 @@ class BILBO_SPI_Interface:
 
         self.lock = threading.Lock()
 
-        self._startSampleListening = False
+        self.acquisition = BILBO_SampleAcquisition(
+            source=source if source is not None else BILBO_SPI_SampleSource(self))
+        self.acquisition.callbacks.rx_batch.register(self._onBatch)
 
         # self.exit = ExitHandler()
         # self.exit.register(self.close)
 
     # === METHODS ======================================================================================================
     def init(self):
-        self._configureSampleGPIO()
+        if isinstance(self.acquisition.source, BILBO_SPI_SampleSource):
+            self._configureSampleGPIO()
 
     # ------------------------------------------------------------------------------------------------------------------
     def start(self):
@@ -62,10 +97,15 @@ class BILBO_SPI_Interface:
 
     # ------------------------------------------------------------------------------------------------------------------
     def startSampleListener(self):
-        self._startSampleListening = True
+        self.acquisition.start()
+
     # ------------------------------------------------------------------------------------------------------------------
     def close(self, *args, **kwargs):
-        ...
+        self.acquisition.close()
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def getSampleStatistics(self) -> dict:
+        return self.acquisition.statistics()
 
     def sendTrajectoryData(self, trajectory_length, trajectory_data_bytes: (bytes, bytearray)):
         with self.lock:
@@ -75,13 +115,12 @@ class BILBO_SPI_Interface:
 
     # === PRIVATE METHODS ==============================================================================================
     def _configureSampleGPIO(self):
+        # No event detection, the acquisition thread waits for the edges
         self.gpio_input = GPIO_Input(
             pin=self.sample_notification_pin,
             pin_type='internal',
-            interrupt_flank=InterruptFlank.BOTH,
+            interrupt_flank=InterruptFlank.NONE,
             pull_up_down=PullupPulldown.DOWN,
-            callback=self._samplesReadyInterrupt,
-            bouncetime=1
         )
 
     # ------------------------------------------------------------------------------------------------------------------
@@ -98,35 +137,12 @@ class BILBO_SPI_Interface:
         self.interface.send(data)
 
     # ------------------------------------------------------------------------------------------------------------------
-    def _samplesReadyInterrupt(self, *args, **kwargs):
-        if not self._startSampleListening:
-            return
+    def _onBatch(self, batch: BILBO_SampleBatch):
+        samples = batch.samples
+        latest_sample = _ll_sample_from_dict(record_to_dict(samples[-1]))
 
-        samples, latest_sample = self._readSamples()
         for callback in self.callbacks.rx_samples:
             callback(samples)
 
         for callback in self.callbacks.rx_latest_sample:
             callback(latest_sample)
-
-    # ------------------------------------------------------------------------------------------------------------------
-
-    # ------------------------------------------------------------------------------------------------------------------
-    def _readSamples(self) -> (list[dict], BILBO_LL_Sample):
-        data_rx_bytes = bytearray(SAMPLE_BUFFER_LL_SIZE * sizeof(bilbo_ll_sample_struct))
-        with self.lock:
-            self._sendCommand(BILBO_SPI_Command_Type.READ_SAMPLE, 0)
-            precise_sleep(0.002)
-            self.interface.readinto(data_rx_bytes, start=0,
-                                    end=SAMPLE_BUFFER_LL_SIZE * sizeof(bilbo_ll_sample_struct))
-
-        samples = []
-        for i in range(0, SAMPLE_BUFFER_LL_SIZE):
-            sample = bytes_to_value(
-                byte_data=data_rx_bytes[i * sizeof(bilbo_ll_sample_struct):(i + 1) * sizeof(bilbo_ll_sample_struct)],
-                ctype_type=bilbo_ll_sample_struct)
-            samples.append(sample)
-
-        latest_sample = from_dict(BILBO_LL_Sample, samples[-1])
-        return samples, latest_sample
-
@@ -4,6 +4,7 @@ from core.communication.wifi.data_link import CommandArgument
 # === OWN PACKAGES =====================================================================================================
 from core.communication.wifi.wifi_interface import WIFI_Interface
 from core.utils.callbacks import Callback, callback_definition, CallbackContainer
+from core.utils.stream_codec import StreamSchema, STREAM_ENCODING_STRUCT
 
 
 # ======================================================================================================================
@@ -44,6 +45,15 @@ class BILBO_WIFI_Interface:
         if self.interface.connected:
             self.interface.sendStreamMessage(data)
 
+    # ------------------------------------------------------------------------------------------------------------------
+    def sendRecords(self, stream_id: int, payload: bytes):
+        if self.interface.connected:
+            self.interface.sendRecordsMessage(stream_id, payload)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def setStreamSchema(self, schema: StreamSchema, encoding: int = STREAM_ENCODING_STRUCT):
+        self.interface.setStreamSchema(schema, encoding)
+
     # ------------------------------------------------------------------------------------------------------------------
     def sendEvent(self, event, data=None):
         if self.interface.connected:
@@ -637,52 +637,121 @@ class BILBO_Control:
             tic_theta_limit=config.balancing_control.tic.theta_limit
         )
 
-        success = self._comm.serial.executeFunction(
-            module=addresses.TWIPR_AddressTables.REGISTER_TABLE_GENERAL,
+        module = addresses.TWIPR_AddressTables.REGISTER_TABLE_GENERAL
+        max_wheel_speed = float(config.general.max_wheel_speed)
+
+        # Everything is sent as one transaction and finishes in one round trip. With verify, the current
+        # configuration is read first, so that it can be restored if the read-back does not match. The snapshot
+        # itself is not required for the transaction to succeed
+        transaction = self._comm.serial.transaction(timeout=1)
+
+        if verify:
+            previous_config = transaction.function(
+                module=module,
+                address=addresses.TWIPR_ControlAddresses.ADDRESS_CONTROL_READ_CONFIG,
+                output_type=bilbo_control_configuration_ll_t,  # type: ignore
+                required=False
+            )
+            previous_max_wheel_speed = transaction.read(
+                module=module,
+                address=addresses.TWIPR_ControlAddresses.ADDRESS_CONTROL_RW_MAX_WHEEL_SPEED,
+                type=ctypes.c_float,
+                required=False
+            )
+
+        set_config = transaction.function(
+            module=module,
             address=addresses.TWIPR_ControlAddresses.SET_CONFIG,
             data=control_config,
             input_type=bilbo_control_configuration_ll_t,  # type: ignore
             output_type=ctypes.c_bool,
-            timeout=1
+            check=bool
         )
+        transaction.write(
+            module=module,
+            address=addresses.TWIPR_ControlAddresses.ADDRESS_CONTROL_RW_MAX_WHEEL_SPEED,
+            value=max_wheel_speed,
+            type=ctypes.c_float
+        )
+
+        if not verify:
+            success = transaction.execute()
+            if not success:
+                logger.warning("Failed to set control configuration")
+            return success
 
-        if success is None or not success:
-            logger.warning("Failed to set control configuration")
+        # Read back the configuration from the low-level module
+        transaction.function(
+            module=module,
+            address=addresses.TWIPR_ControlAddresses.ADDRESS_CONTROL_READ_CONFIG,
+            output_type=bilbo_control_configuration_ll_t,  # type: ignore
+            check=lambda config_ll: self._verifyControlConfig(config, config_ll)
+        )
+        transaction.read(
+            module=module,
+            address=addresses.TWIPR_ControlAddresses.ADDRESS_CONTROL_RW_MAX_WHEEL_SPEED,
+            type=ctypes.c_float,
+            check=lambda speed: are_lists_approximately_equal([speed], [max_wheel_speed])
+        )
+
+        def rollback(rollback_transaction):
+            # Only what was written is restored. The configuration was not applied if SET_CONFIG answered False,
+            # without an answer it may have been. The max wheel speed write is not answered and always restored
+            if previous_config.value is not None and set_config.value is not False:
+                rollback_transaction.function(
+                    module=module,
+                    address=addresses.TWIPR_ControlAddresses.SET_CONFIG,
+                    data=previous_config.value,
+                    input_type=bilbo_control_configuration_ll_t,  # type: ignore
+                    output_type=ctypes.c_bool,
+                    check=bool
+                )
+            if previous_max_wheel_speed.value is not None:
+                rollback_transaction.write(
+                    module=module,
+                    address=addresses.TWIPR_ControlAddresses.ADDRESS_CONTROL_RW_MAX_WHEEL_SPEED,
+                    value=previous_max_wheel_speed.value,
+                    type=ctypes.c_float
+                )
+
+        success = transaction.execute(rollback=rollback)
+        if not success:
+            logger.warning("Failed to set control configuration. Restored the previous configuration")
+        return success
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def _verifyControlConfig(config: BILBO_ControlConfig, config_ll: dict) -> bool:
+        # Verify state feedback gain
+        if not are_lists_approximately_equal(config_ll['K'], config.balancing_control.K):
+            logger.warning("State Feedback Gain not set correctly")
+            return False
+
+        # Verify forward PID control values
+        if not are_lists_approximately_equal(
+                [config.speed_control.v.Kp,
+                 config.speed_control.v.Ki,
+                 config.speed_control.v.Kd],
+                [config_ll['forward_p'], config_ll['forward_i'], config_ll['forward_d']]):
+            logger.warning("PID Control Values not set correctly")
             return False
 
-        self._setMaxWheelSpeed_LL(speed=config.general.max_wheel_speed)
+        # Verify turn PID control values
+        if not are_lists_approximately_equal(
+                [config.speed_control.psidot.Kp,
+                 config.speed_control.psidot.Ki,
+                 config.speed_control.psidot.Kd],
+                [config_ll['turn_p'], config_ll['turn_i'], config_ll['turn_d']]):
+            logger.warning("PID Control Values not set correctly")
+            return False
 
-        if verify:
-            # Read back configuration from the low-level module
-            config_ll = self._readControlConfig_LL()
-
-            if config_ll is None:
-                return False
-
-            # Verify state feedback gain
-            if not are_lists_approximately_equal(config_ll['K'], config.balancing_control.K):
-                logger.warning("State Feedback Gain not set correctly")
-                return False
-
-            # Verify forward PID control values
-            if not are_lists_approximately_equal(
-                    [config.speed_control.v.Kp,
-                     config.speed_control.v.Ki,
-                     config.speed_control.v.Kd],
-                    [config_ll['forward_p'], config_ll['forward_i'], config_ll['forward_d']]):
-                logger.warning("PID Control Values not set correctly")
-                return False
-
-            # Verify turn PID control values
-            if not are_lists_approximately_equal(
-                    [config.speed_control.psidot.Kp,
-                     config.speed_control.psidot.Ki,
-                     config.speed_control.psidot.Kd],
-                    [config_ll['turn_p'], config_ll['turn_i'], config_ll['turn_d']]):
-                logger.warning("PID Control Values not set correctly")
-                return False
+        # Verify the integral control flags
+        if bool(config_ll['vic_enabled']) != bool(config.balancing_control.vic.enabled) or \
+                bool(config_ll['tic_enabled']) != bool(config.balancing_control.tic.enabled):
+            logger.warning("Integral control flags not set correctly")
+            return False
 
-        return success
+        return True
 
     # ------------------------------------------------------------------------------------------------------------------
     def _setControlMode_LL(self, mode: BILBO_Control_Mode_LL) -> None:
@@ -1,37 +1,77 @@
 import numpy as np
 
 from robot.bilbo import BILBO
-from robot.dynamics.tests.sys_id import estimate_system_and_lifted_matrix
+from robot.control.bilbo_control_data import BILBO_Control_Mode
 from robot.experiment.bilbo_experiment import BILBO_Trajectory
+from robot.lowlevel.stm32_general import LOOP_TIME_CONTROL
+from core.utils.data import generate_random_input, generate_time_vector
+from core.utils.logging_utils import Logger
+from core.utils.system_identification import identify, multisine, SystemIdentificationResult
 
+logger = Logger('sys_id')
+logger.setLevel('INFO')
 
-def run_system_identification(bilbo: BILBO, trials, duration, frequencies, gains, wait_for_resume=True):
-    learning_inputs = []
-    learning_outputs = []
 
+def run_system_identification(bilbo: BILBO, trials, duration, frequencies, gains, fir_length: int = 100,
+                              excitation: str = 'random', signal: str = 'lowlevel.estimation.state.theta',
+                              order: int = None) -> (SystemIdentificationResult, None):
+    """
+    Runs one test trajectory per trial back to back and identifies the system from all of them. The input of a trial
+    is the sum of both wheel inputs, as in the trials of the ILC, so the lifted matrix of the result can be used for
+    the ILC directly.
+
+    Args:
+        frequencies: Cutoff frequency (random) or highest excited frequency (multisine) of every trial in Hz.
+        gains: Standard deviation (random) or RMS value (multisine) of the input of every trial.
+        excitation: 'random' for filtered noise or 'multisine' for a Schroeder multisine with a period of one
+            second.
+    """
     if (len(frequencies) != trials) or (len(gains) != trials):
         raise ValueError(
             "The number of frequencies and gains must be equal to the number of trials."
         )
 
-    for i in range(0, trials):
+    t_vector = generate_time_vector(start=0, end=duration, dt=LOOP_TIME_CONTROL)
+    learning_inputs = []
+    trajectories = []
 
-        # Generate Test Trajectory
-        frequency = frequencies[i]
-        gain = gains[i]
-        trajectory: BILBO_Trajectory = bilbo.experiment_handler.generateTestTrajectory(id=i + 1, time=duration,
-                                                                                       frequency=frequency, gain=gain)
+    for i in range(0, trials):
+        if excitation == 'random':
+            input = generate_random_input(t_vector=t_vector, f_cutoff=frequencies[i], sigma_I=gains[i])
+        elif excitation == 'multisine':
+            period = round(1 / LOOP_TIME_CONTROL)
+            input = multisine(period=period, dt=LOOP_TIME_CONTROL, f_min=0, f_max=frequencies[i],
+                              amplitude=gains[i], periods=int(np.ceil(len(t_vector) / period)))[:len(t_vector)]
+        else:
+            raise ValueError(f"Unknown excitation {excitation}")
 
-        input = np.asarray([i.left/2 + i.right/2 for i in trajectory.inputs.values()])
-        learning_inputs.append(input)
+        learning_inputs.append(np.asarray(input, dtype=float))
+        trajectories.append(BILBO_Trajectory(
+            id=i + 1,
+            name='sys_id',
+            length=len(input),
+            inputs=np.column_stack((input / 2, input / 2)),
+            control_mode=BILBO_Control_Mode.BALANCING,
+            control_mode_end=BILBO_Control_Mode.BALANCING
+        ))
 
-        # TODO: Add waiting for a resume signal
-        if wait_for_resume:
-            ...
+    results = bilbo.experiment_handler.runTrajectories(trajectories, signals=[signal])
+    bilbo.board.beep()
 
-            estimate_system_and_lifted_matrix()
+    inputs, outputs = [], []
+    for input, data in zip(learning_inputs, results):
+        if data is None:
+            continue
+        output = np.asarray(data['output'][signal], dtype=float)[:len(input)]
+        inputs.append(input[:len(output)])
+        outputs.append(output)
 
-        data = bilbo.experiment_handler.runTrajectory(trajectory, signals='lowlevel.estimation.state.theta')
-        learning_outputs.append(np.asarray(data['output']['lowlevel.estimation.state.theta']))
-        bilbo.board.beep()
+    if not inputs:
+        logger.warning("No trial could be run")
+        return None
 
+    result = identify(inputs, outputs, fir_length=fir_length, lifted_size=len(t_vector), order=order,
+                      dt=LOOP_TIME_CONTROL)
+    logger.info(f"Identified a model of order {result.model.order} from {len(inputs)} trials "
+                f"(fit: {result.fit:.1f} %)")
+    return result
@@ -1,5 +1,7 @@
 import numpy as np
 
+from core.utils.system_identification import estimate_fir, lifted_matrix
+
 
 def estimate_system_and_lifted_matrix(u_list, y_list, L):
     """
@@ -24,31 +26,10 @@ def estimate_system_and_lifted_matrix(u_list, y_list, L):
           The lifted system matrix where:
               P[i, j] = h[i - j] for i >= j, and 0 otherwise.
     """
-    # Build a big regression problem from all trajectories.
-    U_big = []
-    Y_big = []
-
-    for u, y in zip(u_list, y_list):
-        T = len(u)
-        # For each time step t in this trajectory,
-        # form a row [u[t], u[t-1], ..., u[t-L+1]]
-        for t in range(T):
-            # Use 0 for indices t-k < 0 (causality)
-            row = [u[t - k] if t - k >= 0 else 0 for k in range(L)]
-            U_big.append(row)
-            Y_big.append(y[t])
-
-    U_big = np.array(U_big)
-    Y_big = np.array(Y_big)
-
-    # Solve the linear least squares problem U_big * h = Y_big
-    h, residuals, rank, s = np.linalg.lstsq(U_big, Y_big, rcond=None)
+    h = estimate_fir(u_list, y_list, L)
 
     # Build the lifted system matrix P (L x L lower-triangular Toeplitz matrix)
-    P = np.zeros((L, L))
-    for i in range(L):
-        for j in range(i + 1):  # Only fill entries for which i >= j.
-            P[i, j] = h[i - j]
+    P = lifted_matrix(h, L)
 
     return h, P
 
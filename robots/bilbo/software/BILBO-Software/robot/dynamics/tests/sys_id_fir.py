@@ -1,6 +1,8 @@
 import numpy as np
 import matplotlib.pyplot as plt
 
+from core.utils.system_identification import estimate_fir, lifted_matrix
+
 
 def system_identification(u_list, y_list, max_L=50, threshold=1e-3):
     """
@@ -28,22 +30,8 @@ def system_identification(u_list, y_list, max_L=50, threshold=1e-3):
       L_eff: int
           The effective impulse response length.
     """
-    # Build the regression problem by stacking all the data.
-    U_big = []
-    Y_big = []
-    for u, y in zip(u_list, y_list):
-        T = len(u)
-        for t in range(T):
-            # Create row: [u[t], u[t-1], ..., u[t-max_L+1]] (using 0 for negative indices)
-            row = [u[t - k] if t - k >= 0 else 0 for k in range(max_L)]
-            U_big.append(row)
-            Y_big.append(y[t])
-
-    U_big = np.array(U_big)
-    Y_big = np.array(Y_big)
-
-    # Solve the least squares problem U_big * h = Y_big to get a full impulse response estimate.
-    h_full, residuals, rank, s = np.linalg.lstsq(U_big, Y_big, rcond=None)
+    # Least squares estimate of the full impulse response from all trajectories.
+    h_full = estimate_fir(u_list, y_list, max_L)
 
     # Determine the effective impulse response length L_eff:
     h_abs = np.abs(h_full)
@@ -83,15 +71,8 @@ def compute_P_from_tf(tf, P_size):
     """
     num, den = tf  # For an FIR model, den should be [1.0] and num is the impulse response.
     h = num
-    L = len(h)
-
-    P = np.zeros((P_size, P_size))
-    for i in range(P_size):
-        for j in range(i + 1):
-            k = i - j  # Index difference, corresponds to the impulse response delay.
-            if k < L:
-                P[i, j] = h[k]
-            # else: remains 0
+
+    P = lifted_matrix(h, P_size)
     return P
 
 
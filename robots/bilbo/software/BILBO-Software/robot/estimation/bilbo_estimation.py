@@ -1,13 +1,25 @@
+import collections
 import ctypes
 import dataclasses
 import enum
+import threading
+
+import numpy as np
 
 import robot.lowlevel.stm32_addresses as addresses
 from robot.communication.bilbo_communication import BILBO_Communication
+from robot.estimation.bilbo_state_filter import BILBO_StateFilter, ESTIMATE_FIELDS, STATE_FILTERS, WHEEL_GEOMETRY
 from robot.hardware import get_hardware_definition
-from robot.lowlevel.stm32_sample import BILBO_LL_Sample
+from core.communication.wifi.data_link import CommandArgument
+from core.utils.callbacks import callback_definition, CallbackContainer
 from core.utils.logging_utils import Logger
 
+# Batches of estimates that are kept for the logging, by the tick of their last sample
+ESTIMATE_BATCHES_KEPT = 20
+
+# Batches over which the offset between the global time and the low-level time is estimated
+TIME_OFFSET_WINDOW = 100
+
 
 @dataclasses.dataclass
 class TWIPR_Estimation_State:
@@ -38,32 +50,122 @@ class TWIPR_Estimation_Sample:
 
 
 # ======================================================================================================================
+@callback_definition
+class BILBO_Estimation_Callbacks:
+    estimates: CallbackContainer  # Estimates of every low-level sample of a batch
+
 
 class BILBO_Estimation:
+    """
+    Onboard state estimation. Every batch of low-level samples is processed by a BILBO_StateFilter as soon as it
+    is read over SPI, so an estimate is available for every low-level sample. The estimates are logged at the
+    full rate and passed to the estimates callbacks. The state is the estimate of the latest sample.
+
+    External poses (x, y, psi) can be fused with the setExternalPose command. Their timestamps are global times
+    (the synchronized time of the Wi-Fi interface) and are converted to low-level times with the offset between
+    both clocks, estimated from the arrival times of the batches.
+    """
     _comm: BILBO_Communication
 
     state: TWIPR_Estimation_State
     status: TWIPR_Estimation_Status
 
     mode: TWIPR_Estimation_Mode
+    filter: BILBO_StateFilter
+    callbacks: BILBO_Estimation_Callbacks
 
-    def __init__(self, comm: BILBO_Communication):
+    def __init__(self, comm: BILBO_Communication, filter_config: dict = None):
         self._comm = comm
+        self.filter_config = filter_config if filter_config is not None else {}
 
         self.state = TWIPR_Estimation_State()
         self.status = TWIPR_Estimation_Status.NORMAL
         self.mode = TWIPR_Estimation_Mode.TWIPR_ESTIMATION_MODE_VEL
-        self._comm.callbacks.rx_stm32_sample.register(self._onSample)
+        self.filter = BILBO_StateFilter(self.filter_config)
+        self.callbacks = BILBO_Estimation_Callbacks()
+
+        self._estimates = collections.OrderedDict()
+        self._time_offsets = collections.deque(maxlen=TIME_OFFSET_WINDOW)
+        self._lock = threading.Lock()
+
+        self._comm.spi.callbacks.rx_samples.register(self._onSamples)
+
+        self._comm.wifi.addCommand(
+            identifier='setExternalPose',
+            callback=self.setExternalPose,
+            arguments=[CommandArgument(name='x', type=float, optional=False, description='x in m'),
+                       CommandArgument(name='y', type=float, optional=False, description='y in m'),
+                       CommandArgument(name='psi', type=float, optional=False, description='Yaw in rad'),
+                       CommandArgument(name='time', type=float, optional=True, default=None,
+                                       description='Global time of the measurement. Now if not given')],
+            description='Fuse an external pose measurement, e.g. from motion capture'
+        )
+        self._comm.wifi.addCommand(
+            identifier='setEstimationFilter',
+            callback=self.setFilter,
+            arguments=[CommandArgument(name='filter', type=str, optional=False,
+                                       description=f'One of {", ".join(STATE_FILTERS)}')],
+            description='Select the filter of the onboard estimation'
+        )
+        self._comm.wifi.addCommand(
+            identifier='resetEstimation',
+            callback=self.reset,
+            arguments=[CommandArgument(name='x', type=float, optional=True, default=0.0, description='x in m'),
+                       CommandArgument(name='y', type=float, optional=True, default=0.0, description='y in m'),
+                       CommandArgument(name='psi', type=float, optional=True, default=0.0,
+                                       description='Yaw in rad')],
+            description='Reset the onboard estimation to the given pose'
+        )
 
         self.logger = Logger('Estimation')
         self.logger.setLevel('DEBUG')
 
     # ==================================================================================================================
     def init(self):
-        hardware_definition = get_hardware_definition()
+        hardware_definition = get_hardware_definition() or {}
         theta_offset = hardware_definition.get('settings', {}).get('theta_offset', 0.0)
         self.setThetaOffset(theta_offset)
 
+        model = hardware_definition.get('model', {}).get('type', 'normal')
+        if model not in WHEEL_GEOMETRY:
+            self.logger.warning(f"No wheel geometry for model {model}. Using the normal model")
+            model = 'normal'
+        self.filter = BILBO_StateFilter({'model': model, 'theta_offset': theta_offset, **self.filter_config})
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def setFilter(self, filter: str) -> bool:
+        if filter not in STATE_FILTERS:
+            self.logger.warning(f"Unknown estimation filter {filter}")
+            return False
+        self.filter.setFilter(filter)
+        self.logger.info(f"Estimation filter: {filter}")
+        return True
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def reset(self, x: float = 0.0, y: float = 0.0, psi: float = 0.0):
+        self.filter.reset(x, y, psi)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def setExternalPose(self, x: float, y: float, psi: float, time: float = None) -> bool:
+        """
+        Fuses a pose measured at the given global time. Poses older than the history of the filter are rejected.
+        """
+        if time is None:
+            time = self._comm.wifi.getTime()
+        with self._lock:
+            if not self._time_offsets:
+                return False
+            time_offset = min(self._time_offsets)
+        return self.filter.fusePose(x, y, psi, time - time_offset)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def getBatchEstimates(self, tick: int) -> (np.ndarray, None):
+        """
+        Estimates of the batch whose last low-level sample has the given tick, if it is still kept.
+        """
+        with self._lock:
+            return self._estimates.get(tick)
+
     # ------------------------------------------------------------------------------------------------------------------
     def getSample(self) -> TWIPR_Estimation_Sample:
         # sample = TWIPR_Estimation_Sample(
@@ -100,19 +202,21 @@ class BILBO_Estimation:
         # )
 
     # ==================================================================================================================
-    def _update(self):
-        ...
-
-    # ------------------------------------------------------------------------------------------------------------------
-    def _onSample(self, sample: BILBO_LL_Sample, *args, **kwargs):
-        self.state.v = sample.estimation.state.v
-        self.state.theta = sample.estimation.state.theta
-        self.state.theta_dot = sample.estimation.state.theta_dot
-        self.state.psi = sample.estimation.state.psi
-        self.state.psi_dot = sample.estimation.state.psi_dot
-
-    # ------------------------------------------------------------------------------------------------------------------
-    def _readState_LL(self):
-        ...
-
-    # ------------------------------------------------------------------------------------------------------------------
+    def _onSamples(self, samples: np.ndarray, *args, **kwargs):
+        time_received = self._comm.wifi.getTime()
+        estimates = self.filter.process(samples)
+        if len(estimates) == 0:
+            return
+
+        latest = estimates[-1]
+        for name in ESTIMATE_FIELDS:
+            setattr(self.state, name, float(latest[name]))
+
+        with self._lock:
+            # The batch arrives some time after its last sample. The smallest offset has the least delay.
+            self._time_offsets.append(time_received - float(latest['time']))
+            self._estimates[int(latest['tick'])] = estimates
+            while len(self._estimates) > ESTIMATE_BATCHES_KEPT:
+                self._estimates.popitem(last=False)
+
+        self.callbacks.estimates.call(estimates)
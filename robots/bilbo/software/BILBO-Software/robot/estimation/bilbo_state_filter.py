@@ -0,0 +1,383 @@
+import threading
+
+import numpy as np
+from scipy.signal import lfilter
+
+from robot.lowlevel.stm32_general import LOOP_TIME_CONTROL
+from core.utils.ring_buffer import StructuredRingBuffer
+
+# Wheel geometry of the models, as in the low-level firmware (twipr_model.h)
+WHEEL_GEOMETRY = {
+    'normal': {'wheel_diameter': 0.12381, 'wheel_distance': 0.167167},
+    'small': {'wheel_diameter': 0.099, 'wheel_distance': 0.157},
+    'big': {'wheel_diameter': 0.15736, 'wheel_distance': 0.24},
+}
+
+GRAVITY = 9.81
+
+# Filters of the pitch and yaw estimation:
+#   complementary: pitch from the gyroscope, corrected by the accelerometer with the time constant tau_theta.
+#                  Pose updates correct a fixed fraction (pose_gain) of the error.
+#   ekf:           Kalman filter of pitch and gyroscope bias and extended Kalman filter of the planar pose.
+#   lowlevel:      The estimate of the low-level firmware, extended by the integrated planar pose.
+STATE_FILTERS = ('complementary', 'ekf', 'lowlevel')
+
+# Estimate of every low-level sample
+ESTIMATE_FIELDS = ('x', 'y', 'v', 'theta', 'theta_dot', 'psi', 'psi_dot')
+ESTIMATE_DTYPE = np.dtype([('tick', np.int64), ('time', np.float64)]
+                          + [(name, np.float64) for name in ESTIMATE_FIELDS])
+
+# Samples that are kept to fuse delayed pose updates. P is the covariance of the planar pose (x, y, psi).
+_HISTORY_DTYPE = np.dtype(ESTIMATE_DTYPE.descr + [('P', np.float64, (3, 3))])
+
+default_filter_config = {
+    'filter': 'complementary',
+    'model': 'normal',
+    'theta_offset': 0.0,  # Added to the pitch from the accelerometer, like the offset of the low-level estimation
+    'sample_time': LOOP_TIME_CONTROL,
+    'tau_theta': 0.5,  # Complementary filter: time constant of the accelerometer correction in s
+    'yaw_rate_gyro_weight': 0.0,  # Share of gyr.z in the yaw rate. The rest is taken from the wheel speeds
+    'gyro_noise': 0.02,  # rad/s
+    'gyro_bias_noise': 0.001,  # rad/s/sqrt(s)
+    'acc_theta_noise': 0.05,  # rad, pitch from the accelerometer at rest
+    'velocity_noise': 0.05,  # m/s
+    'yaw_rate_noise': 0.05,  # rad/s
+    'pose_position_noise': 0.01,  # m
+    'pose_yaw_noise': 0.02,  # rad
+    'pose_gain': 0.5,  # Complementary filter: share of the pose error that is corrected by a pose update
+    'history': 1.0,  # Maximum delay of a pose update in s
+}
+
+
+# ======================================================================================================================
+def _column(samples, path: str) -> np.ndarray:
+    """
+    Signal of a batch of low-level samples. The batch can be a structured array of the STM32 struct, its flat
+    variant ('sensors.acc.x') or records or columns of the log ('lowlevel.sensors.acc.x'). The log also has
+    high-level signals with the same paths (e.g. 'estimation.state.v'), so the low-level ones are preferred.
+    """
+    names = samples.dtype.names if isinstance(samples, np.ndarray) else samples.keys()
+    for name in (f"lowlevel.{path}", path):
+        if name in names:
+            return np.asarray(samples[name], dtype=np.float64)
+    value = samples['lowlevel'] if 'lowlevel' in names else samples
+    for key in path.split('.'):
+        value = value[key]
+    return np.asarray(value, dtype=np.float64)
+
+
+def ll_inputs(samples) -> dict:
+    """
+    The signals of a batch of low-level samples that are used by the filters.
+    """
+    return {
+        'tick': _column(samples, 'general.tick').astype(np.int64),
+        'gyr_x': _column(samples, 'sensors.gyr.x'),
+        'gyr_z': _column(samples, 'sensors.gyr.z'),
+        'acc_x': _column(samples, 'sensors.acc.x'),
+        'acc_y': _column(samples, 'sensors.acc.y'),
+        'acc_z': _column(samples, 'sensors.acc.z'),
+        'speed_left': _column(samples, 'sensors.speed_left'),
+        'speed_right': _column(samples, 'sensors.speed_right'),
+        'theta_ll': _column(samples, 'estimation.state.theta'),
+        'theta_dot_ll': _column(samples, 'estimation.state.theta_dot'),
+        'v_ll': _column(samples, 'estimation.state.v'),
+        'psi_dot_ll': _column(samples, 'estimation.state.psi_dot'),
+    }
+
+
+def _wrap(angle):
+    return (angle + np.pi) % (2 * np.pi) - np.pi
+
+
+# ======================================================================================================================
+class BILBO_StateFilter:
+    """
+    Estimation of pitch, velocity, yaw and planar position from batches of low-level samples.
+
+    Every batch is processed at once: the complementary filter and the propagation of the planar pose run as
+    vectorized recursions over the batch, only the Kalman filters step through the samples. The estimate of every
+    sample is returned, so the estimates have the full low-level rate.
+
+    Pose updates, e.g. from a motion capture system, can arrive with a delay. They are fused at the sample they
+    were measured at, and the samples after it are propagated again with their stored velocity and yaw rate.
+    Times are low-level times (tick * sample_time).
+    """
+    config: dict
+    history: StructuredRingBuffer
+
+    def __init__(self, config: dict = None):
+        if config is None:
+            config = {}
+        self.config = {**default_filter_config, **config}
+        if self.config['filter'] not in STATE_FILTERS:
+            raise ValueError(f"Unknown filter {self.config['filter']}")
+
+        self.dt = self.config['sample_time']
+        geometry = WHEEL_GEOMETRY[self.config['model']]
+        self.wheel_radius = self.config.get('wheel_diameter', geometry['wheel_diameter']) / 2
+        self.wheel_distance = self.config.get('wheel_distance', geometry['wheel_distance'])
+
+        self.history = StructuredRingBuffer(_HISTORY_DTYPE, max(1, round(self.config['history'] / self.dt)))
+        self._lock = threading.Lock()
+        self.reset()
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @property
+    def filter(self) -> str:
+        return self.config['filter']
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def setFilter(self, filter: str):
+        if filter not in STATE_FILTERS:
+            raise ValueError(f"Unknown filter {filter}")
+        with self._lock:
+            self.config['filter'] = filter
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def reset(self, x: float = 0.0, y: float = 0.0, psi: float = 0.0):
+        with self._lock:
+            self.history.clear()
+            self._theta = None  # Initialized with the first batch
+            self._theta_P = np.diag([self.config['acc_theta_noise'] ** 2, 0.01 ** 2])
+            self._gyro_bias = 0.0
+            self._pose = np.array([x, y, psi], dtype=np.float64)
+            self._pose_P = np.diag([self.config['pose_position_noise'] ** 2] * 2
+                                   + [self.config['pose_yaw_noise'] ** 2])
+            self.pose_updates = 0
+            self.rejected_pose_updates = 0
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def process(self, samples) -> np.ndarray:
+        """
+        Estimates of a batch of low-level samples (structured array of the STM32 struct or records of the log).
+        """
+        return self.processInputs(ll_inputs(samples))
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def processInputs(self, inputs: dict) -> np.ndarray:
+        n = len(inputs['tick'])
+        estimates = np.zeros(n, dtype=ESTIMATE_DTYPE)
+        if n == 0:
+            return estimates
+        estimates['tick'] = inputs['tick']
+        estimates['time'] = inputs['tick'] * self.dt
+
+        with self._lock:
+            filter = self.config['filter']
+            if filter == 'lowlevel':
+                theta, theta_dot = inputs['theta_ll'], inputs['theta_dot_ll']
+                v, psi_dot = inputs['v_ll'], inputs['psi_dot_ll']
+            else:
+                if filter == 'complementary':
+                    theta, theta_dot = self._pitchComplementary(inputs)
+                else:
+                    theta, theta_dot = self._pitchKalman(inputs)
+                v, psi_dot = self._odometry(inputs, theta_dot)
+
+            estimates['theta'] = theta
+            estimates['theta_dot'] = theta_dot
+            estimates['v'] = v
+            estimates['psi_dot'] = psi_dot
+
+            pose, covariances = self._propagatePose(self._pose, self._pose_P, v, psi_dot,
+                                                    with_covariance=filter == 'ekf')
+            estimates['x'], estimates['y'], estimates['psi'] = pose[:, 0], pose[:, 1], pose[:, 2]
+            self._pose = pose[-1].copy()
+            if covariances is not None:
+                self._pose_P = covariances[-1].copy()
+
+            history = np.zeros(n, dtype=_HISTORY_DTYPE)
+            for name in ESTIMATE_DTYPE.names:
+                history[name] = estimates[name]
+            history['P'] = covariances if covariances is not None else self._pose_P
+            self.history.append(history)
+
+        return estimates
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def fusePose(self, x: float, y: float, psi: float, time: float) -> bool:
+        """
+        Fuses a measured planar pose taken at the given low-level time. Returns False if the measurement is older
+        than the kept history.
+        """
+        measurement = np.array([x, y, psi], dtype=np.float64)
+        with self._lock:
+            if self.history.count == 0:
+                self._pose = measurement
+                return True
+
+            index = self.history.search('time', time + self.dt / 2) - 1
+            if index < self.history.first_index:
+                self.rejected_pose_updates += 1
+                return False
+
+            positions = np.arange(index, self.history.count) % self.history.size
+            records = self.history.data[positions]
+
+            pose = np.array([records['x'][0], records['y'][0], records['psi'][0]])
+            error = measurement - pose
+            error[2] = _wrap(error[2])
+
+            if self.config['filter'] == 'ekf':
+                P = records['P'][0]
+                R = np.diag([self.config['pose_position_noise'] ** 2] * 2 + [self.config['pose_yaw_noise'] ** 2])
+                K = P @ np.linalg.inv(P + R)
+                pose = pose + K @ error
+                P = (np.eye(3) - K) @ P
+            else:
+                pose = pose + self.config['pose_gain'] * error
+                P = records['P'][0]
+
+            # Propagate the corrected pose over the samples after the measurement
+            if len(records) > 1:
+                propagated, covariances = self._propagatePose(pose, P, records['v'][1:], records['psi_dot'][1:],
+                                                              with_covariance=self.config['filter'] == 'ekf')
+                poses = np.vstack([pose, propagated])
+                covariances = (np.concatenate([P[None], covariances]) if covariances is not None
+                               else np.broadcast_to(P, (len(records), 3, 3)))
+            else:
+                poses = pose[None]
+                covariances = P[None]
+
+            self.history.data['x'][positions] = poses[:, 0]
+            self.history.data['y'][positions] = poses[:, 1]
+            self.history.data['psi'][positions] = poses[:, 2]
+            self.history.data['P'][positions] = covariances
+            self._pose = poses[-1].copy()
+            self._pose_P = covariances[-1].copy()
+            self.pose_updates += 1
+        return True
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def latest(self) -> (dict, None):
+        with self._lock:
+            record = self.history.latest()
+            if record is None:
+                return None
+            return {name: float(record[name]) for name in ESTIMATE_FIELDS}
+
+    # === PRIVATE METHODS ==============================================================================================
+    def _pitchFromAcc(self, inputs: dict) -> np.ndarray:
+        return np.arctan2(inputs['acc_y'], inputs['acc_z']) + self.config['theta_offset']
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _pitchComplementary(self, inputs: dict) -> tuple[np.ndarray, np.ndarray]:
+        """
+        theta[k] = a * (theta[k-1] + gyr_x[k] * dt) + (1 - a) * theta_acc[k], as one first-order recursion.
+        """
+        theta_acc = self._pitchFromAcc(inputs)
+        theta_dot = inputs['gyr_x']
+        if self._theta is None:
+            self._theta = float(theta_acc[0])
+
+        a = self.config['tau_theta'] / (self.config['tau_theta'] + self.dt)
+        theta, _ = lfilter([1.0], [1.0, -a], a * theta_dot * self.dt + (1 - a) * theta_acc, zi=[a * self._theta])
+        self._theta = float(theta[-1])
+        return theta, theta_dot
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _pitchKalman(self, inputs: dict) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Kalman filter of the pitch and the bias of gyr.x. The accelerometer is trusted less the more its norm
+        differs from gravity.
+        """
+        theta_acc = self._pitchFromAcc(inputs)
+        acc_norm = np.sqrt(inputs['acc_x'] ** 2 + inputs['acc_y'] ** 2 + inputs['acc_z'] ** 2)
+        R = self.config['acc_theta_noise'] ** 2 * (1 + ((acc_norm - GRAVITY) / (0.1 * GRAVITY)) ** 2)
+        gyr = inputs['gyr_x']
+        dt = self.dt
+        q_theta = (self.config['gyro_noise'] * dt) ** 2
+        q_bias = self.config['gyro_bias_noise'] ** 2 * dt
+
+        if self._theta is None:
+            self._theta = float(theta_acc[0])
+        theta, bias = self._theta, self._gyro_bias
+        (p00, p01), (_, p11) = self._theta_P
+
+        n = len(gyr)
+        theta_out = np.empty(n)
+        bias_out = np.empty(n)
+        for k in range(n):
+            # Prediction with F = [[1, -dt], [0, 1]]
+            theta += (gyr[k] - bias) * dt
+            p00 = p00 - dt * (2 * p01 - dt * p11) + q_theta
+            p01 = p01 - dt * p11
+            p11 = p11 + q_bias
+
+            # Update with the pitch from the accelerometer, H = [1, 0]
+            s = p00 + R[k]
+            k0, k1 = p00 / s, p01 / s
+            innovation = theta_acc[k] - theta
+            theta += k0 * innovation
+            bias += k1 * innovation
+            p00, p01, p11 = (1 - k0) * p00, (1 - k0) * p01, p11 - k1 * p01
+
+            theta_out[k] = theta
+            bias_out[k] = bias
+
+        self._theta, self._gyro_bias = theta, bias
+        self._theta_P = np.array([[p00, p01], [p01, p11]])
+        return theta_out, gyr - bias_out
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _odometry(self, inputs: dict, theta_dot: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Velocity and yaw rate from the wheel speeds. The wheel speeds are relative to the body, so the pitch rate
+        is added, as in the low-level estimation.
+        """
+        speed_left = inputs['speed_left'] + theta_dot
+        speed_right = inputs['speed_right'] + theta_dot
+        v = (speed_left + speed_right) / 2 * self.wheel_radius
+        psi_dot_wheels = (speed_right - speed_left) * self.wheel_radius / self.wheel_distance
+        weight = self.config['yaw_rate_gyro_weight']
+        psi_dot = weight * inputs['gyr_z'] + (1 - weight) * psi_dot_wheels if weight else psi_dot_wheels
+        return v, psi_dot
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _propagatePose(self, pose: np.ndarray, P: np.ndarray, v: np.ndarray, psi_dot: np.ndarray,
+                       with_covariance: bool) -> tuple[np.ndarray, (np.ndarray, None)]:
+        """
+        Integrates the planar pose over the samples (explicit Euler, the heading of the previous sample moves the
+        position). Returns the pose after every sample and, for the EKF, the covariance after every sample.
+        """
+        dt = self.dt
+        psi = pose[2] + np.cumsum(psi_dot) * dt
+        heading = np.concatenate([[pose[2]], psi[:-1]])
+        cos, sin = np.cos(heading), np.sin(heading)
+        x = pose[0] + np.cumsum(v * cos) * dt
+        y = pose[1] + np.cumsum(v * sin) * dt
+        poses = np.column_stack((x, y, _wrap(psi)))
+
+        if not with_covariance:
+            return poses, None
+
+        q_v = (self.config['velocity_noise'] * dt) ** 2
+        q_psi = (self.config['yaw_rate_noise'] * dt) ** 2
+        covariances = np.empty((len(v), 3, 3))
+        F = np.eye(3)
+        for k in range(len(v)):
+            F[0, 2] = -v[k] * sin[k] * dt
+            F[1, 2] = v[k] * cos[k] * dt
+            G = np.array([[cos[k], 0.0], [sin[k], 0.0], [0.0, 1.0]])
+            P = F @ P @ F.T + G @ np.diag([q_v, q_psi]) @ G.T
+            covariances[k] = P
+        return poses, covariances
+
+
+# ======================================================================================================================
+def run_filter_offline(samples, config: dict = None, batch_size: int = 10) -> np.ndarray:
+    """
+    Runs the filter over logged low-level samples in batches like the ones that arrive over SPI, e.g. over the
+    records of a log file.
+
+    Returns:
+        np.ndarray: Estimates of all samples (ESTIMATE_DTYPE).
+    """
+    state_filter = BILBO_StateFilter(config)
+    inputs = ll_inputs(samples)
+    n = len(inputs['tick'])
+    estimates = [state_filter.processInputs({name: values[start:start + batch_size]
+                                             for name, values in inputs.items()})
+                 for start in range(0, n, batch_size)]
+    return np.concatenate(estimates) if estimates else np.zeros(0, dtype=ESTIMATE_DTYPE)
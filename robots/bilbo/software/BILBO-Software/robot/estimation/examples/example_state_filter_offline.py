@@ -0,0 +1,118 @@
+"""
+Runs the onboard state filters offline over batches of low-level samples, like the ones that arrive over SPI.
+
+Without an argument, the samples are simulated: a robot driving a circle while pitching, with noisy IMU signals and
+a slightly miscalibrated right wheel. The pose is corrected by motion capture poses at 50 Hz that arrive 40 ms after
+they were measured. With the path of a log file, the filters are run over its low-level records and compared to the
+estimation of the low-level controller.
+
+Run from the BILBO-Software directory:
+    python -m robot.estimation.examples.example_state_filter_offline [log.h5]
+"""
+import sys
+import time
+
+import numpy as np
+
+from robot.estimation.bilbo_state_filter import (BILBO_StateFilter, STATE_FILTERS, WHEEL_GEOMETRY, run_filter_offline,
+                                                 ll_inputs)
+from robot.lowlevel.stm32_sample import bilbo_ll_sample_dtype
+
+DT = 0.01
+BATCH_SIZE = 10
+MOCAP_DECIMATION = 2
+MOCAP_DELAY = 4  # Samples
+
+
+def wrap(angle):
+    return (angle + np.pi) % (2 * np.pi) - np.pi
+
+
+def simulate(num_samples: int, rng) -> (np.ndarray, dict):
+    t = np.arange(num_samples) * DT
+    theta = 0.1 * np.sin(2 * np.pi * 0.5 * t)
+    theta_dot = np.gradient(theta, DT)
+    v = np.full(num_samples, 0.3)
+    psi_dot = np.full(num_samples, 0.2)
+
+    r = WHEEL_GEOMETRY['normal']['wheel_diameter'] / 2
+    d = WHEEL_GEOMETRY['normal']['wheel_distance']
+
+    samples = np.zeros(num_samples, dtype=bilbo_ll_sample_dtype)
+    samples['general']['tick'] = np.arange(num_samples)
+    samples['sensors']['gyr']['x'] = theta_dot + 0.02 + 0.01 * rng.normal(size=num_samples)
+    samples['sensors']['gyr']['z'] = psi_dot + 0.01 * rng.normal(size=num_samples)
+    samples['sensors']['acc']['y'] = 9.81 * np.sin(theta) + 0.3 * rng.normal(size=num_samples)
+    samples['sensors']['acc']['z'] = 9.81 * np.cos(theta) + 0.3 * rng.normal(size=num_samples)
+    speed_sum = 2 * v / r - 2 * theta_dot
+    speed_diff = psi_dot * d / r
+    samples['sensors']['speed_right'] = (speed_sum + speed_diff) / 2 * 1.02
+    samples['sensors']['speed_left'] = (speed_sum - speed_diff) / 2
+
+    psi = np.cumsum(psi_dot) * DT
+    heading = np.r_[0, psi[:-1]]
+    truth = {
+        'theta': theta,
+        'v': v,
+        'x': np.cumsum(v * np.cos(heading)) * DT,
+        'y': np.cumsum(v * np.sin(heading)) * DT,
+        'psi': wrap(psi),
+    }
+    return samples, truth
+
+
+def run_simulated():
+    rng = np.random.default_rng(1)
+    num_samples = 3000
+    samples, truth = simulate(num_samples, rng)
+
+    for filter in ('complementary', 'ekf'):
+        state_filter = BILBO_StateFilter({'filter': filter})
+        pending = []
+        estimates = []
+        time_start = time.perf_counter()
+        for start in range(0, num_samples, BATCH_SIZE):
+            estimates.append(state_filter.process(samples[start:start + BATCH_SIZE]))
+            for index in range(start, start + BATCH_SIZE, MOCAP_DECIMATION):
+                pending.append((index, truth['x'][index] + 0.005 * rng.normal(),
+                                truth['y'][index] + 0.005 * rng.normal(), truth['psi'][index]))
+            while pending and pending[0][0] <= start + BATCH_SIZE - 1 - MOCAP_DELAY:
+                index, x, y, psi = pending.pop(0)
+                state_filter.fusePose(x, y, psi, index * DT)
+        time_batch = (time.perf_counter() - time_start) / (num_samples / BATCH_SIZE)
+        estimates = np.concatenate(estimates)
+
+        settled = slice(500, None)
+        theta_rms = np.sqrt(np.mean((estimates['theta'][settled] - truth['theta'][settled]) ** 2))
+        pose_error = np.max(np.hypot(estimates['x'][settled] - truth['x'][settled],
+                                     estimates['y'][settled] - truth['y'][settled]))
+        print(f"{filter:>13}: theta rms {np.rad2deg(theta_rms):.3f} deg, max pose error {pose_error * 100:.2f} cm, "
+              f"{state_filter.pose_updates} poses fused, {time_batch * 1e3:.3f} ms per batch")
+
+    dead_reckoning = run_filter_offline(samples, {'filter': 'complementary'})
+    pose_error = np.hypot(dead_reckoning['x'][-1] - truth['x'][-1], dead_reckoning['y'][-1] - truth['y'][-1])
+    print(f"Without motion capture, the pose is off by {pose_error * 100:.1f} cm after {num_samples * DT:g} s")
+
+
+def run_log(filename: str):
+    from core.utils.h5 import H5SampleReader
+
+    with H5SampleReader(filename) as reader:
+        records = reader.read(reader.resolve('lowlevel'))
+
+    reference = ll_inputs(records)
+    for filter in STATE_FILTERS:
+        time_start = time.perf_counter()
+        estimates = run_filter_offline(records, {'filter': filter}, batch_size=BATCH_SIZE)
+        duration = time.perf_counter() - time_start
+        theta_rms = np.sqrt(np.mean((estimates['theta'] - reference['theta_ll']) ** 2))
+        v_rms = np.sqrt(np.mean((estimates['v'] - reference['v_ll']) ** 2))
+        print(f"{filter:>13}: theta rms to low-level {np.rad2deg(theta_rms):.3f} deg, "
+              f"v rms {v_rms:.3f} m/s, {len(estimates)} samples in {duration:.2f} s")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        run_log(sys.argv[1])
+    else:
+        run_simulated()
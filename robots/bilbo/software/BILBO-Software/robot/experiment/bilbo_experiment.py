@@ -1,17 +1,21 @@
 import ctypes
 import dataclasses
 import enum
+import threading
 import time
 from typing import Any, cast
 from numpy.core.defchararray import isnumeric
 
+import numpy as np
+
 # ======================================================================================================================
 from robot.communication.bilbo_communication import BILBO_Communication
 from robot.communication.serial.bilbo_serial_messages import BILBO_Sequencer_Event_Message
 from robot.control.bilbo_control import BILBO_Control
 from robot.control.bilbo_control_data import BILBO_Control_Mode
 from robot.lowlevel.stm32_general import MAX_STEPS_TRAJECTORY, LOOP_TIME_CONTROL
-from robot.lowlevel.stm32_sequencer import bilbo_sequence_input_t, bilbo_sequence_description_t, BILBO_Sequence_LL
+from robot.lowlevel.stm32_sequencer import bilbo_sequence_input_t, bilbo_sequence_description_t, BILBO_Sequence_LL, \
+    bilbo_sequence_input_dtype
 import robot.lowlevel.stm32_addresses as addresses
 from robot.utilities.bilbo_utilities import BILBO_Utilities
 from core.utils.callbacks import callback_definition, CallbackContainer
@@ -51,7 +55,7 @@ class BILBO_Trajectory:
     id: int
     name: str
     length: int
-    inputs: dict[int, BILBO_TrajectoryInput]
+    inputs: (dict[int, BILBO_TrajectoryInput], np.ndarray)  # Dict of inputs or an array of shape (length, 2)
     control_mode: BILBO_Control_Mode
     control_mode_end: BILBO_Control_Mode
 
@@ -64,6 +68,41 @@ class BILBO_Trajectory:
 
 # TODO: ADD OUTPUTS TO THE TRAJECTORY
 
+# ======================================================================================================================
+@dataclasses.dataclass
+class BILBO_PreparedTrajectory:
+    """
+    A trajectory that is already encoded for the low-level sequencer and only has to be transferred.
+    """
+    trajectory: BILBO_Trajectory
+    description: bilbo_sequence_description_t
+    input_bytes: bytes
+
+
+class BILBO_TrajectoryRun:
+    """
+    State of one trajectory on the low-level sequencer. The events are set by the sequencer event callback. Since
+    every run has its own events, waiting for a run cannot be satisfied by an earlier event of a trajectory with the
+    same id.
+    """
+    trajectory: BILBO_Trajectory
+    loaded: threading.Event
+    started: threading.Event
+    finished: threading.Event  # Also set if the trajectory is aborted
+    aborted: bool
+    start_tick: int
+    end_tick: int
+
+    def __init__(self, trajectory: BILBO_Trajectory):
+        self.trajectory = trajectory
+        self.loaded = threading.Event()
+        self.started = threading.Event()
+        self.finished = threading.Event()
+        self.aborted = False
+        self.start_tick = None
+        self.end_tick = None
+
+
 # === EXPERIMENT =======================================================================================================
 class BILBO_Experiment_Type(enum.IntEnum):
     FREE = 1
@@ -103,6 +142,8 @@ class BILBO_ExperimentHandler:
 
     running: bool = False
 
+    _run: BILBO_TrajectoryRun = None  # Run that the sequencer events are assigned to
+
     def __init__(self, communication: BILBO_Communication, utils: BILBO_Utilities, control: BILBO_Control):
         self.communication = communication
         self.callbacks = BILBO_ExperimentCallbacks()
@@ -148,37 +189,57 @@ class BILBO_ExperimentHandler:
         ...
 
     # ------------------------------------------------------------------------------------------------------------------
-    def setTrajectory(self, trajectory: BILBO_Trajectory) -> bool:
-
-        logger.info(f"Loading trajectory {trajectory.id} ... ")
-
-        # First, check the trajectory length
+    def prepareTrajectory(self, trajectory: BILBO_Trajectory) -> (BILBO_PreparedTrajectory, None):
+        """
+        Checks the trajectory and encodes its description and inputs for the low-level sequencer.
+        """
         if trajectory.length != len(trajectory.inputs):
             logger.warning(f"Trajectory length does not match number of inputs. "
                            f"Trajectory length: {trajectory.length}, Number of inputs: {len(trajectory.inputs)}")
-            return False
+            return None
+
+        if trajectory.length > MAX_STEPS_TRAJECTORY:
+            logger.warning(f"Trajectory too long. Length: {trajectory.length}, Maximum: {MAX_STEPS_TRAJECTORY}")
+            return None
+
+        return BILBO_PreparedTrajectory(
+            trajectory=trajectory,
+            description=self._trajectoryDescription(trajectory),
+            input_bytes=self._trajectoryInputToBytes(trajectory.inputs),
+        )
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def setTrajectory(self, trajectory: (BILBO_Trajectory, BILBO_PreparedTrajectory)) -> bool:
+
+        if isinstance(trajectory, BILBO_PreparedTrajectory):
+            prepared = trajectory
+        else:
+            prepared = self.prepareTrajectory(trajectory)
+            if prepared is None:
+                return False
+        trajectory = prepared.trajectory
+
+        logger.info(f"Loading trajectory {trajectory.id} ... ")
+
+        # The run has to exist before anything is sent, the sequencer events can arrive right after
+        run = BILBO_TrajectoryRun(trajectory)
+        self._run = run
 
         # Load the trajectory data to the stm32
-        success = self._setTrajectoryDescription_LL(trajectory)
+        success = self._setTrajectoryDescription_LL(prepared)
 
         if not success:
             logger.warning("Failed to set trajectory")
             return False
 
         # Send the trajectory inputs via SPI
-        trajectory_bytes = self._trajectoryInputToBytes(trajectory.inputs)
-        self.communication.spi.sendTrajectoryData(trajectory.length, trajectory_bytes)
-
-        success = self.events.trajectory_loaded.wait(
-            timeout=2,
-            stale_event_time=0.2,
-            flags={'trajectory_id': trajectory.id}
-        )
+        self.communication.spi.sendTrajectoryData(trajectory.length, prepared.input_bytes)
 
-        if not success:
+        if not run.loaded.wait(timeout=2):
             logger.warning("Failed to load trajectory")
             return False
 
+        trajectory.loaded = True
         logger.info(f"Trajectory {trajectory.id} loaded!")
         # self.utils.speak(f"Trajectory {trajectory.id} loaded")
         return True
@@ -243,64 +304,110 @@ class BILBO_ExperimentHandler:
         return trajectory
 
     # ------------------------------------------------------------------------------------------------------------------
-    def runTrajectory(self, trajectory: BILBO_Trajectory, signals: (list, str) = None) -> (dict, None):
+    def runTrajectory(self, trajectory: BILBO_Trajectory, signals: (list, str) = None,
+                      send_event: bool = True) -> (dict, None):
+        results = self.runTrajectories([trajectory], signals=signals, send_event=send_event)
+        return results[0] if results else None
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def runTrajectories(self, trajectories: list[BILBO_Trajectory], signals: (list, str) = None,
+                        send_event: bool = True) -> list:
+        """
+        Runs the trajectories back to back.
+
+        While a trajectory runs, the next one is already encoded. As soon as the sequencer reports the end of a
+        trajectory, the next one is transferred and started, and the output of the finished one is read from the
+        log while the next one runs. The pipeline stops at the first trajectory that fails.
+
+        If send_event is True, the input and output of every trajectory are sent as a 'trajectory' event via Wi-Fi.
 
+        Returns:
+            list: The output data of every finished trajectory (None if its output could not be read).
+        """
         if signals is not None and not isinstance(signals, list):
             signals = [signals]
 
-        logger.info(f"Running trajectory {trajectory.id} ...")
+        results = []
+        finished_run = None
+        prepared = self.prepareTrajectory(trajectories[0]) if trajectories else None
 
-        # Set the trajectory data in the LL Module
-        success = self.setTrajectory(trajectory)
+        for i, trajectory in enumerate(trajectories):
+            logger.info(f"Running trajectory {trajectory.id} ...")
+            run = self._startRun(prepared) if prepared is not None else None
 
-        if not success:
-            logger.warning(f"Failed to load trajectory {trajectory.id}")
-            return None
+            if finished_run is not None:
+                results.append(self._collectOutput(finished_run, signals, send_event))
+                finished_run = None
 
-        # Start the trajectory
-        success = self.startTrajectory(trajectory.id)
+            if run is None:
+                logger.warning(f"Failed to run trajectory {trajectory.id}")
+                break
 
-        if not success:
-            logger.warning(f"Failed to run trajectory {trajectory.id}")
+            # Encode the next trajectory while this one runs
+            prepared = self.prepareTrajectory(trajectories[i + 1]) if i + 1 < len(trajectories) else None
+
+            if not self._waitForRun(run):
+                break
+            finished_run = run
+
+        if finished_run is not None:
+            results.append(self._collectOutput(finished_run, signals, send_event))
+
+        return results
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def getSample(self):
+        sample = {}
+        return sample
+
+    # === PRIVATE METHODS ==============================================================================================
+    def _startRun(self, prepared: BILBO_PreparedTrajectory) -> (BILBO_TrajectoryRun, None):
+        trajectory = prepared.trajectory
+
+        if not self.setTrajectory(prepared):
             return None
 
-        success = self.events.trajectory_started.wait(
-            timeout=2,
-            stale_event_time=0.2,
-            flags={'trajectory_id': trajectory.id}
-        )
+        run = self._run
+        if not self.startTrajectory(trajectory.id):
+            return None
 
-        if not success:
+        if not run.started.wait(timeout=2):
             logger.warning(f"Failed to start trajectory {trajectory.id}")
             return None
 
-        start_tick = self.events.trajectory_started.get_data()['tick']
+        return run
 
-        success = self.events.trajectory_finished.wait(
-            timeout=trajectory.length * 0.01 + 2,
-            stale_event_time=0.2,
-            flags={'trajectory_id': trajectory.id}
-        )
+    # ------------------------------------------------------------------------------------------------------------------
+    def _waitForRun(self, run: BILBO_TrajectoryRun) -> bool:
+        trajectory = run.trajectory
 
-        if not success:
+        if not run.finished.wait(timeout=trajectory.length * LOOP_TIME_CONTROL + 2) or run.aborted:
             logger.warning(f"Failed to finish trajectory {trajectory.id}")
-            return None
+            return False
+        return True
 
-        end_tick = self.events.trajectory_finished.get_data()['tick']
+    # ------------------------------------------------------------------------------------------------------------------
+    def _collectOutput(self, run: BILBO_TrajectoryRun, signals: (list, None), send_event: bool = True) -> (dict, None):
+        trajectory = run.trajectory
+        start_tick = run.start_tick
+        end_tick = run.end_tick
 
         if start_tick is None or end_tick is None:
             return None
 
-        # Wait for the logger to reach the number of samples
-        while self.logging.sample_index < (end_tick + 100):
-            time.sleep(0.1)
+        # The output is read as soon as the logger has committed the last sample of the trajectory
+        if not self.logging.waitForSampleIndex(end_tick, timeout=2):
+            logger.warning(f"Samples of trajectory {trajectory.id} were not logged")
+            return None
 
         output_signals = {}
         if signals is not None:
             output_signals = self.logging.getData(
                 signals=signals,
                 index_start=start_tick,
-                index_end=end_tick
+                index_end=end_tick,
+                hdf5_only=False,
+                deepcopy=True
             )
 
         output_data = {
@@ -310,28 +417,25 @@ class BILBO_ExperimentHandler:
             'output': output_signals
         }
 
+        if not send_event:
+            return output_data
+
         # Send the event via Wi-Fi
         self.communication.wifi.sendEvent(event='trajectory',
                                           data={
                                               'event': 'finished',
                                               'trajectory_id': trajectory.id,
-                                              'input': [[float(inp.left), float(inp.right)] for inp in
-                                                        trajectory.inputs.values()],
-                                              'output': output_signals,
+                                              'input': self._trajectoryInputToArray(trajectory.inputs).tolist(),
+                                              'output': {signal: values.tolist()
+                                                         for signal, values in output_signals.items()},
                                           })
 
         return output_data
 
     # ------------------------------------------------------------------------------------------------------------------
-    def getSample(self):
-        sample = {}
-        return sample
-
-    # === PRIVATE METHODS ==============================================================================================
-    def _setTrajectoryDescription_LL(self, trajectory: BILBO_Trajectory) -> bool:
-        # Transform the trajectory into the corresponding ctypes structure
-
-        sequence_description = bilbo_sequence_description_t(
+    @staticmethod
+    def _trajectoryDescription(trajectory: BILBO_Trajectory) -> bilbo_sequence_description_t:
+        return bilbo_sequence_description_t(
             sequence_id=trajectory.id,
             length=trajectory.length,
             require_control_mode=False,
@@ -342,11 +446,15 @@ class BILBO_ExperimentHandler:
             loaded=False
         )
 
+    # ------------------------------------------------------------------------------------------------------------------
+    def _setTrajectoryDescription_LL(self, prepared: BILBO_PreparedTrajectory) -> bool:
+        trajectory = prepared.trajectory
+
         # Send the trajectory to the STM32
         success = self.communication.serial.executeFunction(
             module=addresses.TWIPR_AddressTables.REGISTER_TABLE_GENERAL,
             address=addresses.TWIPR_SequencerAddresses.LOAD,
-            data=sequence_description,
+            data=prepared.description,
             input_type=bilbo_sequence_description_t,
             output_type=ctypes.c_bool,
             timeout=0.1
@@ -413,21 +521,30 @@ class BILBO_ExperimentHandler:
 
     # ------------------------------------------------------------------------------------------------------------------
     @staticmethod
-    def _trajectoryInputToBytes(trajectory_input: dict[int, BILBO_TrajectoryInput]) -> bytes:
-        # Create a ctypes array type of the correct length
-
-        ArrayType: Any = cast(Any, bilbo_sequence_input_t * len(trajectory_input))  # type: ignore
-        c_array = ArrayType()  # Now this won't raise a warning
+    def _trajectoryInputToBytes(trajectory_input: (dict[int, BILBO_TrajectoryInput], np.ndarray)) -> bytes:
+        # Fill a structured array with the layout of bilbo_sequence_input_t column by column
+        records = np.zeros(len(trajectory_input), dtype=bilbo_sequence_input_dtype)
+
+        if isinstance(trajectory_input, dict):
+            index = np.fromiter(trajectory_input.keys(), dtype=np.intp, count=len(trajectory_input))
+            inputs = list(trajectory_input.values())
+            records['step'][index] = [inp.step for inp in inputs]
+            records['u_1'][index] = [inp.left for inp in inputs]
+            records['u_2'][index] = [inp.right for inp in inputs]
+        else:
+            trajectory_input = np.asarray(trajectory_input, dtype=np.float32).reshape(-1, 2)
+            records['step'] = np.arange(len(trajectory_input))
+            records['u_1'] = trajectory_input[:, 0]
+            records['u_2'] = trajectory_input[:, 1]
 
-        # Populate the ctypes array with data from trajectory_input
-        for i, inp in trajectory_input.items():
-            c_array[i].step = inp.step
-            c_array[i].u_1 = inp.left
-            c_array[i].u_2 = inp.right
+        return records.tobytes()
 
-        # Get the byte representation of the array
-        bytes_data = ctypes.string_at(ctypes.byref(c_array), ctypes.sizeof(c_array))
-        return bytes_data
+    # ------------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def _trajectoryInputToArray(trajectory_input: (dict[int, BILBO_TrajectoryInput], np.ndarray)) -> np.ndarray:
+        if isinstance(trajectory_input, dict):
+            return np.asarray([[inp.left, inp.right] for inp in trajectory_input.values()], dtype=float)
+        return np.asarray(trajectory_input, dtype=float).reshape(-1, 2)
 
     # ------------------------------------------------------------------------------------------------------------------
     def _sendTrajectoryInputs_ll(self, trajectory: BILBO_Trajectory):
@@ -490,9 +607,19 @@ class BILBO_ExperimentHandler:
         event = BILBO_LL_Sequencer_Event_Type(message.data['event']).name
         trajectory_id = message.data['sequence_id']
         tick = message.data['tick']
+
+        run = self._run
+        if run is not None and run.trajectory.id != trajectory_id:
+            run = None
+
         if event == 'STARTED':
             # self.utils.speak(f"Trajectory {trajectory_id} started")
             logger.info(f"Trajectory {trajectory_id} started (Tick: {tick})")
+            if run is not None:
+                run.start_tick = tick
+                run.trajectory.started = True
+                run.trajectory.running = True
+                run.started.set()
             self.callbacks.trajectory_started.call(trajectory_id=trajectory_id, tick=tick)
 
             self.events.trajectory_started.set(resource={'tick': tick, 'trajectory_id': trajectory_id},
@@ -501,16 +628,22 @@ class BILBO_ExperimentHandler:
         elif event == 'FINISHED':
             # self.utils.speak(f"Trajectory {trajectory_id} finished")
             logger.info(f"Trajectory {trajectory_id} finished (Tick: {tick})")
+            self.running = False
+            self.control.enable_external_input = True
+            if run is not None:
+                run.end_tick = tick
+                run.trajectory.running = False
+                run.trajectory.finished = True
+                run.finished.set()
 
             self.callbacks.trajectory_finished.call(trajectory_id=trajectory_id, tick=tick)
             self.events.trajectory_finished.set(resource={'tick': tick, 'trajectory_id': trajectory_id},
                                                 flags={'trajectory_id': trajectory_id})
 
-            self.running = False
-            self.control.enable_external_input = True
-
         elif event == 'RECEIVED':
             logger.debug(f"Trajectory {trajectory_id} loaded")
+            if run is not None:
+                run.loaded.set()
             self.callbacks.trajectory_loaded.call(trajectory_id=trajectory_id, tick=tick)
             self.events.trajectory_loaded.set(resource={'tick': tick, 'trajectory_id': trajectory_id},
                                               flags={'trajectory_id': trajectory_id})
@@ -518,11 +651,15 @@ class BILBO_ExperimentHandler:
         elif event == 'ABORTED':
             # self.utils.speak(f"Trajectory {trajectory_id} aborted")
             logger.info(f"Trajectory {trajectory_id} aborted")
+            self.running = False
+            self.control.enable_external_input = True
+            if run is not None:
+                run.aborted = True
+                run.trajectory.running = False
+                run.trajectory.aborted = True
+                run.finished.set()
 
             self.callbacks.trajectory_aborted.call(trajectory_id=trajectory_id, tick=tick)
             self.events.trajectory_aborted.set(resource={'tick': tick, 'trajectory_id': trajectory_id},
                                                flags={'trajectory_id': trajectory_id})
-
-            self.running = False
-            self.control.enable_external_input = True
 # ======================================================================================================================
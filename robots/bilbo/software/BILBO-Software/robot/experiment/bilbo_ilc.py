@@ -0,0 +1,338 @@
+import dataclasses
+import threading
+import time
+from typing import Any, Optional
+
+import numpy as np
+
+# ======================================================================================================================
+from robot.communication.bilbo_communication import BILBO_Communication
+from robot.control.bilbo_control_data import BILBO_Control_Mode
+from robot.experiment.bilbo_experiment import BILBO_ExperimentHandler, BILBO_Trajectory
+from robot.lowlevel.stm32_general import MAX_STEPS_TRAJECTORY
+from core.communication.wifi.data_link import CommandArgument
+from core.utils.data import encode_array
+from core.utils.dataclass_utils import from_dict
+from core.utils.logging_utils import Logger
+
+# ======================================================================================================================
+logger = Logger('ILC')
+logger.setLevel('INFO')
+
+# Record of one step of a trial, as returned by getTrialData
+ILC_TRIAL_DTYPE = np.dtype([('input', np.float32), ('output', np.float32), ('error', np.float32)])
+
+
+# ======================================================================================================================
+@dataclasses.dataclass
+class BILBO_ILC_Config:
+    reference: list  # Reference of the output signal, one value per control step
+    num_trials: int = 10
+    signal: str = 'lowlevel.estimation.state.theta'
+
+    # Learning law u_{k+1} = Q u_k + L e_k. L is either given as a matrix or by the PD learning gains (kp, kd), which
+    # correspond to the banded matrix of lib_control.ilc.pdlearning. Q is a scalar or a matrix.
+    learning: str = 'pd'  # 'pd' or 'matrix'
+    kp: float = 0.0
+    kd: float = 0.0
+    L: Optional[list] = None
+    Q: Any = 1.0
+
+    initial_input: Optional[list] = None
+    input_limit: Optional[float] = None  # Limit of the absolute input
+    tolerance: Optional[float] = None  # Stop as soon as the RMS error of a trial is below the tolerance
+
+    trajectory_id: int = 100
+    control_mode: BILBO_Control_Mode = BILBO_Control_Mode.BALANCING
+
+
+@dataclasses.dataclass
+class BILBO_ILC_Trial:
+    trial: int
+    input: np.ndarray
+    output: np.ndarray
+    error: np.ndarray
+    rms_error: float
+    max_error: float
+    duration: float
+
+    def summary(self) -> dict:
+        return {
+            'trial': self.trial,
+            'rms_error': self.rms_error,
+            'max_error': self.max_error,
+            'input_rms': float(np.sqrt(np.mean(self.input ** 2))),
+            'duration': self.duration,
+        }
+
+
+# ======================================================================================================================
+class ILC_LearningLaw:
+    """
+    Input update u_{k+1} = Q u_k + L e_k of an ILC. The PD form of L is applied without building the matrix.
+    """
+    L: (np.ndarray, None)
+    Q: (float, np.ndarray)
+
+    def __init__(self, config: BILBO_ILC_Config, length: int):
+        if config.learning == 'pd':
+            self.L = None
+        elif config.learning == 'matrix':
+            self.L = np.asarray(config.L, dtype=float)
+            if self.L.shape != (length, length):
+                raise ValueError(f"L has shape {self.L.shape}, expected {(length, length)}")
+        else:
+            raise ValueError(f"Unknown learning law {config.learning}")
+
+        self.kp = float(config.kp)
+        self.kd = float(config.kd)
+
+        if np.ndim(config.Q) == 0:
+            self.Q = float(config.Q)
+        else:
+            self.Q = np.asarray(config.Q, dtype=float)
+            if self.Q.shape != (length, length):
+                raise ValueError(f"Q has shape {self.Q.shape}, expected {(length, length)}")
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def update(self, u: np.ndarray, e: np.ndarray) -> np.ndarray:
+        if self.L is None:
+            learning = self.kp * e
+            learning[1:] += self.kd * (e[1:] - e[:-1])
+        else:
+            learning = self.L @ e
+
+        if isinstance(self.Q, float):
+            return self.Q * u + learning
+        return self.Q @ u + learning
+
+
+# ======================================================================================================================
+class BILBO_TrajectoryPlant:
+    """
+    Runs a trial as a trajectory on the low-level sequencer and returns the logged output signal. The input is
+    split equally between both wheels.
+    """
+
+    def __init__(self, experiment_handler: BILBO_ExperimentHandler, signal: str, trajectory_id: int,
+                 control_mode: BILBO_Control_Mode):
+        self.experiment_handler = experiment_handler
+        self.signal = signal
+        self.trajectory_id = trajectory_id
+        self.control_mode = control_mode
+
+    def runTrial(self, input: np.ndarray) -> (np.ndarray, None):
+        trajectory = BILBO_Trajectory(
+            id=self.trajectory_id,
+            name='ilc',
+            length=len(input),
+            inputs=np.column_stack((input / 2, input / 2)),
+            control_mode=self.control_mode,
+            control_mode_end=self.control_mode
+        )
+
+        data = self.experiment_handler.runTrajectory(trajectory, signals=[self.signal], send_event=False)
+        if data is None:
+            return None
+        return np.asarray(data['output'][self.signal], dtype=float)
+
+
+class BILBO_LiftedPlant:
+    """
+    Simulated plant y = P u (+ noise) given by its lifted system matrix. Used to test the ILC without the robot.
+    """
+
+    def __init__(self, P: np.ndarray, noise: float = 0.0, seed: int = None):
+        self.P = np.asarray(P, dtype=float)
+        self.noise = noise
+        self._random = np.random.default_rng(seed)
+
+    def runTrial(self, input: np.ndarray) -> np.ndarray:
+        output = self.P @ input
+        if self.noise:
+            output = output + self._random.normal(0, self.noise, output.shape)
+        return output
+
+
+# === BILBO_ILC ========================================================================================================
+class BILBO_ILC:
+    """
+    Runs ILC trials on the robot. The inputs are updated between the trials from the logged outputs, only a summary
+    of every trial and the final result are sent as 'ilc' events via Wi-Fi. The data of the trials is kept and can
+    be read with the getILCData command.
+    """
+    config: (BILBO_ILC_Config, None)
+    trials: list[BILBO_ILC_Trial]
+    running: bool
+
+    def __init__(self, experiment_handler: BILBO_ExperimentHandler = None, communication: BILBO_Communication = None):
+        self.experiment_handler = experiment_handler
+        self.communication = communication
+
+        self.config = None
+        self.trials = []
+        self.running = False
+        self._stop = False
+        self._lock = threading.Lock()
+
+        if self.communication is not None:
+            self.communication.wifi.addCommand(
+                identifier='runILC',
+                callback=self._run_external,
+                arguments=[CommandArgument(name='config',
+                                           type=dict,
+                                           optional=False,
+                                           description='BILBO_ILC_Config as dict')],
+                description='Run ILC trials on the robot',
+                execute_in_thread=True
+            )
+            self.communication.wifi.addCommand(
+                identifier='stopILC',
+                callback=self.stop,
+                arguments=[],
+                description='Stop the ILC after the current trial'
+            )
+            self.communication.wifi.addCommand(
+                identifier='getILCData',
+                callback=self.getTrialData,
+                arguments=[CommandArgument(name='trials',
+                                           type=list,
+                                           optional=True,
+                                           description='Trials to return. All trials if not given')],
+                description='Return the input, output and error of ILC trials in binary form'
+            )
+
+    # === METHODS ======================================================================================================
+    def run(self, config: BILBO_ILC_Config, plant=None) -> (dict, None):
+        """
+        Runs the trials of the config. The plant needs a runTrial(input) -> output method. By default, the trials
+        are run as trajectories on the robot.
+
+        Returns:
+            dict: The result that is also sent as 'finished' event, or None if the ILC could not be started.
+        """
+        reference = np.asarray(config.reference, dtype=float)
+        length = len(reference)
+
+        if length == 0 or length > MAX_STEPS_TRAJECTORY:
+            logger.warning(f"Invalid reference length {length}. Maximum: {MAX_STEPS_TRAJECTORY}")
+            return None
+
+        if not self._lock.acquire(blocking=False):
+            logger.warning("ILC is already running")
+            return None
+
+        try:
+            learning_law = ILC_LearningLaw(config, length)
+
+            if plant is None:
+                plant = BILBO_TrajectoryPlant(self.experiment_handler, signal=config.signal,
+                                              trajectory_id=config.trajectory_id, control_mode=config.control_mode)
+
+            if config.initial_input is not None:
+                input = np.asarray(config.initial_input, dtype=float)
+                if input.shape != reference.shape:
+                    raise ValueError(f"Initial input has length {len(input)}, expected {length}")
+            else:
+                input = np.zeros(length)
+
+            self.config = config
+            self.trials = []
+            self.running = True
+            self._stop = False
+            converged = False
+
+            logger.info(f"Start ILC with {config.num_trials} trials of {length} steps")
+
+            for trial_index in range(config.num_trials):
+                if self._stop:
+                    logger.info("ILC stopped")
+                    break
+
+                start_time = time.perf_counter()
+                output = plant.runTrial(input)
+                if output is None:
+                    logger.warning(f"Trial {trial_index} failed")
+                    break
+
+                output = self._alignOutput(np.asarray(output, dtype=float), length)
+                error = reference - output
+
+                trial = BILBO_ILC_Trial(
+                    trial=trial_index,
+                    input=input,
+                    output=output,
+                    error=error,
+                    rms_error=float(np.sqrt(np.mean(error ** 2))),
+                    max_error=float(np.max(np.abs(error))),
+                    duration=time.perf_counter() - start_time,
+                )
+                self.trials.append(trial)
+
+                logger.info(f"Trial {trial_index}: RMS error {trial.rms_error:.4f}, max error {trial.max_error:.4f}")
+                self._sendEvent({'event': 'trial', **trial.summary()})
+
+                if config.tolerance is not None and trial.rms_error < config.tolerance:
+                    converged = True
+                    break
+
+                input = learning_law.update(input, error)
+                if config.input_limit is not None:
+                    input = np.clip(input, -config.input_limit, config.input_limit)
+
+            result = {
+                'event': 'finished',
+                'trials': len(self.trials),
+                'converged': converged,
+                'rms_errors': [trial.rms_error for trial in self.trials],
+                'input': encode_array(self.trials[-1].input, dtype=np.float32) if self.trials else None,
+            }
+            self._sendEvent(result)
+            return result
+
+        finally:
+            self.running = False
+            self._lock.release()
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def stop(self):
+        self._stop = True
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def getTrialData(self, trials: list = None) -> dict:
+        """
+        Input, output and error of the given trials as an encoded structured array of shape
+        (number of trials, trial length) with the fields of ILC_TRIAL_DTYPE.
+        """
+        selected = self.trials if trials is None else [self.trials[i] for i in trials]
+        length = len(selected[0].input) if selected else 0
+
+        records = np.zeros((len(selected), length), dtype=ILC_TRIAL_DTYPE)
+        for i, trial in enumerate(selected):
+            records[i]['input'] = trial.input
+            records[i]['output'] = trial.output
+            records[i]['error'] = trial.error
+
+        return {
+            'trials': [trial.trial for trial in selected],
+            'data': encode_array(records),
+        }
+
+    # === PRIVATE METHODS ==============================================================================================
+    @staticmethod
+    def _alignOutput(output: np.ndarray, length: int) -> np.ndarray:
+        # The logged output can be a few samples shorter or longer than the trial
+        if len(output) >= length:
+            return output[:length]
+        if len(output) == 0:
+            return np.zeros(length)
+        return np.pad(output, (0, length - len(output)), mode='edge')
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _sendEvent(self, data: dict):
+        if self.communication is not None:
+            self.communication.wifi.sendEvent(event='ilc', data=data)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _run_external(self, config: dict):
+        return self.run(from_dict(BILBO_ILC_Config, config))
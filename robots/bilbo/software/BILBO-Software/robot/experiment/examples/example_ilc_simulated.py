@@ -0,0 +1,91 @@
+"""
+Runs the on-robot ILC against a simulated plant instead of the low-level sequencer and checks that the trial data
+can be read back in binary form.
+
+Run from the BILBO-Software directory:
+    python -m robot.experiment.examples.example_ilc_simulated
+"""
+import json
+
+import numpy as np
+
+from core.utils.data import decode_array
+from core.utils.dataclass_utils import from_dict
+from robot.experiment.bilbo_ilc import BILBO_ILC, BILBO_ILC_Config, BILBO_LiftedPlant, ILC_LearningLaw
+
+DT = 0.01
+
+
+def lifted_matrix(length: int) -> np.ndarray:
+    """
+    Lifted system matrix of a lightly damped second-order system with relative degree 1.
+    """
+    a1, a2, b = 1.9, -0.92, 0.05
+    impulse_response = np.zeros(length)
+    y1 = y2 = 0.0
+    for k in range(length):
+        y = a1 * y1 + a2 * y2 + (b if k == 1 else 0.0)
+        impulse_response[k] = y
+        y2, y1 = y1, y
+    P = np.zeros((length, length))
+    for k in range(length):
+        P[k:, k] = impulse_response[:length - k]
+    return P
+
+
+def check_pd_learning(length: int = 50):
+    """
+    The PD learning law has to match the matrix of lib_control.ilc.pdlearning.
+    """
+    kp, kd = 0.7, 0.3
+    L = np.zeros((length, length))
+    L[0, 0] = kp
+    for j in range(1, length):
+        L[j, j - 1] = -kd
+        L[j, j] = kp + kd
+
+    rng = np.random.default_rng(0)
+    u, e = rng.normal(size=length), rng.normal(size=length)
+    pd_law = ILC_LearningLaw(BILBO_ILC_Config(reference=[0] * length, kp=kp, kd=kd, Q=0.9), length)
+    matrix_law = ILC_LearningLaw(BILBO_ILC_Config(reference=[0] * length, learning='matrix', L=L.tolist(),
+                                                  Q=(0.9 * np.eye(length)).tolist()), length)
+    difference = np.max(np.abs(pd_law.update(u, e) - matrix_law.update(u, e)))
+    print(f"PD learning law vs. matrix: max difference {difference:.2e}")
+    return difference < 1e-9
+
+
+def example_ilc_simulated(length: int = 300, num_trials: int = 15):
+    P = lifted_matrix(length)
+    t = np.arange(length) * DT
+    reference = 0.1 * np.sin(2 * np.pi * 0.5 * t) * (1 - np.exp(-t))
+
+    # Norm-optimal learning matrix
+    L = np.linalg.solve(P.T @ P + 0.05 * np.eye(length), P.T)
+
+    ilc = BILBO_ILC()
+    config = {
+        'reference': reference.tolist(),
+        'num_trials': num_trials,
+        'learning': 'matrix',
+        'L': L.tolist(),
+        'tolerance': 1e-4,
+    }
+
+    # Same path as the runILC command, but with the simulated plant
+    result = ilc.run(from_dict(BILBO_ILC_Config, config), plant=BILBO_LiftedPlant(P, noise=1e-5, seed=0))
+    print(f"{result['trials']} trials, converged: {result['converged']}")
+    print("RMS errors: " + ", ".join(f"{error:.2e}" for error in result['rms_errors']))
+
+    trial_data = json.loads(json.dumps(ilc.getTrialData()))
+    records = decode_array(trial_data['data'])
+    json_size = len(json.dumps([[trial.input.tolist(), trial.output.tolist(), trial.error.tolist()]
+                                for trial in ilc.trials]))
+    print(f"Trial data: {records.shape} records, {len(trial_data['data']['data'])} bytes encoded "
+          f"(as JSON lists: {json_size} bytes)")
+    assert np.allclose(records['output'][-1], ilc.trials[-1].output, atol=1e-6)
+    return result['rms_errors'][-1] < result['rms_errors'][0]
+
+
+if __name__ == '__main__':
+    assert check_pd_learning()
+    assert example_ilc_simulated()
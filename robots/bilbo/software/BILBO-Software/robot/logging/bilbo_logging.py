@@ -3,25 +3,30 @@ from copy import copy
 from datetime import datetime
 import threading
 
+import numpy as np
+
 from core.utils.delayed_executor import delayed_execution
 # === OWN PACKAGES =====================================================================================================
 from robot.communication.bilbo_communication import BILBO_Communication
 from robot.control.bilbo_control import BILBO_Control
 from robot.drive.bilbo_drive import BILBO_Drive
 from robot.estimation.bilbo_estimation import BILBO_Estimation
+from robot.estimation.bilbo_state_filter import ESTIMATE_FIELDS
 from robot.experiment.bilbo_experiment import BILBO_ExperimentHandler
 from robot.logging.bilbo_sample import BILBO_Sample
-from robot.lowlevel.stm32_sample import BILBO_LL_Sample, SAMPLE_BUFFER_LL_SIZE
+from robot.logging.bilbo_streams import BILBO_Streams
+from robot.lowlevel.stm32_sample import SAMPLE_BUFFER_LL_SIZE, bilbo_ll_sample_flat_dtype
 from robot.sensors.bilbo_sensors import BILBO_Sensors
 from core.utils.callbacks import callback_definition, CallbackContainer
-from core.utils.dict_utils import copy_dict, optimized_deepcopy
+from core.utils.dict_utils import optimized_deepcopy
 from core.utils.events import EventListener
-from core.utils.csv_utils import CSVLogger
+from core.utils.csv_utils import BatchedLogger
 from paths import experiments_path
-from core.utils.dataclass_utils import from_dict, asdict_optimized
 from core.utils.time import PerformanceTimer, TimeoutTimer
 from core.utils.logging_utils import Logger
 from core.utils.h5 import H5PyDictLogger
+from core.utils.stream_codec import StreamSchema, StructStreamCodec
+from core.utils.ring_buffer import StructuredRingBuffer
 from core.utils.exit import register_exit_callback
 from core.utils.delayed_executor import delayed_execution
 
@@ -46,15 +51,17 @@ class BILBO_Logging:
 
     general_sample_collect_function: callable
 
-    sample: BILBO_Sample
-    _sample_buffer: (None, list[dict])
+    streams: BILBO_Streams
+
+    _sample_buffer: StructuredRingBuffer
+    _schema: StreamSchema
+    _codec: StructStreamCodec
 
     _h5Logger: H5PyDictLogger
 
     SAMPLE_BUFFER_SIZE = 1 * 60 * 100
 
-    _sample_buffer_ll: list[dict]
-    _csvLogger: CSVLogger
+    _csvLogger: BatchedLogger
 
     _rx_stm32_event_listener: EventListener
 
@@ -75,29 +82,52 @@ class BILBO_Logging:
         self.general_sample_collect_function = general_sample_collect_function
 
         self.comm.spi.callbacks.rx_samples.register(self._stm32samples_callback)
-        self.sample = BILBO_Sample()
+
+        # The log is kept in a NumPy structured array with one field per leaf of BILBO_Sample. The low-level part
+        # changes with every low-level sample, the high-level part is the same for all samples of one update.
+        self._schema = StreamSchema.fromDataclass(BILBO_Sample)
+        self._codec = StructStreamCodec(self._schema)
+        self._hl_schema = StreamSchema([field for field in self._schema.fields if field.path[0] != 'lowlevel'])
+        self._ll_schema = self._schema.subSchema('lowlevel')
+        self._hl_names = self._hl_schema.names
+        self._ll_names = [f"lowlevel.{name}" for name in self._ll_schema.names]
+
+        # Low-level samples arrive as a structured array of the STM32 struct. Fields of BILBO_LL_Sample that are not
+        # part of the struct keep their default value.
+        self._ll_struct_fields = [name for name in self._ll_schema.names if name in bilbo_ll_sample_flat_dtype.names]
+        self._ll_struct_names = [f"lowlevel.{name}" for name in self._ll_struct_fields]
+
+        self._sample_buffer = StructuredRingBuffer(self._codec.dtype, self.SAMPLE_BUFFER_SIZE)
+        self._records = np.zeros(SAMPLE_BUFFER_LL_SIZE, dtype=self._codec.dtype)
+        self._records[self._ll_names] = tuple(self._ll_schema.flatten({}))
+        self._tick_offsets = np.arange(SAMPLE_BUFFER_LL_SIZE)
+
+        # Stream samples are sent in binary form if the server supports it. The low-level samples are only logged
+        self.comm.wifi.setStreamSchema(self._hl_schema)
+
+        # Streams of single signals with their own rate, e.g. low-level signals, are only sent on request
+        self.streams = BILBO_Streams(comm=self.comm, logging=self)
 
         self._sample_timeout_timer = TimeoutTimer(timeout_time=2, timeout_callback=self._sample_timeout_callback)
 
-        self._h5Logger = H5PyDictLogger(filename='log.h5')
-        self._csvLogger = CSVLogger()
+        # Chunks of 10 s of samples, written in the background and flushed to the SD card every 5 s
+        self._h5Logger = H5PyDictLogger(filename='log.h5', chunk_size=1000, compression='lzf', flush_interval=5)
+        self._csvLogger = BatchedLogger()
         self._num_samples = 0
         self.sample_index = None
 
         register_exit_callback(self.close, priority=2)
 
-        self._sample_buffer = None
-        self._index_sample_buffer = 0
+        self._sample = BILBO_Sample()
+        self._sample_count = 0  # Buffer count the cached sample was built for
         self._first_sample_received = False
         self._startup_phase = True  # Tracks if the logging is still in the startup phase, because in here it might be
         self._running = False
         # throwing warnings
-        self._dict_cache = None
-        self._dict_cache_ll = None
         self._sample_deepcopy_cache = None
-        self._sample_buffer_ll = []
         self._lock = threading.Lock()  # Lock to ensure thread-safe access to the ring buffer.
         self._samples_queue = deque()  # Queue for low-level sample batches.
+        self._sample_index_condition = threading.Condition()  # Notified whenever a batch of samples was committed
     # === METHODS ======================================================================================================
     def init(self) -> None:
         self._build_sample_buffer()
@@ -107,6 +137,26 @@ class BILBO_Logging:
         delayed_execution(lambda: setattr(self, '_startup_phase', False), 1)
         self._running = True
     # ------------------------------------------------------------------------------------------------------------------
+    @property
+    def sample(self) -> BILBO_Sample:
+        """
+        The most recent sample. It is only built from the ring buffer when it is accessed after new samples arrived.
+        """
+        with self._lock:
+            if self._sample_count != self._sample_buffer.count:
+                self._sample = self._codec.decodeInto(self._sample_buffer.latest().tobytes(), BILBO_Sample())
+                self._sample_count = self._sample_buffer.count
+            return self._sample
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @property
+    def schema(self) -> StreamSchema:
+        """
+        Schema of the logged samples. Its field names are the dot-separated signal paths.
+        """
+        return self._schema
+
+    # ------------------------------------------------------------------------------------------------------------------
     def getNumSamples(self):
         return self._num_samples
 
@@ -126,22 +176,38 @@ class BILBO_Logging:
 
         self._csvLogger.make_file(filename, folder)
 
+    # ------------------------------------------------------------------------------------------------------------------
+    def waitForSampleIndex(self, index: int, timeout: float = None) -> bool:
+        """
+        Blocks until the sample with the given low-level tick has been committed to the ring buffer and handed to
+        the HDF5 logger. Returns False if this did not happen within the timeout.
+        """
+        with self._sample_index_condition:
+            return self._sample_index_condition.wait_for(
+                lambda: self.sample_index is not None and self.sample_index >= index, timeout=timeout)
+
     # ------------------------------------------------------------------------------------------------------------------
     def getData(self, index_start: int = None, index_end: int = None, signals=None, hdf5_only: bool = True,
-                deepcopy: bool = False) -> (list, dict):
+                deepcopy: bool = False, time_range: tuple = None) -> (np.ndarray, dict):
         """
-        Retrieves a list of logged samples between index_start and index_end.
+        Retrieves the logged samples between index_start and index_end.
         This function checks whether the requested samples are in the local ring buffer or in the HDF5 file.
         The global sample count is tracked by self._num_samples.
-        The local ring buffer holds the most recent samples corresponding to indices from
-        (self._num_samples - len(self._sample_buffer)) to (self._num_samples - 1) if the buffer is full.
-        If the buffer is not full, samples are stored sequentially in the beginning of the list.
+        The local ring buffer holds the most recent SAMPLE_BUFFER_SIZE samples. Samples read from it are views
+        into the buffer. From the HDF5 file, only the requested signals are read.
+
+        Without signals, a structured array with one field per dot-separated signal path is returned. With
+        signals, a dict with a column array for every signal that is a field (e.g. 'general.time') and a
+        structured array for every prefix (e.g. 'lowlevel.estimation.state').
 
         Parameters:
             index_start (int): Starting global sample index.
             index_end (int): Ending global sample index.
+            signals (str, list): Signals to read. If None, all signals are read.
             hdf5_only (bool): If True, only read samples from the H5Py logger.
-            deepcopy (bool): If True, deep copy samples retrieved from the local ring buffer.
+            deepcopy (bool): If True, copy samples retrieved from the local ring buffer instead of returning a view.
+            time_range (tuple): (start, end) of general.time to read instead of an index range. Only read from
+                the HDF5 file.
         """
 
         if signals is not None and not isinstance(signals, list):
@@ -160,43 +226,51 @@ class BILBO_Logging:
                 index_start = 0
 
         # If hdf5_only is requested, return all samples from H5.
-        if hdf5_only:
-            samples = self._h5Logger.getSampleBatch(slice(index_start, index_end), signals=signals)
+        if hdf5_only or time_range is not None:
+            return self._h5Logger.getColumns(signals, index_start, index_end, time_range=time_range)
+
+        samples = self.getBufferedSamples(index_start, index_end)
+        if len(samples) < index_end - index_start:
+            # Part of the requested range is no longer in the ring buffer
+            return self._h5Logger.getColumns(signals, index_start, index_end)
+
+        if deepcopy:
+            samples = samples.copy()
+        if signals is None:
             return samples
+        return {signal: samples[self._getFields(signal)] for signal in signals}
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def getSignalFields(self, signal: str) -> list[str]:
+        """
+        Fields of the log that belong to a signal path or prefix. Empty if the signal does not exist.
+        """
+        fields = self._getFields(signal)
+        return [fields] if isinstance(fields, str) else fields
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def getBufferedSamples(self, index_start: int = None, index_end: int = None) -> np.ndarray:
+        """
+        Samples with global indices in [index_start, index_end) that are still in the ring buffer, as a structured
+        array with one field per dot-separated signal path. The result is a view into the buffer unless the range
+        wraps around its end, so it has to be copied if it is kept for longer than the buffer holds the samples.
+        """
+        with self._lock:
+            return self._sample_buffer.get(index_start, index_end)
 
-        raise Exception("HDF5 only mode supported yet.")
-        # with self._lock:
-        #     buffer_size = len(self._sample_buffer)
-        #     result = []
-        #
-        #     # Determine the global index corresponding to the first sample in the ring buffer.
-        #     if total_samples < buffer_size:
-        #         ring_buffer_start_index = 0  # All samples are in the buffer sequentially.
-        #     else:
-        #         ring_buffer_start_index = total_samples - buffer_size
-        #
-        #     # Fetch older samples from HDF5 if needed.
-        #     if index_start < ring_buffer_start_index:
-        #         h5_end = min(index_end, ring_buffer_start_index)
-        #         with self._h5Logger.lock:
-        #             h5_data = self._h5Logger.dataset[index_start:h5_end]
-        #         h5_samples = self._h5Logger.record_to_dict(h5_data)
-        #         result.extend(h5_samples)
-        #
-        #     # Fetch samples from the local ring buffer if the requested range includes recent samples.
-        #     if index_end > ring_buffer_start_index:
-        #         for i in range(max(index_start, ring_buffer_start_index), index_end):
-        #             if total_samples < buffer_size:
-        #                 # Buffer not full: direct mapping.
-        #                 local_idx = i
-        #             else:
-        #                 # Buffer is full: map global index to local index using circular indexing.
-        #                 local_idx = (self._index_sample_buffer + (i - ring_buffer_start_index)) % buffer_size
-        #             if deepcopy:
-        #                 result.append(optimized_deepcopy(self._sample_buffer[local_idx], self._sample_deepcopy_cache))
-        #             else:
-        #                 result.append(self._sample_buffer[local_idx])
-        #     return result
+    # ------------------------------------------------------------------------------------------------------------------
+    def getBufferedWindow(self, time_start: float, time_end: float, signals=None) -> (np.ndarray, dict):
+        """
+        Samples in the ring buffer with time_start <= general.time < time_end. If signals are given, a dict of
+        the corresponding fields is returned instead.
+        """
+        with self._lock:
+            samples = self._sample_buffer.window('general.time', time_start, time_end)
+        if signals is None:
+            return samples
+        if not isinstance(signals, list):
+            signals = [signals]
+        return {signal: samples[self._getFields(signal)] for signal in signals}
 
     # ------------------------------------------------------------------------------------------------------------------
     def stopFileLogging(self):
@@ -222,7 +296,7 @@ class BILBO_Logging:
         sample: dict = self._collectData()
 
         # Send the current sample via WI-FI
-        if self.comm.wifi.connected:
+        if self.comm.wifi.connected and self.streams.default_stream:
             self.comm.wifi.sendStream(sample)
 
         # Process all available low-level sample batches from the queue.
@@ -232,31 +306,35 @@ class BILBO_Logging:
             except IndexError:
                 break
 
-            for i in range(0, SAMPLE_BUFFER_LL_SIZE):
-                self._dict_cache = copy_dict(dict_from=sample,
-                                             dict_to=self._sample_buffer[self._index_sample_buffer],
-                                             structure_cache=self._dict_cache)
-                self._sample_buffer[self._index_sample_buffer]['general']['tick'] = sample['general']['tick'] + i
-                self._sample_buffer[self._index_sample_buffer]['general']['time'] = (sample['general']['tick'] + i) * \
-                                                                                    sample['general']['sample_time_ll']
+            records = self._records
+            records[self._hl_names] = tuple(self._hl_schema.flatten(sample))
+            if isinstance(batch, np.ndarray):
+                records[self._ll_struct_names] = batch.view(bilbo_ll_sample_flat_dtype)[self._ll_struct_fields]
+            else:
+                records[self._ll_names] = [tuple(self._ll_schema.flatten(sample_ll)) for sample_ll in batch]
+            records['general.tick'] = sample['general']['tick'] + self._tick_offsets
+            records['general.time'] = records['general.tick'] * sample['general']['sample_time_ll']
 
-                self._dict_cache_ll = copy_dict(dict_from=batch[i],
-                                                dict_to=self._sample_buffer[self._index_sample_buffer]['lowlevel'],
-                                                structure_cache=self._dict_cache_ll)
+            # The onboard estimation has an estimate for every low-level sample of the batch
+            estimates = self.estimation.getBatchEstimates(int(records['lowlevel.general.tick'][-1]))
+            if estimates is not None and len(estimates) == len(records):
+                for name in ESTIMATE_FIELDS:
+                    records[f'estimation.state.{name}'] = estimates[name]
 
-                self._index_sample_buffer = (self._index_sample_buffer + 1) % len(self._sample_buffer)
+            with self._lock:
+                self._sample_buffer.append(records)
 
             # --------------------------------------------------------------------------------------------------------------
-            self._h5Logger.appendSamples(self._get_last_samples(SAMPLE_BUFFER_LL_SIZE))
+            self._h5Logger.appendSamples(records)
 
             # --------------------------------------------------------------------------------------------------------------
             if self._csvLogger.is_open:
-                self._csvLogger.log_event(self._get_last_samples(SAMPLE_BUFFER_LL_SIZE))
+                self._csvLogger.log_event(records)
 
+            tick_ll = int(records['lowlevel.general.tick'][-1])
             if self.sample_index is None:
                 self._sample_timeout_timer.start()
-                self.sample_index = from_dict(BILBO_Sample,
-                                              self._sample_buffer[self._index_sample_buffer - 1]).lowlevel.general.tick
+                self.sample_index = tick_ll
 
                 # Check if the sample index started at 0
                 if self.sample_index != SAMPLE_BUFFER_LL_SIZE - 1:
@@ -267,17 +345,20 @@ class BILBO_Logging:
             else:
                 self.sample_index += SAMPLE_BUFFER_LL_SIZE
 
-            if self.sample_index != from_dict(BILBO_Sample,
-                                              self._sample_buffer[self._index_sample_buffer - 1]).lowlevel.general.tick:
-                logger.warning(
-                    f"Sample index mismatch: HL: {self.sample_index} != LL: {from_dict(BILBO_Sample, self._sample_buffer[self._index_sample_buffer - 1]).lowlevel.general.tick}")
+            if self.sample_index != tick_ll:
+                logger.warning(f"Sample index mismatch: HL: {self.sample_index} != LL: {tick_ll}")
 
             self._num_samples += SAMPLE_BUFFER_LL_SIZE
 
+            with self._sample_index_condition:
+                self._sample_index_condition.notify_all()
+
             if self._num_samples % 2000 == 0:
                 logger.debug(f"Samples collected: {self._num_samples}")
 
-        self.sample = from_dict(BILBO_Sample, self._sample_buffer[self._index_sample_buffer - 1])
+        # Send the subscribed streams with the samples that were just logged
+        if self.comm.wifi.connected:
+            self.streams.update()
 
         elapsed_time = timer.stop()
 
@@ -285,11 +366,15 @@ class BILBO_Logging:
             logger.warning(f"Logging took {elapsed_time:.2f}s")
 
     # ------------------------------------------------------------------------------------------------------------------
-    def deepcopy_samples(self, samples: list[dict]) -> list[dict]:
+    def deepcopy_samples(self, samples: (list[dict], np.ndarray)) -> (list[dict], np.ndarray):
+        if isinstance(samples, np.ndarray):
+            return samples.copy()
         if not isinstance(samples, list):
             samples = [samples]
         new_samples = []
         for i in range(len(samples)):
+            if self._sample_deepcopy_cache is None:
+                _, self._sample_deepcopy_cache = optimized_deepcopy(samples[i])
             new_samples.append(optimized_deepcopy(samples[i], self._sample_deepcopy_cache))
         return new_samples
 
@@ -306,31 +391,23 @@ class BILBO_Logging:
         return sample
 
     # ------------------------------------------------------------------------------------------------------------------
-    def _stm32samples_callback(self, samples: list[dict]):
-        self._samples_queue.append(copy(samples))
+    def _stm32samples_callback(self, samples: (np.ndarray, list[dict])):
+        # The batch is a view on a buffer of the SPI reader, which is reused for later batches
+        self._samples_queue.append(samples.copy() if isinstance(samples, np.ndarray) else copy(samples))
 
     # ------------------------------------------------------------------------------------------------------------------
     def _build_sample_buffer(self):
-        sample = self._collectData()
-        sample['lowlevel'] = asdict_optimized(BILBO_LL_Sample())
-
-        _, self._sample_deepcopy_cache = optimized_deepcopy(sample)
-        self._sample_buffer = [optimized_deepcopy(sample, self._sample_deepcopy_cache) for _ in
-                               range(self.SAMPLE_BUFFER_SIZE)]
-
-        _ = from_dict(BILBO_Sample, self._sample_buffer[0])
-
-        self._h5Logger.init(sample)
+        self._h5Logger.init(self._codec.dtype)
         self._h5Logger.start('w')
 
     # ------------------------------------------------------------------------------------------------------------------
-    def _get_last_samples(self, n: int) -> list:
-        start = self._index_sample_buffer - n
-        if start < 0:
-            # Take the tail of the list and then the beginning
-            return self._sample_buffer[start:] + self._sample_buffer[:self._index_sample_buffer]
-        else:
-            return self._sample_buffer[start:self._index_sample_buffer]
+    def _getFields(self, signal: str) -> (str, list[str]):
+        """
+        Field name of a signal, or the list of all fields below it if the signal is a prefix like 'lowlevel.imu'.
+        """
+        if signal in self._schema.names:
+            return signal
+        return [name for name in self._schema.names if name.startswith(signal + '.')]
 
     # ------------------------------------------------------------------------------------------------------------------
     def _get_value_by_path(self, sample: dict, path: str):
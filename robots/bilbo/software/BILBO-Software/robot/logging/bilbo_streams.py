@@ -0,0 +1,278 @@
+import dataclasses
+import threading
+
+import numpy as np
+
+# === OWN PACKAGES =====================================================================================================
+from robot.communication.bilbo_communication import BILBO_Communication
+from robot.lowlevel.stm32_general import LOOP_TIME_CONTROL
+from core.communication.wifi.data_link import CommandArgument
+from core.utils.logging_utils import Logger
+from core.utils.stream_codec import StreamSchema, StreamField, StructStreamCodec
+
+logger = Logger("Streams")
+logger.setLevel('INFO')
+
+# Rate of the low-level samples in the log
+SAMPLE_RATE_LL = round(1 / LOOP_TIME_CONTROL)
+
+# How the low-level samples within one period of a subscription are turned into a record:
+#   latest: the last sample of the period
+#   mean:   the mean of every signal over the period (all signals as float)
+#   minmax: the minimum and maximum of every signal over the period ('<signal>.min' and '<signal>.max')
+#   batch:  every low-level sample. The rate is ignored.
+STREAM_MODES = ('latest', 'mean', 'minmax', 'batch')
+
+
+# ======================================================================================================================
+@dataclasses.dataclass
+class BILBO_StreamSubscription:
+    id: int
+    signals: list  # Signals as requested, can be prefixes like 'lowlevel.estimation.state'
+    fields: list[str]  # Fields of the log that are sent
+    mode: str
+    decimation: int  # Low-level samples per record
+    codec: StructStreamCodec
+    subscribers: int = 1
+    next_index: int = 0  # Global index of the first low-level sample of the next period
+    records_sent: int = 0
+    bytes_sent: int = 0
+
+    def describe(self) -> dict:
+        return {
+            'id': self.id,
+            'signals': self.signals,
+            'mode': self.mode,
+            'rate': SAMPLE_RATE_LL / self.decimation,
+            'decimation': self.decimation,
+            'record_size': self.codec.size,
+            'schema': self.codec.schema.description(),
+        }
+
+
+# ======================================================================================================================
+class BILBO_Streams:
+    """
+    Subscription based streams of logged signals.
+
+    Clients subscribe to a list of signals with a rate and a mode. After every update, the low-level samples that
+    were logged since the last update are reduced to the requested rate and sent as one binary batch of packed
+    records per subscription. Subscriptions to the same signals, rate and mode are shared. The full sample that is
+    sent with every update (the default stream) can be switched off by clients that only use subscriptions.
+    All subscriptions are removed when the connection is lost.
+    """
+    subscriptions: dict[int, BILBO_StreamSubscription]
+    default_stream: bool
+
+    def __init__(self, comm: BILBO_Communication, logging):
+        self.comm = comm
+        self.logging = logging
+
+        self.subscriptions = {}
+        self.default_stream = True
+
+        self._log_fields = {name: field for name, field in zip(self.logging.schema.names, self.logging.schema.fields)}
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+        self.comm.wifi.callbacks.disconnected.register(self._disconnected_callback)
+
+        self.comm.wifi.addCommand(
+            identifier='subscribeStream',
+            callback=self.subscribe,
+            arguments=[CommandArgument(name='signals',
+                                       type=list,
+                                       optional=False,
+                                       description='Signal paths or prefixes, e.g. lowlevel.estimation.state'),
+                       CommandArgument(name='rate',
+                                       type=float,
+                                       optional=True,
+                                       default=10,
+                                       description=f'Records per second, at most {SAMPLE_RATE_LL}'),
+                       CommandArgument(name='mode',
+                                       type=str,
+                                       optional=True,
+                                       default='latest',
+                                       description=f'One of {", ".join(STREAM_MODES)}')],
+            description='Subscribe to a stream of signals. Returns the id and the schema of the records'
+        )
+        self.comm.wifi.addCommand(
+            identifier='unsubscribeStream',
+            callback=self.unsubscribe,
+            arguments=[CommandArgument(name='id',
+                                       type=int,
+                                       optional=False,
+                                       description='Id of the subscription')],
+            description='Cancel a stream subscription'
+        )
+        self.comm.wifi.addCommand(
+            identifier='getStreamSubscriptions',
+            callback=self.getSubscriptions,
+            arguments=[],
+            description='Return all stream subscriptions'
+        )
+        self.comm.wifi.addCommand(
+            identifier='setDefaultStream',
+            callback=self.setDefaultStream,
+            arguments=[CommandArgument(name='enabled',
+                                       type=bool,
+                                       optional=False,
+                                       description='Send the full sample with every update')],
+            description='Enable or disable the default stream'
+        )
+
+    # === METHODS ======================================================================================================
+    def subscribe(self, signals: list, rate: float = 10, mode: str = 'latest') -> (dict, None):
+        """
+        Returns:
+            dict: Description of the subscription with its id and the schema of the records, or None if the
+                subscription is not valid.
+        """
+        if isinstance(signals, str):
+            signals = [signals]
+
+        if mode not in STREAM_MODES:
+            logger.warning(f"Unknown stream mode {mode}")
+            return None
+        if mode != 'batch' and not rate > 0:
+            logger.warning(f"Invalid stream rate {rate}")
+            return None
+
+        fields = []
+        for signal in signals:
+            signal_fields = self.logging.getSignalFields(signal)
+            if not signal_fields:
+                logger.warning(f"Unknown signal {signal}")
+                return None
+            fields.extend(field for field in signal_fields if field not in fields)
+
+        # Strings can only be sent as they are
+        if mode in ('mean', 'minmax'):
+            fields = [field for field in fields if self._log_fields[field].kind != 'str']
+        if not fields:
+            logger.warning(f"No signals of {signals} can be streamed with mode {mode}")
+            return None
+
+        decimation = 1 if mode == 'batch' else max(1, round(SAMPLE_RATE_LL / rate))
+
+        with self._lock:
+            for subscription in self.subscriptions.values():
+                if (subscription.fields, subscription.mode, subscription.decimation) == (fields, mode, decimation):
+                    subscription.subscribers += 1
+                    return subscription.describe()
+
+            subscription = BILBO_StreamSubscription(id=self._next_id,
+                                                    signals=list(signals),
+                                                    fields=fields,
+                                                    mode=mode,
+                                                    decimation=decimation,
+                                                    codec=StructStreamCodec(self._buildSchema(fields, mode)),
+                                                    next_index=self.logging.getNumSamples())
+            self.subscriptions[subscription.id] = subscription
+            self._next_id += 1
+
+        logger.info(f"Stream {subscription.id}: {len(subscription.fields)} signals with "
+                    f"{SAMPLE_RATE_LL / decimation:g} Hz ({mode})")
+        return subscription.describe()
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def unsubscribe(self, id: int) -> bool:
+        with self._lock:
+            subscription = self.subscriptions.get(id)
+            if subscription is None:
+                return False
+            subscription.subscribers -= 1
+            if subscription.subscribers <= 0:
+                del self.subscriptions[id]
+                logger.info(f"Stream {id} removed")
+        return True
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def getSubscriptions(self) -> list[dict]:
+        with self._lock:
+            return [{**subscription.describe(),
+                     'subscribers': subscription.subscribers,
+                     'records_sent': subscription.records_sent,
+                     'bytes_sent': subscription.bytes_sent} for subscription in self.subscriptions.values()]
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def setDefaultStream(self, enabled: bool):
+        self.default_stream = bool(enabled)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def update(self):
+        """
+        Sends the records of all subscriptions for the low-level samples that were logged since the last update.
+        """
+        if not self.subscriptions:
+            return
+
+        num_samples = self.logging.getNumSamples()
+        with self._lock:
+            subscriptions = list(self.subscriptions.values())
+
+        for subscription in subscriptions:
+            records = self._buildRecords(subscription, num_samples)
+            if records is None:
+                continue
+            payload = records.tobytes()
+            self.comm.wifi.sendRecords(subscription.id, payload)
+            subscription.records_sent += len(records)
+            subscription.bytes_sent += len(payload)
+
+    # === PRIVATE METHODS ==============================================================================================
+    def _buildRecords(self, subscription: BILBO_StreamSubscription, num_samples: int) -> (np.ndarray, None):
+        decimation = subscription.decimation
+        num_records = (num_samples - subscription.next_index) // decimation
+        if num_records <= 0:
+            return None
+
+        index_end = subscription.next_index + num_records * decimation
+        samples = self.logging.getBufferedSamples(subscription.next_index, index_end)
+        subscription.next_index = index_end
+
+        # Samples that are no longer in the ring buffer are skipped
+        num_records = len(samples) // decimation
+        if num_records == 0:
+            return None
+        samples = samples[len(samples) - num_records * decimation:]
+
+        records = np.empty(num_records, dtype=subscription.codec.dtype)
+        records['tick'] = samples['general.tick'][decimation - 1::decimation]
+
+        if subscription.mode in ('latest', 'batch'):
+            latest = samples[decimation - 1::decimation]
+            for field in subscription.fields:
+                records[field] = latest[field]
+        elif subscription.mode == 'mean':
+            for field in subscription.fields:
+                records[field] = samples[field].reshape(num_records, decimation).mean(axis=1)
+        else:
+            for field in subscription.fields:
+                values = samples[field].reshape(num_records, decimation)
+                records[f"{field}.min"] = values.min(axis=1)
+                records[f"{field}.max"] = values.max(axis=1)
+        return records
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _buildSchema(self, fields: list[str], mode: str) -> StreamSchema:
+        """
+        Schema of the records of a subscription: the tick of the last sample of the period, followed by the signals.
+        """
+        schema_fields = [StreamField(path=('tick',), kind='int', default=0)]
+        for name in fields:
+            field = self._log_fields[name]
+            if mode == 'mean':
+                schema_fields.append(StreamField(path=field.path, kind='float', default=float(field.default)))
+            elif mode == 'minmax':
+                schema_fields.append(StreamField(path=field.path + ('min',), kind=field.kind, default=field.default))
+                schema_fields.append(StreamField(path=field.path + ('max',), kind=field.kind, default=field.default))
+            else:
+                schema_fields.append(field)
+        return StreamSchema(schema_fields)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _disconnected_callback(self, *args, **kwargs):
+        with self._lock:
+            self.subscriptions.clear()
+        self.default_stream = True
@@ -1,6 +1,7 @@
 import ctypes
 import dataclasses
 
+from core.utils.ctypes_utils import ctype_to_dtype
 from robot.lowlevel.stm32_errors import bilbo_ll_log_entry_t, BILBO_LL_Log_Entry, TWIPR_ErrorType
 
 # Samples LL
@@ -214,3 +215,9 @@ class BILBO_LL_Sample:
     sensors: BILBO_LL_Sensor_Data = dataclasses.field(default_factory=BILBO_LL_Sensor_Data)
     sequence: BILBO_LL_Sample_Sequence = dataclasses.field(default_factory=BILBO_LL_Sample_Sequence)
     debug: BILBO_LL_Sample_Debug = dataclasses.field(default_factory=BILBO_LL_Sample_Debug)
+
+
+# NumPy mirrors of bilbo_ll_sample_struct, so that a buffer of samples can be read with a single np.frombuffer call.
+# The flat variant names the fields by their dot-separated path, e.g. 'estimation.state.v'.
+bilbo_ll_sample_dtype = ctype_to_dtype(bilbo_ll_sample_struct)
+bilbo_ll_sample_flat_dtype = ctype_to_dtype(bilbo_ll_sample_struct, flatten=True)
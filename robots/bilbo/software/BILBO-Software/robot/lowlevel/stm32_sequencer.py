@@ -1,7 +1,7 @@
 import ctypes
 import dataclasses
 
-from core.utils.ctypes_utils import STRUCTURE
+from core.utils.ctypes_utils import STRUCTURE, ctype_to_dtype
 
 
 @STRUCTURE
@@ -13,6 +13,10 @@ class bilbo_sequence_input_t:
     ]
 
 
+# NumPy mirror of bilbo_sequence_input_t, so that trajectory inputs can be encoded without a loop over the steps
+bilbo_sequence_input_dtype = ctype_to_dtype(bilbo_sequence_input_t)
+
+
 @STRUCTURE
 class bilbo_sequence_description_t:
     FIELDS = [
@@ -1,12 +1,18 @@
 from luma.core.interface.serial import i2c, spi
 from luma.oled.device import sh1106
 from PIL import Image, ImageDraw, ImageFont
+import numpy as np
 import time
 import threading
 
+from core.communication.i2c.i2c import getI2CBus, I2C_PRIORITY_LOW
+
 DISPLAY_WIDTH = 128
 DISPLAY_HEIGHT = 64
 
+# The SH1106 has 132 columns, of which the middle 128 are visible
+SH1106_COLUMN_OFFSET = 2
+
 class Display:
     def __init__(self, i2c_port=1, i2c_address=0x3C, fps=2, page_display_duration=2, page_border_thickness=3):
         """
@@ -27,6 +33,12 @@ class Display:
         self.page_border_thickness = page_border_thickness
         self.update_lock = threading.Lock()
 
+        # Display memory as last sent, one byte per column and page of 8 rows. None if unknown.
+        self.bus = getI2CBus(i2c_port)
+        self.i2c_address = i2c_address
+        self._sent_pages = None
+        self._transfer_lock = threading.Lock()
+
         # Add the Default Page and start with it
         default_page = DefaultPage(self.width, self.height)
         self.add_page(default_page)
@@ -42,7 +54,8 @@ class Display:
     def _clear_display(self):
         """Clear the display to ensure no residual content."""
         blank_image = Image.new("1", (self.width, self.height), 0)  # All black
-        self.device.display(blank_image)
+        self._sent_pages = None
+        self.display_image(blank_image)
 
     def add_page(self, page):
         """Add a page to the display."""
@@ -109,7 +122,7 @@ class Display:
         y = (self.height - text_height) // 2
 
         draw.text((x, y), name, font=font, fill=255)
-        self.device.display(image)  # Display title directly to avoid threading issues
+        self.display_image(image)  # Display title directly to avoid threading issues
 
         # Wait for the title display duration
         time.sleep(self.page_display_duration)
@@ -123,11 +136,38 @@ class Display:
                 self.frame += 1
 
     def display_image(self, image):
-        """Render the given image to the display."""
+        """
+        Render the given image to the display. Only the columns of the pages that changed since the last image are
+        sent, every page in its own low priority bus transaction so that other I2C traffic is not blocked.
+        """
         try:
-            self.device.display(image)
+            with self._transfer_lock:
+                pages = self._packPages(self.device.preprocess(image))
+                if self._sent_pages is None:
+                    changed = np.ones(pages.shape, dtype=bool)
+                else:
+                    changed = pages != self._sent_pages
+
+                for page in np.flatnonzero(changed.any(axis=1)):
+                    columns = np.flatnonzero(changed[page])
+                    start, end = int(columns[0]), int(columns[-1]) + 1
+                    self._writePage(int(page), start, pages[page, start:end])
+
+                self._sent_pages = pages
         except Exception as e:
-            ...
+            self._sent_pages = None
+
+    def _packPages(self, image):
+        """Display memory of a 1-bit image. Bit 0 of every byte is the top row of its page."""
+        pixels = np.asarray(image.convert("1"), dtype=bool)
+        pages = pixels.reshape(self.height // 8, 8, self.width)
+        return np.packbits(pages, axis=1, bitorder='little')[:, 0, :]
+
+    def _writePage(self, page, column, data):
+        column += SH1106_COLUMN_OFFSET
+        with self.bus.transaction(self.i2c_address, I2C_PRIORITY_LOW, num_bytes=len(data) + 3):
+            self.device.command(0xB0 + page, column & 0x0F, 0x10 | (column >> 4))
+            self.device.data(data.tolist())
 
     def start(self):
         """Start the display thread."""
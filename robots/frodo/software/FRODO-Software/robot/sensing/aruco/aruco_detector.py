@@ -1,6 +1,8 @@
 import dataclasses
 import threading
 import time
+from collections import deque
+
 import cv2
 import cv2.aruco as arc
 import numpy as np
@@ -8,6 +10,7 @@ import numpy as np
 # === LOCAL IMPORTS ====================================================================================================
 from robot.sensing.camera.pycamera import PyCamera, PyCameraType
 from robot.utilities.video_streamer.video_streamer import VideoStreamer
+from robot.sensing.aruco.aruco_pipeline import ArucoFrame, FramePool, ImageSequenceSource, LatestQueue
 from robot.sensing.aruco.calibration.calibration import CameraCalibrationData, ArucoCalibration
 from utils.callbacks import callback_handler, CallbackContainer
 from utils.events import ConditionEvent, event_handler
@@ -19,6 +22,9 @@ from utils.exit import ExitHandler
 logger = Logger("Aruco")
 logger.setLevel('DEBUG')
 
+# Measurements over which the rate and the latencies are computed
+STATISTICS_WINDOW = 100
+
 
 # === CALLBACKS and EVENTS =============================================================================================
 @callback_handler
@@ -41,11 +47,27 @@ class ArucoMeasurement:
 
 # === ArucoDetector ====================================================================================================
 class ArucoDetector:
-    camera: PyCamera
+    """
+    Detects ArUco markers in the camera frames with a pipeline of stages, so that the time between two measurements
+    is the time of the slowest stage instead of the sum of all stages:
+
+        capture:  takes a frame every Ts into a slot of a frame pool and stamps it with the capture time
+        workers:  num_workers threads run the marker detection and the pose estimation in parallel, since OpenCV
+                  releases the GIL. Measurements are published in the order of the frames. A frame that is finished
+                  after a newer one is dropped.
+        overlay:  the markers are drawn on the latest frame in getOverlayFrame, i.e. only while a stream client
+                  fetches the frames
+
+    The capture and the workers are linked by a LatestQueue, so that the workers always get the newest frame
+    instead of a backlog. Instead of the camera, a source like an ImageSequenceSource with recorded frames can be
+    given, together with its calibration data.
+    """
+    camera: (PyCamera, ImageSequenceSource)
     measurements: list[ArucoMeasurement]
     callbacks: ArucoDetector_Callbacks
     events: ArucoDetector_Events
     calibration_data: CameraCalibrationData
+    pool: FramePool
 
     Ts: float
     loop_time: float
@@ -54,16 +76,17 @@ class ArucoDetector:
     _exit: bool = False
 
     _overlay_frame_lock = threading.Lock()
-    frame_out: np.array = None
 
     def __init__(self, camera_version: PyCameraType = PyCameraType.V3, image_resolution: tuple = None,
                  aruco_dict: int = arc.DICT_4X4_100,
-                 marker_size: float = 0.08, run_in_thread: bool = True, Ts: float = 0.1):
+                 marker_size: float = 0.08, run_in_thread: bool = True, Ts: float = 0.1, num_workers: int = 2,
+                 source=None, calibration_data: CameraCalibrationData = None):
 
         self.Ts = Ts
         # init program parameters
         self.camera_version = camera_version
         self.run_in_thread = run_in_thread
+        self.num_workers = num_workers
 
         # Init Aruco Detector
         self.marker_size = marker_size
@@ -80,111 +103,198 @@ class ArucoDetector:
         self.detector = arc.ArucoDetector(self.dictionary, self.detector_params)
 
         # Initialize the camera
-        self.camera = PyCamera(version=camera_version, resolution=image_resolution, auto_focus=True)
+        if source is None:
+            source = PyCamera(version=camera_version, resolution=image_resolution, auto_focus=True)
+        self.camera = source
 
         # Load calibration data
-        calibration_name = ArucoCalibration.getCalibrationName(camera_version, image_resolution)
-        self.calibration_data = ArucoCalibration.readCalibrationFile(calibration_name)
+        if calibration_data is None:
+            calibration_name = ArucoCalibration.getCalibrationName(camera_version, image_resolution)
+            calibration_data = ArucoCalibration.readCalibrationFile(calibration_name)
+        self.calibration_data = calibration_data
 
         if self.calibration_data is None:
             raise Exception(
                 f"No Calibration Data found for Camera Version {camera_version} and Resolution {image_resolution}")
 
+        # Frames in use: one in the capture, one in the queue, one per worker and the latest one for the overlay
+        self.pool = FramePool(self.camera.frame_shape, num_frames=num_workers + 3)
+        self._detection_queue = LatestQueue(maxsize=1, on_drop=self._releaseFrame)
+
         # init tasks
-        self.task = threading.Thread(target=self._task)
+        self.task = threading.Thread(target=self._captureTask)
+        self.workers = [threading.Thread(target=self._detectionTask) for _ in range(num_workers)]
         self.exit = ExitHandler()
         self.exit.register(self.close)
         self.timer = IntervalTimer(self.Ts, catch_race_condition=False)
         self.loop_time = 0
+        self.measurements = []
         self.callbacks = ArucoDetector_Callbacks()
         self.events = ArucoDetector_Events()
 
+        self._publish_lock = threading.Lock()
+        self._latest_frame = None
+        self._statistics_lock = threading.Lock()
+        self.resetStatistics()
+
     # ------------------------------------------------------------------------------------------------------------------
     def start(self):
         """start Aruco Detector, activate configured features"""
         self.camera.start()
         self.task.start()
-        logger.info("Aruco Detector started!")
+        for worker in self.workers:
+            worker.start()
+        logger.info(f"Aruco Detector started with {self.num_workers} workers!")
 
     # ------------------------------------------------------------------------------------------------------------------
     def close(self, *args, **kwargs):
         logger.info("Close Aruco Detector")
         self._exit = True
-        self.task.join()
+        self._detection_queue.close()
+        for thread in [self.task, *self.workers]:
+            if thread.is_alive():
+                thread.join()
 
     # ------------------------------------------------------------------------------------------------------------------
     def getOverlayFrame(self):
+        """
+        The latest frame with the detected markers as JPEG. The markers are only drawn when a frame is requested.
+        """
         with self._overlay_frame_lock:
-            if self.frame_out is not None:
-                return self.camera.getImageBufferBytes(self.frame_out)
-            else:
+            frame = self._latest_frame
+            if frame is None:
                 return None
+            frame_out = np.copy(frame.image)
+            marker_corners, marker_ids = frame.marker_corners, frame.marker_ids
+
+        if marker_ids is not None and len(marker_ids) > 0:
+            frame_out = arc.drawDetectedMarkers(frame_out, marker_corners, marker_ids)
+
+        with self._statistics_lock:
+            self._statistics['overlays'] += 1
+        return PyCamera.getImageBuffer(frame_out).tobytes()
 
     # ------------------------------------------------------------------------------------------------------------------
-    def _task(self):
-        first_run = True  # Detect the first run, because it takes longer
-        self.timer.reset()
-        while not self._exit:
+    def getStatistics(self) -> dict:
+        """
+        Counts of the pipeline, the measurement rate and the latencies from the capture to the end of the detection
+        and to the measurement, over the last measurements.
+        """
+        with self._statistics_lock:
+            statistics = {key: value for key, value in self._statistics.items() if key != 'window'}
+            window = np.asarray(self._statistics['window']).reshape(-1, 3)
+        statistics['frames_dropped'] = self._detection_queue.dropped
+
+        if len(window) > 1 and window[-1, 0] > window[0, 0]:
+            statistics['measurement_rate'] = (len(window) - 1) / (window[-1, 0] - window[0, 0])
+        else:
+            statistics['measurement_rate'] = 0.0
+
+        statistics['latency'] = {}
+        for column, name in ((1, 'detection'), (2, 'measurement')):
+            values = window[:, column]
+            statistics['latency'][name] = {
+                'mean': float(np.mean(values)) if len(values) else 0.0,
+                'p95': float(np.percentile(values, 95)) if len(values) else 0.0,
+                'max': float(np.max(values)) if len(values) else 0.0,
+            }
+        return statistics
 
-            # time1 = time.perf_counter()
-            # Reset the measurement
-            self.measurements = []
+    # ------------------------------------------------------------------------------------------------------------------
+    def resetStatistics(self):
+        with self._statistics_lock:
+            self._statistics = {
+                'frames_captured': 0,
+                'frames_stale': 0,  # Finished after a newer frame
+                'measurements': 0,
+                'overlays': 0,
+                'window': deque(maxlen=STATISTICS_WINDOW),  # (time measured, detection latency, measurement latency)
+            }
 
-            # Capture a camera frame
-            frame = self.camera.takeFrame()
+    # ------------------------------------------------------------------------------------------------------------------
+    def _captureTask(self):
+        index = 0
+        self.timer.reset()
+        while not self._exit:
+            slot = self.pool.acquire(timeout=0.1)
+            if slot is None:
+                # All frames are still in use by the workers
+                continue
+
+            if not self.camera.takeFrameInto(self.pool.frames[slot]):
+                self.pool.release(slot)
+                logger.info("No more frames from the source")
+                break
+
+            self._detection_queue.put(ArucoFrame(index=index,
+                                                 slot=slot,
+                                                 image=self.pool.frames[slot],
+                                                 time_capture=time.perf_counter()))
+            index += 1
+            with self._statistics_lock:
+                self._statistics['frames_captured'] += 1
+
+            if self.Ts:
+                self.timer.sleep_until_next()
 
-            # Copy the frame to not mess with the original frame
+    # ------------------------------------------------------------------------------------------------------------------
+    def _detectionTask(self):
+        # Every worker has its own detector
+        detector = arc.ArucoDetector(self.dictionary, self.detector_params)
 
-            frame_out = np.copy(frame)
+        while not self._exit:
+            frame = self._detection_queue.get(timeout=0.1)
+            if frame is None:
+                continue
 
             # Run Aruco Detection
-            # time_11 = time.perf_counter()
-            marker_corners, marker_ids, rejected_candidates = self.detector.detectMarkers(frame)
-            # print(f"Aruco Detection took {((time.perf_counter() - time_11) * 1000):.2f} ms")
+            frame.marker_corners, frame.marker_ids, _ = detector.detectMarkers(frame.image)
+            frame.time_detected = time.perf_counter()
 
             # Check if Marker IDs have been detected
-            if marker_ids is not [] and marker_ids is not None:
-
-                # Generate an overlay frame with detected markers
-                frame_out = arc.drawDetectedMarkers(frame_out, marker_corners, marker_ids)
-
+            if frame.marker_ids is not None and len(frame.marker_ids) > 0:
                 # Run Aruco Measurement
-                rotation_vec, translation_vec, objpts = cv2.aruco.estimatePoseSingleMarkers(marker_corners,
-                                                                                            self.marker_size,
-                                                                                            self.calibration_data.camera_matrix,
-                                                                                            self.calibration_data.dist_coeff)
-                for i, marker_id in enumerate(marker_ids):
-                    self.measurements.append(self._processMeasurement(marker_id, translation_vec[i], rotation_vec[i]))
+                rotation_vec, translation_vec, objpts = cv2.aruco.estimatePoseSingleMarkers(
+                    frame.marker_corners,
+                    self.marker_size,
+                    self.calibration_data.camera_matrix,
+                    self.calibration_data.dist_coeff)
+                frame.measurements = [self._processMeasurement(marker_id, translation_vec[i], rotation_vec[i])
+                                      for i, marker_id in enumerate(frame.marker_ids)]
+            frame.time_measured = time.perf_counter()
 
-            else:
-                # No markers have been detected
-                ...
+            self._publish(frame)
 
-            with self._overlay_frame_lock:
-                self.frame_out = frame_out
-
-            # self.callbacks.new_measurement.call(self.measurements)
-            self.events.new_measurement.set(self.measurements)
-
-            # print(f"Aruco took {((time.perf_counter() - time1) * 1000):.2f} ms")
-            self.loop_time = self.timer.time
+    # ------------------------------------------------------------------------------------------------------------------
+    def _publish(self, frame: ArucoFrame):
+        with self._publish_lock:
+            previous = self._latest_frame
+            if previous is not None and frame.index < previous.index:
+                with self._statistics_lock:
+                    self._statistics['frames_stale'] += 1
+                self._releaseFrame(frame)
+                return
 
-            if not first_run and self.loop_time > self.Ts:
-                ...
-                # logger.debug(f"Aruco Detector loop took longer than Ts: {self.loop_time:.2f} > {self.Ts:.2f}")
+            with self._overlay_frame_lock:
+                self._latest_frame = frame
 
-            if first_run:
-                first_run = False
+            if previous is not None:
+                self.loop_time = frame.time_measured - previous.time_measured
+                self._releaseFrame(previous)
 
-            self.timer.sleep_until_next()
+            self.measurements = frame.measurements
+            with self._statistics_lock:
+                self._statistics['measurements'] += 1
+                self._statistics['window'].append((frame.time_measured,
+                                                   frame.time_detected - frame.time_capture,
+                                                   frame.time_measured - frame.time_capture))
 
-    # ------------------------------------------------------------------------------------------------------------------
-    def _captureImage(self):
-        ...
+            # self.callbacks.new_measurement.call(self.measurements)
+            self.events.new_measurement.set(self.measurements)
 
     # ------------------------------------------------------------------------------------------------------------------
-    def _runMeasurement(self):
-        ...
+    def _releaseFrame(self, frame: ArucoFrame):
+        self.pool.release(frame.slot)
 
     # ------------------------------------------------------------------------------------------------------------------
     @staticmethod
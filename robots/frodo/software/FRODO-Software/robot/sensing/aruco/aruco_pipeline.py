@@ -0,0 +1,173 @@
+import dataclasses
+import os
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+# ======================================================================================================================
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+
+# ======================================================================================================================
+@dataclasses.dataclass
+class ArucoFrame:
+    index: int  # Number of the frame since the start
+    slot: int  # Slot of the frame pool that holds the image
+    image: np.ndarray
+    time_capture: float  # time.perf_counter() when the capture returned
+    time_detected: float = 0.0
+    time_measured: float = 0.0
+    marker_corners: tuple = ()
+    marker_ids: (np.ndarray, None) = None
+    measurements: list = dataclasses.field(default_factory=list)
+
+
+# ======================================================================================================================
+class FramePool:
+    """
+    Preallocated frames for the stages of the pipeline. A stage acquires a slot, fills its frame and passes it on.
+    The last stage that uses a frame releases the slot again.
+    """
+    frames: list[np.ndarray]
+
+    def __init__(self, shape: tuple, num_frames: int, dtype=np.uint8):
+        self.frames = [np.zeros(shape, dtype=dtype) for _ in range(num_frames)]
+        self._free = deque(range(num_frames))
+        self._condition = threading.Condition()
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @property
+    def available(self) -> int:
+        with self._condition:
+            return len(self._free)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def acquire(self, timeout: float = None) -> (int, None):
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._free, timeout):
+                return None
+            return self._free.popleft()
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def release(self, slot: int):
+        with self._condition:
+            self._free.append(slot)
+            self._condition.notify()
+
+
+# ======================================================================================================================
+class LatestQueue:
+    """
+    Bounded queue between two stages. If it is full, put() drops the oldest item, so that a slow consumer always gets
+    the newest frames instead of a growing backlog. Dropped items are passed to on_drop, e.g. to release their frame.
+    """
+    maxsize: int
+    dropped: int
+
+    def __init__(self, maxsize: int = 1, on_drop: callable = None):
+        self.maxsize = maxsize
+        self.on_drop = on_drop
+        self.dropped = 0
+        self._items = deque()
+        self._condition = threading.Condition()
+        self._closed = False
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def put(self, item):
+        dropped = None
+        with self._condition:
+            if len(self._items) >= self.maxsize:
+                dropped = self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._condition.notify()
+
+        if dropped is not None and self.on_drop is not None:
+            self.on_drop(dropped)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def get(self, timeout: float = None):
+        """
+        Returns the oldest item, or None if the timeout expired or the queue was closed.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._items or self._closed, timeout)
+            if not self._items:
+                return None
+            return self._items.popleft()
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def close(self):
+        with self._condition:
+            self._closed = True
+            items = list(self._items)
+            self._items.clear()
+            self._condition.notify_all()
+
+        if self.on_drop is not None:
+            for item in items:
+                self.on_drop(item)
+
+
+# ======================================================================================================================
+class ImageSequenceSource:
+    """
+    Recorded images in place of the camera, e.g. to test the detector without hardware. The images are delivered in
+    order at the frame rate of a camera, or as fast as they are requested if frame_rate is None. Without loop,
+    takeFrameInto returns False after the last image.
+    """
+    images: list[np.ndarray]
+    running: bool = False
+
+    def __init__(self, images: (str, list), frame_rate: (float, None) = 30.0, loop: bool = True):
+        if isinstance(images, str):
+            images = self.readImages(images)
+        if len(images) == 0:
+            raise ValueError("No images for the image sequence")
+
+        self.images = list(images)
+        self.frame_rate = frame_rate
+        self.loop = loop
+        self.frames_delivered = 0
+        self._time_start = None
+        self._frame_number = 0
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def readImages(directory: str) -> list[np.ndarray]:
+        files = sorted(file for file in os.listdir(directory) if file.lower().endswith(IMAGE_EXTENSIONS))
+        return [cv2.imread(os.path.join(directory, file), cv2.IMREAD_COLOR) for file in files]
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @property
+    def frame_shape(self) -> tuple:
+        return self.images[0].shape
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def start(self):
+        self.running = True
+        self._time_start = time.perf_counter()
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def takeFrameInto(self, frame: np.ndarray) -> bool:
+        if not self.loop and self.frames_delivered >= len(self.images):
+            return False
+
+        if self.frame_rate is not None:
+            if self._time_start is None:
+                self._time_start = time.perf_counter()
+            # Like a camera, the next frame is the first one that is completed after the request
+            elapsed = time.perf_counter() - self._time_start
+            self._frame_number = max(int(elapsed * self.frame_rate) + 1, self._frame_number + 1)
+            time.sleep(max(0.0, self._time_start + self._frame_number / self.frame_rate - time.perf_counter()))
+
+        np.copyto(frame, self.images[self.frames_delivered % len(self.images)])
+        self.frames_delivered += 1
+        return True
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def close(self):
+        self.running = False
@@ -0,0 +1,122 @@
+"""
+Compares the pipelined ArucoDetector with the serial loop it replaced (capture, copy, detect, draw, estimate the
+pose, one after the other) on a recorded image sequence. Both get the frames at the rate of the camera. Prints
+the measurement rate and the latency from the capture to the measurement.
+
+Without an argument, a sequence with three markers is generated. A directory with recorded images and the name of
+their calibration (e.g. V3_960x540) can be given instead:
+
+Run from the FRODO-Software directory:
+    python -m robot.sensing.aruco.examples.example_aruco_pipeline [image_directory calibration_name]
+"""
+import sys
+import time
+
+import cv2
+import cv2.aruco as arc
+import numpy as np
+
+from robot.sensing.aruco.aruco_detector import ArucoDetector
+from robot.sensing.aruco.aruco_pipeline import ImageSequenceSource
+from robot.sensing.aruco.calibration.calibration import CameraCalibrationData, ArucoCalibration
+
+RESOLUTION = (960, 540)
+FRAME_RATE = 30
+DURATION = 5.0
+
+
+def generate_sequence(num_frames: int = 60) -> list[np.ndarray]:
+    rng = np.random.default_rng(1)
+    dictionary = arc.getPredefinedDictionary(arc.DICT_4X4_100)
+    width, height = RESOLUTION
+    background = cv2.GaussianBlur(rng.integers(60, 200, (height, width, 3), dtype=np.uint8), (0, 0), 3)
+
+    images = []
+    for k in range(num_frames):
+        image = background.copy()
+        for marker_id, (x, y) in zip((1, 2, 3), ((200, 150), (500, 250), (750, 350))):
+            marker = cv2.cvtColor(arc.generateImageMarker(dictionary, marker_id, 100), cv2.COLOR_GRAY2BGR)
+            marker = cv2.copyMakeBorder(marker, 20, 20, 20, 20, cv2.BORDER_CONSTANT, value=(255, 255, 255))
+            size = marker.shape[0]
+            shift = 20 * np.sin(2 * np.pi * k / num_frames + marker_id)
+            source = np.float32([[0, 0], [size, 0], [size, size], [0, size]])
+            target = np.float32([[x + shift, y], [x + size + shift, y + 10], [x + size, y + size], [x, y + size - 10]])
+            warped = cv2.warpPerspective(marker, cv2.getPerspectiveTransform(source, target), (width, height),
+                                         borderValue=(0, 0, 0))
+            mask = cv2.warpPerspective(np.full((size, size), 255, np.uint8), cv2.getPerspectiveTransform(source, target),
+                                       (width, height)) > 0
+            image[mask] = warped[mask]
+        noise = rng.normal(0, 4, image.shape)
+        images.append(np.clip(image + noise, 0, 255).astype(np.uint8))
+    return images
+
+
+def synthetic_calibration() -> CameraCalibrationData:
+    width, height = RESOLUTION
+    camera_matrix = np.array([[700.0, 0, width / 2], [0, 700.0, height / 2], [0, 0, 1]])
+    return CameraCalibrationData(camera_matrix=camera_matrix, dist_coeff=np.zeros(5), resolution=RESOLUTION)
+
+
+def run_serial(images: list, calibration: CameraCalibrationData, marker_size: float = 0.08) -> dict:
+    """
+    The loop of the detector before the pipeline, with the overlay drawn for every frame.
+    """
+    source = ImageSequenceSource(images, frame_rate=FRAME_RATE)
+    detector = arc.ArucoDetector(arc.getPredefinedDictionary(arc.DICT_4X4_100), arc.DetectorParameters())
+    frame = np.zeros(source.frame_shape, dtype=np.uint8)
+    times, latencies = [], []
+
+    source.start()
+    time_end = time.perf_counter() + DURATION
+    while time.perf_counter() < time_end:
+        source.takeFrameInto(frame)
+        time_capture = time.perf_counter()
+        frame_out = np.copy(frame)
+        marker_corners, marker_ids, _ = detector.detectMarkers(frame)
+        if marker_ids is not None:
+            frame_out = arc.drawDetectedMarkers(frame_out, marker_corners, marker_ids)
+            arc.estimatePoseSingleMarkers(marker_corners, marker_size, calibration.camera_matrix,
+                                          calibration.dist_coeff)
+        times.append(time.perf_counter())
+        latencies.append(times[-1] - time_capture)
+
+    return {'measurement_rate': (len(times) - 1) / (times[-1] - times[0]),
+            'latency': np.mean(latencies), 'latency_max': np.max(latencies)}
+
+
+def run_pipeline(images: list, calibration: CameraCalibrationData, num_workers: int) -> dict:
+    detector = ArucoDetector(source=ImageSequenceSource(images, frame_rate=FRAME_RATE),
+                             calibration_data=calibration, Ts=0, num_workers=num_workers)
+    detector.start()
+    time.sleep(DURATION)
+    statistics = detector.getStatistics()
+    markers = len(detector.measurements)
+    detector.close()
+
+    latency = statistics['latency']['measurement']
+    return {'measurement_rate': statistics['measurement_rate'], 'latency': latency['mean'],
+            'latency_max': latency['max'], 'frames_dropped': statistics['frames_dropped'], 'markers': markers}
+
+
+def main():
+    if len(sys.argv) > 2:
+        images = ImageSequenceSource.readImages(sys.argv[1])
+        calibration = ArucoCalibration.readCalibrationFile(sys.argv[2])
+    else:
+        images = generate_sequence()
+        calibration = synthetic_calibration()
+
+    results = {'serial': run_serial(images, calibration)}
+    for num_workers in (1, 2):
+        results[f'pipeline, {num_workers} workers'] = run_pipeline(images, calibration, num_workers)
+
+    print(f"{len(images)} frames of {images[0].shape[1]}x{images[0].shape[0]} at {FRAME_RATE} fps")
+    for name, result in results.items():
+        print(f"{name:>20}: {result['measurement_rate']:5.1f} measurements/s, capture to measurement "
+              f"{result['latency'] * 1e3:5.1f} ms (max {result['latency_max'] * 1e3:5.1f} ms)"
+              + (f", {result['frames_dropped']} frames dropped, {result['markers']} markers" if 'markers' in result
+                 else ""))
+
+
+if __name__ == '__main__':
+    main()
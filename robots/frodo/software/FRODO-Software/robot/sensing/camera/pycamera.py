@@ -11,8 +11,9 @@ def disableLibcameraLogs():
 disableLibcameraLogs()
 
 import cv2
+import numpy as np
 from libcamera import controls
-from picamera2 import picamera2
+from picamera2 import picamera2, MappedArray
 from robot.utilities.video_streamer.video_streamer import VideoStreamer
 from utils.logging_utils import Logger
 
@@ -74,6 +75,23 @@ class PyCamera:
         with self._camera_lock:
             return self.picam.capture_array()
 
+    @property
+    def frame_shape(self) -> tuple:
+        return self.resolution[1], self.resolution[0], 3
+
+    def takeFrameInto(self, frame: np.ndarray) -> bool:
+        """
+        Copies the next frame into a preallocated array of frame_shape, without allocating a new array like takeFrame.
+        """
+        with self._camera_lock:
+            request = self.picam.capture_request()
+            try:
+                with MappedArray(request, 'main') as mapped:
+                    np.copyto(frame, mapped.array[:, :, :3])
+            finally:
+                request.release()
+        return True
+
     @staticmethod
     def getImageBuffer(frame):
         _, buffer = cv2.imencode('.jpg', frame)
@@ -85,6 +85,7 @@ class VideoStreamer:
             while True:
                 image_buffer = self.image_fetcher()
                 if image_buffer is None:
+                    time.sleep(0.05)
                     continue
                 yield (b'--frame\r\n'
                        b'Content-Type: image/jpeg\r\n\r\n' + image_buffer + b'\r\n')
@@ -0,0 +1,56 @@
+import os
+import tempfile
+
+import h5py
+import numpy as np
+
+from core.utils.archive import ExperimentArchive
+
+
+def write_h5_log(file: str, num_samples: int = 10):
+    # Layout of H5PyDictLogger: one structured dataset with nested fields, larger than the number of samples
+    dtype = np.dtype([('tick', np.uint32), ('estimation', [('state', [('v', np.float32), ('theta', np.float32)])])])
+    data = np.zeros(num_samples + 5, dtype=dtype)
+    data['tick'][:num_samples] = np.arange(num_samples)
+    data['estimation']['state']['v'][:num_samples] = np.linspace(0, 1, num_samples)
+    with h5py.File(file, 'w') as f:
+        dataset = f.create_dataset('samples', data=data)
+        dataset.attrs['num_samples'] = num_samples
+
+
+def test_import_h5_all_signals():
+    folder = tempfile.mkdtemp()
+    file = os.path.join(folder, 'log.h5')
+    write_h5_log(file)
+
+    archive = ExperimentArchive(os.path.join(folder, 'archive'))
+    run = archive.importH5(file, robot='bilbo1')
+    assert run.num_samples == 10
+    assert set(run.signals) == {'tick', 'estimation.state.v', 'estimation.state.theta'}
+
+    data = archive.load(run)
+    assert list(data['tick']) == list(range(10))
+    assert np.allclose(data['estimation.state.v'], np.linspace(0, 1, 10))
+    archive.close()
+
+
+def test_import_h5_selected_signals():
+    folder = tempfile.mkdtemp()
+    file = os.path.join(folder, 'log.h5')
+    write_h5_log(file)
+
+    archive = ExperimentArchive(os.path.join(folder, 'archive'))
+    run = archive.importH5(file, robot='bilbo1', signals=['estimation'])
+    assert run.num_samples == 10
+    assert set(run.signals) == {'estimation.state.v', 'estimation.state.theta'}
+    archive.close()
+
+
+def main():
+    test_import_h5_all_signals()
+    test_import_h5_selected_signals()
+    print("ExperimentArchive.importH5: OK")
+
+
+if __name__ == '__main__':
+    main()
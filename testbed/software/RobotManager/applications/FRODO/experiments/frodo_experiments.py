@@ -14,7 +14,7 @@ from extensions.cli.src.cli import Command, CommandSet, CommandArgument
 from robots.frodo.frodo_manager import FrodoManager
 from robots.frodo.frodo_definitions import get_title_from_marker
 from core.utils.logging_utils import Logger
-from core.utils.csv_utils import CSVLogger
+from core.utils.csv_utils import BatchedLogger
 from core.utils.sound.sound import speak, playSound
 
 # INPUT_FILE_PATH = "./applications/FRODO/experiments/input/"
@@ -103,7 +103,7 @@ class FRODO_ExperimentHandler:
     logging_marker              : int
     logging_marker_count        : int
     logging_marker_description  : str
-    csv_logger                  : CSVLogger
+    csv_logger                  : BatchedLogger
     experiment_log_data         : dict
 
     config                      : json
@@ -145,7 +145,7 @@ class FRODO_ExperimentHandler:
 
     def startCsvLogging(self):
         self._stopped = False
-        self.csv_logger = CSVLogger()
+        self.csv_logger = BatchedLogger()
         self.logging_thread = threading.Thread(target=self._logging_task, daemon=True)
         self.logging_thread.start()
 
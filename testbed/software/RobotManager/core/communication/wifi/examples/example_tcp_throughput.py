@@ -0,0 +1,97 @@
+import socket
+import threading
+import time
+
+import cobs.cobs as cobs
+
+from core.communication.wifi.tcp.tcp_socket import TCP_Socket
+
+
+def _loopback_pair():
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(('127.0.0.1', 0))
+    server.listen(1)
+    client = socket.create_connection(server.getsockname())
+    connection, address = server.accept()
+    server.close()
+    return client, connection, address
+
+
+def example_rx_throughput(num_packets=20000, packet_size=200, chunk_size=65536):
+    """
+    Sends num_packets COBS framed packets over a loopback connection and measures how fast
+    the TCP_Socket on the other end extracts them.
+    """
+    client, connection, address = _loopback_pair()
+    tcp_socket = TCP_Socket(connection, address)
+
+    payload = bytes(range(1, 256)) * (packet_size // 255 + 1)
+    packet = cobs.encode(payload[:packet_size]) + b'\x00'
+    stream = packet * num_packets
+
+    received = threading.Event()
+    count = 0
+
+    def rx_callback(*args, **kwargs):
+        nonlocal count
+        while tcp_socket.rx_queue.qsize() > 0:
+            tcp_socket.rx_queue.get_nowait()
+            count += 1
+        if count >= num_packets:
+            received.set()
+
+    tcp_socket.callbacks.rx.register(rx_callback)
+
+    start = time.perf_counter()
+    for i in range(0, len(stream), chunk_size):
+        client.sendall(stream[i:i + chunk_size])
+    received.wait(timeout=30)
+    duration = time.perf_counter() - start
+
+    print(f"Received {count}/{num_packets} packets of {packet_size} bytes in {duration:.3f} s "
+          f"({count / duration:.0f} packets/s, {len(stream) / duration / 1e6:.1f} MB/s)")
+
+    client.close()
+    tcp_socket.close()
+
+
+def example_tx_throughput(num_packets=20000, packet_size=100, coalesce_time=0.0):
+    """
+    Queues num_packets packets on a TCP_Socket and measures how fast they arrive on the
+    other end of a loopback connection, together with the number of writes needed.
+    """
+    client, connection, address = _loopback_pair()
+    tcp_socket = TCP_Socket(connection, address)
+    tcp_socket.setConfig({'tx_coalesce_time': coalesce_time})
+
+    payload = bytes(range(1, 256)) * (packet_size // 255 + 1)
+    payload = payload[:packet_size]
+
+    start = time.perf_counter()
+    for _ in range(num_packets):
+        tcp_socket.send(payload)
+
+    count = 0
+    while count < num_packets:
+        data = client.recv(65536)
+        if not data:
+            break
+        count += data.count(b'\x00')
+    duration = time.perf_counter() - start
+
+    print(f"Sent {count}/{num_packets} packets of {packet_size} bytes in {duration:.3f} s "
+          f"({count / duration:.0f} packets/s) using {tcp_socket.tx_batches} writes, "
+          f"backpressure: {tcp_socket.tx_backpressure}")
+
+    client.close()
+    tcp_socket.close()
+
+
+if __name__ == '__main__':
+    example_rx_throughput(packet_size=20)
+    example_rx_throughput(packet_size=200)
+    example_rx_throughput(num_packets=200, packet_size=100000)
+
+    example_tx_throughput(packet_size=20)
+    example_tx_throughput(packet_size=1000)
+    example_tx_throughput(packet_size=20, coalesce_time=0.002)
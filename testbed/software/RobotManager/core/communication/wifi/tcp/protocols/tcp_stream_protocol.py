@@ -0,0 +1,81 @@
+import struct
+
+from core.communication.protocol import Protocol, Message
+from core.utils.stream_codec import StreamCodec
+from .tcp_base_protocol import TCP_Base_Protocol
+
+
+# ======================================================================================================================
+class TCP_Stream_Message(Message):
+    """
+    Binary encoded stream sample. The payload is only decoded when it is accessed, using the
+    codec that has been negotiated for the connection.
+    """
+    type: str = 'stream'
+    schema_hash: int
+    encoding: int
+    payload: bytes
+    codec: StreamCodec
+
+    def __init__(self, schema_hash: int = 0, encoding: int = 0, payload: bytes = b'', codec: StreamCodec = None):
+        self.schema_hash = schema_hash
+        self.encoding = encoding
+        self.payload = payload
+        self.codec = codec
+        self._data = None
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @property
+    def data(self) -> dict:
+        if self._data is None and self.codec is not None:
+            self._data = self.codec.decode(self.payload)
+        return self._data
+
+    @data.setter
+    def data(self, value: dict):
+        self._data = value
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def decodeInto(self, instance):
+        """
+        Decode the payload directly into a preallocated dataclass instance.
+        """
+        return self.codec.decodeInto(self.payload, instance)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def decodeRecords(self):
+        """
+        View the payload as a NumPy record array. Only available for the struct encoding.
+        """
+        return self.codec.decodeRecords(self.payload)
+
+
+# ======================================================================================================================
+class TCP_Stream_Protocol(Protocol):
+    """
+    Header: schema hash (4 bytes, little endian) and encoding (1 byte), followed by the encoded sample.
+    """
+    base = TCP_Base_Protocol
+    Message = TCP_Stream_Message
+    identifier = 0x03
+    header = struct.Struct('<IB')
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @classmethod
+    def decode(cls, data: bytes):
+        if len(data) < cls.header.size:
+            return None
+        schema_hash, encoding = cls.header.unpack_from(data)
+        return cls.Message(schema_hash=schema_hash, encoding=encoding, payload=data[cls.header.size:])
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @classmethod
+    def encode(cls, msg: TCP_Stream_Message, *args, **kwargs):
+        return cls.header.pack(msg.schema_hash, msg.encoding) + msg.payload
+
+    @classmethod
+    def check(cls, data):
+        return 1
+
+
+TCP_Stream_Message._protocol = TCP_Stream_Protocol  # Type: Ignore
@@ -7,6 +7,7 @@ from core.communication.wifi.tcp.protocols.tcp_base_protocol import TCP_Base_Pro
 # from core.communication.wifi.tcp.protocols.tcp_handshake_protocol import TCP_Handshake_Protocol, \
 #     TCP_Handshake_Message
 from core.communication.wifi.tcp.protocols.tcp_json_protocol import TCP_JSON_Protocol, TCP_JSON_Message
+from core.communication.wifi.tcp.protocols.tcp_stream_protocol import TCP_Stream_Protocol
 from core.communication.protocol import Message
 from core.communication.wifi.tcp.tcp_socket import TCP_Socket
 from core.utils.callbacks import callback_definition, CallbackContainer
@@ -30,6 +31,10 @@ class TCP_Connection:
     callbacks: TCPConnectionCallback
     base_protocol = TCP_Base_Protocol
     protocol = TCP_JSON_Protocol
+    protocols = {
+        TCP_JSON_Protocol.identifier: TCP_JSON_Protocol,
+        TCP_Stream_Protocol.identifier: TCP_Stream_Protocol,
+    }
 
     _events: dict[str, threading.Event]
     _thread: threading.Thread
@@ -107,8 +112,8 @@ class TCP_Connection:
     # === PRIVATE METHODS ==============================================================================================
     def _encodeMessage(self, msg: Message):
 
-        if msg._protocol is not self.protocol:
-            print("OH NOO")
+        if self.protocols.get(msg._protocol.identifier) is not msg._protocol:
+            logger.error(f"Cannot send message with protocol: {msg._protocol}")
             return
 
         payload = msg.encode()
@@ -156,11 +161,15 @@ class TCP_Connection:
         self.last_contact = time.time()
 
         # Check if the protocol ID uses a protocol known to the device
-        if base_msg.data_protocol_id is not self.protocol.identifier:
+        protocol = self.protocols.get(base_msg.data_protocol_id)
+        if protocol is None:
             return
 
         # Decode the message
-        message = self.protocol.decode(base_msg.data)  # Type: Ignore
+        message = protocol.decode(base_msg.data)  # Type: Ignore
+        if message is None:
+            self.error_packets += 1
+            return
 
         # Check if the message is a handshake event
         if message.type == 'event' and message.event == 'handshake':
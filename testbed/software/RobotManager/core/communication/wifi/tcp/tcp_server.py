@@ -1,7 +1,9 @@
 import time
+from typing import Union
 
 import core.settings as settings
 from core.communication.wifi.tcp.tcp_socket import TCP_SocketsHandler, TCP_Socket
+from core.communication.wifi.tcp.tcp_socket_async import TCP_AsyncSocketsHandler
 from core.communication.wifi.udp.protocols.udp_json_protocol import UDP_JSON_Message
 from core.communication.wifi.udp.udp import UDP, UDP_Broadcast
 import core.communication.addresses as addresses
@@ -31,15 +33,21 @@ class TCP_Server:
     address: str
 
     _unregistered_connections: list[TCP_Connection]
-    _tcp: TCP_SocketsHandler
+    _tcp: Union[TCP_SocketsHandler, TCP_AsyncSocketsHandler]
     _udp: UDP
 
     # === INIT =========================================================================================================
-    def __init__(self, address):
-
+    def __init__(self, address, use_asyncio: bool = False):
+        """
+        :param address: address to host the server on
+        :param use_asyncio: serve all connections from one asyncio event loop instead of two threads per connection
+        """
         self.address = address
 
-        self._tcp = TCP_SocketsHandler(address=self.address)
+        if use_asyncio:
+            self._tcp = TCP_AsyncSocketsHandler(address=self.address)
+        else:
+            self._tcp = TCP_SocketsHandler(address=self.address)
         self._udp = UDP(address=self.address, port=settings.UDP_PORT_ADDRESS_STREAM)
 
         self.connections = []
@@ -17,8 +17,21 @@ logger.setLevel('INFO')
 PACKAGE_TIMEOUT_TIME = 5
 FAULTY_PACKAGES_MAX_NUMBER = 10
 
-# Default minimum delay (in seconds) between consecutive TX writes.
-DEFAULT_MIN_TX_DELAY = 0.001
+# Default minimum delay (in seconds) between consecutive TX writes. Since all pending
+# messages are sent in one write, no delay is needed by default.
+DEFAULT_MIN_TX_DELAY = 0
+# Default time (in seconds) to wait for further messages before writing a batch (0 = disabled).
+DEFAULT_TX_COALESCE_TIME = 0
+# Default maximum number of bytes combined into a single write.
+DEFAULT_TX_MAX_BATCH_SIZE = 65536
+
+# Flag for non-blocking sends. Not available on all platforms.
+_MSG_DONTWAIT = getattr(socket, 'MSG_DONTWAIT', 0)
+
+# Initial size of the preallocated receive buffer. It grows if a single packet does not fit.
+RX_BUFFER_SIZE = 65536
+# Minimum free space at the end of the receive buffer before calling recv_into().
+RX_MIN_FREE_SPACE = 8192
 
 
 @dataclasses.dataclass
@@ -29,6 +42,35 @@ class FaultyPackage:
     timestamp: float
 
 
+# ----------------------------------------------------------------------------------------------------------------------
+def cobs_decode_in_place(buffer: memoryview, start: int, end: int):
+    """
+    Decode the COBS encoded packet buffer[start:end] in place.
+
+    The decoded packet is never longer than the encoded one, so it is written back starting at `start`.
+    Returns the length of the decoded packet or None if the packet is malformed.
+    """
+    read = start
+    write = start
+    while read < end:
+        code = buffer[read]
+        if code == 0:
+            return None
+        read += 1
+        block_end = read + code - 1
+        if block_end > end:
+            return None
+        length = code - 1
+        if length:
+            buffer[write:write + length] = buffer[read:block_end]
+            write += length
+        read = block_end
+        if code < 0xFF and read < end:
+            buffer[write] = 0
+            write += 1
+    return write - start
+
+
 @callback_definition
 class TCPSocketCallbacks:
     """
@@ -36,13 +78,14 @@ class TCPSocketCallbacks:
     """
     rx: CallbackContainer
     disconnected: CallbackContainer
+    tx_backpressure: CallbackContainer
 
 
 class TCP_Socket:
     """
     TCP socket wrapper that handles asynchronous reads and writes.
     Incoming messages are buffered and processed, while outgoing messages
-    are queued and sent with a minimum delay between writes.
+    are queued and all pending messages are sent together in a single write.
     """
     address: str  # IP address of the client
     rx_queue: queue.Queue  # Queue for incoming messages
@@ -52,11 +95,19 @@ class TCP_Socket:
     rx_callback: callable  # Callback function for received messages
     rx_event: threading.Event  # Event signaling new data reception
 
+    tx_packets: int  # Number of sent packets
+    tx_batches: int  # Number of writes used to send them
+    tx_backpressure: int  # Number of writes that found the kernel send buffer full
+
     _connection: socket.socket
     _rxThread: threading.Thread
     _txThread: threading.Thread  # Thread handling the TX queue
     _faultyPackages: list
-    _rx_buffer: bytes  # Buffer for accumulating partial data
+    _rx_buffer: bytearray  # Preallocated buffer for accumulating partial data
+    _rx_view: memoryview  # View on _rx_buffer used for recv_into and in-place decoding
+    _rx_start: int  # Start of the first unprocessed packet in _rx_buffer
+    _rx_end: int  # End of the valid data in _rx_buffer
+    _rx_scan: int  # Position from which the next delimiter search resumes
     _last_faulty_cleanup: float
     _exit: bool  # Flag to signal shutdown
 
@@ -69,13 +120,22 @@ class TCP_Socket:
         self.address = address
 
         # Default configuration: delimiter for packets, whether to use COBS encoding,
-        # and minimum TX delay between consecutive sends.
+        # minimum TX delay between consecutive writes, the coalescing window and the
+        # maximum size of a single write.
         self.config = {
             'delimiter': b'\x00',
             'cobs': True,
-            'min_tx_delay': DEFAULT_MIN_TX_DELAY
+            'min_tx_delay': DEFAULT_MIN_TX_DELAY,
+            'tx_coalesce_time': DEFAULT_TX_COALESCE_TIME,
+            'tx_max_batch_size': DEFAULT_TX_MAX_BATCH_SIZE,
         }
 
+        # Messages are batched here, so the kernel does not need to delay small writes.
+        try:
+            self._connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except (OSError, AttributeError):
+            pass
+
         self.rx_queue = queue.Queue()
         self.tx_queue = queue.Queue()
 
@@ -85,17 +145,19 @@ class TCP_Socket:
 
         self.rx_event = threading.Event()
 
+        self.tx_packets = 0
+        self.tx_batches = 0
+        self.tx_backpressure = 0
+
         self._faultyPackages = []
-        self._rx_buffer = b''
+        self._rx_buffer = bytearray(RX_BUFFER_SIZE)
+        self._rx_view = memoryview(self._rx_buffer)
+        self._rx_start = 0
+        self._rx_end = 0
+        self._rx_scan = 0
         self._last_faulty_cleanup = time.time()
 
-        # Start the RX thread to handle incoming data.
-        self._rxThread = threading.Thread(target=self._rx_thread_fun, daemon=True)
-        self._rxThread.start()
-
-        # Start the TX thread to process outgoing messages from the tx_queue.
-        self._txThread = threading.Thread(target=self._tx_thread_fun, daemon=True)
-        self._txThread.start()
+        self._start()
 
     # -------------------------------------------------------------------------
     def send(self, data):
@@ -103,8 +165,8 @@ class TCP_Socket:
         Encode and queue data to be sent over the socket.
 
         Instead of sending data immediately, the data is encoded and then put
-        into a transmit queue. The TX thread processes this queue and ensures
-        that there is a minimum delay between consecutive writes.
+        into a transmit queue. The TX thread sends all messages pending in this
+        queue with a single write.
         """
         data = self._prepareTxData(data)
         self.tx_queue.put(data)
@@ -142,53 +204,69 @@ class TCP_Socket:
         """
         self.config = {**self.config, **config}
 
+    # -------------------------------------------------------------------------
+    def _start(self):
+        """
+        Start the RX thread to handle incoming data and the TX thread to process
+        outgoing messages from the tx_queue.
+        """
+        self._rxThread = threading.Thread(target=self._rx_thread_fun, daemon=True)
+        self._rxThread.start()
+
+        self._txThread = threading.Thread(target=self._tx_thread_fun, daemon=True)
+        self._txThread.start()
+
     # -------------------------------------------------------------------------
     def _rx_thread_fun(self):
         """
         Thread function to continuously receive data from the socket.
-        Received data is accumulated into an internal buffer and processed to extract
-        complete packets. This implementation properly handles partial packets
-        that may exceed the recv() call's size.
-
-        Note: Even if a packet is larger than the recv() size (8192 bytes),
-        TCP (being a stream protocol) will deliver it in parts, which are then
-        reassembled by the buffer.
+        Data is received directly into the preallocated receive buffer with recv_into()
+        and processed there to extract complete packets. Partial packets stay in the
+        buffer until the rest arrives; the buffer grows if a single packet does not fit.
         """
         while not self._exit:
+            self._reserveRxSpace(RX_MIN_FREE_SPACE)
             try:
-                # Increase recv buffer size to 8192 bytes.
-                data = self._connection.recv(8192)
+                received = self._connection.recv_into(self._rx_view[self._rx_end:])
             except Exception as e:
                 logger.warning("Error in TCP connection: %s. Closing connection.", e)
                 self.close()
                 return
 
             # If no data is received, assume the client closed the connection.
-            if not data:
+            if received == 0:
                 self.close()
                 break
 
             # Process the received data, accumulating partial packets if needed.
-            self._processRxData(data)
-
-            # Clean up old faulty packages approximately once per second.
-            now = time.time()
-            if int(now - self._last_faulty_cleanup) > 1:
-                self._faultyPackages = [
-                    p for p in self._faultyPackages if now < (p.timestamp + PACKAGE_TIMEOUT_TIME)
-                ]
-                if len(self._faultyPackages) > FAULTY_PACKAGES_MAX_NUMBER:
-                    logger.warning("Received %d faulty TCP packages in the last %d seconds",
-                                   FAULTY_PACKAGES_MAX_NUMBER, PACKAGE_TIMEOUT_TIME)
-                self._last_faulty_cleanup = now
+            self._rx_end += received
+            self._processRxBuffer()
+            self._cleanupFaultyPackages()
+
+    # -------------------------------------------------------------------------
+    def _cleanupFaultyPackages(self):
+        """
+        Clean up old faulty packages approximately once per second.
+        """
+        now = time.time()
+        if int(now - self._last_faulty_cleanup) > 1:
+            self._faultyPackages = [
+                p for p in self._faultyPackages if now < (p.timestamp + PACKAGE_TIMEOUT_TIME)
+            ]
+            if len(self._faultyPackages) > FAULTY_PACKAGES_MAX_NUMBER:
+                logger.warning("Received %d faulty TCP packages in the last %d seconds",
+                               FAULTY_PACKAGES_MAX_NUMBER, PACKAGE_TIMEOUT_TIME)
+            self._last_faulty_cleanup = now
 
     # -------------------------------------------------------------------------
     def _tx_thread_fun(self):
         """
         TX thread function that continuously sends messages from the tx_queue.
-        Ensures that a defined minimum delay is observed between consecutive writes.
+
+        After the first message arrives, the thread optionally waits for the coalescing
+        window and then drains everything pending in the queue (up to the maximum batch
+        size) into one buffer, which is written with a single call.
         """
-        min_tx_delay = self.config.get("min_tx_delay", DEFAULT_MIN_TX_DELAY)
         while not self._exit:
             try:
                 # Use a timeout to periodically check the _exit flag.
@@ -196,8 +274,28 @@ class TCP_Socket:
             except queue.Empty:
                 continue
 
-            self._write(data)
-            time.sleep(min_tx_delay)
+            coalesce_time = self.config.get('tx_coalesce_time', DEFAULT_TX_COALESCE_TIME)
+            if coalesce_time > 0:
+                time.sleep(coalesce_time)
+
+            batch = [data]
+            batch_size = len(data)
+            max_batch_size = self.config.get('tx_max_batch_size', DEFAULT_TX_MAX_BATCH_SIZE)
+            while batch_size < max_batch_size:
+                try:
+                    data = self.tx_queue.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(data)
+                batch_size += len(data)
+
+            self._write(batch[0] if len(batch) == 1 else b''.join(batch))
+            self.tx_packets += len(batch)
+            self.tx_batches += 1
+
+            min_tx_delay = self.config.get('min_tx_delay', DEFAULT_MIN_TX_DELAY)
+            if min_tx_delay > 0:
+                time.sleep(min_tx_delay)
 
     # -------------------------------------------------------------------------
     def _prepareTxData(self, data):
@@ -218,55 +316,128 @@ class TCP_Socket:
     # -------------------------------------------------------------------------
     def _write(self, data):
         """
-        Write data immediately to the socket using sendall.
+        Write data immediately to the socket.
+
+        The data is first sent without blocking. If the kernel send buffer cannot take all
+        of it, backpressure is reported and the rest is sent blocking with sendall.
         If an error occurs during the send, the connection is closed.
         """
         try:
-            self._connection.sendall(data)
+            if not _MSG_DONTWAIT:
+                self._connection.sendall(data)
+                return
+            try:
+                sent = self._connection.send(data, _MSG_DONTWAIT)
+            except BlockingIOError:
+                sent = 0
+            if sent < len(data):
+                self._reportBackpressure(len(data) - sent)
+                self._connection.sendall(memoryview(data)[sent:])
         except Exception as e:
             logger.warning("Error sending data: %s", e)
             self.close()
 
+    # -------------------------------------------------------------------------
+    def _reportBackpressure(self, pending):
+        """
+        Called when the kernel send buffer is full and `pending` bytes have to wait.
+        """
+        self.tx_backpressure += 1
+        logger.debug("TCP send buffer of %s full, %d bytes pending, %d messages queued",
+                     self.address, pending, self.tx_queue.qsize())
+        for callback in self.callbacks.tx_backpressure:
+            callback(self, pending)
+
     # -------------------------------------------------------------------------
     def _processRxData(self, data):
         """
-        Append new data to the internal buffer and extract complete packets.
-        Incomplete data remains in the buffer until more data arrives.
+        Append new data to the receive buffer and extract complete packets.
+        Used for data that was not received via recv_into(), e.g. for testing.
+        """
+        self._reserveRxSpace(len(data))
+        self._rx_view[self._rx_end:self._rx_end + len(data)] = data
+        self._rx_end += len(data)
+        self._processRxBuffer()
+
+    # -------------------------------------------------------------------------
+    def _reserveRxSpace(self, size):
+        """
+        Make sure that at least `size` bytes are free at the end of the receive buffer.
+
+        Pending (incomplete) data is first moved to the front of the buffer. Only if that
+        does not free enough space, a larger buffer is allocated.
+        """
+        if len(self._rx_buffer) - self._rx_end >= size:
+            return
+
+        pending = self._rx_end - self._rx_start
+        if len(self._rx_buffer) - pending >= size:
+            # Move the pending data to the front of the buffer
+            self._rx_view[0:pending] = self._rx_view[self._rx_start:self._rx_end]
+        else:
+            buffer = bytearray(max(2 * len(self._rx_buffer), pending + size))
+            buffer[0:pending] = self._rx_view[self._rx_start:self._rx_end]
+            self._rx_view.release()
+            self._rx_buffer = buffer
+            self._rx_view = memoryview(buffer)
+            logger.debug("Increased TCP receive buffer of %s to %d bytes", self.address, len(buffer))
+
+        self._rx_scan -= self._rx_start
+        self._rx_start = 0
+        self._rx_end = pending
+
+    # -------------------------------------------------------------------------
+    def _processRxBuffer(self):
+        """
+        Extract complete packets from the receive buffer.
+        Incomplete data remains in the buffer until more data arrives. The delimiter
+        search resumes where the last search stopped, so every byte is scanned once.
 
-        If COBS encoding is enabled, the packet is decoded before being added
-        to the receive queue.
+        If COBS encoding is enabled, the packet is decoded in place before being
+        copied into the receive queue.
         """
-        # Append newly received data to the persistent buffer.
-        self._rx_buffer += data
         delimiter = self.config.get('delimiter')
+        use_cobs = self.config.get('cobs', False)
 
         while True:
-            index = self._rx_buffer.find(delimiter)
+            index = self._rx_buffer.find(delimiter, self._rx_scan, self._rx_end)
             if index == -1:
-                # No complete packet found yet; wait for more data.
+                # No complete packet found yet; a delimiter might still start in the last bytes.
+                self._rx_scan = max(self._rx_start, self._rx_end - len(delimiter) + 1)
                 break
 
-            # Extract one complete packet from the buffer.
-            packet = self._rx_buffer[:index]
-            # Remove the processed packet and delimiter from the buffer.
-            self._rx_buffer = self._rx_buffer[index + len(delimiter):]
+            start = self._rx_start
+            end = index
+            # Remove the packet and delimiter from the pending data.
+            self._rx_start = self._rx_scan = index + len(delimiter)
 
             # If COBS encoding is enabled, attempt to decode the packet.
-            if self.config.get('cobs', False):
-                try:
-                    packet = cobs.decode(packet)
-                except Exception:
+            if use_cobs:
+                length = cobs_decode_in_place(self._rx_view, start, end)
+                if length is None:
                     # If decoding fails, log a faulty package and skip this packet.
                     self._faultyPackages.append(FaultyPackage(timestamp=time.time()))
                     continue
+                end = start + length
+
+            self.rx_queue.put(bytes(self._rx_view[start:end]))
 
-            self.rx_queue.put(packet)
+        # Rewind the buffer if all data has been processed.
+        if self._rx_start == self._rx_end:
+            self._rx_start = self._rx_end = self._rx_scan = 0
 
         # Signal and invoke receive callbacks if any packets have been queued.
         if not self.rx_queue.empty():
-            self.rx_event.set()
-            for callback in self.callbacks.rx:
-                callback(self)
+            self._notifyRx()
+
+    # -------------------------------------------------------------------------
+    def _notifyRx(self):
+        """
+        Signal the rx_event and invoke the receive callbacks.
+        """
+        self.rx_event.set()
+        for callback in self.callbacks.rx:
+            callback(self)
 
 
 @callback_definition
@@ -0,0 +1,307 @@
+import asyncio
+import concurrent.futures
+import socket
+import threading
+
+from core.communication.wifi.tcp.tcp_socket import TCP_Socket, TCPSocketsHandlerCallbacks, RX_MIN_FREE_SPACE, logger
+
+# Number of worker threads used to run user callbacks of all asyncio TCP sockets.
+DEFAULT_CALLBACK_WORKERS = 8
+
+
+class TCP_AsyncLoop:
+    """
+    Single asyncio event loop running in a background thread, shared by all asyncio TCP sockets.
+    Blocking user callbacks are run in a shared thread pool instead of the loop.
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    loop: asyncio.AbstractEventLoop
+    executor: concurrent.futures.ThreadPoolExecutor
+    _thread: threading.Thread
+
+    def __init__(self, callback_workers: int = DEFAULT_CALLBACK_WORKERS):
+        self.loop = asyncio.new_event_loop()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=callback_workers,
+                                                              thread_name_prefix='tcp_callbacks')
+        self._thread = threading.Thread(target=self._threadFunction, daemon=True)
+        self._thread.start()
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def get(cls) -> 'TCP_AsyncLoop':
+        """
+        Return the shared loop, starting it on first use.
+        """
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = TCP_AsyncLoop()
+            return cls._instance
+
+    # -------------------------------------------------------------------------
+    def run(self, coroutine, timeout=None):
+        """
+        Run a coroutine on the loop from another thread and wait for its result.
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(timeout)
+
+    # -------------------------------------------------------------------------
+    def _threadFunction(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+
+class TCP_AsyncSocket(TCP_Socket):
+    """
+    Asyncio variant of TCP_Socket with the same interface and callbacks.
+
+    Data is received by the shared event loop directly into the receive buffer
+    (via the asyncio.BufferedProtocol methods) and framed exactly like in TCP_Socket. Messages passed to
+    send() are collected and written together in the next loop iteration. Callbacks are run
+    in the thread pool of the loop; the receive callbacks of one socket never run concurrently.
+    """
+    _transport: asyncio.Transport
+    _async_loop: TCP_AsyncLoop
+    _tx_pending: list
+    _tx_lock: threading.Lock
+    _rx_dispatch_lock: threading.Lock
+    _rx_dispatch_pending: bool
+    _closed: bool
+
+    def __init__(self, transport: asyncio.Transport, address, async_loop: TCP_AsyncLoop = None):
+        self._transport = transport
+        self._async_loop = async_loop if async_loop is not None else TCP_AsyncLoop.get()
+        self._tx_pending = []
+        self._tx_lock = threading.Lock()
+        self._rx_dispatch_lock = threading.Lock()
+        self._rx_dispatch_pending = False
+        self._closed = False
+        super().__init__(transport.get_extra_info('socket'), address)
+
+    # -------------------------------------------------------------------------
+    def send(self, data):
+        """
+        Encode and queue data to be sent over the socket. Everything queued until the
+        event loop gets to it is written with a single call.
+        """
+        data = self._prepareTxData(data)
+        with self._tx_lock:
+            self._tx_pending.append(data)
+            schedule = len(self._tx_pending) == 1
+        if schedule:
+            self._async_loop.loop.call_soon_threadsafe(self._flushTx)
+
+    # -------------------------------------------------------------------------
+    def close(self):
+        """
+        Close the connection. The disconnected callbacks are called once the
+        transport has been closed.
+        """
+        self._exit = True
+        if not self._transport.is_closing():
+            self._async_loop.loop.call_soon_threadsafe(self._transport.close)
+
+    # === asyncio.BufferedProtocol =============================================
+    def get_buffer(self, sizehint):
+        self._reserveRxSpace(max(sizehint, RX_MIN_FREE_SPACE))
+        return self._rx_view[self._rx_end:]
+
+    # -------------------------------------------------------------------------
+    def buffer_updated(self, nbytes):
+        self._rx_end += nbytes
+        self._processRxBuffer()
+        self._cleanupFaultyPackages()
+
+    # -------------------------------------------------------------------------
+    def eof_received(self):
+        # Returning a false value closes the transport, which calls connection_lost().
+        return False
+
+    # -------------------------------------------------------------------------
+    def connection_lost(self, exc):
+        if self._closed:
+            return
+        self._closed = True
+        self._exit = True
+        if exc is not None:
+            logger.warning("Error in TCP connection: %s. Closing connection.", exc)
+        logger.info("TCP socket %s closed", self.address)
+        self._async_loop.executor.submit(self._notifyDisconnected)
+
+    # -------------------------------------------------------------------------
+    def pause_writing(self):
+        self._reportBackpressure(self._transport.get_write_buffer_size())
+
+    # -------------------------------------------------------------------------
+    def resume_writing(self):
+        pass
+
+    # === PRIVATE METHODS ======================================================
+    def _start(self):
+        # Reading and writing is done by the event loop, no threads are needed.
+        pass
+
+    # -------------------------------------------------------------------------
+    def _flushTx(self):
+        with self._tx_lock:
+            batch = self._tx_pending
+            self._tx_pending = []
+        if not batch or self._transport.is_closing():
+            return
+        self._transport.write(batch[0] if len(batch) == 1 else b''.join(batch))
+        self.tx_packets += len(batch)
+        self.tx_batches += 1
+
+    # -------------------------------------------------------------------------
+    def _notifyRx(self):
+        """
+        Hand the receive callbacks to the thread pool. At most one dispatch per socket
+        is pending at a time; packets arriving in the meantime are picked up by it.
+        """
+        if self._rx_dispatch_pending:
+            return
+        self._rx_dispatch_pending = True
+        self._async_loop.executor.submit(self._dispatchRx)
+
+    # -------------------------------------------------------------------------
+    def _dispatchRx(self):
+        with self._rx_dispatch_lock:
+            self._rx_dispatch_pending = False
+            try:
+                super()._notifyRx()
+            except Exception as e:
+                logger.error("Error in TCP rx callback of %s: %s", self.address, e)
+
+    # -------------------------------------------------------------------------
+    def _notifyDisconnected(self):
+        for callback in self.callbacks.disconnected:
+            callback(self)
+
+
+class TCP_AsyncSocketsHandler:
+    """
+    Asyncio variant of TCP_SocketsHandler. All client connections are served by the
+    shared event loop instead of dedicated threads.
+    """
+    address: str
+    port: int
+    sockets: list  # List of connected client TCP_AsyncSocket instances
+    config: dict
+    callbacks: TCPSocketsHandlerCallbacks
+    _async_loop: TCP_AsyncLoop
+    _server: asyncio.AbstractServer
+
+    def __init__(self, address, hostname: bool = False, config: dict = None):
+        default_config = {
+            'max_clients': 100,
+            'port': 6666,
+        }
+        if config is None:
+            config = {}
+        self.config = {**default_config, **config}
+
+        self.sockets = []
+        self.address = address
+        self.port = self.config['port']
+        self.callbacks = TCPSocketsHandlerCallbacks()
+        self._async_loop = TCP_AsyncLoop.get()
+        self._server = None
+
+    # -------------------------------------------------------------------------
+    def init(self):
+        pass
+
+    # -------------------------------------------------------------------------
+    def start(self):
+        """
+        Start accepting client connections on the shared event loop.
+        """
+        try:
+            self._server = self._async_loop.run(self._async_loop.loop.create_server(
+                self._createSocket, self.address, self.port,
+                family=socket.AF_INET, reuse_address=True, backlog=self.config['max_clients']))
+        except OSError as e:
+            raise Exception("Address already in use. Please wait until the address is released") from e
+        logger.info("Starting TCP host on %s:%d", self.address, self.port)
+
+    # -------------------------------------------------------------------------
+    def close(self):
+        logger.info("TCP host closed on %s:%d", self.address, self.port)
+        if self._server is not None:
+            self._async_loop.loop.call_soon_threadsafe(self._server.close)
+
+    # -------------------------------------------------------------------------
+    def send(self):
+        pass
+
+    # === PRIVATE METHODS ======================================================
+    def _createSocket(self):
+        return _TCP_AsyncServerProtocol(self)
+
+    # -------------------------------------------------------------------------
+    def _acceptNewClient(self, transport: asyncio.Transport):
+        """
+        Create a TCP_AsyncSocket for a new connection. Reading is paused until the
+        client_connected callbacks have registered their own callbacks on the socket.
+        """
+        client = TCP_AsyncSocket(transport, transport.get_extra_info('peername'), self._async_loop)
+        self.sockets.append(client)
+        logger.info("New client connected: %s", client.address)
+        client.callbacks.disconnected.register(self._clientClosed_callback)
+
+        transport.pause_reading()
+        future = self._async_loop.executor.submit(self._notifyClientConnected, client)
+        future.add_done_callback(
+            lambda _: self._async_loop.loop.call_soon_threadsafe(self._resumeReading, transport))
+        return client
+
+    # -------------------------------------------------------------------------
+    def _notifyClientConnected(self, client):
+        for callback in self.callbacks.client_connected:
+            callback(client)
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _resumeReading(transport: asyncio.Transport):
+        if not transport.is_closing():
+            transport.resume_reading()
+
+    # -------------------------------------------------------------------------
+    def _clientClosed_callback(self, client: TCP_AsyncSocket):
+        if client in self.sockets:
+            self.sockets.remove(client)
+        for cb in self.callbacks.client_disconnected:
+            cb(client)
+
+
+class _TCP_AsyncServerProtocol(asyncio.BufferedProtocol):
+    """
+    Protocol created by the server for every incoming connection. Forwards everything
+    to the TCP_AsyncSocket created in connection_made().
+    """
+
+    def __init__(self, handler: TCP_AsyncSocketsHandler):
+        self._handler = handler
+        self._socket = None
+
+    def connection_made(self, transport):
+        self._socket = self._handler._acceptNewClient(transport)
+
+    def get_buffer(self, sizehint):
+        return self._socket.get_buffer(sizehint)
+
+    def buffer_updated(self, nbytes):
+        self._socket.buffer_updated(nbytes)
+
+    def eof_received(self):
+        return self._socket.eof_received()
+
+    def connection_lost(self, exc):
+        self._socket.connection_lost(exc)
+
+    def pause_writing(self):
+        self._socket.pause_writing()
+
+    def resume_writing(self):
+        self._socket.resume_writing()
@@ -1,13 +1,19 @@
+import asyncio
+import concurrent.futures
 import dataclasses
+import itertools
+import threading
 import time
 
 # === OWN PACKAGES =====================================================================================================
 from core.communication.protocol import Message
 from core.communication.wifi.tcp.protocols.tcp_json_protocol import TCP_JSON_Message
+from core.communication.wifi.tcp.protocols.tcp_stream_protocol import TCP_Stream_Message
 from core.communication.wifi.tcp.tcp_connection import TCP_Connection
 from core.utils.callbacks import callback_definition, CallbackContainer
 from core.utils.events import event_definition, ConditionEvent
 from core.utils.logging_utils import Logger
+from core.utils.stream_codec import StreamSchema, StreamCodec, getStreamCodec, STREAM_ENCODING_RECORDS
 from core.utils.time import TimeoutTimer
 
 # === GLOBAL VARIABLES =================================================================================================
@@ -22,6 +28,7 @@ class DeviceCallbacks:
     disconnected: CallbackContainer
     rx: CallbackContainer
     stream: CallbackContainer
+    records: CallbackContainer  # Batches of records of stream subscriptions
     event: CallbackContainer
     timeout: CallbackContainer
 
@@ -36,12 +43,19 @@ class DeviceEvents:
 
 
 # ======================================================================================================================
-class Request:
-    event: ConditionEvent
+class RequestFuture(concurrent.futures.Future):
+    """
+    Pending request to a device. The result is the data of the response message. Can be waited on with
+    result(timeout) or awaited from an asyncio event loop.
+    """
     id: int
 
-    def __init__(self):
-        self.event = ConditionEvent()
+    def __init__(self, request_id: int):
+        super().__init__()
+        self.id = request_id
+
+    def __await__(self):
+        return asyncio.wrap_future(self).__await__()
 
 
 # ======================================================================================================================
@@ -81,7 +95,11 @@ class Device:
     last_heartbeat: (float, None)
     heartbeat_timer: TimeoutTimer
 
-    _readRequests = dict[int, Request]
+    stream_codec: (StreamCodec, None)  # Codec for binary stream messages, negotiated on registration
+
+    _requests: dict[int, RequestFuture]
+    _request_ids: itertools.count
+    _requests_lock: threading.Lock
 
     # === INIT =========================================================================================================
     def __init__(self, connection: TCP_Connection = None):
@@ -93,8 +111,11 @@ class Device:
         self.commands = {}
         self.last_heartbeat = None
         self.heartbeat_timer = TimeoutTimer(timeout_time=5, timeout_callback=self._heartBeatTimeout_callback)
+        self.stream_codec = None
 
-        self._readRequests = {}
+        self._requests = {}
+        self._request_ids = itertools.count(1)
+        self._requests_lock = threading.Lock()
         self.callbacks = DeviceCallbacks()
         self.events = DeviceEvents()
 
@@ -123,121 +144,132 @@ class Device:
         self.tcp_connection.close()
 
     # ------------------------------------------------------------------------------------------------------------------
-    def write(self, parameter, value, request_response: bool = False, timeout: float = 0.1):
-        msg = TCP_JSON_Message()
-        msg.type = 'write'
-        msg.address = ''
-        msg.source = ''
-        msg.request_response = request_response
+    def write(self, parameter, value=None, request_response: bool = False, timeout: float = 0.1):
+        """
+        Write a parameter ('name' or 'group/name') or a dict of parameters in a single message.
+        """
+        if not request_response:
+            self.send(self._writeMessage(parameter, value))
+            return True
 
-        if isinstance(parameter, str):
-            params = parameter.split('/')
-
-            if len(params) == 1:
-                msg.data = {
-                    parameter: value
-                }
-            elif len(params) == 2:
-                msg.data = {
-                    params[0]: {
-                        params[1]: value
-                    }
-                }
-            else:
-                raise Exception("Levels >1 are not allowed for parameters")
+        try:
+            data = self._waitForResponse(self.writeAsync(parameter, value), timeout)
+        except concurrent.futures.TimeoutError:
+            return Exception("Timeout")
+        return data['success']
 
-        elif isinstance(parameter, dict):
-            msg.data = parameter
+    # ------------------------------------------------------------------------------------------------------------------
+    def writeAsync(self, parameter, value=None) -> RequestFuture:
+        """
+        Send a write request without waiting. The future resolves to the response data {'success', 'errors'}.
+        """
+        return self._sendRequest(self._writeMessage(parameter, value))
 
-        # --- FIX: Add request before sending ---
-        if request_response:
-            request = self._addRequest(message_id=msg.id)
-        self.send(message=msg)
-        if request_response:
-            if request.event.wait(timeout=timeout):
-                self._readRequests.pop(request.id)
-                data = request.event.get_data()
-                success = data['success']
-                return success
-            else:
-                self._readRequests.pop(request.id)
-                return Exception("Timeout")
+    # ------------------------------------------------------------------------------------------------------------------
+    def writeMany(self, values: dict, timeout: float = 1) -> dict:
+        """
+        Write several parameters with one message and one round trip. Keys are 'name' or 'group/name'.
+        Returns the errors reported by the device (empty if all parameters were set).
+        """
+        data = self._waitForResponse(self.writeAsync(_nest_parameters(values)), timeout)
+        return data['errors']
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def read(self, parameter: str, return_type: type = None, timeout: float = 0.1):
+        try:
+            data = self._waitForResponse(self.readAsync(parameter), timeout)
+        except concurrent.futures.TimeoutError:
+            return Exception("Timeout")
+
+        # Check if the read was a success
+        if data['success']:
+            return _get_parameter(data['output'], parameter)
         else:
-            return True
+            raise NotImplementedError("TODO")
 
     # ------------------------------------------------------------------------------------------------------------------
-    def read(self, parameter: str, return_type: type, timeout: float = 0.1):
+    def readAsync(self, parameters: (str, list)) -> RequestFuture:
+        """
+        Send a read request for one or more parameters without waiting. The future resolves to the
+        response data {'output', 'errors', 'success'}.
+        """
+        if isinstance(parameters, str):
+            parameters = [parameters]
+
         msg = TCP_JSON_Message()
         msg.address = ''
         msg.source = ''
         msg.type = 'read'
         msg.request_response = True
+        msg.data = _nest_parameters({parameter: None for parameter in parameters}, as_list=True)
+        return self._sendRequest(msg)
 
-        msg.data = {
-            'parameter': parameter
-        }
-
-        # --- FIX: Add request before sending ---
-        request = self._addRequest(message_id=msg.id)
-        self.send(msg)
-
-        if request.event.wait(timeout=timeout):
-            self._readRequests.pop(request.id)
-            data = request.event.get_data()
-            # Check if the read was a success
-            if data['success']:
-                return data['output']
-            else:
-                raise NotImplementedError("TODO")
-        else:
-            self._readRequests.pop(request.id)
-            return Exception("Timeout")
+    # ------------------------------------------------------------------------------------------------------------------
+    def readMany(self, parameters: list, timeout: float = 1) -> dict:
+        """
+        Read several parameters with one message and one round trip. Returns a dict with one entry per
+        requested parameter. Parameters that could not be read are missing in the result.
+        """
+        data = self._waitForResponse(self.readAsync(parameters), timeout)
+        output = {}
+        for parameter in parameters:
+            try:
+                output[parameter] = _get_parameter(data['output'], parameter)
+            except KeyError:
+                logger.warning(f"Could not read parameter {parameter}: {data['errors']}")
+        return output
 
     # ------------------------------------------------------------------------------------------------------------------
     def function(self, function: str, data, return_type: type = None, request_response: bool = False,
                  timeout: float = 1):
-        msg = TCP_JSON_Message()
-        msg.address = ''
-        msg.source = ''
-        msg.type = 'function'
-        msg.request_response = request_response
-
-        msg.data = {
-            'function': function,
-            'input': data
-        }
-        time1 = time.perf_counter()
-        # --- FIX: Register request before sending ---
-        if request_response:
-            request = self._addRequest(message_id=msg.id)
+        if not request_response:
+            self.send(self._functionMessage(function, data, request_response=False))
+            return True
 
-        self.send(msg)
+        future = self.functionAsync(function, data)
+        try:
+            data = self._waitForResponse(future, timeout)
+        except concurrent.futures.TimeoutError:
+            logger.error(f"Timeout for function request {future.id}")
+            raise TimeoutError
+
+        # Check if it was a success
+        success = data['success']
+        if return_type is None:
+            return success
+        else:
+            if success:
+                return data['output']
+            else:
+                return None
 
-        if request_response:
-            if request.event.wait(timeout=timeout, stale_event_time=0.1):
-                response_time = (time.perf_counter() - time1) * 1000
-                # logger.warning(f"Got response for function \"{function}\"! Response time: {response_time:.0f}")
-                # Get the response data
-                data = request.event.get_data()
-
-                # Check if it was a success
-                success = data['success']
-
-                self._readRequests.pop(request.id)
-                if return_type is None:
-                    return success
-                else:
-                    if success:
-                        return data['output']
-                    else:
-                        return None
+    # ------------------------------------------------------------------------------------------------------------------
+    def functionAsync(self, function: str, data=None) -> RequestFuture:
+        """
+        Call a function on the device without waiting. The future resolves to the response data
+        {'output', 'error', 'success'}.
+        """
+        return self._sendRequest(self._functionMessage(function, data, request_response=True))
 
-            else:
-                self._readRequests.pop(request.id)
-                logger.error(f"Timeout for function request {request.id}")
-                raise TimeoutError
-        else:
-            return True
+    # ------------------------------------------------------------------------------------------------------------------
+    def functionMany(self, calls: list, timeout: float = 1) -> list:
+        """
+        Call several functions back to back and wait for all responses, so that the calls share one
+        round trip. Calls are given as (function, data) tuples. Returns the output of each call,
+        or None if the call failed.
+        """
+        futures = [self.functionAsync(function, data) for function, data in calls]
+        done, not_done = concurrent.futures.wait(futures, timeout=timeout)
+        for future in not_done:
+            future.cancel()
+        if not_done:
+            raise TimeoutError(f"{len(not_done)} of {len(futures)} function requests timed out")
+
+        outputs = []
+        for future in futures:
+            data = future.result()
+            outputs.append(data['output'] if data['success'] else None)
+        return outputs
 
     # ------------------------------------------------------------------------------------------------------------------
     def sendEvent(self, event, data, request_response: bool = False, timeout: float = 1):
@@ -252,20 +284,15 @@ class Device:
             'data': data
         }
 
-        request = None
-
-        if request_response:
-            request = self._addRequest(message_id=msg.id)
+        if not request_response:
+            self.send(msg)
+            return
 
-        self.send(msg)
-
-        if request_response:
-            if request.event.wait(timeout=timeout):
-                self._readRequests.pop(request.id)
-                return True
-            else:
-                self._readRequests.pop(request.id)
-                return Exception("Timeout")
+        try:
+            self._waitForResponse(self._sendRequest(msg), timeout)
+            return True
+        except concurrent.futures.TimeoutError:
+            return Exception("Timeout")
 
     # ------------------------------------------------------------------------------------------------------------------
     def send(self, message: Message):
@@ -307,7 +334,18 @@ class Device:
         self.events.event.set(resource=message, flags={'event': message.event})
 
     # ------------------------------------------------------------------------------------------------------------------
-    def _handleStreamMessage(self, message: TCP_JSON_Message):
+    def _handleStreamMessage(self, message: (TCP_JSON_Message, TCP_Stream_Message)):
+        if isinstance(message, TCP_Stream_Message):
+            if message.encoding == STREAM_ENCODING_RECORDS:
+                # The schema hash is the id of the subscription. The records are decoded by the subscriber
+                for callback in self.callbacks.records:
+                    callback(message, self)
+                return
+            if self.stream_codec is None or message.schema_hash != self.stream_codec.schema.hash:
+                logger.warning(f"Got a binary stream message with unknown schema {message.schema_hash:08x}")
+                return
+            message.codec = self.stream_codec
+
         for callback in self.callbacks.stream:
             callback(message, self)
 
@@ -316,11 +354,13 @@ class Device:
     # ------------------------------------------------------------------------------------------------------------------
     def _handleResponseMessage(self, message: TCP_JSON_Message):
         # Check if the response was in the requests
-        if message.request_id in self._readRequests:
-            read_request = self._readRequests[message.request_id]
-            read_request.event.set(resource=message.data)
-        else:
+        with self._requests_lock:
+            request = self._requests.pop(message.request_id, None)
+        if request is None:
             logger.debug(f"Got a response for an unknown request: {message.request_id}")
+            return
+        if request.set_running_or_notify_cancel():
+            request.set_result(message.data)
 
     # ------------------------------------------------------------------------------------------------------------------
     def _handleIdentificationEvent(self, data):
@@ -332,6 +372,10 @@ class Device:
         self.information.address = data['address']
         self.information.revision = data['revision']
 
+        # Set up the binary stream encoding. It has to be confirmed before the device is registered,
+        # so that the stream callbacks already receive binary samples
+        self._setupStreamCodec(data.get('stream'))
+
         # Set the data
 
         # Set the commands
@@ -341,8 +385,41 @@ class Device:
         for callback in self.callbacks.registered:
             callback(self)
 
+    # ------------------------------------------------------------------------------------------------------------------
+    def _setupStreamCodec(self, stream_description: (dict, None)):
+        """
+        Build the codec from the stream schema announced by the device and tell the device which
+        encoding to use. If the encoding is not available here, the device keeps sending JSON streams.
+        """
+        self.stream_codec = None
+        if stream_description is not None:
+            schema = StreamSchema.fromDescription(stream_description['schema'])
+            if schema.hash != stream_description['hash']:
+                logger.warning("Stream schema of the device does not match its hash. Using JSON streams.")
+            else:
+                self.stream_codec = getStreamCodec(schema, stream_description['encoding'])
+
+        msg = TCP_JSON_Message()
+        msg.address = ''
+        msg.source = ''
+        msg.type = 'event'
+        msg.event = 'stream_config'
+        msg.data = {
+            'hash': self.stream_codec.schema.hash if self.stream_codec is not None else None,
+            'encoding': self.stream_codec.encoding if self.stream_codec is not None else None,
+        }
+        self.send(msg)
+
     # ------------------------------------------------------------------------------------------------------------------
     def _disconnected_callback(self, connection: TCP_Connection):
+        # Fail all requests that are still waiting for a response
+        with self._requests_lock:
+            requests = list(self._requests.values())
+            self._requests.clear()
+        for request in requests:
+            if request.set_running_or_notify_cancel():
+                request.set_exception(ConnectionError("Device disconnected"))
+
         for callback in self.callbacks.disconnected:
             callback(self)
 
@@ -352,13 +429,92 @@ class Device:
             callback(self)
 
     # ------------------------------------------------------------------------------------------------------------------
-    def _addRequest(self, message_id) -> Request:
-        read_request = Request()
-        read_request.id = message_id
-        self._readRequests[read_request.id] = read_request
-        return read_request
+    def _sendRequest(self, msg: TCP_JSON_Message) -> RequestFuture:
+        """
+        Give the message a request id, register a future for the response and send it. Any number
+        of requests can be in flight at the same time.
+        """
+        msg.id = next(self._request_ids)
+        msg.request_response = True
+        request = RequestFuture(msg.id)
+        with self._requests_lock:
+            self._requests[msg.id] = request
+        request.add_done_callback(self._removeRequest)
+        self.send(msg)
+        return request
 
     # ------------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def _waitForResponse(request: RequestFuture, timeout: float):
+        try:
+            return request.result(timeout)
+        except concurrent.futures.TimeoutError:
+            request.cancel()
+            raise
+
     # ------------------------------------------------------------------------------------------------------------------
+    def _removeRequest(self, request: RequestFuture):
+        # Requests that were cancelled or timed out by the caller must not pile up
+        with self._requests_lock:
+            self._requests.pop(request.id, None)
+
     # ------------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def _writeMessage(parameter, value) -> TCP_JSON_Message:
+        msg = TCP_JSON_Message()
+        msg.type = 'write'
+        msg.address = ''
+        msg.source = ''
+
+        if isinstance(parameter, str):
+            if len(parameter.split('/')) > 2:
+                raise Exception("Levels >1 are not allowed for parameters")
+            msg.data = _nest_parameters({parameter: value})
+        elif isinstance(parameter, dict):
+            msg.data = parameter
+        return msg
+
     # ------------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def _functionMessage(function: str, data, request_response: bool) -> TCP_JSON_Message:
+        msg = TCP_JSON_Message()
+        msg.address = ''
+        msg.source = ''
+        msg.type = 'function'
+        msg.request_response = request_response
+
+        msg.data = {
+            'function': function,
+            'input': data
+        }
+        return msg
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # ------------------------------------------------------------------------------------------------------------------
+    # ------------------------------------------------------------------------------------------------------------------
+    # ------------------------------------------------------------------------------------------------------------------
+
+
+# ======================================================================================================================
+def _nest_parameters(values: dict, as_list: bool = False) -> dict:
+    """
+    Convert {'name': value, 'group/name': value} into the nested structure used by the device.
+    With as_list, grouped parameters are collected into lists of names (as used by read requests).
+    """
+    nested = {}
+    for parameter, value in values.items():
+        if '/' not in parameter:
+            nested[parameter] = value
+            continue
+        group, name = parameter.split('/', 1)
+        if as_list:
+            nested.setdefault(group, []).append(name)
+        else:
+            nested.setdefault(group, {})[name] = value
+    return nested
+
+
+def _get_parameter(output: dict, parameter: str):
+    for key in parameter.split('/'):
+        output = output[key]
+    return output
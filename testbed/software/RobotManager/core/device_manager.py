@@ -39,7 +39,7 @@ class DeviceManager:
     events: DeviceManagerEvents
 
     # === INIT =========================================================================================================
-    def __init__(self):
+    def __init__(self, use_asyncio: bool = False):
 
         self.devices = {}
         self.callbacks = DeviceManagerCallbacks()
@@ -52,7 +52,7 @@ class DeviceManager:
             exit()
 
         self.address = address
-        self.server = TCP_Server(address)
+        self.server = TCP_Server(address, use_asyncio=use_asyncio)
         self.server.callbacks.connected.register(self._newConnection_callback)
         self._unregistered_devices = []
 
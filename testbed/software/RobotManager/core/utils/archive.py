@@ -0,0 +1,403 @@
+"""
+Columnar archive of experiment runs.
+
+Every run is stored as one Parquet file in a directory tree partitioned by robot and run
+(<root>/robot=<robot>/run=<run_id>/data.parquet). Its metadata is stored in the file and in a
+SQLite catalog next to it, so runs can be selected without opening any of the data files, and
+only the columns that are needed are read from the selected ones.
+"""
+
+import dataclasses
+import json
+import os
+import sqlite3
+import subprocess
+import threading
+import time
+import uuid
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+from core.utils.csv_utils import read_csv_file
+from core.utils.logging_utils import Logger
+
+logger = Logger('archive')
+
+CATALOG_FILE = 'catalog.sqlite'
+DATA_FILE = 'data.parquet'
+METADATA_KEY = b'experiment'
+
+_CATALOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    robot TEXT NOT NULL,
+    path TEXT NOT NULL,
+    trajectory_id INTEGER,
+    controller TEXT,
+    git_hash TEXT,
+    start_time REAL,
+    end_time REAL,
+    num_samples INTEGER,
+    signals TEXT,
+    metadata TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_selection ON runs (robot, trajectory_id, controller);
+CREATE INDEX IF NOT EXISTS runs_time ON runs (start_time);
+"""
+
+
+# ======================================================================================================================
+@dataclasses.dataclass
+class ArchiveRun:
+    run_id: str
+    robot: str
+    path: str
+    trajectory_id: (int, None) = None
+    controller: (str, None) = None
+    git_hash: (str, None) = None
+    start_time: (float, None) = None
+    end_time: (float, None) = None
+    num_samples: int = 0
+    signals: list = dataclasses.field(default_factory=list)
+    metadata: dict = dataclasses.field(default_factory=dict)
+
+
+# ======================================================================================================================
+class ExperimentArchive:
+    """
+    Parquet experiment archive with an SQLite catalog.
+
+    Usage:
+        archive = ExperimentArchive('~/bilbolab/archive')
+        archive.writeRun('bilbo1', data, metadata={'trajectory_id': 3, 'controller': 'lqr'})
+        runs = archive.query(robot='bilbo1', trajectory_id=3, controller='lqr')
+        theta = archive.load(runs[0], signals=['lowlevel.estimation.state.theta'])
+        table = archive.loadRuns(runs, signals=['lowlevel.estimation.state.theta'])
+    """
+    root: str
+
+    def __init__(self, root: str):
+        if pa is None:
+            raise ImportError("pyarrow is required for the experiment archive")
+        self.root = os.path.abspath(os.path.expanduser(root))
+        os.makedirs(self.root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(self.root, CATALOG_FILE), check_same_thread=False)
+        self._db.executescript(_CATALOG_SCHEMA)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def writeRun(self, robot: str, data, metadata: dict = None, run_id: str = None, start_time: float = None,
+                 end_time: float = None) -> ArchiveRun:
+        """
+        Archive the data of one run.
+
+        Args:
+            robot: Robot the run belongs to. Used as partition.
+            data: Dict of equally long 1D arrays, NumPy structured array or pandas DataFrame. Nested fields of
+                structured arrays and columns of 2D arrays are flattened into separate columns.
+            metadata: JSON serializable metadata, e.g. trajectory_id, controller, controller_config. The git
+                hash of the code is added if it is not given.
+            run_id: Identifier of the run. Generated from the time if not given.
+            start_time: Start of the run (Unix time). Defaults to now.
+            end_time: End of the run (Unix time). Defaults to start_time.
+        """
+        metadata = dict(metadata or {})
+        if 'git_hash' not in metadata:
+            metadata['git_hash'] = getGitHash()
+        start_time = time.time() if start_time is None else start_time
+        end_time = start_time if end_time is None else end_time
+        if run_id is None:
+            run_id = f"{time.strftime('%Y%m%d_%H%M%S', time.localtime(start_time))}_{uuid.uuid4().hex[:6]}"
+
+        table = _to_table(data)
+        run = ArchiveRun(
+            run_id=run_id,
+            robot=robot,
+            path=os.path.join(f"robot={robot}", f"run={run_id}", DATA_FILE),
+            trajectory_id=int(metadata['trajectory_id']) if metadata.get('trajectory_id') is not None else None,
+            controller=_controller_name(metadata.get('controller')),
+            git_hash=metadata.get('git_hash'),
+            start_time=start_time,
+            end_time=end_time,
+            num_samples=table.num_rows,
+            signals=table.column_names,
+            metadata=metadata,
+        )
+
+        run_metadata = json.dumps(dataclasses.asdict(run), default=_json_default)
+        table = table.replace_schema_metadata({METADATA_KEY: run_metadata})
+        file = os.path.join(self.root, run.path)
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        pq.write_table(table, file, compression='zstd')
+
+        self._register(run)
+        return run
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def query(self, robot: str = None, trajectory_id: int = None, controller: str = None, since: float = None,
+              until: float = None, **metadata) -> list[ArchiveRun]:
+        """
+        Select runs from the catalog. All given conditions have to match. Additional keyword arguments are
+        compared with the corresponding metadata entries.
+        """
+        conditions, parameters = [], []
+        for column, value in (('robot', robot), ('trajectory_id', trajectory_id), ('controller', controller)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                parameters.append(value)
+        if since is not None:
+            conditions.append("start_time >= ?")
+            parameters.append(since)
+        if until is not None:
+            conditions.append("start_time < ?")
+            parameters.append(until)
+        for key, value in metadata.items():
+            conditions.append("json_extract(metadata, ?) = ?")
+            parameters.extend([f"$.{key}", value])
+
+        statement = "SELECT * FROM runs"
+        if conditions:
+            statement += " WHERE " + " AND ".join(conditions)
+        statement += " ORDER BY start_time"
+
+        with self._lock:
+            rows = self._db.execute(statement, parameters).fetchall()
+        return [_run_from_row(row) for row in rows]
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def load(self, run: (ArchiveRun, str), signals: list = None, as_pandas: bool = False) -> (dict, object):
+        """
+        Read the given signals of one run. A signal can also be a prefix like 'lowlevel.estimation.state'.
+
+        Returns a dict of column arrays, or a DataFrame if as_pandas is True.
+        """
+        run = self._getRun(run)
+        table = pq.read_table(os.path.join(self.root, run.path), columns=_resolve_signals(run.signals, signals))
+        if as_pandas:
+            return table.to_pandas()
+        return {name: column.to_numpy() for name, column in zip(table.column_names, table.columns)}
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def loadRuns(self, runs: list, signals: list = None) -> 'pa.Table':
+        """
+        Read the given signals of several runs into one table, with the robot and run_id of every row as
+        additional columns. Only the files of the given runs are opened.
+        """
+        tables = []
+        for run in runs:
+            run = self._getRun(run)
+            table = pq.read_table(os.path.join(self.root, run.path), columns=_resolve_signals(run.signals, signals))
+            table = table.replace_schema_metadata(None)
+            table = table.append_column('robot', pa.array([run.robot] * table.num_rows, pa.string()))
+            table = table.append_column('run_id', pa.array([run.run_id] * table.num_rows, pa.string()))
+            tables.append(table)
+        if not tables:
+            return pa.table({})
+        return pa.concat_tables(tables, promote_options='default')
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def remove(self, run: (ArchiveRun, str)):
+        run = self._getRun(run)
+        file = os.path.join(self.root, run.path)
+        if os.path.exists(file):
+            os.remove(file)
+            os.rmdir(os.path.dirname(file))
+        with self._lock:
+            self._db.execute("DELETE FROM runs WHERE run_id = ?", (run.run_id,))
+            self._db.commit()
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def rebuildCatalog(self) -> int:
+        """
+        Rebuild the catalog from the metadata stored in the Parquet files, e.g. after copying runs from another
+        archive. Returns the number of registered runs.
+        """
+        runs = []
+        for directory, _, files in os.walk(self.root):
+            if DATA_FILE not in files:
+                continue
+            file = os.path.join(directory, DATA_FILE)
+            schema_metadata = pq.read_schema(file).metadata or {}
+            if METADATA_KEY not in schema_metadata:
+                logger.warning(f"No run metadata in {file}")
+                continue
+            run = ArchiveRun(**json.loads(schema_metadata[METADATA_KEY]))
+            run.path = os.path.relpath(file, self.root)
+            runs.append(run)
+
+        with self._lock:
+            self._db.execute("DELETE FROM runs")
+            self._db.commit()
+        for run in runs:
+            self._register(run)
+        return len(runs)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def importCSV(self, file: str, robot: str, metadata: dict = None, meta_lines: int = 0) -> ArchiveRun:
+        """
+        Archive a file written by CSVLogger. meta_lines is the number of custom header lines of the file.
+        """
+        content = read_csv_file(file, meta_lines=meta_lines)
+        rows = [_flatten_dict(row) for row in content['data']]
+        columns = {key: np.asarray([row[key] for row in rows]) for key in (rows[0] if rows else {})}
+        metadata = {'source': os.path.basename(file), 'csv_meta': [line.strip() for line in content['meta']],
+                    **(metadata or {})}
+        return self.writeRun(robot, columns, metadata=metadata, start_time=os.path.getmtime(file))
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def importH5(self, file: str, robot: str, metadata: dict = None, signals: list = None,
+                 dataset_name: str = 'samples') -> ArchiveRun:
+        """
+        Archive (the given signals of) a log written by H5PyDictLogger.
+        """
+        if h5py is None:
+            raise ImportError("h5py is required to import HDF5 logs")
+        with h5py.File(file, 'r') as f:
+            dataset = f[dataset_name]
+            num_samples = int(dataset.attrs.get('num_samples', dataset.shape[0]))
+            fields = _resolve_signals(list(dataset.dtype.names), signals)
+            if fields is None:
+                data = dataset[:num_samples]
+            else:
+                data = dataset.fields(fields)[:num_samples]
+        if data.dtype.names is None:
+            data = {fields[0]: data}
+        metadata = {'source': os.path.basename(file), **(metadata or {})}
+        return self.writeRun(robot, data, metadata=metadata, start_time=os.path.getmtime(file))
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    # === PRIVATE METHODS ==============================================================================================
+    def _register(self, run: ArchiveRun):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (run.run_id, run.robot, run.path, run.trajectory_id, run.controller, run.git_hash, run.start_time,
+                 run.end_time, run.num_samples, json.dumps(run.signals),
+                 json.dumps(run.metadata, default=_json_default)))
+            self._db.commit()
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _getRun(self, run: (ArchiveRun, str)) -> ArchiveRun:
+        if isinstance(run, ArchiveRun):
+            return run
+        with self._lock:
+            row = self._db.execute("SELECT * FROM runs WHERE run_id = ?", (run,)).fetchone()
+        if row is None:
+            raise KeyError(f"Run {run} not found in archive")
+        return _run_from_row(row)
+
+
+# ======================================================================================================================
+_git_hash = None
+
+
+def getGitHash() -> (str, None):
+    """
+    Hash of the git commit the code is running from, or None if it is not in a git repository.
+    """
+    global _git_hash
+    if _git_hash is None:
+        try:
+            _git_hash = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       capture_output=True, text=True, timeout=2).stdout.strip() or ''
+        except (OSError, subprocess.SubprocessError):
+            _git_hash = ''
+    return _git_hash or None
+
+
+# ======================================================================================================================
+def _to_table(data) -> 'pa.Table':
+    if isinstance(data, pa.Table):
+        return data
+    if isinstance(data, np.ndarray) and data.dtype.names is not None:
+        columns = {}
+        _flatten_structured(data, '', columns)
+        data = columns
+    if isinstance(data, dict):
+        columns = {}
+        for name, values in data.items():
+            values = np.asarray(values)
+            if values.ndim == 2:
+                for i in range(values.shape[1]):
+                    columns[f"{name}[{i}]"] = values[:, i]
+            else:
+                columns[name] = values.astype(str) if values.dtype.kind == 'S' else values
+        return pa.table(columns)
+    # pandas DataFrame
+    return pa.Table.from_pandas(data, preserve_index=False)
+
+
+def _flatten_structured(data: np.ndarray, prefix: str, columns: dict):
+    for name in data.dtype.names:
+        values = data[name]
+        if values.dtype.names is not None:
+            _flatten_structured(values, f"{prefix}{name}.", columns)
+        else:
+            columns[f"{prefix}{name}"] = values
+
+
+def _flatten_dict(data: dict, prefix: str = '') -> dict:
+    flat = {}
+    for key, value in data.items():
+        if isinstance(value, dict):
+            flat.update(_flatten_dict(value, f"{prefix}{key}."))
+        else:
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def _resolve_signals(available: list, signals: (list, str, None)) -> (list, None):
+    if signals is None:
+        return None
+    if not isinstance(signals, list):
+        signals = [signals]
+    columns = []
+    for signal in signals:
+        matched = [name for name in available if name == signal or name.startswith(signal + '.')
+                   or name.startswith(signal + '[')]
+        if not matched:
+            raise KeyError(f"Signal '{signal}' not found")
+        columns.extend(name for name in matched if name not in columns)
+    return columns
+
+
+def _controller_name(controller) -> (str, None):
+    if controller is None or isinstance(controller, str):
+        return controller
+    if isinstance(controller, dict) and 'name' in controller:
+        return str(controller['name'])
+    return str(getattr(controller, 'name', controller))
+
+
+def _run_from_row(row) -> ArchiveRun:
+    return ArchiveRun(run_id=row[0], robot=row[1], path=row[2], trajectory_id=row[3], controller=row[4],
+                      git_hash=row[5], start_time=row[6], end_time=row[7], num_samples=row[8],
+                      signals=json.loads(row[9]), metadata=json.loads(row[10]))
+
+
+def _json_default(obj):
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if dataclasses.is_dataclass(obj):
+        return dataclasses.asdict(obj)
+    if hasattr(obj, 'name'):
+        return obj.name  # Enums
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
@@ -258,29 +258,82 @@
 
 from __future__ import annotations  # Optional, works either way
 import enum
+import functools
+import threading
+import time
 import typing
 
+from core.utils.logging_utils import Logger
+
+logger = Logger('callbacks')
+
 # Constants to indicate whether a parameter is required or optional.
 REQUIRED = True
 OPTIONAL = False
 
+# If enabled, the execution time of every callback called via CallbackContainer.call() is recorded
+_profiling = False
+
+
+def setCallbackProfiling(enabled: bool):
+    global _profiling
+    _profiling = enabled
+
 
 class Callback:
     inputs: dict
     lambdas: dict
     parameters: dict
     function: callable
+    once: bool
+
+    calls: int
+    errors: int
+    total_time: float
+    max_time: float
 
     def __init__(self, function: callable, inputs: dict = None, lambdas: dict = None, parameters: dict = None,
-                 discard_inputs: bool = False, *args, **kwargs):
+                 discard_inputs: bool = False, once: bool = False, *args, **kwargs):
         self.function = function
 
         self.inputs = inputs or {}
         self.lambdas = lambdas or {}
         self.parameters = parameters or {}
         self.discard_inputs = discard_inputs
+        self.once = once
+
+        self.calls = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+        self._invoke = self._bind()
 
     def __call__(self, *args, **kwargs):
+        return self._invoke(*args, **kwargs)
+
+    def statistics(self) -> dict:
+        return {
+            'function': getattr(self.function, '__qualname__', repr(self.function)),
+            'calls': self.calls,
+            'errors': self.errors,
+            'mean_time': self.total_time / self.calls if self.calls else 0.0,
+            'max_time': self.max_time,
+        }
+
+    def _bind(self):
+        # Pre-bind the inputs, so that the common cases do not build dictionaries on every call
+        if self.lambdas:
+            return self._callWithLambdas
+        if self.discard_inputs:
+            inputs = dict(self.inputs)
+            function = self.function
+            return lambda *args, **kwargs: function(**inputs)
+        if self.inputs:
+            return functools.partial(self.function, **self.inputs)
+        return self.function
+
+    def _callWithLambdas(self, *args, **kwargs):
         lambdas_exec = {key: value() for (key, value) in self.lambdas.items()}
         if self.discard_inputs:
             ret = self.function(**{**self.inputs, **lambdas_exec})
@@ -290,11 +343,17 @@ class Callback:
 
 
 class CallbackContainer:
-    callbacks: list[Callback]
+    """
+    Registering and removing callbacks replaces the tuple of callbacks (copy-on-write), so calling them
+    iterates over a snapshot without taking a lock. Exceptions raised by one callback are logged and do not
+    prevent the other callbacks from being called.
+    """
+    callbacks: tuple[Callback, ...]
 
     def __init__(self, parameters=None):
-        self.callbacks = []
+        self.callbacks = ()
         self.parameters = parameters
+        self._lock = threading.Lock()
 
         if parameters is not None:
             if not isinstance(parameters, list):
@@ -316,7 +375,7 @@ class CallbackContainer:
             self.expected_parameters = {}
 
     def register(self, function: callable, inputs: dict = None, parameters: dict = None, lambdas: dict = None,
-                 discard_inputs=False, *args, **kwargs):
+                 discard_inputs=False, once=False, *args, **kwargs):
         if self.expected_parameters:
             if parameters is None:
                 parameters = {}
@@ -334,26 +393,65 @@ class CallbackContainer:
                         )
 
         callback = Callback(function, inputs=inputs, lambdas=lambdas, parameters=parameters,
-                            discard_inputs=discard_inputs, *args, **kwargs)
-        self.callbacks.append(callback)
+                            discard_inputs=discard_inputs, once=once, *args, **kwargs)
+        with self._lock:
+            self.callbacks = self.callbacks + (callback,)
+        return callback
 
-    def remove(self, callback):
-        if isinstance(callback, Callback):
-            self.callbacks.remove(callback)
-        elif callable(callback):
-            cb = next((cb for cb in self.callbacks if cb.function == callback), None)
-            if cb is not None:
-                self.callbacks.remove(cb)
+    def remove(self, callback) -> bool:
+        with self._lock:
+            if isinstance(callback, Callback):
+                remaining = tuple(cb for cb in self.callbacks if cb is not callback)
+            elif callable(callback):
+                cb = next((cb for cb in self.callbacks if cb.function == callback), None)
+                remaining = tuple(other for other in self.callbacks if other is not cb)
+            else:
+                return False
+            removed = len(remaining) != len(self.callbacks)
+            self.callbacks = remaining
+        return removed
 
     def call(self, *args, **kwargs):
         for callback in self.callbacks:
-            callback(*args, **kwargs)
+            # Once-only callbacks are removed before they are called, so concurrent calls run them only once
+            if callback.once and not self.remove(callback):
+                continue
+            if _profiling:
+                start = time.perf_counter()
+                try:
+                    callback._invoke(*args, **kwargs)
+                except Exception as e:
+                    self._reportError(callback, e)
+                duration = time.perf_counter() - start
+                callback.calls += 1
+                callback.total_time += duration
+                if duration > callback.max_time:
+                    callback.max_time = duration
+            else:
+                try:
+                    callback._invoke(*args, **kwargs)
+                except Exception as e:
+                    self._reportError(callback, e)
+
+    def statistics(self) -> list[dict]:
+        """
+        Call statistics of all callbacks, slowest first. Times are only recorded while profiling is enabled
+        (see setCallbackProfiling).
+        """
+        return sorted((callback.statistics() for callback in self.callbacks),
+                      key=lambda entry: entry['max_time'], reverse=True)
 
     def __iter__(self):
         return iter(self.callbacks)
 
     def clear_callbacks(self):
-        self.callbacks.clear()
+        with self._lock:
+            self.callbacks = ()
+
+    @staticmethod
+    def _reportError(callback: Callback, error: Exception):
+        callback.errors += 1
+        logger.error(f"Error in callback {getattr(callback.function, '__qualname__', callback.function)}: {error}")
 
 
 def callback_definition(cls):
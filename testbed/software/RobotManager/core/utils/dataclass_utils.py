@@ -1,3 +1,4 @@
+import collections.abc
 import copy
 import dataclasses
 from enum import IntEnum
@@ -7,6 +8,7 @@ import graphviz
 from dataclasses import fields, make_dataclass, is_dataclass, field
 from typing import Any, Dict, Tuple, Type
 from itertools import zip_longest
+from functools import lru_cache
 from typing import TypeVar, Type, Optional, get_type_hints, Mapping, Any, Collection, MutableMapping
 
 from dacite.cache import cache
@@ -339,4 +341,294 @@ def analyze_dataclass(
         add_to_graph(root_name, "", structure)
 
         # Render the figure with the name of the dataclass
-        graph.render(dataclass_name, cleanup=True)
\ No newline at end of file
+        graph.render(dataclass_name, cleanup=True)
+
+
+@lru_cache(maxsize=10)
+def get_dataclass_fields(cls):
+    """
+    Retrieve the fields for a dataclass type using caching.
+
+    This function is cached to speed up repeated access to field metadata.
+
+    Args:
+        cls: The dataclass type.
+
+    Returns:
+        A tuple of Field objects for the dataclass.
+    """
+    return fields(cls)
+
+
+def asdict_optimized(obj):
+    """
+    Convert a dataclass instance to a dictionary using cached field metadata.
+
+    This function recursively converts dataclass instances, as well as their nested
+    lists, tuples, and dictionaries, to dictionaries.
+
+    Args:
+        obj: The dataclass instance or container to convert.
+
+    Returns:
+        A dictionary representation of the dataclass.
+    """
+    if is_dataclass(obj):
+        result = {}
+        for f in get_dataclass_fields(type(obj)):
+            value = getattr(obj, f.name)
+            # Recursively convert nested dataclasses or collections
+            result[f.name] = asdict_optimized(value)
+        return result
+    elif isinstance(obj, (list, tuple)):
+        # Preserve the original type (list or tuple) for sequences
+        return type(obj)(asdict_optimized(item) for item in obj)
+    elif isinstance(obj, dict):
+        # Recursively process dictionary values
+        return {key: asdict_optimized(value) for key, value in obj.items()}
+    else:
+        return obj
+
+
+# ======================================================================================================================
+# Compiled converters
+#
+# from_dict and asdict_optimized inspect the type hints and walk the fields on every call. The functions below
+# generate a specialized Python function once per dataclass type (and per config for from_dict) and cache it.
+# The generated from_dict converters only handle the valid case. Whenever the input does not match the dataclass,
+# they fall back to from_dict, so results and errors are the same as with from_dict.
+
+class _Fallback(Exception):
+    pass
+
+
+# Types that asdict_optimized returns unchanged
+_LEAF_TYPES = frozenset({int, float, bool, str, bytes, type(None)})
+
+_from_dict_converters: Dict[Any, list] = {}
+_to_dict_converters: Dict[type, list] = {}
+
+
+def compile_from_dict(data_class: Type[T], config: Optional[Config] = None):
+    """
+    Return a function data -> instance of data_class that gives the same results as
+    from_dict(data_class, data, config).
+
+    The function is generated on the first call for a dataclass type and config and cached afterward. Nested
+    dataclasses, Optional fields, IntEnums and plain types (including NumPy arrays) are converted by generated
+    code, all other types (unions, collections, type hooks, casts) go through _build_value.
+
+    Args:
+        data_class (Type[T]): The target dataclass type.
+        config (Optional[Config]): Optional configuration for the conversion process.
+
+    Returns:
+        Callable[[Data], T]: The converter.
+    """
+    return _get_from_dict_converter(data_class, config)[0]
+
+
+def from_dict_fast(data_class: Type[T], data: Data, config: Optional[Config] = None) -> T:
+    """
+    Drop-in replacement for from_dict that uses the cached converter of compile_from_dict. Code that converts
+    often should keep the converter returned by compile_from_dict instead.
+    """
+    return _get_from_dict_converter(data_class, config)[0](data)
+
+
+def compile_to_dict(data_class: type):
+    """
+    Return a function instance -> dict that gives the same result as asdict_optimized for instances of data_class.
+    The function is generated on the first call for a dataclass type and cached afterward.
+    """
+    return _get_to_dict_converter(data_class)[0]
+
+
+def asdict_fast(obj):
+    """
+    Drop-in replacement for asdict_optimized that uses the cached converter of compile_to_dict for dataclasses.
+    """
+    if is_dataclass(obj) and not isinstance(obj, type):
+        return _get_to_dict_converter(type(obj))[0](obj)
+    return asdict_optimized(obj)
+
+
+def _config_key(config: Optional[Config]):
+    if config is None:
+        return None
+    return (tuple(config.type_hooks.items()), tuple(config.cast),
+            tuple(config.forward_references.items()) if config.forward_references else None,
+            config.check_types, config.strict, config.strict_unions_match)
+
+
+def _get_from_dict_converter(data_class: type, config: Optional[Config]) -> list:
+    """
+    Cached converter of a dataclass, as a one-element list. The list is created before the code is generated, so
+    that (recursive) nested dataclasses can reference it.
+    """
+    key = (data_class, _config_key(config))
+    holder = _from_dict_converters.get(key)
+    if holder is None:
+        holder = [None]
+        _from_dict_converters[key] = holder
+        try:
+            holder[0] = _generate_from_dict(data_class, config)
+        except Exception:
+            del _from_dict_converters[key]
+            raise
+    return holder
+
+
+def _generate_from_dict(data_class: type, config: Optional[Config]):
+    conf = config or Config()
+    try:
+        hints = get_type_hints(data_class, localns=conf.hashable_forward_references)
+    except NameError as error:
+        raise ForwardReferenceError(str(error))
+    data_class_fields = get_fields(data_class)
+
+    namespace = {
+        '_cls': data_class, '_config': config, '_conf': conf, '_from_dict': from_dict, '_Fallback': _Fallback,
+        '_DaciteError': DaciteError, '_Mapping': collections.abc.Mapping, '_build_value': _build_value, '_is_instance': is_instance,
+        '_field_names': frozenset(f.name for f in data_class_fields),
+    }
+    lines = ["def convert(data):", "    try:"]
+    if conf.strict:
+        lines.append("        if not _field_names.issuperset(data.keys()): raise _Fallback")
+
+    init_args = []
+    post_init = []
+    for i, f in enumerate(data_class_fields):
+        field_type = hints[f.name]
+        var = f"f_{i}"
+        lines.append(f"        if {f.name!r} in data:")
+        lines.append(f"            v = data[{f.name!r}]")
+        lines.extend(_generate_build_value(field_type, conf, namespace, f"{i}", 12))
+        if conf.check_types:
+            lines.append(f"            if not ({_generate_check(field_type, namespace, f'{i}')}): raise _Fallback")
+        lines.append(f"            {var} = v")
+        lines.append("        else:")
+        try:
+            get_default_value_for_field(f, field_type)
+        except DefaultValueNotFoundError:
+            if not f.init:
+                lines.append(f"            {var} = _Fallback")  # Marks a post-init field without value
+            else:
+                lines.append("            raise _Fallback")
+        else:
+            if f.default is not dataclasses.MISSING:
+                namespace[f"_d_{i}"] = f.default
+                lines.append(f"            {var} = _d_{i}")
+            elif f.default_factory is not dataclasses.MISSING:
+                namespace[f"_df_{i}"] = f.default_factory
+                lines.append(f"            {var} = _df_{i}()")
+            else:
+                lines.append(f"            {var} = None")
+
+        if f.init:
+            init_args.append(f"{f.name}={var}")
+        elif not is_frozen(data_class):
+            post_init.append((f.name, var))
+
+    lines.append(f"        instance = _cls({', '.join(init_args)})")
+    lines.append("    except (_Fallback, _DaciteError):")
+    lines.append("        return _from_dict(_cls, data, _config)")
+    for name, var in post_init:
+        lines.append(f"    if {var} is not _Fallback: instance.{name} = {var}")
+    lines.append("    return instance")
+
+    exec("\n".join(lines), namespace)
+    convert = namespace['convert']
+    convert.__name__ = convert.__qualname__ = f"{data_class.__name__}_from_dict"
+    return convert
+
+
+def _is_plain_class(type_) -> bool:
+    return isinstance(type_, type) and type_ is not Any and not is_generic_collection(type_) and not is_union(type_)
+
+
+def _generate_build_value(type_, config: Config, namespace: dict, suffix: str, indent: int) -> list:
+    """
+    Code that converts the variable v in place like _build_value(type_, v, config).
+    """
+    pad = " " * indent
+    namespace[f"_b_{suffix}"] = type_
+    if type_ in config.type_hooks or is_init_var(type_) or \
+            any(is_subclass(type_, cast_type) for cast_type in config.cast):
+        return [f"{pad}v = _build_value(_b_{suffix}, v, _conf)"]
+
+    if is_optional(type_):
+        types = extract_generic(type_)
+        if len(types) == 2 and types[1] is type(None):
+            inner = _generate_build_value(types[0], config, namespace, suffix + "o", indent + 4)
+            return [f"{pad}if v is not None:", *inner] if inner else []
+        return [f"{pad}v = _build_value(_b_{suffix}, v, _conf)"]
+
+    if not _is_plain_class(type_):
+        return [f"{pad}v = _build_value(_b_{suffix}, v, _conf)"]
+
+    if is_dataclass(type_):
+        namespace[f"_c_{suffix}"] = _get_from_dict_converter(type_, namespace['_config'])
+        return [f"{pad}if v.__class__ is dict or isinstance(v, _Mapping): v = _c_{suffix}[0](v)"]
+
+    if issubclass(type_, IntEnum):
+        return [f"{pad}if isinstance(v, int): v = _b_{suffix}(v)",
+                f"{pad}else: raise _Fallback"]
+    return []
+
+
+def _generate_check(type_, namespace: dict, suffix: str) -> str:
+    """
+    Expression that is True if v is an instance of type_ like is_instance(v, type_).
+    """
+    if type_ in (float, complex):
+        namespace[f"_k_{suffix}"] = (int, float, type_)
+        return f"isinstance(v, _k_{suffix})"
+    namespace[f"_k_{suffix}"] = type_
+    if _is_plain_class(type_):
+        return f"isinstance(v, _k_{suffix})"
+    if is_optional(type_):
+        types = extract_generic(type_)
+        if len(types) == 2 and types[1] is type(None):
+            return f"v is None or {_generate_check(types[0], namespace, suffix + 'o')}"
+    return f"_is_instance(v, _k_{suffix})"
+
+
+def _get_to_dict_converter(data_class: type) -> list:
+    holder = _to_dict_converters.get(data_class)
+    if holder is None:
+        holder = [None]
+        _to_dict_converters[data_class] = holder
+        holder[0] = _generate_to_dict(data_class)
+    return holder
+
+
+def _generate_to_dict(data_class: type):
+    try:
+        hints = get_type_hints(data_class)
+    except Exception:
+        hints = {}
+
+    namespace = {'_asdict': asdict_optimized, '_leaf': _LEAF_TYPES}
+    lines = ["def convert(obj):"]
+    items = []
+    for i, f in enumerate(fields(data_class)):
+        field_type = hints.get(f.name, f.type)
+        lines.append(f"    v = obj.{f.name}")
+        if isinstance(field_type, type) and is_dataclass(field_type):
+            # Values of the declared dataclass type use its converter, anything else the generic conversion
+            namespace[f"_t_{i}"] = field_type
+            namespace[f"_c_{i}"] = _get_to_dict_converter(field_type)
+            lines.append(f"    r_{i} = _c_{i}[0](v) if v.__class__ is _t_{i} else _asdict(v)")
+        elif isinstance(field_type, type) and not issubclass(field_type, (list, tuple, dict)):
+            namespace[f"_t_{i}"] = field_type
+            lines.append(f"    r_{i} = v if v.__class__ in _leaf or v.__class__ is _t_{i} else _asdict(v)")
+        else:
+            lines.append(f"    r_{i} = v if v.__class__ in _leaf else _asdict(v)")
+        items.append(f"{f.name!r}: r_{i}")
+    lines.append(f"    return {{{', '.join(items)}}}")
+
+    exec("\n".join(lines), namespace)
+    convert = namespace['convert']
+    convert.__name__ = convert.__qualname__ = f"{data_class.__name__}_to_dict"
+    return convert
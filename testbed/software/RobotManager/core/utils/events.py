@@ -480,6 +480,9 @@ from threading import Lock, Condition
 import weakref
 import collections
 
+# Number of worker threads that run the listener callbacks of all events
+DEFAULT_DISPATCHER_WORKERS = 4
+
 
 # ======================================================================================================================
 class SharedResource:
@@ -507,6 +510,143 @@ class SharedResource:
         self.lock.release()
 
 
+# ======================================================================================================================
+class _ListenerQueue:
+    """
+    Pending calls of one listener. The queue is handled by at most one dispatcher worker at a time,
+    so the calls of a listener are executed in order and never concurrently.
+    """
+    __slots__ = ('callback_ref', 'input_resource', 'coalesce', 'items', 'scheduled')
+
+    def __init__(self, callback_ref, input_resource: bool, coalesce: bool):
+        self.callback_ref = callback_ref
+        self.input_resource = input_resource
+        self.coalesce = coalesce
+        self.items = collections.deque()
+        self.scheduled = False
+
+    def resolve(self):
+        if isinstance(self.callback_ref, weakref.WeakMethod):
+            return self.callback_ref()
+        return self.callback_ref
+
+
+# ======================================================================================================================
+class EventDispatcher:
+    """
+    Bounded pool of worker threads that runs the listener callbacks of all ConditionEvents.
+
+    Every listener has its own queue. Workers take one call at a time from the listeners that have pending
+    calls, so a slow listener does not hold up the others. Listeners registered with coalesce=True only keep
+    the latest pending value if the event is set faster than they can process it.
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    dispatched: int
+    coalesced: int
+    errors: int
+    max_queue_depth: int
+
+    def __init__(self, workers: int = DEFAULT_DISPATCHER_WORKERS):
+        self._lock = Lock()
+        self._work_available = Condition(self._lock)
+        self._ready = collections.deque()
+        self._queue_depth = 0
+        self.resetMetrics()
+
+        self._threads = [threading.Thread(target=self._worker, name=f'event_dispatcher_{i}', daemon=True)
+                         for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    @classmethod
+    def get(cls) -> 'EventDispatcher':
+        """
+        Return the shared dispatcher, starting it on first use.
+        """
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = EventDispatcher()
+        return cls._instance
+
+    def submit(self, listener: _ListenerQueue, resource):
+        timestamp = time.perf_counter()
+        with self._lock:
+            if listener.coalesce and listener.items:
+                listener.items[-1] = (resource, timestamp)
+                self.coalesced += 1
+                return
+            listener.items.append((resource, timestamp))
+            self._queue_depth += 1
+            if self._queue_depth > self.max_queue_depth:
+                self.max_queue_depth = self._queue_depth
+            if not listener.scheduled:
+                listener.scheduled = True
+                self._ready.append(listener)
+                self._work_available.notify()
+
+    def getMetrics(self) -> dict:
+        """
+        Queue depth and dispatch latency (time from set() to the start of the callback, in seconds).
+        """
+        with self._lock:
+            return {
+                'workers': len(self._threads),
+                'queue_depth': self._queue_depth,
+                'max_queue_depth': self.max_queue_depth,
+                'dispatched': self.dispatched,
+                'coalesced': self.coalesced,
+                'errors': self.errors,
+                'latency_mean': self._latency_sum / self.dispatched if self.dispatched else 0.0,
+                'latency_max': self._latency_max,
+            }
+
+    def resetMetrics(self):
+        self.dispatched = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.max_queue_depth = 0
+        self._latency_sum = 0.0
+        self._latency_max = 0.0
+
+    def _worker(self):
+        while True:
+            with self._lock:
+                while not self._ready:
+                    self._work_available.wait()
+                listener = self._ready.popleft()
+                resource, timestamp = listener.items.popleft()
+                self._queue_depth -= 1
+
+            latency = time.perf_counter() - timestamp
+            error = False
+            callback = listener.resolve()
+            if callback is not None:
+                try:
+                    if listener.input_resource:
+                        callback(resource)
+                    else:
+                        callback()
+                except Exception as e:
+                    error = True
+                    print("Error in listener callback:", e)
+
+            with self._lock:
+                self.dispatched += 1
+                self.errors += error
+                self._latency_sum += latency
+                if latency > self._latency_max:
+                    self._latency_max = latency
+                if listener.items:
+                    self._ready.append(listener)
+                    self._work_available.notify()
+                else:
+                    listener.scheduled = False
+
+
+# ======================================================================================================================
 class ConditionEvent(threading.Condition):
     id: str
     resource: 'SharedResource'
@@ -527,17 +667,20 @@ class ConditionEvent(threading.Condition):
         self.flag = None
         self._parameters_def = flags if flags is not None else []
         self._last_set_time = None
-        # List of listeners. Each listener is a tuple: (callback_ref, flags, once, input_resource)
+        # List of listeners. Each listener is a tuple: (listener_queue, flags, once)
         self._listeners = []
+        # Waiters of waitForEvents that are notified directly when the event is set
+        self._event_waiters = []
         # Deque to store history events as tuples: (timestamp, flags)
         self._event_history = collections.deque(maxlen=history_size)
 
-    def on(self, callback, flags=None, once=False, input_resource=True):
+    def on(self, callback, flags=None, once=False, input_resource=True, coalesce=False):
         """
         Register a callback to be called once the event is set and the flags match.
-        The callback will be executed in a separate oneshot thread.
-        If input_resource is True, the callback will be called with the event's resource data;
+        The callback is executed by the shared EventDispatcher, in the order the event was set.
+        If input_resource is True, the callback will be called with the resource the event was set with;
         otherwise, it will be called without any arguments.
+        If coalesce is True, only the latest value is kept while the callback is still busy with an earlier one.
         """
         try:
             if hasattr(callback, '__self__') and callback.__self__ is not None:
@@ -548,7 +691,7 @@ class ConditionEvent(threading.Condition):
             callback_ref = callback
 
         with self:
-            self._listeners.append((callback_ref, flags, once, input_resource))
+            self._listeners.append((_ListenerQueue(callback_ref, input_resource, coalesce), flags, once))
 
     def set(self, resource=None, flags=None):
         """
@@ -582,37 +725,31 @@ class ConditionEvent(threading.Condition):
             self._event_history.append((timestamp, self.flag))
             self.notify_all()
 
+            for waiter in self._event_waiters:
+                waiter.eventSet(self)
+
             # Process listeners.
+            if not self._listeners:
+                return
             to_call = []
             remaining_listeners = []
-            for callback_ref, listener_flags, once_flag, input_resource in self._listeners:
+            for listener in self._listeners:
+                listener_queue, listener_flags, once_flag = listener
                 if self._check_flag(listener_flags):
-                    to_call.append((callback_ref, input_resource))
+                    # Drop listeners whose object has been deleted
+                    if listener_queue.resolve() is None:
+                        continue
+                    to_call.append(listener_queue)
                     if not once_flag:
-                        remaining_listeners.append((callback_ref, listener_flags, once_flag, input_resource))
+                        remaining_listeners.append(listener)
                 else:
-                    remaining_listeners.append((callback_ref, listener_flags, once_flag, input_resource))
+                    remaining_listeners.append(listener)
             self._listeners = remaining_listeners
 
-        for callback_ref, input_resource in to_call:
-            # Always resolve weak references to get the actual callback.
-            if isinstance(callback_ref, weakref.WeakMethod):
-                callback_func = callback_ref()
-            else:
-                callback_func = callback_ref
-            if callback_func is None:
-                continue
-            threading.Thread(target=self._call_listener, args=(callback_func, input_resource)).start()
-
-    def _call_listener(self, callback, input_resource):
-        try:
-            if input_resource:
-                data = self.get_data()
-                callback(data)
-            else:
-                callback()
-        except Exception as e:
-            print("Error in listener callback:", e)
+        if to_call:
+            dispatcher = EventDispatcher.get()
+            for listener_queue in to_call:
+                dispatcher.submit(listener_queue, resource)
 
     def _check_flag(self, filter_params):
         if not filter_params:
@@ -751,6 +888,28 @@ class ConditionEvent(threading.Condition):
             self.resource.set(None)
 
 
+class _EventWaiter:
+    """
+    Waits for several ConditionEvents at once. The events report to the waiter from set(), so no helper
+    threads are needed.
+    """
+
+    def __init__(self, events: list):
+        self.condition = Condition()
+        self.events = events
+        self.triggered = [False] * len(events)
+        self.results = []
+
+    def eventSet(self, event: ConditionEvent):
+        # Called by the event while it holds its own lock
+        with self.condition:
+            for i, (ev, flags) in enumerate(self.events):
+                if ev is event and not self.triggered[i] and event._check_flag(flags):
+                    self.triggered[i] = True
+                    self.results.append(event)
+                    self.condition.notify()
+
+
 def waitForEvents(events: list, timeout=None, wait_for_all=False):
     """
     Wait for one or more events with corresponding flag conditions.
@@ -764,49 +923,32 @@ def waitForEvents(events: list, timeout=None, wait_for_all=False):
              If wait_for_all is True, returns a list of events in the same order as provided.
              Returns None if the timeout expires.
     """
-    results = []
-    lock = threading.Lock()
-    done_event = threading.Event()
-    threads = []
-    start_time = time.time()
-
-    for i, value in enumerate(events):
-        if isinstance(value, ConditionEvent):
-            events[i] = (value, None)
-
-    def worker(ev, flags, overall_timeout):
-        remaining = overall_timeout - (time.time() - start_time) if overall_timeout is not None else None
-        if remaining is not None and remaining <= 0:
-            return
-        ret = ev.wait(timeout=remaining, flags=flags)
-        if ret:
-            with lock:
-                results.append(ev)
-            if not wait_for_all:
-                done_event.set()
-
-    # Start a thread for each event.
-    for ev, flags in events:
-        t = threading.Thread(target=worker, args=(ev, flags, timeout))
-        t.daemon = True
-        t.start()
-        threads.append(t)
+    events = [(value, None) if isinstance(value, ConditionEvent) else value for value in events]
+    waiter = _EventWaiter(events)
+
+    registered = []
+    for ev, _ in events:
+        if ev not in registered:
+            with ev:
+                ev._event_waiters.append(waiter)
+            registered.append(ev)
+
+    try:
+        with waiter.condition:
+            if wait_for_all:
+                done = waiter.condition.wait_for(lambda: all(waiter.triggered), timeout=timeout)
+            else:
+                done = waiter.condition.wait_for(lambda: bool(waiter.results), timeout=timeout)
+    finally:
+        for ev in registered:
+            with ev:
+                ev._event_waiters.remove(waiter)
 
+    if not done:
+        return None
     if wait_for_all:
-        # Wait for all threads to finish, taking into account the overall timeout.
-        for t in threads:
-            remaining = timeout - (time.time() - start_time) if timeout is not None else None
-            t.join(timeout=remaining)
-        if len(results) == len(events):
-            return results
-        else:
-            return None
-    else:
-        done_event.wait(timeout=timeout)
-        if results:
-            return results[0]
-        else:
-            return None
+        return [ev for ev, _ in events]
+    return waiter.results[0]
 
 
 # ======================================================================================================================
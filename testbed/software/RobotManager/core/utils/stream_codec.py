@@ -0,0 +1,354 @@
+"""
+Schema-driven binary codec for stream samples.
+
+A StreamSchema is generated once from a (nested) dataclass and lists all scalar leaf fields
+in a fixed order. Both ends of a connection build the same codec from the schema description,
+which is identified by a hash that is exchanged on connect. Samples are then sent as either a
+fixed struct layout or a msgpack list instead of a JSON dictionary.
+"""
+
+import dataclasses
+import enum
+import hashlib
+import json
+import struct
+import typing
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Identifiers of the supported encodings
+STREAM_ENCODING_STRUCT = 1
+STREAM_ENCODING_MSGPACK = 2
+# Batch of packed struct records of a stream subscription. The schema hash of the message carries the id of the
+# subscription, whose schema is returned when subscribing.
+STREAM_ENCODING_RECORDS = 3
+
+# Fixed length of strings in the struct layout. Longer strings are truncated.
+STRING_LENGTH = 32
+
+# Struct format and NumPy type of each field kind
+_FIELD_FORMATS = {
+    'float': ('d', '<f8'),
+    'int': ('q', '<i8'),
+    'bool': ('?', '?'),
+    'enum': ('i', '<i4'),
+    'str': (f'{STRING_LENGTH}s', f'S{STRING_LENGTH}'),
+}
+
+
+# ======================================================================================================================
+@dataclasses.dataclass
+class StreamField:
+    path: tuple
+    kind: str
+    default: object
+
+
+# ======================================================================================================================
+class StreamSchema:
+    """
+    Ordered list of the scalar leaf fields of a sample.
+    """
+    fields: list[StreamField]
+    hash: int
+
+    def __init__(self, fields: list[StreamField]):
+        self.fields = fields
+        self.names = ['.'.join(field.path) for field in fields]
+        self._paths = [field.path for field in fields]
+        self._defaults = [field.default for field in fields]
+        self._kinds = [field.kind for field in fields]
+        description = json.dumps(self.description()).encode()
+        self.hash = int.from_bytes(hashlib.sha1(description).digest()[:4], byteorder='little')
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @classmethod
+    def fromDataclass(cls, data_class, exclude: list = None) -> 'StreamSchema':
+        """
+        Generate the schema from a dataclass. Nested dataclasses are flattened, dict fields are
+        flattened using the keys of their default value. Fields that cannot be represented
+        (e.g. lists) and the dot-separated paths in `exclude` are skipped.
+        """
+        fields = []
+        _collect_dataclass_fields(data_class, (), fields, set(exclude or []))
+        return cls(fields)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @classmethod
+    def fromDescription(cls, description: list) -> 'StreamSchema':
+        """
+        Rebuild a schema from the description sent by the other end of the connection.
+        """
+        return cls([StreamField(path=tuple(path.split('.')), kind=kind, default=default)
+                    for path, kind, default in description])
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def description(self) -> list:
+        return [['.'.join(field.path), field.kind, field.default] for field in self.fields]
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def subSchema(self, prefix: str) -> 'StreamSchema':
+        """
+        Schema of all fields below the given dot-separated prefix, with the prefix removed from their paths.
+        """
+        prefix = tuple(prefix.split('.'))
+        return StreamSchema([StreamField(path=field.path[len(prefix):], kind=field.kind, default=field.default)
+                             for field in self.fields if field.path[:len(prefix)] == prefix])
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def dtype(self) -> np.dtype:
+        """
+        Packed NumPy dtype with one field per schema field, named by its dot-separated path. It has the
+        same memory layout as the struct encoding.
+        """
+        return np.dtype({'names': self.names, 'formats': [_FIELD_FORMATS[kind][1] for kind in self._kinds]})
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def flatten(self, sample) -> list:
+        """
+        Values of all fields of a (nested) dict or dataclass sample in schema order. Missing entries are
+        replaced by their default value, enums are converted to int.
+        """
+        values = []
+        for path, default, kind in zip(self._paths, self._defaults, self._kinds):
+            value = sample
+            for key in path:
+                value = value.get(key) if isinstance(value, dict) else getattr(value, key, None)
+                if value is None:
+                    value = default
+                    break
+            if kind == 'enum':
+                value = int(value)
+            values.append(value)
+        return values
+
+
+# ======================================================================================================================
+class StreamCodec:
+    """
+    Base class of the stream codecs. Subclasses only implement packing and unpacking of the
+    flat list of values in schema order.
+    """
+    encoding: int
+    schema: StreamSchema
+
+    def __init__(self, schema: StreamSchema):
+        self.schema = schema
+        self._paths = schema._paths
+        self._kinds = schema._kinds
+        self._setter_cache = {}
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def describe(self) -> dict:
+        """
+        Description of the codec that is sent to the other end of the connection on connect.
+        """
+        return {
+            'encoding': self.encoding,
+            'hash': self.schema.hash,
+            'schema': self.schema.description(),
+        }
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def encode(self, sample: dict) -> bytes:
+        """
+        Encode a (nested) sample dictionary. Missing entries are encoded with their default value.
+        """
+        return self._pack(self.schema.flatten(sample))
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def decode(self, data) -> dict:
+        """
+        Decode a sample into a nested dictionary with the same structure as the JSON stream.
+        """
+        sample = {}
+        for path, value in zip(self._paths, self._unpack(data)):
+            entry = sample
+            for key in path[:-1]:
+                entry = entry.setdefault(key, {})
+            entry[path[-1]] = value
+        return sample
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def decodeInto(self, data, instance):
+        """
+        Decode a sample directly into an existing dataclass instance. Fields of the schema that
+        do not exist in the dataclass are skipped, enum fields are converted to their enum type.
+        """
+        values = self._unpack(data)
+        for index, parent_path, key, converter in self._getSetters(type(instance)):
+            target = instance
+            for attribute in parent_path:
+                target = target[attribute] if isinstance(target, dict) else getattr(target, attribute)
+            value = values[index] if converter is None else converter(values[index])
+            if isinstance(target, dict):
+                target[key] = value
+            else:
+                object.__setattr__(target, key, value)
+        return instance
+
+    # === PRIVATE METHODS ==============================================================================================
+    def _pack(self, values: list) -> bytes:
+        raise NotImplementedError
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _unpack(self, data) -> list:
+        raise NotImplementedError
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _getSetters(self, data_class) -> list:
+        setters = self._setter_cache.get(data_class)
+        if setters is None:
+            setters = []
+            template = data_class()
+            for index, path in enumerate(self._paths):
+                setter = _build_setter(template, path)
+                if setter is not None:
+                    setters.append((index, *setter))
+            self._setter_cache[data_class] = setters
+        return setters
+
+
+# ======================================================================================================================
+class StructStreamCodec(StreamCodec):
+    """
+    Fixed binary layout (little endian, packed). The layout is mirrored by a NumPy dtype,
+    so one or more concatenated samples can be read as a record array without copying.
+    """
+    encoding = STREAM_ENCODING_STRUCT
+    dtype: np.dtype
+
+    def __init__(self, schema: StreamSchema):
+        super().__init__(schema)
+        self._struct = struct.Struct('<' + ''.join(_FIELD_FORMATS[kind][0] for kind in self._kinds))
+        self._string_indices = [i for i, kind in enumerate(self._kinds) if kind == 'str']
+        self.dtype = schema.dtype()
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @property
+    def size(self) -> int:
+        return self._struct.size
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def decodeRecords(self, data) -> np.ndarray:
+        """
+        View one or more concatenated samples as a NumPy record array.
+        """
+        return np.frombuffer(data, dtype=self.dtype)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _pack(self, values: list) -> bytes:
+        for i in self._string_indices:
+            values[i] = str(values[i]).encode()
+        return self._struct.pack(*values)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _unpack(self, data) -> list:
+        values = list(self._struct.unpack(data))
+        for i in self._string_indices:
+            values[i] = values[i].rstrip(b'\x00').decode(errors='replace')
+        return values
+
+
+# ======================================================================================================================
+class MsgpackStreamCodec(StreamCodec):
+    """
+    Flat msgpack list of the values in schema order. Strings are not truncated.
+    """
+    encoding = STREAM_ENCODING_MSGPACK
+
+    def __init__(self, schema: StreamSchema):
+        if msgpack is None:
+            raise ImportError("msgpack is required for the msgpack stream encoding")
+        super().__init__(schema)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _pack(self, values: list) -> bytes:
+        return msgpack.packb(values)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _unpack(self, data) -> list:
+        return msgpack.unpackb(data)
+
+
+# ======================================================================================================================
+def getStreamCodec(schema: StreamSchema, encoding: int = STREAM_ENCODING_STRUCT) -> (StreamCodec, None):
+    """
+    Create the codec for the given encoding. Returns None if the encoding is not available.
+    """
+    if encoding == STREAM_ENCODING_STRUCT:
+        return StructStreamCodec(schema)
+    if encoding == STREAM_ENCODING_MSGPACK and msgpack is not None:
+        return MsgpackStreamCodec(schema)
+    return None
+
+
+# ======================================================================================================================
+def _unwrap_optional(type_):
+    if typing.get_origin(type_) is typing.Union:
+        args = [arg for arg in typing.get_args(type_) if arg is not type(None)]
+        if len(args) == 1:
+            return args[0]
+    return type_
+
+
+def _collect_dataclass_fields(data_class, prefix: tuple, fields: list, exclude: set):
+    hints = typing.get_type_hints(data_class)
+    template = data_class()
+    for field in dataclasses.fields(data_class):
+        _collect_value(prefix + (field.name,), hints[field.name], getattr(template, field.name), fields, exclude)
+
+
+def _collect_value(path: tuple, type_, default, fields: list, exclude: set):
+    if '.'.join(path) in exclude:
+        return
+    type_ = _unwrap_optional(type_)
+    if dataclasses.is_dataclass(type_):
+        _collect_dataclass_fields(type_, path, fields, exclude)
+    elif isinstance(type_, type) and issubclass(type_, enum.Enum):
+        fields.append(StreamField(path=path, kind='enum', default=int(default.value)))
+    elif type_ is bool:
+        fields.append(StreamField(path=path, kind='bool', default=bool(default)))
+    elif type_ is int:
+        fields.append(StreamField(path=path, kind='int', default=int(default or 0)))
+    elif type_ is float:
+        fields.append(StreamField(path=path, kind='float', default=float(default or 0.0)))
+    elif type_ is str:
+        fields.append(StreamField(path=path, kind='str', default=default or ''))
+    elif isinstance(default, dict):
+        for key, value in default.items():
+            _collect_value(path + (key,), type(value), value, fields, exclude)
+
+
+def _build_setter(template, path: tuple):
+    """
+    Resolve a schema path on a dataclass instance. Returns (parent path, key, converter) or
+    None if the path does not exist in the dataclass. Keys are added to dict fields as needed.
+    """
+    target = template
+    for key in path[:-1]:
+        if isinstance(target, dict):
+            if key not in target:
+                return None
+            target = target[key]
+        elif dataclasses.is_dataclass(target) and key in {f.name for f in dataclasses.fields(target)}:
+            target = getattr(target, key)
+        else:
+            return None
+
+    key = path[-1]
+    converter = None
+    if isinstance(target, dict):
+        pass
+    elif dataclasses.is_dataclass(target) and key in {f.name for f in dataclasses.fields(target)}:
+        type_ = _unwrap_optional(typing.get_type_hints(type(target))[key])
+        if isinstance(type_, type) and issubclass(type_, enum.Enum):
+            converter = type_
+    else:
+        return None
+    return path[:-1], key, converter
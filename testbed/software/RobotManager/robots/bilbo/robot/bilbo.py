@@ -1,9 +1,11 @@
 from core.device import Device
 from robots.bilbo.robot.bilbo_control import BILBO_Control
 from robots.bilbo.robot.bilbo_core import BILBO_Core
+from robots.bilbo.robot.bilbo_estimation import BILBO_Estimation
 from robots.bilbo.robot.bilbo_experiment import BILBO_Experiments
 from robots.bilbo.robot.bilbo_interfaces import BILBO_Interfaces
-from robots.bilbo.robot.bilbo_data import TWIPR_Data, twiprSampleFromDict
+from robots.bilbo.robot.bilbo_streams import BILBO_Streams
+from robots.bilbo.robot.bilbo_data import TWIPR_Data, twiprSampleFromStream
 from robots.bilbo.robot.bilbo_definitions import *
 from robots.bilbo.robot.bilbo_utilities import BILBO_Utilities
 
@@ -13,7 +15,9 @@ class BILBO:
     device: Device
     core: BILBO_Core
     control: BILBO_Control
+    estimation: BILBO_Estimation
     experiments: BILBO_Experiments
+    streams: BILBO_Streams
 
     interfaces: BILBO_Interfaces
 
@@ -26,8 +30,10 @@ class BILBO:
         self.core = BILBO_Core(device=device, robot_id=self.device.information.device_id)
 
         self.control = BILBO_Control(core=self.core)
+        self.estimation = BILBO_Estimation(core=self.core)
         self.experiments = BILBO_Experiments(core=self.core)
         self.utilities = BILBO_Utilities(core=self.core)
+        self.streams = BILBO_Streams(core=self.core)
         self.interfaces = BILBO_Interfaces(core=self.core,
                                            control=self.control,
                                            experiments=self.experiments,
@@ -91,7 +97,7 @@ class BILBO:
 
     # ------------------------------------------------------------------------------------------------------------------
     def _onStreamCallback(self, stream, *args, **kwargs):
-        self.data = twiprSampleFromDict(stream.data)
+        self.data = twiprSampleFromStream(stream)
 
     # ------------------------------------------------------------------------------------------------------------------
     def _disconnected_callback(self, *args, **kwargs):
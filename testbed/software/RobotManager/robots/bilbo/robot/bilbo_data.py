@@ -4,7 +4,9 @@ import math
 import time
 
 import dacite
-from dacite import from_dict
+
+from core.communication.wifi.tcp.protocols.tcp_stream_protocol import TCP_Stream_Message
+from core.utils.dataclass_utils import compile_from_dict
 
 
 @dataclasses.dataclass
@@ -209,11 +211,25 @@ type_hooks = {
 }
 
 
+# Generated once, converting a sample then only costs a few dict lookups and type checks per field
+_twipr_data_from_dict = compile_from_dict(TWIPR_Data, dacite.Config(type_hooks=type_hooks))
+
+
 def twiprSampleFromDict(dict):
-    sample = from_dict(data_class=TWIPR_Data, data=dict, config=dacite.Config(type_hooks=type_hooks))
+    sample = _twipr_data_from_dict(dict)
     return sample
 
 
+def twiprSampleFromStream(stream):
+    """
+    Convert a stream message into TWIPR_Data. Binary stream messages are decoded directly into
+    the dataclass, JSON stream messages go through twiprSampleFromDict.
+    """
+    if isinstance(stream, TCP_Stream_Message):
+        return stream.decodeInto(TWIPR_Data())
+    return twiprSampleFromDict(stream.data)
+
+
 BILBO_STATE_DATA_DEFINITIONS = {
     'x': {
         'type': 'float',
@@ -0,0 +1,36 @@
+from robots.bilbo.robot.bilbo_core import BILBO_Core
+
+
+# ======================================================================================================================
+class BILBO_Estimation:
+    """
+    Access to the onboard state estimation of the robot. Poses from an external source like the motion capture
+    system are fused by the robot with the estimates of the sample they were measured at.
+    """
+
+    def __init__(self, core: BILBO_Core):
+        self.core = core
+        self.device = core.device
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def setExternalPose(self, x: float, y: float, psi: float, timestamp: float = None):
+        """
+        Sends a measured pose. The timestamp is the global time of the measurement. Without a timestamp, the robot
+        takes the time the pose is received.
+        """
+        data = {'x': x, 'y': y, 'psi': psi}
+        if timestamp is not None:
+            data['time'] = timestamp
+        self.device.function(function='setExternalPose', data=data)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def setFilter(self, filter: str):
+        """
+        Selects the filter of the onboard estimation: 'complementary', 'ekf' or 'lowlevel'.
+        """
+        self.core.logger.info(f"Robot {self.core.id}: Set estimation filter to {filter}")
+        self.device.function(function='setEstimationFilter', data={'filter': filter})
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def reset(self, x: float = 0.0, y: float = 0.0, psi: float = 0.0):
+        self.device.function(function='resetEstimation', data={'x': x, 'y': y, 'psi': psi})
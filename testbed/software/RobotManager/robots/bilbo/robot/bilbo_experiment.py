@@ -1,10 +1,13 @@
 import dataclasses
 import math
+import time
+
 import numpy as np
 
 # === CUSTOM PACKAGES ==================================================================================================
 from robots.bilbo.robot.bilbo_core import BILBO_Core
-from core.utils.data import generate_time_vector, generate_random_input
+from core.utils.archive import ExperimentArchive
+from core.utils.data import generate_time_vector, generate_random_input, decode_array
 from robots.bilbo.robot.bilbo_definitions import BILBO_Control_Mode, BILBO_CONTROL_DT, MAX_STEPS_TRAJECTORY
 from core.utils.events import event_definition, ConditionEvent, waitForEvents
 from core.utils.plotting import UpdatablePlot
@@ -16,6 +19,8 @@ from core.utils.sound.sound import speak, playSound
 class BILBO_Experiments_Events:
     finished: ConditionEvent = ConditionEvent(flags=[('trajectory_id', int)])
     aborted: ConditionEvent = ConditionEvent(flags=[('trajectory_id', int)])
+    ilc_trial: ConditionEvent
+    ilc_finished: ConditionEvent
 
 
 # ======================================================================================================================
@@ -39,15 +44,18 @@ class BILBO_Trajectory:
 
 # ======================================================================================================================
 class BILBO_Experiments:
+    archive: (ExperimentArchive, None)
 
     def __init__(self, core: BILBO_Core):
         self.core = core
         self.id = id
         self.logger = self.core.logger
         self.device = self.core.device
+        self.archive = None  # If set, all finished trajectories are archived
 
         self.events = BILBO_Experiments_Events()
         self.device.events.event.on(self._trajectory_event_callback, flags={'event': 'trajectory'})
+        self.device.events.event.on(self._ilc_event_callback, flags={'event': 'ilc'})
 
     # ------------------------------------------------------------------------------------------------------------------
     def runTestTrajectories(self, num, time, frequency=2, gain=0.25):
@@ -119,7 +127,11 @@ class BILBO_Experiments:
             print(f"MAE error between trajectory 1 and trajectory {i + 2}: {math.degrees(mae_error):.4f}")
 
     # ------------------------------------------------------------------------------------------------------------------
-    def runTrajectory(self, trajectory: BILBO_Trajectory, signals: list[str] = None):
+    def setArchive(self, archive: (ExperimentArchive, None)):
+        self.archive = archive
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def runTrajectory(self, trajectory: BILBO_Trajectory, signals: list[str] = None, metadata: dict = None):
         assert (len(trajectory.inputs) <= MAX_STEPS_TRAJECTORY)
         assert (trajectory.length == len(trajectory.inputs))
         assert (trajectory.time_vector.shape[0] == trajectory.length)
@@ -134,6 +146,7 @@ class BILBO_Experiments:
                        'lowlevel.estimation.state.psi',
                        'lowlevel.estimation.state.psi_dot']
 
+        start_time = time.time()
         self.device.function(
             function='runTrajectory',
             data={
@@ -152,8 +165,78 @@ class BILBO_Experiments:
 
         data = self.events.finished.get_data()
 
+        if self.archive is not None:
+            self._archiveTrajectory(trajectory, data, start_time, metadata)
+
         return data
 
+    # ------------------------------------------------------------------------------------------------------------------
+    def runILC(self, reference, num_trials: int, kp: float = 0.0, kd: float = 0.0, L=None, Q=1.0,
+               initial_input=None, input_limit: float = None, tolerance: float = None,
+               signal: str = 'lowlevel.estimation.state.theta', trajectory_id: int = 100,
+               control_mode: BILBO_Control_Mode = BILBO_Control_Mode.BALANCING) -> (dict, None):
+        """
+        Runs ILC trials on the robot. The robot updates the inputs between the trials itself and only sends a summary
+        per trial (ilc_trial event). If L is given, it is used as learning matrix, otherwise the PD learning gains
+        kp and kd. Blocks until all trials are done and returns the final result. The data of the trials can be read
+        with getILCData.
+        """
+        reference = np.asarray(reference, dtype=float)
+        assert (len(reference) <= MAX_STEPS_TRAJECTORY)
+
+        def to_list(value):
+            return np.asarray(value, dtype=float).tolist() if value is not None else None
+
+        config = {
+            'reference': reference.tolist(),
+            'num_trials': num_trials,
+            'signal': signal,
+            'learning': 'matrix' if L is not None else 'pd',
+            'kp': kp,
+            'kd': kd,
+            'L': to_list(L),
+            'Q': to_list(Q),
+            'initial_input': to_list(initial_input),
+            'input_limit': input_limit,
+            'tolerance': tolerance,
+            'trajectory_id': trajectory_id,
+            'control_mode': int(control_mode),
+        }
+
+        self.logger.info(f"Running ILC with {num_trials} trials on {self.core.id}")
+        timeout = num_trials * (len(reference) * BILBO_CONTROL_DT + 5)
+        try:
+            result = self.device.function(function='runILC', data={'config': config}, return_type=dict,
+                                          request_response=True, timeout=timeout)
+        except TimeoutError:
+            self.logger.error("ILC did not finish")
+            return None
+
+        if result is not None and result.get('input') is not None:
+            result['input'] = decode_array(result['input'])
+        return result
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def stopILC(self):
+        self.device.function(function='stopILC', data={})
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def getILCData(self, trials: list = None, timeout: float = 5) -> (np.ndarray, None):
+        """
+        Reads the input, output and error of ILC trials from the robot. Returns a structured array of shape
+        (number of trials, trial length) with the fields 'input', 'output' and 'error'.
+        """
+        data = {'trials': trials} if trials is not None else {}
+        try:
+            result = self.device.function(function='getILCData', data=data, return_type=dict,
+                                          request_response=True, timeout=timeout)
+        except TimeoutError:
+            return None
+
+        if result is None:
+            return None
+        return decode_array(result['data'])
+
     # ------------------------------------------------------------------------------------------------------------------
     def generateTrajectory(self, inputs: list, name: str, id: int, control_mode: BILBO_Control_Mode):
         assert (len(inputs) <= MAX_STEPS_TRAJECTORY)
@@ -197,6 +280,35 @@ class BILBO_Experiments:
     def stopTrajectory(self):
         ...
 
+    # ------------------------------------------------------------------------------------------------------------------
+    def _archiveTrajectory(self, trajectory: BILBO_Trajectory, data: dict, start_time: float, metadata: dict = None):
+        inputs = np.asarray([[trajectory_input.left, trajectory_input.right]
+                             for trajectory_input in trajectory.inputs.values()], dtype=float)
+        columns = {
+            'step': np.arange(trajectory.length),
+            'time': trajectory.time_vector,
+            'input.left': inputs[:, 0],
+            'input.right': inputs[:, 1],
+        }
+        for signal, values in data['output'].items():
+            columns[signal] = np.asarray(values, dtype=float)
+
+        # The output can have a slightly different length than the trajectory. Pad all columns with NaN.
+        length = max(len(values) for values in columns.values())
+        columns = {name: np.pad(np.asarray(values, dtype=float), (0, length - len(values)), constant_values=np.nan)
+                   for name, values in columns.items()}
+
+        try:
+            self.archive.writeRun(robot=self.core.id, data=columns, start_time=start_time, end_time=time.time(),
+                                  metadata={
+                                      'trajectory_id': trajectory.id,
+                                      'trajectory_name': trajectory.name,
+                                      'controller': trajectory.control_mode.name,
+                                      **(metadata or {}),
+                                  })
+        except Exception as e:
+            self.logger.error(f"Could not archive trajectory {trajectory.id}: {e}")
+
     # ------------------------------------------------------------------------------------------------------------------
     def _trajectory_event_callback(self, message, *args, **kwargs):
         if not 'event' in message.data:
@@ -207,3 +319,14 @@ class BILBO_Experiments:
             speak(f"{self.id}: Trajectory {message.data['trajectory_id']} finished")
 
             self.events.finished.set(resource=message.data, flags={'trajectory_id': message.data['trajectory_id']})
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _ilc_event_callback(self, message, *args, **kwargs):
+        if message.data.get('event') == 'trial':
+            self.logger.info(f"ILC trial {message.data['trial']}: RMS error {message.data['rms_error']:.4f}, "
+                             f"max error {message.data['max_error']:.4f}")
+            self.events.ilc_trial.set(resource=message.data)
+        elif message.data.get('event') == 'finished':
+            self.logger.info(f"ILC finished after {message.data['trials']} trials "
+                             f"(converged: {message.data['converged']})")
+            self.events.ilc_finished.set(resource=message.data)
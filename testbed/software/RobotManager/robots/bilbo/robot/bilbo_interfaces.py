@@ -9,7 +9,7 @@ from extensions.joystick.joystick_manager import Joystick
 from robots.bilbo.robot.bilbo_control import BILBO_Control
 from robots.bilbo.robot.bilbo_core import BILBO_Core
 from robots.bilbo.robot.bilbo_definitions import BILBO_Control_Mode
-from robots.bilbo.robot.bilbo_data import twiprSampleFromDict, BILBO_STATE_DATA_DEFINITIONS
+from robots.bilbo.robot.bilbo_data import twiprSampleFromStream, BILBO_STATE_DATA_DEFINITIONS
 from core.utils.callbacks import CallbackContainer, callback_definition, Callback
 from core.utils.events import event_definition, ConditionEvent
 from core.utils.exit import register_exit_callback
@@ -120,7 +120,7 @@ class BILBO_Interfaces:
 
     # ------------------------------------------------------------------------------------------------------------------
     def _streamCallback(self, stream, *args, **kwargs):
-        data = twiprSampleFromDict(stream.data)
+        data = twiprSampleFromStream(stream)
         #
         # for plot in self.live_plots:
         #     state_name = plot["state_name"]
@@ -0,0 +1,139 @@
+import threading
+
+import numpy as np
+
+# === CUSTOM PACKAGES ==================================================================================================
+from core.communication.wifi.tcp.protocols.tcp_stream_protocol import TCP_Stream_Message
+from core.device import Device
+from core.utils.callbacks import callback_definition, CallbackContainer
+from core.utils.stream_codec import StreamSchema, StructStreamCodec
+from robots.bilbo.robot.bilbo_core import BILBO_Core
+
+
+# ======================================================================================================================
+@callback_definition
+class BILBO_StreamSubscription_Callbacks:
+    records: CallbackContainer
+
+
+class BILBO_StreamSubscription:
+    """
+    Stream of signals the robot sends on request. Every batch of records is passed to the records callbacks as a
+    NumPy structured array with the field 'tick' and one field per signal ('<signal>.min' and '<signal>.max' for
+    the minmax mode).
+    """
+    id: int
+    signals: list
+    mode: str
+    rate: float
+    codec: StructStreamCodec
+    latest: (np.ndarray, None)  # Last received batch
+
+    def __init__(self, streams: 'BILBO_Streams', description: dict):
+        self.streams = streams
+        self.id = description['id']
+        self.signals = description['signals']
+        self.mode = description['mode']
+        self.rate = description['rate']
+        self.codec = StructStreamCodec(StreamSchema.fromDescription(description['schema']))
+        self.callbacks = BILBO_StreamSubscription_Callbacks()
+        self.latest = None
+        self.subscribers = 0
+
+    # ------------------------------------------------------------------------------------------------------------------
+    @property
+    def fields(self) -> list[str]:
+        return self.codec.schema.names
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def unsubscribe(self, callback=None):
+        self.streams.unsubscribe(self, callback)
+
+
+# ======================================================================================================================
+class BILBO_Streams:
+    """
+    Subscriptions to streams of single signals with their own rate. The robot sends the records of all
+    subscriptions in binary batches after every update. Identical subscriptions of several clients are shared.
+    """
+    subscriptions: dict[int, BILBO_StreamSubscription]
+
+    def __init__(self, core: BILBO_Core):
+        self.core = core
+        self.device: Device = self.core.device
+        self.subscriptions = {}
+        self._lock = threading.Lock()
+
+        self.device.callbacks.records.register(self._records_callback)
+        self.device.callbacks.disconnected.register(self._disconnected_callback)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def subscribe(self, signals: (str, list), rate: float = 10, mode: str = 'latest', callback=None,
+                  timeout: float = 1) -> (BILBO_StreamSubscription, None):
+        """
+        Subscribes to a stream of signals. Signals are paths of the robot's log like 'lowlevel.estimation.state.theta'
+        or prefixes like 'lowlevel.estimation.state'. The mode is one of 'latest', 'mean', 'minmax' (reduced over
+        every period of the rate) or 'batch' (all 100 Hz samples). The callback is called with every received batch.
+        """
+        if isinstance(signals, str):
+            signals = [signals]
+        try:
+            description = self.device.function(function='subscribeStream',
+                                               data={'signals': signals, 'rate': rate, 'mode': mode},
+                                               return_type=dict, request_response=True, timeout=timeout)
+        except TimeoutError:
+            description = None
+
+        if description is None:
+            self.core.logger.warning(f"Cannot subscribe to {signals}")
+            return None
+
+        with self._lock:
+            subscription = self.subscriptions.get(description['id'])
+            if subscription is None:
+                subscription = BILBO_StreamSubscription(self, description)
+                self.subscriptions[subscription.id] = subscription
+            subscription.subscribers += 1
+
+        if callback is not None:
+            subscription.callbacks.records.register(callback)
+        return subscription
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def unsubscribe(self, subscription: BILBO_StreamSubscription, callback=None):
+        """
+        Cancels one subscribe call of the subscription. The robot stops the stream once all of them are canceled.
+        """
+        if callback is not None:
+            subscription.callbacks.records.remove(callback)
+
+        with self._lock:
+            if self.subscriptions.get(subscription.id) is not subscription:
+                return
+            subscription.subscribers -= 1
+            if subscription.subscribers <= 0:
+                del self.subscriptions[subscription.id]
+
+        self.device.function(function='unsubscribeStream', data={'id': subscription.id})
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def setDefaultStream(self, enabled: bool):
+        """
+        Enables or disables the full sample the robot sends with every update. It is needed for the data of the
+        BILBO object, so it should only be disabled if the subscriptions are the only data that is used.
+        """
+        self.device.function(function='setDefaultStream', data={'enabled': enabled})
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _records_callback(self, message: TCP_Stream_Message, *args, **kwargs):
+        subscription = self.subscriptions.get(message.schema_hash)
+        if subscription is None:
+            return
+        records = np.frombuffer(message.payload, dtype=subscription.codec.dtype)
+        subscription.latest = records
+        subscription.callbacks.records.call(records)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    def _disconnected_callback(self, *args, **kwargs):
+        with self._lock:
+            self.subscriptions.clear()